@@ -7,6 +7,7 @@ import uuid
 from fastapi import BackgroundTasks
 import tempfile
 from app.utils.task_manager_memory import task_manager
+from app.tts.audio_formats import AUDIO_EXTENSIONS
 import shutil
 
 router = APIRouter()
@@ -47,11 +48,11 @@ async def download_all_srt_and_wav(
     task_dir = SRT_WAV_DIR / pdf_name
     if not task_dir.exists() or not task_dir.is_dir():
         raise HTTPException(status_code=404, detail="任务音频目录不存在")
-    wav_files = list(task_dir.glob("*.wav"))
+    audio_files = sorted(f for f in task_dir.iterdir() if f.is_file() and f.suffix.lower() in AUDIO_EXTENSIONS)
     srt_files = list(task_dir.glob("*_merged.srt"))
-    files_to_zip = wav_files + srt_files
+    files_to_zip = audio_files + srt_files
     if not files_to_zip:
-        raise HTTPException(status_code=404, detail="没有找到可打包的 .wav 和 *_merged.srt 文件")
+        raise HTTPException(status_code=404, detail="没有找到可打包的音频（.wav/.mp3/.ogg）和 *_merged.srt 文件")
     tmp_dir = tempfile.mkdtemp()
     zip_path = Path(tmp_dir) / f"{pdf_name}_srt_and_wav.zip"
     with zipfile.ZipFile(zip_path, "w") as zipf:
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, HTTPException, Form, Query, Depends, BackgroundTasks, Body
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 from fastapi_limiter import FastAPILimiter
 from fastapi_limiter.depends import RateLimiter
 from pathlib import Path
@@ -9,8 +9,11 @@ import openai
 import tempfile
 import shutil
 import os
+import asyncio
+import json
 from typing import List, Dict
 from ..utils.task_manager import task_manager
+from ..utils.text_rewrite import build_rewrite_payload, rewrite_limiter, stream_rewrite_to_file
 from pydantic import BaseModel, Field
 
 router = APIRouter()
@@ -25,10 +28,14 @@ openai.api_key = "sk-proj-Mt9b37Wy7xJj7N7v95-VKz5qaUIC7swffq48SJc6ghB0CgESpUFFvi
 @router.post("/api/image-notes/generate-all")
 async def generate_notes_for_all_images(
     prompt: str = Form("请将下列文字整理为简洁通顺的日文文稿"),
-    task_id: str = Form(None, description="任务ID，可选")
+    task_id: str = Form(None, description="任务ID，可选"),
+    stream: bool = Form(False, description="是否以NDJSON流式返回生成的文本")
 ):
     """
     遍历 converted_images 下所有图片，生成对应 txt 文件并保存在同目录，并可选写入任务进度
+    OCR 在线程中执行，AI 调用为流式，文本边生成边写入 txt；与文稿清洗共用并发上限（排队等待，不返回 429）
+    stream=true 时每收到一段文本返回一行 {"status": "processing", "image", "delta"}，
+    每张图片完成时返回一行 status=image_done，最后一行为 status=completed 的汇总
     """
     if not IMG_DIR.exists():
         raise HTTPException(status_code=404, detail="converted_images 目录不存在")
@@ -40,60 +47,72 @@ async def generate_notes_for_all_images(
 
     result = []
     total = len(image_files)
-    for idx, img_path in enumerate(image_files, 1):
-        try:
-            # OCR识别
-            ocr_text = pytesseract.image_to_string(Image.open(img_path), lang='chi_sim+eng')
-            
-            # 使用 prompt + OCR内容 调用 AI
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": prompt},
-                    {"role": "user", "content": ocr_text}
-                ]
-            )
-            generated_text = response.choices[0].message.content.strip()
 
-            # 保存 txt 到同目录
+    async def process_images():
+        for idx, img_path in enumerate(image_files, 1):
             txt_path = img_path.with_suffix(".txt")
-            txt_path.write_text(generated_text, encoding="utf-8")
+            try:
+                # OCR识别（CPU密集，放到线程中执行，不阻塞事件循环）
+                ocr_text = await asyncio.to_thread(
+                    lambda: pytesseract.image_to_string(Image.open(img_path), lang='chi_sim+eng')
+                )
 
-            result.append({"image": img_path.name, "txt": txt_path.name, "status": "success"})
-            status = "success"
-            error = None
-        except Exception as e:
-            result.append({"image": img_path.name, "status": "failed", "error": str(e)})
-            status = "failed"
-            error = str(e)
-        # 实时写入任务进度
+                # 使用 prompt + OCR内容 流式调用 AI，边生成边保存 txt 到同目录
+                await rewrite_limiter.acquire(timeout=None)
+                try:
+                    async for delta in stream_rewrite_to_file(
+                        build_rewrite_payload(prompt, ocr_text), txt_path, openai.api_key, group="openai"
+                    ):
+                        yield {"status": "processing", "image": img_path.name, "delta": delta}
+                finally:
+                    rewrite_limiter.release()
+
+                result.append({"image": img_path.name, "txt": txt_path.name, "status": "success"})
+                error = None
+            except Exception as e:
+                result.append({"image": img_path.name, "status": "failed", "error": str(e)})
+                error = str(e)
+            yield dict(result[-1], status="image_done", image_status=result[-1]["status"],
+                       progress=int(idx / total * 100), current=idx, total=total)
+            # 实时写入任务进度
+            if task_id:
+                task = task_manager.get_task(task_id)
+                if task:
+                    task_data = task.get("data", {})
+                    task_data["notes_generate"] = {
+                        "status": "processing" if idx < total else ("completed" if error is None else "failed"),
+                        "progress": int(idx / total * 100),
+                        "current": idx,
+                        "total": total,
+                        "current_image": img_path.name,
+                        "results": result.copy(),
+                        "error": error
+                    }
+                    task_manager.update_task(task_id, data=task_data)
+        # 处理完成后写入最终状态
         if task_id:
             task = task_manager.get_task(task_id)
             if task:
                 task_data = task.get("data", {})
                 task_data["notes_generate"] = {
-                    "status": "processing" if idx < total else ("completed" if error is None else "failed"),
-                    "progress": int(idx / total * 100),
-                    "current": idx,
+                    "status": "completed" if all(r.get("status") == "success" for r in result) else "failed",
+                    "progress": 100,
                     "total": total,
-                    "current_image": img_path.name,
-                    "results": result.copy(),
-                    "error": error
+                    "results": result
                 }
                 task_manager.update_task(task_id, data=task_data)
-    # 处理完成后写入最终状态
-    if task_id:
-        task = task_manager.get_task(task_id)
-        if task:
-            task_data = task.get("data", {})
-            task_data["notes_generate"] = {
-                "status": "completed" if all(r.get("status") == "success" for r in result) else "failed",
-                "progress": 100,
-                "total": total,
-                "results": result
-            }
-            task_manager.update_task(task_id, data=task_data)
-    return JSONResponse(content={"results": result})
+
+    if not stream:
+        async for _ in process_images():
+            pass
+        return JSONResponse(content={"results": result})
+
+    async def generate():
+        async for event in process_images():
+            yield json.dumps(event, ensure_ascii=False).encode() + b"\n"
+        yield json.dumps({"status": "completed", "results": result}, ensure_ascii=False).encode() + b"\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
 
 @router.delete("/api/image-notes/image")
 async def delete_images_by_task(
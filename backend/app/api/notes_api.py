@@ -1,22 +1,34 @@
-from fastapi import APIRouter, HTTPException, Body, Query, Form, UploadFile, File
+from fastapi import APIRouter, HTTPException, Body, Query, Form, UploadFile, File, BackgroundTasks
 from fastapi import Path as FastAPIPath
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pathlib import Path
 import openai
 import os
 from dotenv import load_dotenv
 from fastapi.responses import JSONResponse
-from app.utils.base64encoder import encode_image
+from app.utils.image_optimizer import encode_for_llm
 from app.utils.pdf2imgs import pdf_to_jpg
 from app.utils.prompt import read_file_as_text
+from app.utils.llm_batch import (
+    BATCH_POLL_INTERVAL, collect_batch, job_summary, list_jobs, load_job, poll_batch, refresh_batch, submit_batch
+)
+from app.utils.llm_cache import CacheStats, llm_cache
+from app.utils.llm_client import LLMStreamError, llm_client
+from app.utils.llm_provider_pool import provider_pool
+from app.utils.notes_index import DEFAULT_SEARCH_LIMIT, notes_index
+from app.utils.script_checkpoint import ScriptCheckpoint, load_state
+from app.utils.text_rewrite import build_rewrite_payload, rewrite_limiter, stream_rewrite_to_file
+from app.utils.script_context import CONTEXT_MODES
+from app.utils.script_generation import (
+    GENERATION_MODES, PIPELINE_CONCURRENCY, extract_page_num, find_source_pdf,
+    generate_scripts, list_slide_images, request_script
+)
 from typing import List, Dict
 from pydantic import BaseModel, Field
 import asyncio
+import json
 import time
 from app.utils.mysql_config_helper import get_config_value
-from openai import OpenAI
-import requests
-import re
 
 
 load_dotenv()
@@ -30,14 +42,16 @@ NOTES_DIR = BASE_DIR / "notes_output"
 PROCESSED_IMAGES_DIR = BASE_DIR / "processed_images"
 PROCESSED_IMAGES_DIR.mkdir(parents=True, exist_ok=True)
 
-MAX_BASE64_LENGTH = 3000  # 控制图片base64内容最大长度，防止token超限
-OPENAI_RETRY = 3          # OpenAI API最大重试次数
-OPENAI_RETRY_INTERVAL = 2 # 重试间隔秒数
+OPENAI_VISION_MODEL = "gpt-4o-mini"  # 单图讲稿生成使用的视觉模型
+
+# 流式生成的后台任务引用，客户端断开后任务继续执行直至完成
+_background_generations = set()
 
 def save_txt_to_notes_dir(filename: str, content: str):
     """保存文本内容到 notes_output 目录"""
     file_path = NOTES_DIR / filename
     file_path.write_text(content, encoding="utf-8")
+    notes_index.update(file_path)
 
 @router.get("/all")
 async def list_all_txt_files(
@@ -105,6 +119,48 @@ async def get_notes_folders():
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"获取notes文件夹列表失败: {str(e)}")
 
+@router.get("/search")
+async def search_txt_files(
+    keyword: str = Query(..., description="用英文逗号分隔多个关键词"),
+    task_id: str = Query(None, description="任务ID，可选"),
+    dir_name: str = Query(None, description="目录名，可选"),
+    limit: int = Query(DEFAULT_SEARCH_LIMIT, ge=1, le=500, description="最多返回的结果数")
+):
+    """
+    在讲稿全文索引中搜索关键词（任一关键词命中即返回），结果按相关度排序并带高亮摘要
+    传task_id或dir_name时只搜索该目录，都不传时搜索所有项目
+    """
+    from app.utils.task_manager_memory import task_manager
+    subdir = None
+    if task_id:
+        task = task_manager.get_task(task_id)
+        if not task:
+            raise HTTPException(status_code=404, detail="任务不存在")
+        if task["type"] == "pdf_upload":
+            subdir = task["data"].get("original_filename", "").rsplit(".", 1)[0]
+        elif task["type"] == "pdf_to_images":
+            subdir = task["data"].get("pdf_filename", "").rsplit(".", 1)[0]
+        elif task["type"] == "ppt_upload":
+            subdir = task["data"].get("original_filename", "").rsplit(".", 1)[0]
+    elif dir_name:
+        subdir = dir_name
+    if subdir:
+        target_dir = NOTES_DIR / subdir
+        if not target_dir.exists() or not target_dir.is_dir():
+            return {"count": 0, "results": []}
+    if not keyword.strip():
+        raise HTTPException(status_code=400, detail="关键词不能为空")
+    keywords = [kw.strip() for kw in keyword.split(",") if kw.strip()]
+    if not keywords:
+        raise HTTPException(status_code=400, detail="没有有效关键词")
+    start = time.perf_counter()
+    matches = await asyncio.to_thread(notes_index.search, keywords, subdir, limit)
+    return {
+        "count": len(matches),
+        "results": matches,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 2)
+    }
+
 @router.get("/{filename}")
 async def get_txt_file_content(
     filename: str = FastAPIPath(..., description="要读取的文稿文件名"),
@@ -142,10 +198,16 @@ async def get_txt_file_content(
 async def rewrite_txt_file(
     task_id: str = Form(None, description="任务ID，可选"),
     dir_name: str = Form(None, description="目录名，可选"),
-    prompt: str = Form("请将下列文字整理为简洁通顺的日文文稿", description="OpenAI 使用的提示词")
+    filename: str = Form(..., description="要清洗的txt文件名"),
+    prompt: str = Form("请将下列文字整理为简洁通顺的日文文稿", description="OpenAI 使用的提示词"),
+    bypass_cache: bool = Form(default=False, description="是否跳过LLM响应缓存"),
+    stream: bool = Form(default=False, description="是否以NDJSON逐段流式返回生成的文本")
 ):
     """
-    获取指定目录下的txt文件内容，去除 breaktime 行，调用 OpenAI 生成清洗版本，保存为 _cleaned.txt 文件并返回
+    获取指定目录下的txt文件内容，去除 breaktime 行，调用 OpenAI 生成清洗版本，边生成边写入 _cleaned.txt 文件
+    相同的提示词和输入文本命中缓存时直接返回缓存结果
+    stream=true 时每收到一段文本返回一行 {"status": "processing", "delta"}，最后一行为 status=completed 的汇总
+    同时进行的清洗请求数超过 REWRITE_CONCURRENCY 且排队超时时返回 429
     """
     from app.utils.task_manager_memory import task_manager
     subdir = None
@@ -168,29 +230,64 @@ async def rewrite_txt_file(
         file_path = file_path.with_suffix(".txt")
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="文件不存在")
-    try:
-        original_text = file_path.read_text(encoding="utf-8")
-        cleaned_input = "\n".join([
-            line.strip() for line in original_text.splitlines()
-            if line.strip() and "break" not in line.lower()
-        ])
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": prompt},
-                {"role": "user", "content": cleaned_input}
-            ]
-        )
-        new_content = response.choices[0].message.content.strip()
-        new_filename = file_path.with_name(file_path.stem + "_cleaned.txt")
-        new_filename.write_text(new_content, encoding="utf-8")
+    original_text = file_path.read_text(encoding="utf-8")
+    cleaned_input = "\n".join([
+        line.strip() for line in original_text.splitlines()
+        if line.strip() and "break" not in line.lower()
+    ])
+    request_body = build_rewrite_payload(prompt, cleaned_input)
+    new_filename = file_path.with_name(file_path.stem + "_cleaned.txt")
+    cache_stats = CacheStats()
+    result = {}
+
+    if not await rewrite_limiter.acquire():
+        raise HTTPException(status_code=429, detail="文稿清洗请求过多，请稍后重试")
+
+    def summary():
         return {
             "original_file": str(file_path.relative_to(NOTES_DIR)),
             "new_file": str(new_filename.relative_to(NOTES_DIR)),
-            "content": new_content
+            "cache": cache_stats.to_dict(),
+            "provider": result.get("provider"),
+            "usage": result.get("usage")
         }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"处理失败: {e}")
+
+    chunks = stream_rewrite_to_file(
+        request_body, new_filename, openai.api_key, group="openai",
+        use_cache=not bypass_cache, cache_stats=cache_stats, result=result
+    )
+    if not stream:
+        try:
+            new_content = "".join([delta async for delta in chunks])
+        except LLMStreamError as e:
+            raise HTTPException(status_code=500, detail=f"处理失败: {e}")
+        finally:
+            rewrite_limiter.release()
+        return dict(summary(), content=new_content)
+
+    released = False
+
+    def release_slot():
+        # 流结束时释放；客户端在流开始前断开时由 background 兜底，保证只释放一次
+        nonlocal released
+        if not released:
+            released = True
+            rewrite_limiter.release()
+
+    async def generate():
+        try:
+            async for delta in chunks:
+                yield json.dumps({"status": "processing", "delta": delta}, ensure_ascii=False).encode() + b"\n"
+            yield json.dumps(dict(summary(), status="completed"), ensure_ascii=False).encode() + b"\n"
+        except LLMStreamError as e:
+            print(f"[ERROR] 文稿清洗失败: {e}")
+            yield json.dumps({"status": "failed", "error": f"处理失败: {e}"}, ensure_ascii=False).encode() + b"\n"
+        finally:
+            release_slot()
+
+    background_tasks = BackgroundTasks()
+    background_tasks.add_task(release_slot)
+    return StreamingResponse(generate(), media_type="application/x-ndjson", background=background_tasks)
 
 @router.delete("/{filename}")
 async def delete_txt_file(
@@ -223,124 +320,56 @@ async def delete_txt_file(
         raise HTTPException(status_code=404, detail="文件不存在")
     try:
         file_path.unlink()
+        notes_index.update(file_path)
         return {"message": f"{file_path.relative_to(NOTES_DIR)} 删除成功"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"删除失败：{str(e)}")
 
-@router.get("/search")
-async def search_txt_files(
-    keyword: str = Query(..., description="用英文逗号分隔多个关键词"),
-    task_id: str = Query(None, description="任务ID，可选"),
-    dir_name: str = Query(None, description="目录名，可选")
-):
-    """
-    在指定目录下所有 .txt 文件中搜索关键词，必须传task_id或dir_name
-    """
-    from app.utils.task_manager_memory import task_manager
-    subdir = None
-    if task_id:
-        task = task_manager.get_task(task_id)
-        if not task:
-            raise HTTPException(status_code=404, detail="任务不存在")
-        if task["type"] == "pdf_upload":
-            subdir = task["data"].get("original_filename", "").rsplit(".", 1)[0]
-        elif task["type"] == "pdf_to_images":
-            subdir = task["data"].get("pdf_filename", "").rsplit(".", 1)[0]
-        elif task["type"] == "ppt_upload":
-            subdir = task["data"].get("original_filename", "").rsplit(".", 1)[0]
-    elif dir_name:
-        subdir = dir_name
-    else:
-        raise HTTPException(status_code=400, detail="必须提供task_id或dir_name")
-    target_dir = NOTES_DIR / subdir
-    if not target_dir.exists() or not target_dir.is_dir():
-        return {"count": 0, "results": []}
-    if not keyword.strip():
-        raise HTTPException(status_code=400, detail="关键词不能为空")
-    keywords = [kw.strip() for kw in keyword.split(",") if kw.strip()]
-    if not keywords:
-        raise HTTPException(status_code=400, detail="没有有效关键词")
-    matches = []
-    for txt_file in target_dir.glob("*.txt"):
-        try:
-            content = txt_file.read_text(encoding="utf-8")
-            first_hit_index = -1
-            for kw in keywords:
-                index = content.find(kw)
-                if index != -1 and (first_hit_index == -1 or index < first_hit_index):
-                    first_hit_index = index
-            if first_hit_index == -1:
-                continue
-            snippet_start = max(0, first_hit_index - 20)
-            snippet_end = min(len(content), first_hit_index + 100)
-            snippet = content[snippet_start:snippet_end].replace("\n", " ")
-            for kw in keywords:
-                snippet = snippet.replace(kw, f"<mark>{kw}</mark>")
-            matches.append({
-                "file": str(txt_file.relative_to(NOTES_DIR)),
-                "snippet": snippet
-            })
-        except Exception as e:
-            matches.append({
-                "file": str(txt_file.relative_to(NOTES_DIR)),
-                "error": f"读取失败: {str(e)}"
-            })
-    return {"count": len(matches), "results": matches}
-
-async def generate_script_for_image(image_path, notes_subdir, semaphore):
+async def generate_script_for_image(image_path, notes_subdir, semaphore, use_cache=True, cache_stats=None, openai_key=None):
     async with semaphore:
         print(f"[LOG] 开始处理图片: {image_path}")
-        encoded_image = encode_image(str(image_path))
-        print(f"[LOG] 图片base64编码长度: {len(encoded_image)}")
-        if len(encoded_image) > MAX_BASE64_LENGTH:
-            print(f"[WARN] 图片base64过长，已截断: {len(encoded_image)} -> {MAX_BASE64_LENGTH}")
-            encoded_image = encoded_image[:MAX_BASE64_LENGTH]
+        # 使用缩小后的图片并以 image_url 方式发送，不再截断 base64
+        encoded_image, mime_type = await asyncio.to_thread(encode_for_llm, image_path)
         prompt = [
             {"role": "system", "content": "你是一个专业的讲稿生成助手，请根据图片内容生成简洁通顺的中文讲稿。"},
-            {"role": "user", "content": f"图片内容的base64编码：{encoded_image}"}
+            {"role": "user", "content": [
+                {"type": "text", "text": "请根据这张幻灯片生成讲稿。"},
+                {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{encoded_image}"}}
+            ]}
         ]
-        for attempt in range(1, OPENAI_RETRY + 1):
-            try:
-                openai_key = get_config_value('openai_key')
-                print(f"[LOG] 使用OpenAI Key: {openai_key[:6]}...{openai_key[-4:]}")
-                client = OpenAI(api_key=openai_key)
-                print(f"[LOG] 调用OpenAI API（第{attempt}次），图片: {image_path}")
-                response = await asyncio.to_thread(
-                    client.chat.completions.create,
-                    model="gpt-3.5-turbo",
-                    messages=prompt
-                )
-                script_content = response.choices[0].message.content.strip()
-                txt_path = notes_subdir / f"{Path(image_path).stem}.txt"
-                txt_path.write_text(script_content, encoding="utf-8")
-                print(f"[LOG] 文稿生成并保存成功: {txt_path}")
-                print(f"[LOG] 文稿内容预览: {script_content[:50]}...")
-                return {
-                    "image_path": str(image_path),
-                    "txt_path": str(txt_path.relative_to(NOTES_DIR)),
-                    "content": script_content
-                }
-            except Exception as e:
-                import traceback
-                print(f"[ERROR] OpenAI API 调用失败（第{attempt}次），图片: {image_path}，错误: {e}")
-                print(traceback.format_exc())
-                if attempt < OPENAI_RETRY:
-                    print(f"[LOG] {OPENAI_RETRY_INTERVAL}秒后重试...")
-                    time.sleep(OPENAI_RETRY_INTERVAL)
-                else:
-                    print(f"[ERROR] 最终失败，跳过该图片: {image_path}")
-                    return {
-                        "image_path": str(image_path),
-                        "txt_path": None,
-                        "content": None,
-                        "error": str(e)
-                    }
+        payload = {"model": OPENAI_VISION_MODEL, "messages": prompt}
+        txt_path = notes_subdir / f"{Path(image_path).stem}.txt"
+        print(f"[LOG] 调用OpenAI API，图片: {image_path}")
+        # 重试、退避和故障转移由 llm_client 统一处理
+        call = await request_script(openai_key, payload, use_cache, cache_stats, group="openai")
+        if not call["ok"]:
+            print(f"[ERROR] OpenAI API 调用失败（共尝试{call['attempts']}次），跳过该图片: {image_path}，错误: {call['content']}")
+            return {
+                "image_path": str(image_path),
+                "txt_path": None,
+                "content": None,
+                "error": call["content"]
+            }
+        script_content = call["content"].strip()
+        txt_path.write_text(script_content, encoding="utf-8")
+        notes_index.update(txt_path)
+        print(f"[LOG] 文稿生成并保存成功: {txt_path}")
+        print(f"[LOG] 文稿内容预览: {script_content[:50]}...")
+        return {
+            "image_path": str(image_path),
+            "txt_path": str(txt_path.relative_to(NOTES_DIR)),
+            "content": script_content,
+            "cached": call["cached"],
+            "payload_bytes": call["payload_bytes"],
+            "provider": call["provider"]
+        }
 
 @router.post("/generate-script")
 async def generate_script(
     task_id: str = Query(None, description="任务ID，可选"),
     filename: str = Query(None, description="目录名/文件名，可选"),
-    files: List[UploadFile] = File(None, description="多个文件，可选")
+    files: List[UploadFile] = File(None, description="多个文件，可选"),
+    bypass_cache: bool = Query(False, description="是否跳过LLM响应缓存")
 ) -> JSONResponse:
     print(f"[LOG] 接收到请求: task_id={task_id}, filename={filename}, files数量={len(files) if files else 0}")
     if not task_id and not filename and not files:
@@ -350,6 +379,15 @@ async def generate_script(
     try:
         scripts = []
         semaphore = asyncio.Semaphore(3)  # 控制最大并发数
+        cache_stats = CacheStats()
+        openai_key = None
+        if not provider_pool.has_providers("openai"):
+            # 未配置 openai 组提供方时，每个请求只读取一次数据库中的 key
+            try:
+                openai_key = await asyncio.to_thread(get_config_value, 'openai_key')
+            except Exception as e:
+                print(f"[WARN] 读取数据库中的 openai_key 失败: {e}")
+            openai_key = openai_key or openai.api_key
         if task_id or filename:
             subdir = None
             if task_id:
@@ -383,7 +421,7 @@ async def generate_script(
                 image_paths.extend(target_dir.glob(ext))
             print(f"[LOG] 待处理图片数量: {len(image_paths)}")
             tasks = [
-                generate_script_for_image(image_path, notes_subdir, semaphore)
+                generate_script_for_image(image_path, notes_subdir, semaphore, not bypass_cache, cache_stats, openai_key)
                 for image_path in image_paths
             ]
             scripts = await asyncio.gather(*tasks)
@@ -407,13 +445,13 @@ async def generate_script(
                 image_paths = pdf_to_jpg(str(save_path), str(PROCESSED_IMAGES_DIR), max_size=768, dpi=300)
                 print(f"[LOG] PDF {file.filename} 转换图片数量: {len(image_paths)}")
                 tasks = [
-                    generate_script_for_image(image_path, notes_subdir, semaphore)
+                    generate_script_for_image(image_path, notes_subdir, semaphore, not bypass_cache, cache_stats, openai_key)
                     for image_path in image_paths
                 ]
                 scripts += await asyncio.gather(*tasks)
 
         print(f"[LOG] 全部处理完成，成功生成文稿数: {len([s for s in scripts if s.get('content')])}")
-        return JSONResponse(content={"message": "文稿生成成功", "scripts": scripts})
+        return JSONResponse(content={"message": "文稿生成成功", "scripts": scripts, "cache": cache_stats.to_dict()})
     except Exception as e:
         print(f"[FATAL] 文稿生成失败: {e}")
         raise HTTPException(status_code=500, detail=f"文稿生成失败: {str(e)}")
@@ -455,7 +493,7 @@ async def get_available_folders():
 
 class FolderScriptsRequest(BaseModel):
     folder_name: str = Field(..., description="processed_images下的文件夹名称")
-    api_key: str = Field(..., description="API Key，必需")
+    api_key: str = Field(None, description="API Key，可选；未配置 llm_providers.json 时必需")
     prompt: str = Field(None, description="自定义prompt，可选")
     
     class Config:
@@ -474,6 +512,12 @@ class FolderScriptsResponse(BaseModel):
     output_directory: str = Field(..., description="输出目录路径")
     combined_script_file: str = Field(..., description="合并脚本文件路径")
     scripts: List[str] = Field(..., description="生成的脚本列表")
+    mode: str = Field("sequential", description="生成模式")
+    elapsed_seconds: float = Field(None, description="生成总耗时（秒）")
+    cache: Dict[str, int] = Field(None, description="LLM缓存命中统计 {hits, misses}")
+    payload_bytes: int = Field(None, description="所有LLM请求体的总字节数")
+    resumed_pages: int = Field(None, description="续跑时直接复用的已完成页数")
+    prompt_tokens: int = Field(None, description="所有请求提示词文本的估算token总数（不含图片）")
     
     class Config:
         schema_extra = {
@@ -483,7 +527,13 @@ class FolderScriptsResponse(BaseModel):
                 "processed_images": 10,
                 "output_directory": "notes_output/presentation",
                 "combined_script_file": "notes_output/presentation/presentation_combined_scripts.txt",
-                "scripts": ["Page 1:\n这是第一页的讲稿...", "Page 2:\n这是第二页的讲稿..."]
+                "scripts": ["Page 1:\n这是第一页的讲稿...", "Page 2:\n这是第二页的讲稿..."],
+                "mode": "pipelined",
+                "elapsed_seconds": 42.5,
+                "cache": {"hits": 8, "misses": 2},
+                "payload_bytes": 1843200,
+                "resumed_pages": 0,
+                "prompt_tokens": 15000
             }
         }
 
@@ -496,8 +546,16 @@ class FolderScriptsResponse(BaseModel):
     
     输入:
     - folder_name: processed_images下的文件夹名称（与步骤3处理的目录相同）
-    - api_key: 用于调用AI生成讲稿的API密钥
+    - api_key: 用于调用AI生成讲稿的API密钥；配置了 llm_providers.json 时可省略，传入时作为额外的提供方参与负载均衡
     - prompt: 可选的自定义提示词
+    - mode: 生成模式，sequential(默认，逐页串行并携带前几页讲稿) 或 pipelined(并发生成草稿后顺序润色)
+    - concurrency: pipelined模式下的最大并发数
+    - bypass_cache: 为 true 时跳过LLM响应缓存，强制重新生成
+    - stream: 为 true 时以NDJSON流式返回，每完成一页返回一行（页码、讲稿、耗时、token用量、进度），
+      最后一行为 status=completed 的汇总；客户端中途断开时后台继续生成，已完成的页面均已保存
+    - resume: 为 true 时读取 notes_output/<folder>/_generation_state.json，从第一个未完成的页面继续生成，
+      之前的页面直接复用已保存的讲稿并恢复上下文（提示词变化时自动从头生成）
+    - context_mode: sequential模式的前文携带方式，compressed(默认，上一页全文+更早页面摘要) 或 full(前6页全文)
     
     处理流程:
     1. 读取处理后的图片
@@ -507,19 +565,33 @@ class FolderScriptsResponse(BaseModel):
     返回:
     - 处理结果及生成的脚本列表
     - 输出目录和合并脚本文件路径
+    - 生成模式和总耗时，便于对比两种模式的速度
+    - LLM缓存命中/未命中次数，以及所有请求体的总字节数
     """,
     response_model=FolderScriptsResponse
 )
 async def generate_folder_scripts(
     folder_name: str = Form(..., description="processed_images下的文件夹名称"),
-    api_key: str = Form(..., description="API Key，必需"),
-    prompt: str = Form(default=None, description="自定义prompt，可选")
+    api_key: str = Form(default=None, description="API Key，配置了LLM提供方池时可省略"),
+    prompt: str = Form(default=None, description="自定义prompt，可选"),
+    mode: str = Form(default="sequential", description="生成模式：sequential(逐页串行) 或 pipelined(并发草稿+顺序润色)"),
+    concurrency: int = Form(default=PIPELINE_CONCURRENCY, description="pipelined模式下的最大并发数"),
+    bypass_cache: bool = Form(default=False, description="是否跳过LLM响应缓存"),
+    stream: bool = Form(default=False, description="是否以NDJSON逐页流式返回"),
+    resume: bool = Form(default=False, description="是否从上次中断的页面继续生成"),
+    context_mode: str = Form(default="compressed", description="前文携带方式：compressed(上一页全文+摘要) 或 full(全文)")
 ):
     """
     为指定文件夹下的所有图片生成文稿
     """
-    print(f"[LOG] 接收到文件夹脚本生成请求: folder_name={folder_name}")
+    print(f"[LOG] 接收到文件夹脚本生成请求: folder_name={folder_name}, mode={mode}, context_mode={context_mode}")
     print(f"[LOG] 接收到参数: api_key={api_key[:10] if api_key else None}..., prompt={prompt[:50] if prompt else None}...")
+    if mode not in GENERATION_MODES:
+        raise HTTPException(status_code=400, detail=f"mode 必须是 {' 或 '.join(GENERATION_MODES)}")
+    if context_mode not in CONTEXT_MODES:
+        raise HTTPException(status_code=400, detail=f"context_mode 必须是 {' 或 '.join(CONTEXT_MODES)}")
+    if not api_key and not provider_pool.has_providers("script"):
+        raise HTTPException(status_code=400, detail="未配置LLM提供方，必须提供 api_key")
     
     # 构建目标目录路径
     target_dir = PROCESSED_IMAGES_DIR / folder_name
@@ -529,13 +601,8 @@ async def generate_folder_scripts(
         print("[ERROR] 目录不存在")
         raise HTTPException(status_code=404, detail="指定的文件夹不存在")
     
-    # 获取所有图片文件
-    slides_imgs = []
-    for ext in ["*.jpg", "*.jpeg", "*.png"]:
-        slides_imgs.extend(target_dir.glob(ext))
-    
-    # 按文件名排序，确保按页码顺序处理
-    slides_imgs.sort(key=lambda x: x.name)
+    # 获取所有图片文件，按页码顺序处理
+    slides_imgs = list_slide_images(target_dir)
     
     print(f"[LOG] 待处理图片数量: {len(slides_imgs)}")
     
@@ -543,118 +610,135 @@ async def generate_folder_scripts(
         raise HTTPException(status_code=404, detail="文件夹中没有找到图片文件")
     
     # 准备输出目录
-    output_dir = Path("./notes_output") / folder_name
+    output_dir = NOTES_DIR / folder_name
     output_dir.mkdir(parents=True, exist_ok=True)
     print(f"[LOG] 输出目录: {output_dir}")
     
     # 获取提示词
     base_prompt = prompt or read_file_as_text("课程讲稿生成prompt")
-    url = "https://www.dmxapi.com/v1/chat/completions"
     
-    scripts = []
-    recent_scripts = []
-    
-    for i, slide in enumerate(slides_imgs, 1):
-        print(f"[LOG] 开始处理图片 {i}/{len(slides_imgs)}: {slide.name}")
-        time.sleep(5)  # 避免API频率限制
-        
-        # 编码图片
-        encoded_slide = encode_image(slide)
-        print(f"[LOG] 图片base64编码长度: {len(encoded_slide)}")
-        
-        # 构建上下文提示词
-        previous_scripts = "\n".join(
-            [f"Page {i-j}:\n{script}" for j, script in enumerate(reversed(recent_scripts), 1)]
-        )
-        full_prompt = (
-            f"{base_prompt}\n\n[Scripts of Previous pages]\n{previous_scripts}"
-            if recent_scripts else base_prompt
+    cache_stats = CacheStats()
+    checkpoint = ScriptCheckpoint(output_dir, base_prompt, mode, resume=resume, slides=slides_imgs)
+
+    async def run_generation(on_page=None):
+        start_time = time.perf_counter()
+        pages = await generate_scripts(
+            slides_imgs, api_key, base_prompt, output_dir,
+            mode=mode, pdf_path=find_source_pdf(folder_name), concurrency=concurrency,
+            use_cache=not bypass_cache, cache_stats=cache_stats, on_page=on_page, checkpoint=checkpoint,
+            context_mode=context_mode
         )
+        elapsed_seconds = round(time.perf_counter() - start_time, 2)
+        scripts = [f"Page {page['page']}:\n{page['script']}" for page in pages]
         
-        # API请求
-        payload = {
-            "model": "claude-3-5-sonnet-20241022",
-            "messages": [
-                {"role": "system", "content": "You are an experienced lecturer for IT skill training, now you are in charge of writing scripts for various IT courses."},
-                {"role": "user", "content": [
-                    {"type": "text", "text": full_prompt},
-                    {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{encoded_slide}"}},
-                ]},
-            ],
-            "temperature": 0.4,
-            "max_tokens": 4000,
-            "user": "DMXAPI",
-        }
+        # 保存合并文稿
+        combined_script_file = output_dir / f"{folder_name}_combined_scripts.txt"
+        with open(combined_script_file, "w", encoding="utf-8") as f:
+            f.write("\n\n".join(scripts))
+        notes_index.update(combined_script_file)
+        print(f"[LOG] 合并脚本已保存到: {combined_script_file}")
         
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}",
-            "User-Agent": "DMXAPI/1.0.0 (https://www.dmxapi.com/)",
+        print(f"[LOG] 全部处理完成，成功生成文稿数: {len(scripts)}，模式: {mode}，耗时: {elapsed_seconds}秒，缓存: {cache_stats.to_dict()}")
+        return {
+            "message": "文稿生成成功",
+            "folder_name": folder_name,
+            "processed_images": len(slides_imgs),
+            "output_directory": str(output_dir),
+            "combined_script_file": str(combined_script_file),
+            "scripts": scripts,
+            "mode": mode,
+            "elapsed_seconds": elapsed_seconds,
+            "cache": cache_stats.to_dict(),
+            "payload_bytes": sum(page["payload_bytes"] for page in pages),
+            "resumed_pages": len([page for page in pages if page["resumed"]]),
+            "prompt_tokens": sum(page["prompt_tokens"] for page in pages)
         }
-        
-        try:
-            response = requests.post(url, headers=headers, json=payload)
-            print(f"[LOG] API响应状态: {response.status_code}")
-            
-            if response.status_code == 200:
-                result = response.json()
-                script = result["choices"][0]["message"]["content"]
-            else:
-                script = f"API调用失败: {response.status_code} {response.text}"
-                print(f"[ERROR] API调用失败: {response.text}")
-        except Exception as e:
-            print(f"[ERROR] API异常: {e}")
-            script = f"API异常: {e}"
-        
-        # 保存脚本
-        script_with_page = f"Page {i}:\n{script}"
-        scripts.append(script_with_page)
-        recent_scripts.append(script)
-        
-        # 保持最近6页的上下文
-        if len(recent_scripts) > 6:
-            recent_scripts.pop(0)
-        
-        # 保存单页文稿
-        page_txt = output_dir / f"{slide.stem}.txt"
-        with open(page_txt, "w", encoding="utf-8") as f:
-            f.write(script)
-        print(f"[LOG] 单页脚本已保存到: {page_txt}")
-    
-    # 保存合并文稿
-    combined_script_file = output_dir / f"{folder_name}_combined_scripts.txt"
-    with open(combined_script_file, "w", encoding="utf-8") as f:
-        f.write("\n\n".join(scripts))
-    print(f"[LOG] 合并脚本已保存到: {combined_script_file}")
-    
-    print(f"[LOG] 全部处理完成，成功生成文稿数: {len(scripts)}")
-    return {
-        "message": "文稿生成成功",
-        "folder_name": folder_name,
-        "processed_images": len(slides_imgs),
-        "output_directory": str(output_dir),
-        "combined_script_file": str(combined_script_file),
-        "scripts": scripts
-    }
+
+    if not stream:
+        return await run_generation()
+
+    # 流式模式：生成在后台任务中进行，通过队列把每页结果推给响应流
+    queue = asyncio.Queue()
+    generation = asyncio.create_task(run_generation(on_page=queue.put_nowait))
+    _background_generations.add(generation)
+    generation.add_done_callback(_background_generations.discard)
+    generation.add_done_callback(lambda _: queue.put_nowait(None))
+
+    async def generate():
+        total_pages = len(slides_imgs)
+        done = 0
+        while True:
+            page = await queue.get()
+            if page is None:
+                break
+            done += 1
+            yield json.dumps({
+                "status": "processing",
+                "page": page["page"],
+                "slide": page["slide"],
+                "script": page["script"],
+                "ok": page["ok"],
+                "latency": page["latency"],
+                "usage": page["usage"],
+                "cached": page["cached"],
+                "provider": page["provider"],
+                "payload_bytes": page["payload_bytes"],
+                "prompt_tokens": page["prompt_tokens"],
+                "resumed": page["resumed"],
+                "txt_path": page["txt_path"],
+                "progress": int(done / total_pages * 100),
+                "current_page": done,
+                "total_pages": total_pages
+            }, ensure_ascii=False).encode() + b"\n"
+        if generation.exception():
+            print(f"[ERROR] 文稿生成失败: {generation.exception()}")
+            yield json.dumps({
+                "status": "failed",
+                "error": f"文稿生成失败: {generation.exception()}"
+            }, ensure_ascii=False).encode() + b"\n"
+            return
+        result = generation.result()
+        result.pop("scripts")
+        yield json.dumps(dict(result, status="completed"), ensure_ascii=False).encode() + b"\n"
+
+    return StreamingResponse(
+        generate(),
+        media_type="application/x-ndjson"
+    )
 
 @router.post("/generate-pages-script")
 async def generate_pages_script(
     task_id: str = Query(None, description="任务ID，可选"),
     filename: str = Query(None, description="目录名/文件名，可选"),
     files: List[UploadFile] = File(default=None, description="多个文件，可选"),
-    api_key: str = Form(..., description="API Key，可自定义"),
+    api_key: str = Form(default=None, description="API Key，配置了LLM提供方池时可省略"),
     prompt: str = Form(default=None, description="自定义prompt，可选"),
-    pages: List[int] = Form(default=None, description="选中的页码，可选")
+    pages: List[int] = Form(default=None, description="选中的页码，可选"),
+    mode: str = Form(default="sequential", description="生成模式：sequential(逐页串行) 或 pipelined(并发草稿+顺序润色)"),
+    concurrency: int = Form(default=PIPELINE_CONCURRENCY, description="pipelined模式下的最大并发数"),
+    bypass_cache: bool = Form(default=False, description="是否跳过LLM响应缓存"),
+    resume: bool = Form(default=False, description="是否从上次中断的页面继续生成"),
+    context_mode: str = Form(default="compressed", description="前文携带方式：compressed(上一页全文+摘要) 或 full(全文)")
 ):
     print(f"[LOG] 接收到请求: task_id={task_id}, filename={filename}, files数量={len(files) if files else 0}")
-    print(f"[LOG] 接收到参数: api_key={api_key[:10] if api_key else None}..., prompt={prompt[:50] if prompt else None}..., pages={pages}")
+    print(f"[LOG] 接收到参数: api_key={api_key[:10] if api_key else None}..., prompt={prompt[:50] if prompt else None}..., pages={pages}, mode={mode}, resume={resume}")
     if not task_id and not filename and not files:
         print("[ERROR] 参数缺失，必须提供 task_id、filename 或 files")
         raise HTTPException(status_code=400, detail="必须提供 task_id、filename 或 files")
+    if mode not in GENERATION_MODES:
+        raise HTTPException(status_code=400, detail=f"mode 必须是 {' 或 '.join(GENERATION_MODES)}")
+    if context_mode not in CONTEXT_MODES:
+        raise HTTPException(status_code=400, detail=f"context_mode 必须是 {' 或 '.join(CONTEXT_MODES)}")
+    if not api_key and not provider_pool.has_providers("script"):
+        raise HTTPException(status_code=400, detail="未配置LLM提供方，必须提供 api_key")
 
     scripts = []
-    recent_scripts = []
     output_file = None  # 最终稿件txt文件路径
+    cache_stats = CacheStats()
+    payload_bytes = 0
+    resumed_pages = 0
+    prompt_tokens = 0
+    start_time = time.perf_counter()
     if task_id or filename:
         subdir = None
         if task_id:
@@ -677,76 +761,25 @@ async def generate_pages_script(
         if not target_dir.exists() or not target_dir.is_dir():
             print("[ERROR] 目录不存在")
             raise HTTPException(status_code=404, detail="目录不存在")
-        slides_imgs = []
-        for ext in ["*.jpg", "*.jpeg", "*.png"]:
-            slides_imgs.extend(target_dir.glob(ext))
+        slides_imgs = list_slide_images(target_dir)
         print(f"[LOG] 待处理图片数量: {len(slides_imgs)}")
         if pages:
-            def extract_page_num(p):
-                match = re.search(r"(\d+)", p.stem)
-                return int(match.group(1)) if match else None
             slides_imgs = [img for img in slides_imgs if extract_page_num(img) in pages]
             print(f"[LOG] 过滤后图片数量: {len(slides_imgs)}，选中页码: {pages}")
         base_prompt = prompt or read_file_as_text("课程讲稿生成prompt")
-        url = "https://www.dmxapi.com/v1/chat/completions"
-        output_dir = Path("./notes_output") / subdir
+        output_dir = NOTES_DIR / subdir
         output_dir.mkdir(parents=True, exist_ok=True)
-        for i, slide in enumerate(slides_imgs, 1):
-            print(f"[LOG] 开始处理图片: {slide}")
-            time.sleep(5)
-            encoded_slide = encode_image(slide)
-            print(f"[LOG] 图片base64编码长度: {len(encoded_slide)}")
-            previous_scripts = "\n".join(
-                [f"Page {i-j}:\n{script}" for j, script in enumerate(reversed(recent_scripts), 1)]
-            )
-            full_prompt = (
-                f"{base_prompt}\n\n[Scripts of Previous pages]\n{previous_scripts}"
-                if recent_scripts else base_prompt
-            )
-            payload = {
-                "model": "claude-3-5-sonnet-20241022",
-                "messages": [
-                    {"role": "system", "content": "You are an experienced lecture for IT skill training, now you are in charge of writing scripts for various IT courses."},
-                    {"role": "user", "content": [
-                        {"type": "text", "text": full_prompt},
-                        {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{encoded_slide}"}},
-                    ]},
-                ],
-                "temperature": 0.4,
-                "max_tokens": 4000,
-                "user": "DMXAPI",
-            }
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {api_key}",
-                "User-Agent": "DMXAPI/1.0.0 (https://www.dmxapi.com/)",
-            }
-            try:
-                response = requests.post(url, headers=headers, json=payload)
-                print(f"[LOG] API响应状态: {response.status_code}")
-                if response.status_code == 200:
-                    result = response.json()
-                    script = result["choices"][0]["message"]["content"]
-                else:
-                    script = f"API调用失败: {response.status_code} {response.text}"
-            except Exception as e:
-                print(f"[ERROR] API异常: {e}")
-                script = f"API异常: {e}"
-            script_with_page = f"Page {i}:\n{script}"
-            scripts.append(script_with_page)
-            recent_scripts.append(script)
-            if len(recent_scripts) > 6:
-                recent_scripts.pop(0)
-            # 自动保存每页为单独txt
-            page_txt = output_dir / f"{slide.stem}.txt"
-            with open(page_txt, "w", encoding="utf-8") as f:
-                f.write(script)
-            print(f"[LOG] 单页脚本已保存到: {page_txt}")
-        # 自动保存总稿件
-        # output_file = output_dir / f"{subdir}_scripts.txt"
-        # with open(output_file, "w", encoding="utf-8") as f:
-        #     f.write("\n\n".join(scripts))
-        # print(f"[LOG] 脚本已保存到: {output_file}")
+        generated = await generate_scripts(
+            slides_imgs, api_key, base_prompt, output_dir,
+            mode=mode, pdf_path=find_source_pdf(subdir), concurrency=concurrency,
+            use_cache=not bypass_cache, cache_stats=cache_stats,
+            checkpoint=ScriptCheckpoint(output_dir, base_prompt, mode, resume=resume, slides=slides_imgs),
+            context_mode=context_mode
+        )
+        scripts += [f"Page {page['page']}:\n{page['script']}" for page in generated]
+        payload_bytes += sum(page["payload_bytes"] for page in generated)
+        resumed_pages += len([page for page in generated if page["resumed"]])
+        prompt_tokens += sum(page["prompt_tokens"] for page in generated)
     else:
         for file in files:
             print(f"[LOG] 处理上传文件: {file.filename}")
@@ -758,73 +791,34 @@ async def generate_pages_script(
             with open(save_path, "wb") as f:
                 f.write(await file.read())
             print(f"[LOG] PDF已保存: {save_path}")
-            slides_imgs = pdf_to_jpg(str(save_path), "./temp", max_size=768, dpi=300)
+            slides_imgs = [Path(p) for p in pdf_to_jpg(str(save_path), "./temp", max_size=768, dpi=300)]
             print(f"[LOG] PDF {file.filename} 转换图片数量: {len(slides_imgs)}")
             base_prompt = prompt or read_file_as_text("课程讲稿生成prompt")
-            url = "https://www.dmxapi.com/v1/chat/completions"
-            output_dir = Path("./notes_output") / Path(file.filename).stem
+            output_dir = NOTES_DIR / Path(file.filename).stem
             output_dir.mkdir(parents=True, exist_ok=True)
-            for i, slide in enumerate(slides_imgs, 1):
-                print(f"[LOG] 开始处理图片: {slide}")
-                time.sleep(5)
-                encoded_slide = encode_image(slide)
-                print(f"[LOG] 图片base64编码长度: {len(encoded_slide)}")
-                previous_scripts = "\n".join(
-                    [f"Page {i-j}:\n{script}" for j, script in enumerate(reversed(recent_scripts), 1)]
-                )
-                full_prompt = (
-                    f"{base_prompt}\n\n[Scripts of Previous pages]\n{previous_scripts}"
-                    if recent_scripts else base_prompt
-                )
-                payload = {
-                    "model": "claude-3-5-sonnet-20241022",
-                    "messages": [
-                        {"role": "system", "content": "You are an experienced lecture for IT skill training, now you are in charge of writing scripts for various IT courses."},
-                        {"role": "user", "content": [
-                            {"type": "text", "text": full_prompt},
-                            {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{encoded_slide}"}},
-                        ]},
-                    ],
-                    "temperature": 0.4,
-                    "max_tokens": 4000,
-                    "user": "DMXAPI",
-                }
-                headers = {
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {api_key}",
-                    "User-Agent": "DMXAPI/1.0.0 (https://www.dmxapi.com/)",
-                }
-                try:
-                    response = requests.post(url, headers=headers, json=payload)
-                    print(f"[LOG] API响应状态: {response.status_code}")
-                    if response.status_code == 200:
-                        result = response.json()
-                        script = result["choices"][0]["message"]["content"]
-                    else:
-                        script = f"API调用失败: {response.status_code} {response.text}"
-                except Exception as e:
-                    print(f"[ERROR] API异常: {e}")
-                    script = f"API异常: {e}"
-                script_with_page = f"Page {i}:\n{script}"
-                scripts.append(script_with_page)
-                recent_scripts.append(script)
-                if len(recent_scripts) > 6:
-                    recent_scripts.pop(0)
-                # 自动保存每页为单独txt
-                page_txt = output_dir / f"{slide.stem}.txt"
-                with open(page_txt, "w", encoding="utf-8") as f:
-                    f.write(script)
-                print(f"[LOG] 单页脚本已保存到: {page_txt}")
-            # 自动保存总稿件
-            # output_file = output_dir / f"{Path(file.filename).stem}_scripts.txt"
-            # with open(output_file, "w", encoding="utf-8") as f:
-            #     f.write("\n\n".join(scripts))
-            # print(f"[LOG] 脚本已保存到: {output_file}")
-    print(f"[LOG] 全部处理完成，成功生成文稿数: {len(scripts)}")
+            generated = await generate_scripts(
+                slides_imgs, api_key, base_prompt, output_dir,
+                mode=mode, pdf_path=save_path, concurrency=concurrency,
+                use_cache=not bypass_cache, cache_stats=cache_stats,
+                checkpoint=ScriptCheckpoint(output_dir, base_prompt, mode, resume=resume, slides=slides_imgs),
+                context_mode=context_mode
+            )
+            scripts += [f"Page {page['page']}:\n{page['script']}" for page in generated]
+            payload_bytes += sum(page["payload_bytes"] for page in generated)
+            resumed_pages += len([page for page in generated if page["resumed"]])
+            prompt_tokens += sum(page["prompt_tokens"] for page in generated)
+    elapsed_seconds = round(time.perf_counter() - start_time, 2)
+    print(f"[LOG] 全部处理完成，成功生成文稿数: {len(scripts)}，模式: {mode}，耗时: {elapsed_seconds}秒")
     return {
         "message": "生成成功",
         "scripts": scripts,
-        "txt_file": str(output_file) if output_file else None
+        "txt_file": str(output_file) if output_file else None,
+        "mode": mode,
+        "elapsed_seconds": elapsed_seconds,
+        "cache": cache_stats.to_dict(),
+        "payload_bytes": payload_bytes,
+        "resumed_pages": resumed_pages,
+        "prompt_tokens": prompt_tokens
     }
 
 @router.post("/split-script")
@@ -900,6 +894,7 @@ async def split_script(
             page_file = source_file.parent / f"{i}.txt"
             # 写入内容（不包含Page标记）
             page_file.write_text(page_content.strip(), encoding="utf-8")
+            notes_index.update(page_file)
             new_files.append(str(page_file.relative_to(NOTES_DIR)))
             print(f"[LOG] 页面 {i} 已保存到: {page_file}")
         
@@ -918,3 +913,132 @@ async def split_script(
         print(f"[ERROR] 文件拆分失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"文件拆分失败: {str(e)}")
 
+
+@router.get("/generation-state/{folder_name}")
+async def get_generation_state(folder_name: str = FastAPIPath(..., description="notes_output下的文件夹名称")):
+    """
+    查看讲稿生成的断点记录（每页状态、使用的上下文），用于判断是否需要 resume
+    """
+    state = load_state(NOTES_DIR / folder_name)
+    if state is None:
+        raise HTTPException(status_code=404, detail="没有找到生成记录")
+    return state
+
+@router.post("/batch/submit")
+async def submit_batch_generation(
+    folder_names: List[str] = Form(..., description="processed_images下的文件夹名称，可传多个"),
+    api_key: str = Form(default=None, description="API Key，配置了LLM提供方池时可省略"),
+    prompt: str = Form(default=None, description="自定义prompt，可选"),
+    poll_interval: int = Form(default=BATCH_POLL_INTERVAL, description="后台轮询批任务状态的间隔秒数")
+):
+    """
+    离线批量生成：把一个或多个文件夹的所有幻灯片打包成 JSONL 提交到 Batch 接口，
+    后台轮询，完成后自动把讲稿写回 notes_output/<folder>/<页>.txt 和合并文稿
+    """
+    print(f"[LOG] 接收到批量生成请求: folder_names={folder_names}")
+    if not api_key and not provider_pool.has_providers("batch") and not provider_pool.has_providers("script"):
+        raise HTTPException(status_code=400, detail="未配置LLM提供方，必须提供 api_key")
+    for folder_name in folder_names:
+        target_dir = PROCESSED_IMAGES_DIR / folder_name
+        if not target_dir.is_dir():
+            raise HTTPException(status_code=404, detail=f"指定的文件夹不存在: {folder_name}")
+        if not list_slide_images(target_dir):
+            raise HTTPException(status_code=404, detail=f"文件夹中没有找到图片文件: {folder_name}")
+
+    base_prompt = prompt or read_file_as_text("课程讲稿生成prompt")
+    try:
+        job = await submit_batch(folder_names, base_prompt, api_key)
+    except Exception as e:
+        print(f"[ERROR] 批任务提交失败: {e!r}")
+        raise HTTPException(status_code=502, detail=f"批任务提交失败: {e}")
+
+    task = asyncio.create_task(poll_batch(job["job_id"], poll_interval, api_key))
+    _background_generations.add(task)
+    task.add_done_callback(_background_generations.discard)
+    return job_summary(job)
+
+@router.get("/batch/jobs")
+async def get_batch_jobs():
+    """
+    列出所有批任务
+    """
+    return await asyncio.to_thread(list_jobs)
+
+@router.get("/batch/{job_id}")
+async def get_batch_job(
+    job_id: str = FastAPIPath(..., description="批任务ID"),
+    api_key: str = Query(None, description="提交时使用的API Key（服务重启后查询临时提供方的任务时需要）")
+):
+    """
+    查询批任务状态（同时向服务端刷新一次）
+    """
+    job = load_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="批任务不存在")
+    try:
+        job = await refresh_batch(job, api_key)
+    except Exception as e:
+        print(f"[WARN] 批任务状态刷新失败: {e!r}")
+    return job_summary(job)
+
+@router.post("/batch/{job_id}/collect")
+async def collect_batch_job(
+    job_id: str = FastAPIPath(..., description="批任务ID"),
+    api_key: str = Form(default=None, description="提交时使用的API Key（服务重启后收取临时提供方的任务时需要）")
+):
+    """
+    手动收取批任务结果（服务重启导致后台轮询中断时使用）
+    """
+    job = load_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="批任务不存在")
+    try:
+        job = await collect_batch(await refresh_batch(job, api_key), api_key)
+    except Exception as e:
+        print(f"[ERROR] 批任务结果收取失败: {e!r}")
+        raise HTTPException(status_code=502, detail=f"批任务结果收取失败: {e}")
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"批任务尚未完成，当前状态: {job['status']}")
+    return job_summary(job)
+
+@router.post("/search-index/rebuild")
+async def rebuild_search_index():
+    """
+    重建讲稿全文索引（平时写入讲稿时自动增量更新，一般不需要手动调用）
+    """
+    result = await asyncio.to_thread(notes_index.rebuild)
+    return dict(result, **notes_index.stats())
+
+@router.get("/llm-providers/metrics")
+async def get_llm_provider_metrics():
+    """
+    查看每个LLM提供方（key）的并发、RPM、成功/失败/限流次数、平均耗时和token用量，以及熔断状态和对冲请求统计
+    """
+    metrics = provider_pool.metrics()
+    metrics["client"] = llm_client.metrics()
+    metrics["rewrite"] = rewrite_limiter.metrics()
+    return metrics
+
+@router.post("/llm-providers/reload")
+async def reload_llm_providers():
+    """
+    重新读取 llm_providers.json
+    """
+    provider_pool.reload()
+    return provider_pool.metrics()
+
+@router.get("/llm-cache/stats")
+async def get_llm_cache_stats():
+    """
+    查看LLM响应缓存的条目数和占用空间
+    """
+    return await asyncio.to_thread(llm_cache.stats)
+
+@router.post("/llm-cache/clear")
+async def clear_llm_cache():
+    """
+    清空LLM响应缓存
+    """
+    deleted = await asyncio.to_thread(llm_cache.clear)
+    print(f"[LOG] LLM缓存已清空，删除 {deleted} 条")
+    return {"message": "缓存已清空", "deleted": deleted}
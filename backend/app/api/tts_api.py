@@ -1,12 +1,22 @@
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi import APIRouter, HTTPException, Query, Body, WebSocket, WebSocketDisconnect,BackgroundTasks
 from pydantic import BaseModel, Field
 from pathlib import Path
 from app.utils.mysql_config_helper import get_config_value, set_config_value
 import os
-from app.tts.tts_engine import tts, find_txt_files
+import asyncio
+from app.tts.tts_engine import default_voice, find_txt_files
+from app.tts.backends import get_backend
+from app.tts.tts_pool import iter_synthesize_pages
+from app.tts.tts_cache import tts_cache
+from app.tts.audio_formats import AUDIO_EXTENSIONS, AUDIO_FORMATS, format_stats, get_audio_format
+from app.tts.audio_index import audio_index
+from app.tts.lecture_concat import concat_lecture, lecture_paths
+from app.tts.tts_jobs import tts_jobs
+from app.tts.synthesizer_pool import synthesizer_pool
+from app.tts.tts_preview import PREVIEW_AUDIO_FORMAT, clip_preview_text, iter_preview_audio, preview_metrics
 from app.utils.task_manager_memory import task_manager
-from typing import Dict, List
+from typing import Dict, List, Optional
 import logging
 import json
 
@@ -21,12 +31,21 @@ VOICE_MAPPING = {
     "chinese_female": "zh-CN-XiaoxiaoNeural"    # 中文女声
 }
 
+AUDIO_FORMAT_DESCRIPTION = f"输出音频格式：{' / '.join(AUDIO_FORMATS)}，不传时使用默认格式"
+
 tts_tasks: Dict[str, dict] = {}
 tts_tasks_by_filename: Dict[str, dict] = {}
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 
+def check_audio_format(audio_format: str = None) -> str:
+    """校验输出音频格式，返回格式名（未传时为默认格式）"""
+    try:
+        return get_audio_format(audio_format)["name"]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 class ConfigItem(BaseModel):
     key: str
     value: str
@@ -47,6 +66,25 @@ class GenerateAudioRequest(BaseModel):
             }
         }
 
+class PreviewRequest(BaseModel):
+    text: Optional[str] = Field(None, description="要试听的文本，与 page 二选一")
+    task_id: Optional[str] = Field(None, description="任务ID（试听某一页时使用）")
+    filename: Optional[str] = Field(None, description="文件名/目录名（试听某一页时使用）")
+    page: Optional[str] = Field(None, description="要试听的讲稿文件名，例如 3.txt")
+    gender: Optional[str] = Field(None, description="声音性别：male / female / chinese_female")
+    voice: Optional[str] = Field(None, description="声音名称，优先于 gender")
+    rate: Optional[str] = Field(None, description="语速，例如 -10%")
+    audio_format: Optional[str] = Field(None, description="输出音频格式，默认 mp3")
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "text": "今日は関数の基本について説明します。",
+                "gender": "male",
+                "rate": "-10%"
+            }
+        }
+
 class GenerateAudioResponse(BaseModel):
     audio_files: List[str] = Field(..., description="生成的音频文件列表")
     subtitle_files: List[str] = Field(..., description="生成的字幕文件列表")
@@ -102,6 +140,9 @@ def list_txt_files(
 @router.post("/set-config")
 def set_config(item: ConfigItem):
     set_config_value(item.key, item.value)
+    if item.key in ("speech_key", "service_region"):
+        # 下次合成时重新读取密钥和区域
+        get_backend("azure").reset_credentials()
     return {"message": "配置已更新", "key": item.key, "value": item.value}
 
 @router.get("/get-config/{key}")
@@ -145,7 +186,9 @@ def set_voice(voice: str = Body(..., embed=True)):
 async def generate_all_audio(
     task_id: str = Query(None, description="任务ID"),
     filename: str = Query(None, description="文件名/目录名"),
-    gender: str = Query("male", description="声音性别：male(日语男声) 或 female(日语女声) 或 chinese_female(中文女声)")
+    gender: str = Query("male", description="声音性别：male(日语男声) 或 female(日语女声) 或 chinese_female(中文女声)"),
+    bypass_cache: bool = Query(False, description="不使用TTS缓存，全部重新合成"),
+    audio_format: str = Query(None, description=AUDIO_FORMAT_DESCRIPTION)
 ):
     """
     生成所有音频和字幕，支持task_id和filename双入口。
@@ -158,6 +201,7 @@ async def generate_all_audio(
     
     # 设置对应的声音
     voice = VOICE_MAPPING[gender]
+    audio_format = check_audio_format(audio_format)
     
     logging.info(f"🚀 开始执行 generate_all_audio, task_id: {task_id}, filename: {filename}, gender: {gender}, voice: {voice}")
     
@@ -201,25 +245,14 @@ async def generate_all_audio(
     
     results = []
     total = len(raw_txt)
-    for idx, path in enumerate(raw_txt, 1):
-        logging.info(f"🔄 开始处理第 {idx}/{total} 个文件: {path.name}")
-        try:
-            logging.info(f"🎵 开始生成音频: {path.name}, 使用声音: {voice}")
-            tts(path, output_dir=str(output_dir), voice=voice)
-            wav_name = path.stem + ".wav"
-            srt_name = path.stem + "_merged.srt"
-            audio_path = output_dir / wav_name
-            srt_path = output_dir / srt_name
-            
-            result = {
-                "filename": path.name,
-                "audio_file": audio_path.name if audio_path.exists() else None,
-                "subtitle_file": srt_path.name if srt_path.exists() else None,
-                "status": "success"
-            }
-            results.append(result)
+    # 各页并发合成，按页面顺序汇报进度
+    async for idx, result in iter_synthesize_pages(
+        raw_txt, output_dir, voice=voice, use_cache=not bypass_cache, audio_format=audio_format
+    ):
+        path = raw_txt[idx - 1]
+        results.append(result)
+        if result["status"] == "success":
             logging.info(f"✅ 成功生成音频: {path.name}")
-            
             # 构造进度信息
             progress_info = {
                 "status": "processing" if idx < total else "completed",
@@ -229,39 +262,25 @@ async def generate_all_audio(
                 "current_file": path.name,
                 "results": results.copy()
             }
-            # 实时写入 tts_tasks
-            if task_id:
-                tts_tasks[task_id] = progress_info
-                logging.info(f"📊 更新任务进度: {task_id} - {int(idx / total * 100)}%")
-            # 实时写入 tts_tasks_by_filename
-            if filename:
-                tts_tasks_by_filename[filename] = progress_info
-                logging.info(f"📊 [by_filename] 当前进度: {progress_info}")
-        except Exception as e:
-            logging.error(f"❌ 处理文件失败: {path.name}, 错误: {str(e)}")
-            result = {
-                "filename": path.name,
-                "audio_file": None,
-                "subtitle_file": None,
-                "status": "failed",
-                "error": str(e)
-            }
-            results.append(result)
+        else:
+            logging.error(f"❌ 处理文件失败: {path.name}, 错误: {result['error']}")
             # 构造失败进度
             progress_info = {
                 "status": "failed",
-                "error": str(e),
+                "error": result["error"],
                 "current": idx,
                 "total": total,
                 "current_file": path.name,
                 "results": results.copy()
             }
-            if task_id:
-                tts_tasks[task_id] = progress_info
-                logging.error(f"❌ 更新任务状态为失败: {task_id}")
-            if filename:
-                tts_tasks_by_filename[filename] = json.loads(json.dumps(progress_info))
-                logging.error(f"❌ [by_filename] 当前进度: {progress_info}")
+        # 实时写入 tts_tasks
+        if task_id:
+            tts_tasks[task_id] = progress_info
+            logging.info(f"📊 更新任务进度: {task_id} - {int(idx / total * 100)}%")
+        # 实时写入 tts_tasks_by_filename
+        if filename:
+            tts_tasks_by_filename[filename] = json.loads(json.dumps(progress_info))
+            logging.info(f"📊 [by_filename] 当前进度: {progress_info}")
     # 处理完成后写入最终状态
     if task_id:
         tts_tasks[task_id] = {
@@ -280,7 +299,7 @@ async def generate_all_audio(
         }
         logging.info(f"🎉 [by_filename] 任务完成: {filename}")
     files = os.listdir(output_dir)
-    audio_files = [f for f in files if f.endswith(".wav")]
+    audio_files = [f for f in files if f.endswith(AUDIO_EXTENSIONS)]
     srt_files = [f for f in files if f.endswith("_merged.srt")]
     logging.info(f"📊 最终统计 - 音频文件: {len(audio_files)}, 字幕文件: {len(srt_files)}")
     return {
@@ -312,9 +331,49 @@ async def ws_generate_all_audio(websocket: WebSocket):
         await websocket.send_json({"status": "error", "message": str(e)})
         await websocket.close()
 
-async def generate_all_audio_with_ws(websocket, task_id, filename):
-    import asyncio
-    import logging
+def _finished_progress(job, event, results):
+    """任务结束事件对应的进度信息：使用任务真实的结束状态、错误和已完成的页数"""
+    progress_info = {
+        "status": event["status"],
+        "progress": job.snapshot()["progress"],
+        "total": job.total,
+        "results": results
+    }
+    if event.get("error"):
+        progress_info["error"] = event["error"]
+    return progress_info
+
+def _record_all_progress(task_id, filename):
+    """后台任务的事件回调：和 generate_all_audio 一样写入 tts_tasks / tts_tasks_by_filename，供 /ws/generate 等查看"""
+    def on_event(job, event):
+        if event["type"] == "page":
+            result = event["result"]
+            progress_info = {
+                "status": "processing" if event["index"] < job.total else "completed",
+                "progress": event["progress"],
+                "current": event["index"],
+                "total": job.total,
+                "current_file": Path(job.txt_paths[event["index"] - 1]).name,
+                "results": job.results.copy()
+            }
+            if result["status"] != "success":
+                progress_info.update(status="failed", error=result["error"])
+                progress_info.pop("progress")
+        elif event["type"] == "finished":
+            progress_info = _finished_progress(job, event, job.results.copy())
+        else:
+            return
+        if task_id:
+            tts_tasks[task_id] = progress_info
+        if filename:
+            tts_tasks_by_filename[filename] = json.loads(json.dumps(progress_info))
+    return on_event
+
+async def generate_all_audio_with_ws(websocket, task_id, filename, audio_format=None, last_seq=0):
+    """
+    在后台任务中合成整个目录，WebSocket 只转发进度（{"progress": ...}，带 seq 和 job_id）
+    该目录已有进行中的相同任务时直接订阅，不重复合成；last_seq 为断线前最后收到的 seq
+    """
     notes_dir = Path(NOTES_DIR)
     subdir = None
     logging.info(f"[WS] 进入 generate_all_audio_with_ws, task_id={task_id}, filename={filename}")
@@ -357,64 +416,29 @@ async def generate_all_audio_with_ws(websocket, task_id, filename):
 
     raw_txt.sort()
     logging.info(f"[WS] 共找到 {len(raw_txt)} 个 txt 文件待处理")
-    results = []
-    total = len(raw_txt)
-    for idx, path in enumerate(raw_txt, 1):
-        logging.info(f"[WS] 开始处理第 {idx}/{total} 个文件: {path.name}")
-        try:
-            logging.info(f"[WS] 调用 tts 处理: {path}")
-            tts(path, output_dir=str(output_dir))
-            wav_name = path.stem + ".wav"
-            srt_name = path.stem + "_merged.srt"
-            audio_path = output_dir / wav_name
-            srt_path = output_dir / srt_name
-            result = {
-                "filename": path.name,
-                "audio_file": audio_path.name if audio_path.exists() else None,
-                "subtitle_file": srt_path.name if srt_path.exists() else None,
-                "status": "success"
-            }
-            results.append(result)
+    job = tts_jobs.start(
+        output_dir, raw_txt, audio_format=audio_format, owner=task_id or filename,
+        on_event=_record_all_progress(task_id, filename),
+    )
+    async for event in job.subscribe(last_seq):
+        if event["type"] == "page":
+            result = event["result"]
             progress_info = {
-                "status": "processing" if idx < total else "completed",
-                "progress": int(idx / total * 100),
-                "current": idx,
-                "total": total,
-                "current_file": path.name,
-                "results": results.copy()
+                "status": "processing" if event["index"] < job.total else "completed",
+                "progress": event["progress"],
+                "current": event["index"],
+                "total": job.total,
+                "current_file": Path(job.txt_paths[event["index"] - 1]).name,
+                "results": job.results[:event["index"]]
             }
-            logging.info(f"[WS] 推送进度: {progress_info}")
-            await websocket.send_json({"progress": progress_info})
-        except Exception as e:
-            logging.error(f"[WS] 处理文件失败: {path.name}, 错误: {str(e)}")
-            result = {
-                "filename": path.name,
-                "audio_file": None,
-                "subtitle_file": None,
-                "status": "failed",
-                "error": str(e)
-            }
-            results.append(result)
-            progress_info = {
-                "status": "failed",
-                "error": str(e),
-                "current": idx,
-                "total": total,
-                "current_file": path.name,
-                "results": results.copy()
-            }
-            logging.info(f"[WS] 推送失败进度: {progress_info}")
-            await websocket.send_json({"progress": progress_info})
-            break
-        await asyncio.sleep(0.1)
-    # 最终完成状态
-    logging.info(f"[WS] 所有文件处理完成，推送最终状态")
-    await websocket.send_json({"progress": {
-        "status": "completed",
-        "progress": 100,
-        "total": total,
-        "results": results
-    }})
+            if result["status"] != "success":
+                progress_info.update(status="failed", error=result["error"])
+                progress_info.pop("progress")
+        elif event["type"] == "finished":
+            progress_info = _finished_progress(job, event, job.results)
+        else:
+            continue
+        await websocket.send_json({"progress": progress_info, "seq": event["seq"], "job_id": job.job_id})
 
 @router.get("/check-breaktime/all")
 def check_all_merged_srt():
@@ -448,10 +472,12 @@ def check_all_merged_srt():
 
 
 @router.post("/generate-selected")
-def generate_selected_audio(
+async def generate_selected_audio(
     task_id: str = Query(None, description="任务ID"),
     filename: str = Query(None, description="文件名/目录名"),
-    filenames: list = Body(..., embed=True, description="要生成的txt文件名列表")
+    filenames: list = Body(..., embed=True, description="要生成的txt文件名列表"),
+    bypass_cache: bool = Query(False, description="不使用TTS缓存，全部重新合成"),
+    audio_format: str = Query(None, description=AUDIO_FORMAT_DESCRIPTION)
 ):
     """
     批量生成选中的txt文件的音频和字幕，流式返回进度和结果。
@@ -459,6 +485,7 @@ def generate_selected_audio(
     优先使用task_id，若没有则使用filename。
     """
     import json
+    audio_format = check_audio_format(audio_format)
     subdir = None
     if task_id:
         task = task_manager.get_task(task_id)
@@ -486,21 +513,15 @@ def generate_selected_audio(
     if total == 0:
         raise HTTPException(status_code=400, detail="没有可处理的文件")
     results = []
-    def generate():
-        for idx, txt_path in enumerate(selected_files, 1):
-            try:
-                tts(txt_path, output_dir=str(output_dir))
-                wav_name = txt_path.stem + ".wav"
-                srt_name = txt_path.stem + "_merged.srt"
-                audio_path = output_dir / wav_name
-                srt_path = output_dir / srt_name
-                result = {
-                    "filename": txt_path.name,
-                    "audio_file": audio_path.name if audio_path.exists() else None,
-                    "subtitle_file": srt_path.name if srt_path.exists() else None,
-                    "status": "success",
-                    "progress": int(idx / total * 100)
-                }
+    async def generate():
+        # 各页并发合成，按页面顺序逐条返回
+        async for idx, page in iter_synthesize_pages(
+            selected_files, output_dir, use_cache=not bypass_cache, audio_format=audio_format
+        ):
+            txt_path = selected_files[idx - 1]
+            result = {**page, "progress": int(idx / total * 100)}
+            result.pop("elapsed", None)
+            if page["status"] == "success":
                 # 实时写入全局进度
                 if task_id:
                     tts_tasks[task_id] = {
@@ -517,22 +538,13 @@ def generate_selected_audio(
                         tts_tasks_by_filename[filename] = tts_tasks[task_id]
                         logging.info("当前 tts_tasks_by_filename 状态：%s", tts_tasks_by_filename)
                 logging.info(f"✅ 成功生成音频: {txt_path.name}")
-            except Exception as e:
-                result = {
-                    "filename": txt_path.name,
-                    "audio_file": None,
-                    "subtitle_file": None,
+            elif task_id:
+                # 实时写入全局进度
+                tts_tasks[task_id] = {
                     "status": "failed",
-                    "error": str(e),
-                    "progress": int(idx / total * 100)
+                    "error": page["error"]
                 }
-                # 实时写入全局进度
-                if task_id:
-                    tts_tasks[task_id] = {
-                        "status": "failed",
-                        "error": str(e)
-                    }
-                    logging.info("当前 tts_tasks 状态：%s", tts_tasks)
+                logging.info("当前 tts_tasks 状态：%s", tts_tasks)
             results.append(result)
             yield json.dumps(result).encode() + b"\n"
         # 更新任务状态
@@ -596,102 +608,334 @@ def get_gender():
         "gender_name": gender_name
     }
 
-@router.websocket("/ws/generate-selected/{task_id}")
-async def ws_generate_selected_audio(websocket: WebSocket, task_id: str):
+@router.get("/cache/stats")
+def get_tts_cache_stats():
+    """
+    查看TTS缓存的条目数、占用空间和命中率
+    """
+    return tts_cache.stats()
+
+@router.post("/cache/clear")
+def clear_tts_cache():
+    """
+    清空TTS缓存
+    """
+    deleted = tts_cache.clear()
+    print(f"[LOG] TTS缓存已清空，删除 {deleted} 条")
+    return {"message": "缓存已清空", "deleted": deleted}
+
+@router.get("/synthesizers/metrics")
+def get_synthesizer_metrics():
+    """
+    查看语音合成器池的新建/复用次数、空闲连接数、平均建连耗时和平均首包耗时
+    """
+    return synthesizer_pool.metrics()
+
+def resolve_preview(req: PreviewRequest):
+    """
+    解析试听请求，返回 (文本, 声音, 语速, 音频格式)；参数错误时抛出 ValueError
+    """
+    if req.text:
+        text = req.text
+    elif req.page:
+        subdir = None
+        if req.task_id:
+            task = task_manager.get_task(req.task_id)
+            if not task:
+                raise ValueError("任务不存在")
+            if task["type"] in ("pdf_upload", "ppt_upload"):
+                subdir = task["data"].get("original_filename", "").rsplit(".", 1)[0]
+            elif task["type"] == "pdf_to_images":
+                subdir = task["data"].get("pdf_filename", "").rsplit(".", 1)[0]
+            else:
+                raise ValueError("不支持的任务类型")
+        elif req.filename:
+            subdir = req.filename
+        notes_dir = Path(NOTES_DIR) / subdir if subdir else Path(NOTES_DIR)
+        page_path = notes_dir / Path(req.page).name
+        if not page_path.is_file() or page_path.suffix != ".txt":
+            raise ValueError(f"讲稿文件不存在: {req.page}")
+        text = page_path.read_text(encoding="utf-8")
+    else:
+        raise ValueError("请提供 text 或 page 参数")
+    text = clip_preview_text(text)
+    if not text:
+        raise ValueError("试听文本为空")
+    if req.gender and req.gender not in VOICE_MAPPING:
+        raise ValueError("性别参数必须是 'male'(日语男声)、'female'(日语女声) 或 'chinese_female'(中文女声)")
+    voice = req.voice or (VOICE_MAPPING[req.gender] if req.gender else default_voice())
+    backend = get_backend()
+    audio_format = req.audio_format or PREVIEW_AUDIO_FORMAT
+    if not req.audio_format and not backend.supports_format(audio_format):
+        audio_format = "wav"
+    audio_format = get_audio_format(audio_format)["name"]
+    if not backend.supports_format(audio_format):
+        raise ValueError(f"{backend.name} 后端不支持 {audio_format} 格式")
+    return text, voice, req.rate, audio_format
+
+@router.post("/preview")
+async def preview_audio(req: PreviewRequest):
+    """
+    试听：流式返回一段文本或某一页讲稿的合成音频（分块传输，边合成边播放）
+    首段音频耗时等统计见 /preview/metrics
+    """
+    try:
+        text, voice, rate, audio_format = resolve_preview(req)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logging.info(f"🎧 试听: {len(text)} 字, voice: {voice}, rate: {rate}, format: {audio_format}")
+    chunks = iter_preview_audio(text, voice, rate, audio_format)
+    # 先等到第一段音频再返回响应头，合成失败时可以返回错误状态码
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = b""
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"语音合成失败: {e}")
+
+    async def stream():
+        yield first
+        async for chunk in chunks:
+            yield chunk
+
+    return StreamingResponse(
+        stream(),
+        media_type=get_audio_format(audio_format)["media_type"],
+        headers={"Cache-Control": "no-store"}
+    )
+
+@router.get("/preview/metrics")
+def get_preview_metrics():
+    """
+    查看试听的次数、首段音频耗时（TTFA）平均值/P95 和最近的记录
+    """
+    return preview_metrics.snapshot()
+
+@router.websocket("/ws/preview")
+async def ws_preview_audio(websocket: WebSocket):
+    """
+    WebSocket 试听：客户端发送与 POST /preview 相同的 JSON，
+    服务端依次推送 {"status": "started"}、音频二进制帧、{"status": "completed", ttfa_ms, 单词边界...}
+    同一连接可以连续试听多次
+    """
     await websocket.accept()
     try:
-        data = await websocket.receive_json()
-        filenames = data.get("filenames", [])
-        if not isinstance(filenames, list) or not filenames:
-            await websocket.send_json({"error": "请提供要生成的txt文件名列表"})
-            await websocket.close()
-            return
+        while True:
+            data = await websocket.receive_json()
+            try:
+                text, voice, rate, audio_format = resolve_preview(PreviewRequest(**data))
+            except ValueError as e:
+                await websocket.send_json({"status": "error", "error": str(e)})
+                continue
+            fmt = get_audio_format(audio_format)
+            await websocket.send_json({
+                "status": "started", "chars": len(text), "voice": voice,
+                "audio_format": audio_format, "media_type": fmt["media_type"]
+            })
+            info = {}
+            try:
+                async for chunk in iter_preview_audio(text, voice, rate, audio_format, info=info):
+                    await websocket.send_bytes(chunk)
+            except RuntimeError as e:
+                await websocket.send_json({"status": "error", "error": str(e), **info})
+                continue
+            await websocket.send_json({"status": "completed", **info})
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        await websocket.send_json({"status": "error", "error": str(e)})
+        await websocket.close()
+
+@router.get("/formats")
+def get_audio_formats():
+    """
+    查看可选的输出音频格式，以及各格式已生成音频的总字节数、总时长和每分钟语音的字节数
+    """
+    return format_stats.snapshot()
+
+def resolve_output_dir(task_id: str = None, filename: str = None) -> Path:
+    """按 task_id 或 filename 找到项目的音频目录，目录不存在时返回 404"""
+    subdir = None
+    if task_id:
         task = task_manager.get_task(task_id)
         if not task:
-            await websocket.send_json({"error": "任务不存在"})
-            await websocket.close()
-            return
-        if task["type"] == "pdf_upload":
-            pdf_name = task["data"].get("original_filename", "").rsplit(".", 1)[0]
+            raise HTTPException(status_code=404, detail="任务不存在")
+        if task["type"] in ("pdf_upload", "ppt_upload"):
+            subdir = task["data"].get("original_filename", "").rsplit(".", 1)[0]
         elif task["type"] == "pdf_to_images":
-            pdf_name = task["data"].get("pdf_filename", "").rsplit(".", 1)[0]
-        elif task["type"] == "ppt_upload":
-            pdf_name = task["data"].get("original_filename", "").rsplit(".", 1)[0]
+            subdir = task["data"].get("pdf_filename", "").rsplit(".", 1)[0]
         else:
-            await websocket.send_json({"error": "不支持的任务类型"})
-            await websocket.close()
-            return
-        notes_dir = Path(NOTES_DIR) / pdf_name
-        output_dir = Path(AUDIO_OUTPUT_DIR) / pdf_name
-        output_dir.mkdir(parents=True, exist_ok=True)
-        if not notes_dir.exists() or not notes_dir.is_dir():
-            await websocket.send_json({"error": "任务文稿目录不存在"})
-            await websocket.close()
-            return
-        selected_files = [notes_dir / f for f in filenames if (notes_dir / f).exists() and f.endswith('.txt')]
-        total = len(selected_files)
-        if total == 0:
-            await websocket.send_json({"error": "没有可处理的文件"})
-            await websocket.close()
-            return
-        results = []
-        for idx, txt_path in enumerate(selected_files, 1):
-            try:
-                tts(txt_path, output_dir=str(output_dir))
-                wav_name = txt_path.stem + ".wav"
-                srt_name = txt_path.stem + "_merged.srt"
-                audio_path = output_dir / wav_name
-                srt_path = output_dir / srt_name
-                result = {
-                    "filename": txt_path.name,
-                    "audio_file": audio_path.name if audio_path.exists() else None,
-                    "subtitle_file": srt_path.name if srt_path.exists() else None,
-                    "status": "success",
-                    "progress": int(idx / total * 100)
+            raise HTTPException(status_code=400, detail="不支持的任务类型")
+    elif filename:
+        subdir = Path(filename).name
+    output_dir = Path(AUDIO_OUTPUT_DIR) / subdir if subdir else Path(AUDIO_OUTPUT_DIR)
+    if not output_dir.is_dir():
+        raise HTTPException(status_code=404, detail="音频目录不存在")
+    return output_dir
+
+@router.get("/audio-index")
+def get_audio_index(
+    task_id: str = Query(None, description="任务ID"),
+    filename: str = Query(None, description="文件名/目录名"),
+    rebuild: bool = Query(False, description="忽略已有索引，重新读取所有音频头")
+):
+    """
+    查看项目各页音频的时长、采样率、字节数、哈希和在整套音频中的起止时间（毫秒），按页码排序
+    只读取 WAV 头，不解码音频；未变化的文件直接使用 audio_index.json 中的记录
+    """
+    return audio_index.timeline(resolve_output_dir(task_id, filename), rebuild=rebuild)
+
+@router.post("/lecture")
+async def build_lecture_audio(
+    task_id: str = Query(None, description="任务ID"),
+    filename: str = Query(None, description="文件名/目录名")
+):
+    """
+    把各页 WAV 按页码拼接成一条完整的课程音频，同时生成合并后的字幕和每页一个章节的 FFMETADATA 文件
+    只拷贝 PCM 数据、不解码，结果保存在音频目录的 lecture/ 下
+    """
+    output_dir = resolve_output_dir(task_id, filename)
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(None, concat_lecture, output_dir)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/lecture/download")
+def download_lecture_file(
+    task_id: str = Query(None, description="任务ID"),
+    filename: str = Query(None, description="文件名/目录名"),
+    kind: str = Query("audio", description="audio(整条音频) / subtitle(字幕) / chapters(章节)")
+):
+    """
+    下载 POST /lecture 生成的课程音频、字幕或章节文件
+    """
+    paths = lecture_paths(resolve_output_dir(task_id, filename))
+    if kind not in paths:
+        raise HTTPException(status_code=400, detail="kind 必须是 audio、subtitle 或 chapters")
+    path = paths[kind]
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail="课程音频尚未生成，请先调用 /api/tts/lecture")
+    media_types = {"audio": "audio/wav", "subtitle": "application/x-subrip", "chapters": "text/plain"}
+    return FileResponse(path=path, filename=path.name, media_type=media_types[kind])
+
+def _record_selected_progress(task_id, pdf_name, task):
+    """后台任务的事件回调：更新 tts_tasks / tts_tasks_by_filename，结束时把结果写入任务数据"""
+    results = []
+    def on_event(job, event):
+        if event["type"] == "page":
+            page = event["result"]
+            if page["status"] == "success":
+                tts_tasks[task_id] = {
+                    "status": "processing" if event["index"] < job.total else "completed",
+                    "progress": event["progress"],
+                    "current": event["index"],
+                    "total": job.total,
+                    "current_file": page["filename"],
+                    "results": results.copy()
                 }
-                # 实时写入全局进度
-                if task_id:
-                    tts_tasks[task_id] = {
-                        "status": "processing" if idx < total else "completed",
-                        "progress": int(idx / total * 100),
-                        "current": idx,
-                        "total": total,
-                        "current_file": txt_path.name,
-                        "results": results.copy()
-                    }
-                    logging.info("当前 tts_tasks 状态：%s", tts_tasks)
-                    # 同时更新 tts_tasks_by_filename
-                    if pdf_name:
-                        tts_tasks_by_filename[pdf_name] = tts_tasks[task_id]
-                        logging.info("当前 tts_tasks_by_filename 状态：%s", tts_tasks_by_filename)
-                logging.info(f"✅ 成功生成音频: {txt_path.name}")
-            except Exception as e:
-                result = {
-                    "filename": txt_path.name,
-                    "audio_file": None,
-                    "subtitle_file": None,
+                if pdf_name:
+                    tts_tasks_by_filename[pdf_name] = tts_tasks[task_id]
+                logging.info(f"✅ 成功生成音频: {page['filename']}")
+            else:
+                tts_tasks[task_id] = {
                     "status": "failed",
-                    "error": str(e),
-                    "progress": int(idx / total * 100)
+                    "error": page["error"]
                 }
-                # 实时写入全局进度
-                if task_id:
-                    tts_tasks[task_id] = {
-                        "status": "failed",
-                        "error": str(e)
-                    }
-                    logging.info("当前 tts_tasks 状态：%s", tts_tasks)
+            result = {**page, "progress": event["progress"]}
+            result.pop("elapsed", None)
             results.append(result)
-            logging.info(f"📤 推送中: {result}")
-            await websocket.send_json(result)
-        # 更新任务状态
-        task_data = task.get("data", {})
-        task_data["tts_generate_selected"] = {
-            "status": "completed",
-            "progress": 100,
-            "results": results
-        }
-        task_manager.update_task(task_id, data=task_data)
+        elif event["type"] == "finished":
+            tts_tasks[task_id] = _finished_progress(job, event, results.copy())
+            if pdf_name:
+                tts_tasks_by_filename[pdf_name] = tts_tasks[task_id]
+            task_data = task.get("data", {})
+            task_data["tts_generate_selected"] = {
+                "status": event["status"],
+                "progress": tts_tasks[task_id]["progress"],
+                "results": results
+            }
+            if event.get("error"):
+                task_data["tts_generate_selected"]["error"] = event["error"]
+            task_manager.update_task(task_id, data=task_data)
+    return on_event
+
+@router.websocket("/ws/generate-selected/{task_id}")
+async def ws_generate_selected_audio(websocket: WebSocket, task_id: str):
+    """
+    合成选中的页面：收到 {"filenames": [...], "audio_format"?} 后启动后台任务，逐页推送结果（带 seq 和 job_id）
+    合成在后台进行，连接断开不会中断；重连时发送 {"last_seq": n}（不带 filenames）继续接收该任务 seq > n 的事件，
+    也可以用 {"job_id": ..., "last_seq": n} 订阅指定任务。多个连接选中相同页面时共用同一个任务
+    """
+    await websocket.accept()
+    try:
+        data = await websocket.receive_json()
+        last_seq = int(data.get("last_seq") or 0)
+        filenames = data.get("filenames", [])
+        job = None
+        if data.get("job_id"):
+            job = tts_jobs.get(data["job_id"])
+            if not job:
+                await websocket.send_json({"error": "TTS任务不存在或已过期"})
+                await websocket.close()
+                return
+        elif not filenames:
+            # 不带页面列表时按任务ID续订
+            job = tts_jobs.find(task_id)
+        if job is None:
+            if not isinstance(filenames, list) or not filenames:
+                await websocket.send_json({"error": "请提供要生成的txt文件名列表"})
+                await websocket.close()
+                return
+            try:
+                audio_format = get_audio_format(data.get("audio_format"))["name"]
+            except ValueError as e:
+                await websocket.send_json({"error": str(e)})
+                await websocket.close()
+                return
+            task = task_manager.get_task(task_id)
+            if not task:
+                await websocket.send_json({"error": "任务不存在"})
+                await websocket.close()
+                return
+            if task["type"] == "pdf_upload":
+                pdf_name = task["data"].get("original_filename", "").rsplit(".", 1)[0]
+            elif task["type"] == "pdf_to_images":
+                pdf_name = task["data"].get("pdf_filename", "").rsplit(".", 1)[0]
+            elif task["type"] == "ppt_upload":
+                pdf_name = task["data"].get("original_filename", "").rsplit(".", 1)[0]
+            else:
+                await websocket.send_json({"error": "不支持的任务类型"})
+                await websocket.close()
+                return
+            notes_dir = Path(NOTES_DIR) / pdf_name
+            output_dir = Path(AUDIO_OUTPUT_DIR) / pdf_name
+            output_dir.mkdir(parents=True, exist_ok=True)
+            if not notes_dir.exists() or not notes_dir.is_dir():
+                await websocket.send_json({"error": "任务文稿目录不存在"})
+                await websocket.close()
+                return
+            selected_files = [notes_dir / f for f in filenames if (notes_dir / f).exists() and f.endswith('.txt')]
+            if not selected_files:
+                await websocket.send_json({"error": "没有可处理的文件"})
+                await websocket.close()
+                return
+            job = tts_jobs.start(
+                output_dir, selected_files, audio_format=audio_format, owner=task_id,
+                on_event=_record_selected_progress(task_id, pdf_name, task),
+            )
+        await websocket.send_json({"status": "subscribed", "job_id": job.job_id, "total": job.total, "last_seq": job.last_seq})
+        # 只转发后台任务的事件，各页按页面顺序推送
+        async for event in job.subscribe(last_seq):
+            if event["type"] == "page":
+                result = {**event["result"], "progress": event["progress"], "seq": event["seq"], "job_id": job.job_id}
+                result.pop("elapsed", None)
+                await websocket.send_json(result)
+            elif event["type"] == "finished":
+                await websocket.send_json({
+                    "type": "finished", "status": event["status"], "total": job.total,
+                    "seq": event["seq"], "job_id": job.job_id,
+                })
         await websocket.close()
     except WebSocketDisconnect:
         pass
@@ -699,3 +943,30 @@ async def ws_generate_selected_audio(websocket: WebSocket, task_id: str):
         await websocket.send_json({"error": str(e)})
         await websocket.close()
 
+
+@router.get("/jobs")
+async def list_tts_jobs():
+    """
+    查看后台合成任务（进行中和保留期内已结束的）
+    任务由事件循环管理，这几个接口必须是 async def，在事件循环中读写任务表和取消 asyncio.Task
+    """
+    return {"jobs": tts_jobs.list_jobs()}
+
+@router.get("/jobs/{job_id}")
+async def get_tts_job(job_id: str):
+    """
+    查看后台合成任务的状态和已完成页面的结果；断线后可用 last_seq 通过 WebSocket 继续订阅
+    """
+    job = tts_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="TTS任务不存在或已过期")
+    return {**job.snapshot(), "results": job.results}
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_tts_job(job_id: str):
+    """
+    取消进行中的后台合成任务（已开始合成的页面会完成，尚未开始的页面不再合成）
+    """
+    if not tts_jobs.cancel(job_id):
+        raise HTTPException(status_code=404, detail="TTS任务不存在或已结束")
+    return {"message": "已取消", "job_id": job_id}
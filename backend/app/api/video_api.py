@@ -11,7 +11,7 @@ import tempfile
 import time
 import logging
 from datetime import datetime
-from app.utils.transcoding import encode_video, get_video_info
+from app.utils.transcode_scheduler import transcode_scheduler
 import shutil
 from app.utils.task_manager_memory import task_manager
 
@@ -157,15 +157,91 @@ async def get_all_videos():
 
     return {"tasks": tasks, "encoded": encoded}
 
+def _transcode_callbacks(task_name: str, display_name, output_name):
+    """
+    转码调度器的回调：更新 transcoding_tasks[task_name] 并通过 WebSocket 推送
+    display_name / output_name 把输入/输出路径转为结果中显示的名称
+    多个文件同时转码时，running 为各文件当前的进度，current_file / current_progress 为最近一次更新的文件
+    """
+    state = transcoding_tasks[task_name]
+
+    async def on_start(item):
+        name = display_name(item.input_path)
+        logger.info(f"[{state['completed'] + len(state['running']) + 1}/{state['total']}] 开始转码: {name}")
+        if not item.input_path.exists():
+            raise FileNotFoundError(f"输入文件不存在: {item.input_path}")
+        # 获取输入文件大小用于统计
+        state["statistics"]["total_input_size"] += item.input_path.stat().st_size
+        state["running"][name] = 0
+        state["current_file"] = name
+        state["current_progress"] = 0
+        await send_progress(task_name, state)
+
+    async def on_progress(item, percent):
+        name = display_name(item.input_path)
+        if name not in state["running"]:
+            return
+        state["running"][name] = percent
+        state["current_file"] = name
+        state["current_progress"] = percent
+        await send_progress(task_name, state)
+
+    async def on_done(item, success, transcode_result):
+        name = display_name(item.input_path)
+        state["running"].pop(name, None)
+        if success and transcode_result:
+            # 转码成功
+            state["statistics"]["successful_transcodes"] += 1
+            state["statistics"]["total_output_size"] += transcode_result['output_info']['file_size']
+            result = {
+                "input": name,
+                "output": output_name(item.output_path),
+                "status": "success",
+                "duration": transcode_result.get("encoding_duration", 0),
+                "input_info": transcode_result.get("input_info", {}),
+                "output_info": transcode_result.get("output_info", {}),
+                "changes": transcode_result.get("changes", {}),
+                "encoding_settings": transcode_result.get("encoding_settings", {}),
+                "timestamp": datetime.now().isoformat()
+            }
+            logger.info(f"✅ 转码成功: {name}")
+            if "changes" in transcode_result:
+                changes = transcode_result["changes"]
+                logger.info(f"   文件大小变化: {changes.get('size_change_mb', 0):+.2f} MB ({changes.get('size_change_percent', 0):+.2f}%)")
+                logger.info(f"   压缩比: {changes.get('compression_ratio', 1):.3f}")
+        else:
+            # 转码失败
+            state["statistics"]["failed_transcodes"] += 1
+            error_msg = "转码失败"
+            if isinstance(transcode_result, dict) and "error" in transcode_result:
+                error_msg = transcode_result["error"]
+            result = {
+                "input": name,
+                "status": "failed",
+                "error": error_msg,
+                "timestamp": datetime.now().isoformat()
+            }
+            logger.error(f"❌ 转码失败: {name} - {error_msg}")
+        state["results"].append(result)
+        # 更新进度
+        state["completed"] += 1
+        state["current_file"] = name
+        state["current_progress"] = 100
+        await send_progress(task_name, state)
+
+    return on_start, on_progress, on_done
+
 @router.post("/transcode")
 async def transcode_video(
     task_id: str = Query(None, description="任务ID"),
     filename: str = Query(None, description="文件名/目录名"),
+    priority: int = Query(0, description="转码优先级，数值大的任务先转码；相同优先级的任务轮流转码"),
     background_tasks: BackgroundTasks = None
 ):
     """
     转码指定任务目录下的所有视频文件，支持task_id和filename双入口。
     优先使用task_id，若没有则使用filename。
+    文件由转码调度器并发转码（见 transcode_scheduler），进度通过 /ws/transcode/{task} 推送。
     """
     # 检查 ffmpeg 是否可用
     if not check_ffmpeg():
@@ -211,6 +287,8 @@ async def transcode_video(
         "completed": 0,
         "current_file": "",
         "current_progress": 0,
+        "running": {},
+        "priority": priority,
         "results": [],
         "start_time": datetime.now().isoformat(),
         "statistics": {
@@ -231,90 +309,11 @@ async def transcode_video(
         try:
             batch_start_time = time.time()
             
-            for index, (input_path, output_path) in enumerate(videos_to_process, 1):
-                try:
-                    # 更新当前处理的文件
-                    transcoding_tasks[pdf_name]["current_file"] = input_path.name
-                    transcoding_tasks[pdf_name]["current_progress"] = 0
-                    await send_progress(pdf_name, transcoding_tasks[pdf_name])
-                    
-                    logger.info(f"[{index}/{len(videos_to_process)}] 开始转码: {input_path.name}")
-                    
-                    if not input_path.exists():
-                        raise FileNotFoundError(f"输入文件不存在: {input_path}")
-                    output_path.parent.mkdir(parents=True, exist_ok=True)
-                    
-                    # 获取输入文件信息用于统计
-                    input_info = get_video_info(str(input_path))
-                    if input_info:
-                        transcoding_tasks[pdf_name]["statistics"]["total_input_size"] += input_info['file_size']
-                    
-                    # 执行转码
-                    success, transcode_result = encode_video(str(input_path), str(output_path))
-                    
-                    if success and transcode_result:
-                        # 转码成功
-                        transcoding_tasks[pdf_name]["statistics"]["successful_transcodes"] += 1
-                        transcoding_tasks[pdf_name]["statistics"]["total_output_size"] += transcode_result['output_info']['file_size']
-                        
-                        result = {
-                            "input": input_path.name,
-                            "output": output_path.name,
-                            "status": "success",
-                            "duration": transcode_result.get("encoding_duration", 0),
-                            "input_info": transcode_result.get("input_info", {}),
-                            "output_info": transcode_result.get("output_info", {}),
-                            "changes": transcode_result.get("changes", {}),
-                            "encoding_settings": transcode_result.get("encoding_settings", {}),
-                            "timestamp": datetime.now().isoformat()
-                        }
-                        
-                        logger.info(f"✅ 转码成功: {input_path.name} -> {output_path.name}")
-                        
-                        # 打印转码结果统计
-                        if "changes" in transcode_result:
-                            changes = transcode_result["changes"]
-                            logger.info(f"   文件大小变化: {changes.get('size_change_mb', 0):+.2f} MB ({changes.get('size_change_percent', 0):+.2f}%)")
-                            logger.info(f"   压缩比: {changes.get('compression_ratio', 1):.3f}")
-                    
-                    else:
-                        # 转码失败
-                        transcoding_tasks[pdf_name]["statistics"]["failed_transcodes"] += 1
-                        error_msg = "转码失败"
-                        if isinstance(transcode_result, dict) and "error" in transcode_result:
-                            error_msg = transcode_result["error"]
-                        
-                        result = {
-                            "input": input_path.name,
-                            "status": "failed",
-                            "error": error_msg,
-                            "timestamp": datetime.now().isoformat()
-                        }
-                        
-                        logger.error(f"❌ 转码失败: {input_path.name} - {error_msg}")
-                    
-                    transcoding_tasks[pdf_name]["results"].append(result)
-                    
-                except Exception as e:
-                    # 处理异常
-                    transcoding_tasks[pdf_name]["statistics"]["failed_transcodes"] += 1
-                    error_msg = str(e)
-                    
-                    result = {
-                        "input": input_path.name,
-                        "status": "failed", 
-                        "error": error_msg,
-                        "timestamp": datetime.now().isoformat()
-                    }
-                    
-                    transcoding_tasks[pdf_name]["results"].append(result)
-                    logger.error(f"❌ 转码异常: {input_path.name} - {error_msg}")
-                
-                finally:
-                    # 更新进度
-                    transcoding_tasks[pdf_name]["completed"] += 1
-                    transcoding_tasks[pdf_name]["current_progress"] = 100
-                    await send_progress(pdf_name, transcoding_tasks[pdf_name])
+            # 交给转码调度器并发转码，每个文件开始/进度/完成时更新状态并推送
+            on_start, on_progress, on_done = _transcode_callbacks(
+                pdf_name, lambda path: path.name, lambda path: path.name
+            )
+            await transcode_scheduler.run(pdf_name, videos_to_process, priority, on_start, on_progress, on_done)
             
             # 完成所有转码
             batch_end_time = time.time()
@@ -722,14 +721,23 @@ async def get_all_transcode_tasks():
         "tasks": tasks_overview
     }
 
+@router.get("/transcode-scheduler")
+async def get_transcode_scheduler():
+    """
+    转码调度器状态：并发数、每个 ffmpeg 的线程数，以及各任务正在转码和排队的文件
+    """
+    return transcode_scheduler.snapshot()
+
 @router.post("/transcode-directory")
 async def transcode_directory(
     directory_path: str = Query(..., description="要转码的目录路径（相对于videos目录）"),
     recursive: bool = Query(True, description="是否递归处理子目录"),
+    priority: int = Query(0, description="转码优先级，数值大的任务先转码；相同优先级的任务轮流转码"),
     background_tasks: BackgroundTasks = None
 ):
     """
     直接对指定目录进行转码，支持递归处理子目录下的所有视频文件
+    文件由转码调度器并发转码（见 transcode_scheduler），进度通过 /ws/transcode/{task} 推送。
     """
     # 检查 ffmpeg 是否可用
     if not check_ffmpeg():
@@ -782,6 +790,8 @@ async def transcode_directory(
         "completed": 0,
         "current_file": "",
         "current_progress": 0,
+        "running": {},
+        "priority": priority,
         "results": [],
         "start_time": datetime.now().isoformat(),
         "directory_path": directory_path,
@@ -804,94 +814,13 @@ async def transcode_directory(
         try:
             batch_start_time = time.time()
             
-            for index, (input_path, output_path) in enumerate(videos_to_process, 1):
-                try:
-                    # 更新当前处理的文件
-                    relative_input = input_path.relative_to(input_dir)
-                    transcoding_tasks[task_name]["current_file"] = str(relative_input)
-                    transcoding_tasks[task_name]["current_progress"] = 0
-                    await send_progress(task_name, transcoding_tasks[task_name])
-                    
-                    logger.info(f"[{index}/{len(videos_to_process)}] 开始转码: {relative_input}")
-                    
-                    if not input_path.exists():
-                        raise FileNotFoundError(f"输入文件不存在: {input_path}")
-                    
-                    # 确保输出目录存在
-                    output_path.parent.mkdir(parents=True, exist_ok=True)
-                    
-                    # 获取输入文件信息用于统计
-                    input_info = get_video_info(str(input_path))
-                    if input_info:
-                        transcoding_tasks[task_name]["statistics"]["total_input_size"] += input_info['file_size']
-                    
-                    # 执行转码
-                    success, transcode_result = encode_video(str(input_path), str(output_path))
-                    
-                    if success and transcode_result:
-                        # 转码成功
-                        transcoding_tasks[task_name]["statistics"]["successful_transcodes"] += 1
-                        transcoding_tasks[task_name]["statistics"]["total_output_size"] += transcode_result['output_info']['file_size']
-                        
-                        result = {
-                            "input": str(relative_input),
-                            "output": str(output_path.relative_to(output_dir)),
-                            "status": "success",
-                            "duration": transcode_result.get("encoding_duration", 0),
-                            "input_info": transcode_result.get("input_info", {}),
-                            "output_info": transcode_result.get("output_info", {}),
-                            "changes": transcode_result.get("changes", {}),
-                            "encoding_settings": transcode_result.get("encoding_settings", {}),
-                            "timestamp": datetime.now().isoformat()
-                        }
-                        
-                        logger.info(f"✅ 转码成功: {relative_input}")
-                        
-                        # 打印转码结果统计
-                        if "changes" in transcode_result:
-                            changes = transcode_result["changes"]
-                            logger.info(f"   文件大小变化: {changes.get('size_change_mb', 0):+.2f} MB ({changes.get('size_change_percent', 0):+.2f}%)")
-                            logger.info(f"   压缩比: {changes.get('compression_ratio', 1):.3f}")
-                    
-                    else:
-                        # 转码失败
-                        transcoding_tasks[task_name]["statistics"]["failed_transcodes"] += 1
-                        error_msg = "转码失败"
-                        if isinstance(transcode_result, dict) and "error" in transcode_result:
-                            error_msg = transcode_result["error"]
-                        
-                        result = {
-                            "input": str(relative_input),
-                            "status": "failed",
-                            "error": error_msg,
-                            "timestamp": datetime.now().isoformat()
-                        }
-                        
-                        logger.error(f"❌ 转码失败: {relative_input} - {error_msg}")
-                    
-                    transcoding_tasks[task_name]["results"].append(result)
-                    
-                except Exception as e:
-                    # 处理异常
-                    transcoding_tasks[task_name]["statistics"]["failed_transcodes"] += 1
-                    error_msg = str(e)
-                    relative_input = input_path.relative_to(input_dir) if input_path.exists() else "unknown"
-                    
-                    result = {
-                        "input": str(relative_input),
-                        "status": "failed", 
-                        "error": error_msg,
-                        "timestamp": datetime.now().isoformat()
-                    }
-                    
-                    transcoding_tasks[task_name]["results"].append(result)
-                    logger.error(f"❌ 转码异常: {relative_input} - {error_msg}")
-                
-                finally:
-                    # 更新进度
-                    transcoding_tasks[task_name]["completed"] += 1
-                    transcoding_tasks[task_name]["current_progress"] = 100
-                    await send_progress(task_name, transcoding_tasks[task_name])
+            # 交给转码调度器并发转码，每个文件开始/进度/完成时更新状态并推送
+            on_start, on_progress, on_done = _transcode_callbacks(
+                task_name,
+                lambda path: str(path.relative_to(input_dir)),
+                lambda path: str(path.relative_to(output_dir)),
+            )
+            await transcode_scheduler.run(task_name, videos_to_process, priority, on_start, on_progress, on_done)
             
             # 完成所有转码
             batch_end_time = time.time()
@@ -0,0 +1,124 @@
+"""
+TTS 输出音频格式
+
+原来每页固定输出未压缩的 WAV，整套课程的音频和打包下载都很大。这里直接使用 Azure 合成器的原生输出格式
+（SpeechSynthesisOutputFormat），合成结果即为目标格式，不做事后转码：
+- wav：SDK 默认的 RIFF PCM（与原来的输出相同）；wav16 / wav24 / wav48 指定采样率
+- mp3：24kHz 48kbps 单声道 MP3
+- opus：24kHz 单声道 Ogg Opus
+
+只有 PCM 格式可以按帧拼接和插入静音，分段并行合成（tts_chunking）只用于 PCM 格式，压缩格式整页合成。
+每页生成后按格式累计字节数和音频时长，用于比较各格式每分钟语音的大小。
+"""
+import os
+import struct
+import threading
+import wave
+from typing import Optional
+
+# name: (SDK 输出格式名, 扩展名, MIME 类型, 是否 PCM, 码率 bit/s，None 表示不固定)
+AUDIO_FORMATS = {
+    "wav": {"sdk_format": None, "ext": ".wav", "media_type": "audio/wav", "pcm": True, "bitrate": None},
+    "wav16": {"sdk_format": "Riff16Khz16BitMonoPcm", "ext": ".wav", "media_type": "audio/wav", "pcm": True, "bitrate": 256000},
+    "wav24": {"sdk_format": "Riff24Khz16BitMonoPcm", "ext": ".wav", "media_type": "audio/wav", "pcm": True, "bitrate": 384000},
+    "wav48": {"sdk_format": "Riff48Khz16BitMonoPcm", "ext": ".wav", "media_type": "audio/wav", "pcm": True, "bitrate": 768000},
+    "mp3": {"sdk_format": "Audio24Khz48KBitRateMonoMp3", "ext": ".mp3", "media_type": "audio/mpeg", "pcm": False, "bitrate": 48000},
+    "opus": {"sdk_format": "Ogg24Khz16BitMonoOpus", "ext": ".ogg", "media_type": "audio/ogg", "pcm": False, "bitrate": None},
+}
+DEFAULT_AUDIO_FORMAT = os.getenv("TTS_AUDIO_FORMAT", "wav")
+
+# 下载、列表等下游识别的音频扩展名
+AUDIO_EXTENSIONS = tuple(sorted({fmt["ext"] for fmt in AUDIO_FORMATS.values()}))
+
+
+def get_audio_format(name: Optional[str] = None) -> dict:
+    """按名称取格式定义（None 时为默认格式），未知格式抛出 ValueError"""
+    name = name or DEFAULT_AUDIO_FORMAT
+    if name not in AUDIO_FORMATS:
+        raise ValueError(f"不支持的音频格式: {name}，可选: {', '.join(AUDIO_FORMATS)}")
+    return dict(AUDIO_FORMATS[name], name=name)
+
+
+def sdk_output_format(name: Optional[str]):
+    """对应的 speechsdk.SpeechSynthesisOutputFormat，默认 wav 返回 None（不修改 SDK 的默认格式）"""
+    sdk_format = get_audio_format(name)["sdk_format"]
+    if sdk_format is None:
+        return None
+    import azure.cognitiveservices.speech as speechsdk
+    return speechsdk.SpeechSynthesisOutputFormat[sdk_format]
+
+
+def _ogg_duration_ms(path) -> Optional[int]:
+    """Ogg Opus 时长：最后一页的 granule position（48kHz 采样数）减去 OpusHead 中的 pre-skip"""
+    with open(path, "rb") as f:
+        head = f.read(64)
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(0, size - 65536))
+        tail = f.read()
+    pos = tail.rfind(b"OggS")
+    opus_head = head.find(b"OpusHead")
+    if pos < 0 or len(tail) < pos + 14:
+        return None
+    granule = struct.unpack_from("<q", tail, pos + 6)[0]
+    pre_skip = struct.unpack_from("<H", head, opus_head + 10)[0] if opus_head >= 0 else 0
+    return max(0, granule - pre_skip) * 1000 // 48000
+
+
+def audio_duration_ms(path, name: Optional[str] = None) -> Optional[int]:
+    """
+    音频时长（毫秒），无法确定时返回 None
+    PCM 读 WAV 头，Ogg 读最后一页的 granule position，固定码率的 MP3 按文件大小换算
+    """
+    fmt = get_audio_format(name)
+    try:
+        if fmt["pcm"]:
+            with wave.open(str(path), "rb") as reader:
+                return reader.getnframes() * 1000 // reader.getframerate()
+        if fmt["ext"] == ".ogg":
+            return _ogg_duration_ms(path)
+        if fmt["bitrate"]:
+            return os.path.getsize(path) * 8000 // fmt["bitrate"]
+    except (OSError, EOFError, wave.Error, struct.error) as e:
+        print(f"[WARN] 读取音频时长失败: {path}: {e}")
+    return None
+
+
+class FormatStats:
+    """按格式累计生成的音频字节数和时长，计算每分钟语音的字节数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def record(self, name: str, size: int, duration_ms: Optional[int]):
+        if not duration_ms:
+            return
+        with self._lock:
+            total = self._totals.setdefault(name, {"pages": 0, "bytes": 0, "duration_ms": 0})
+            total["pages"] += 1
+            total["bytes"] += size
+            total["duration_ms"] += duration_ms
+
+    def snapshot(self) -> dict:
+        formats = {}
+        with self._lock:
+            totals = {name: dict(total) for name, total in self._totals.items()}
+        for name, fmt in AUDIO_FORMATS.items():
+            total = totals.get(name, {"pages": 0, "bytes": 0, "duration_ms": 0})
+            formats[name] = {
+                "ext": fmt["ext"],
+                "media_type": fmt["media_type"],
+                "nominal_bytes_per_minute": fmt["bitrate"] * 60 // 8 if fmt["bitrate"] else None,
+                "pages": total["pages"],
+                "bytes": total["bytes"],
+                "duration_ms": total["duration_ms"],
+                "bytes_per_minute": (
+                    round(total["bytes"] * 60000 / total["duration_ms"]) if total["duration_ms"] else None
+                ),
+            }
+        return {"default": DEFAULT_AUDIO_FORMAT, "formats": formats}
+
+
+# 全局统计
+format_stats = FormatStats()
@@ -0,0 +1,216 @@
+"""
+项目音频索引
+
+进度预估、视频合成、字幕检查都需要各页音频的时长，原来只能解码音频或调用 ffprobe（像 get_video_info 对视频那样）。
+这里为每个输出目录维护一份索引 audio_index.json，记录各页音频的时长、采样率、字节数和内容哈希：
+- WAV 只读 RIFF 头（fmt / data 块的头部），不读音频数据；MP3 / Ogg 按 audio_formats.audio_duration_ms 计算
+- tts() 写出音频后立即更新对应条目（见 tts_engine._finish_page）
+- 查询时只对目录做一次 stat：大小和修改时间都没变的条目直接复用，新增或被改动的文件才重新读头和计算哈希，已删除的文件移出索引
+"""
+import hashlib
+import json
+import os
+import re
+import struct
+import threading
+from pathlib import Path
+from typing import Dict
+
+from .audio_formats import AUDIO_EXTENSIONS, AUDIO_FORMATS, audio_duration_ms
+
+AUDIO_INDEX_FILENAME = "audio_index.json"
+AUDIO_INDEX_VERSION = 1
+
+# 扩展名 -> 用于计算时长的格式名（WAV 读头，不依赖具体采样率）
+_EXT_FORMATS = {".wav": "wav", ".mp3": "mp3", ".ogg": "opus"}
+
+
+def read_wav_header(path) -> dict:
+    """
+    只读取 RIFF 头，返回 {"sample_rate", "channels", "bits_per_sample", "block_align", "data_offset", "data_bytes", "duration_ms"}
+    跳过 fmt / data 之外的块；data 块长度缺失（流式写出时为 0 或 0xFFFFFFFF）时按文件大小计算
+    """
+    with open(path, "rb") as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+            raise ValueError("不是 RIFF/WAVE 文件")
+        file_size = os.fstat(f.fileno()).st_size
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError("缺少 data 块")
+            chunk_id, chunk_size = struct.unpack("<4sI", header)
+            if chunk_id == b"fmt ":
+                fmt = struct.unpack("<HHIIHH", f.read(16))
+                f.seek(chunk_size - 16 + (chunk_size & 1), os.SEEK_CUR)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError("data 块之前缺少 fmt 块")
+                data_offset = f.tell()
+                available = file_size - data_offset
+                data_bytes = available if chunk_size in (0, 0xFFFFFFFF) else min(chunk_size, available)
+                break
+            else:
+                f.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+    _, channels, sample_rate, byte_rate, block_align, bits = fmt
+    frames = data_bytes // block_align if block_align else 0
+    return {
+        "sample_rate": sample_rate,
+        "channels": channels,
+        "bits_per_sample": bits,
+        "block_align": block_align,
+        "data_offset": data_offset,
+        "data_bytes": data_bytes,
+        "duration_ms": frames * 1000 // sample_rate if sample_rate else 0,
+    }
+
+
+def file_sha256(path, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _page_key(name: str):
+    """按页码排序：1.wav, 2.wav, ..., 10.wav"""
+    stem = os.path.splitext(name)[0]
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", stem)]
+
+
+def probe_audio(path, stat: os.stat_result = None) -> dict:
+    """读取单个音频文件的索引条目"""
+    path = Path(path)
+    stat = stat or path.stat()
+    ext = path.suffix.lower()
+    entry = {
+        "filename": path.name,
+        "audio_format": _EXT_FORMATS[ext],
+        "bytes": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sample_rate": None,
+        "channels": None,
+        "bits_per_sample": None,
+        "duration_ms": None,
+        "sha256": file_sha256(path),
+    }
+    if ext == ".wav":
+        header = read_wav_header(path)
+        entry.update(
+            (key, header[key]) for key in ("sample_rate", "channels", "bits_per_sample", "duration_ms")
+        )
+    else:
+        entry["duration_ms"] = audio_duration_ms(path, entry["audio_format"])
+        sample_rate = AUDIO_FORMATS[entry["audio_format"]]["sdk_format"]
+        entry["sample_rate"] = int(re.search(r"(\d+)Khz", sample_rate).group(1)) * 1000
+        entry["channels"] = 1
+    return entry
+
+
+class AudioIndex:
+    """按输出目录维护音频索引，内存中保留已加载的目录，变化时写回目录下的 audio_index.json"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dirs: Dict[str, Dict[str, dict]] = {}
+
+    def _load(self, output_dir: Path) -> Dict[str, dict]:
+        key = str(output_dir.resolve())
+        if key not in self._dirs:
+            entries = {}
+            try:
+                data = json.loads((output_dir / AUDIO_INDEX_FILENAME).read_text(encoding="utf-8"))
+                if data.get("version") == AUDIO_INDEX_VERSION:
+                    entries = {entry["filename"]: entry for entry in data.get("pages", [])}
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError, KeyError, AttributeError) as e:
+                print(f"[WARN] 音频索引损坏，重新建立: {output_dir}: {e}")
+            self._dirs[key] = entries
+        return self._dirs[key]
+
+    def _save(self, output_dir: Path, entries: Dict[str, dict]):
+        path = output_dir / AUDIO_INDEX_FILENAME
+        tmp_path = path.with_name(path.name + ".tmp")
+        data = {"version": AUDIO_INDEX_VERSION, "pages": sorted(entries.values(), key=lambda e: _page_key(e["filename"]))}
+        tmp_path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    def update(self, output_dir, audio_path) -> dict:
+        """音频写出后调用：重新读取该文件的条目并写回索引，返回条目"""
+        output_dir, audio_path = Path(output_dir), Path(audio_path)
+        entry = probe_audio(audio_path)
+        with self._lock:
+            entries = self._load(output_dir)
+            stem = audio_path.stem
+            # 换了输出格式时，同一页旧格式的条目随旧文件一起移除
+            for name in [n for n in entries if os.path.splitext(n)[0] == stem and n != audio_path.name]:
+                if not (output_dir / name).exists():
+                    del entries[name]
+            entries[audio_path.name] = entry
+            self._save(output_dir, entries)
+        return entry
+
+    def refresh(self, output_dir, rebuild: bool = False) -> Dict[str, dict]:
+        """与目录内容同步：复用大小和修改时间未变的条目，rebuild=True 时全部重新读取"""
+        output_dir = Path(output_dir)
+        with self._lock:
+            entries = {} if rebuild else self._load(output_dir)
+            self._dirs[str(output_dir.resolve())] = entries
+            changed = rebuild
+            seen = set()
+            with os.scandir(output_dir) as it:
+                for item in it:
+                    if not item.name.lower().endswith(AUDIO_EXTENSIONS) or not item.is_file():
+                        continue
+                    seen.add(item.name)
+                    stat = item.stat()
+                    entry = entries.get(item.name)
+                    if entry and entry["bytes"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                        continue
+                    try:
+                        entries[item.name] = probe_audio(item.path, stat)
+                    except (OSError, ValueError, struct.error) as e:
+                        print(f"[WARN] 读取音频头失败: {item.path}: {e}")
+                        entries.pop(item.name, None)
+                    changed = True
+            for name in [n for n in entries if n not in seen]:
+                del entries[name]
+                changed = True
+            if changed:
+                self._save(output_dir, entries)
+            return {name: dict(entry) for name, entry in entries.items()}
+
+    def timeline(self, output_dir, rebuild: bool = False) -> dict:
+        """
+        按页码顺序返回各页音频的条目和在整套音频中的起止时间（毫秒）
+        {"pages": [...], "count", "total_ms", "total_bytes"}
+        """
+        entries = self.refresh(output_dir, rebuild)
+        pages, start = [], 0
+        for entry in sorted(entries.values(), key=lambda e: _page_key(e["filename"])):
+            duration = entry["duration_ms"] or 0
+            entry.pop("mtime_ns", None)
+            entry.update(start_ms=start, end_ms=start + duration)
+            pages.append(entry)
+            start += duration
+        return {
+            "pages": pages,
+            "count": len(pages),
+            "total_ms": start,
+            "total_bytes": sum(entry["bytes"] for entry in pages),
+        }
+
+    def forget(self, output_dir=None):
+        """丢弃内存中已加载的索引（下次查询时从 audio_index.json 重新加载）"""
+        with self._lock:
+            if output_dir is None:
+                self._dirs.clear()
+            else:
+                self._dirs.pop(str(Path(output_dir).resolve()), None)
+
+
+# 全局实例
+audio_index = AudioIndex()
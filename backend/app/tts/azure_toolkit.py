@@ -1,5 +1,12 @@
+import os
+import re
+import time
+
 import azure.cognitiveservices.speech as speechsdk
 
+from .subtitles import Cues, format_srt_time
+from .synthesizer_pool import synthesizer_pool
+
 
 def format_time(nanoseconds):
     """
@@ -7,46 +14,12 @@ def format_time(nanoseconds):
     audio_offset of Azure uses a unit of 100 nano seconds
     Need to be transformed to the form of HH:MM:SS,mmm
     """
-    # transform to seconds
-    total_seconds = nanoseconds / 10000000  # from 100ns to seconds
-
-    # transform to hours/minutes/seconds/milliseconds
-    hours = int(total_seconds // 3600)
-    minutes = int((total_seconds % 3600) // 60)
-    seconds = int(total_seconds % 60)
-    milliseconds = int((total_seconds * 1000) % 1000)
-
-    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
+    return format_srt_time(nanoseconds // 10000)
 
 
 def create_srt(word_boundaries, output_path):
     """Generate SRT subtitle file"""
-    with open(output_path, "w", encoding="utf-8") as srt_file:
-        subtitle_index = 1
-        current_line = []
-        current_start = None
-
-        for i, word in enumerate(word_boundaries):
-            if current_start is None:
-                current_start = word["audio_offset"]
-
-            current_line.append(word["text"])
-
-            # Convert duration from timedelta to microseconds
-            duration_microseconds = int(
-                word["duration"].total_seconds() * 10000000
-            )  # Convert to 100-nanosecond units
-            end_time = word["audio_offset"] + duration_microseconds
-
-            srt_file.write(f"{subtitle_index}\n")
-            srt_file.write(
-                f"{format_time(current_start)} --> {format_time(end_time)}\n"
-            )
-            srt_file.write(f"{''.join(current_line)}\n\n")
-
-            subtitle_index += 1
-            current_line = []
-            current_start = None
+    Cues.from_word_boundaries(word_boundaries).write_srt(output_path)
 
 
 def text_to_speech_with_subtitle(
@@ -108,102 +81,194 @@ def text_to_speech_with_subtitle(
         return False
 
 
-def controlable_text_to_speech_with_subtitle(
-    speech_key,
-    service_region,
-    text,
-    audio_path,
-    srt_path,
-    voice,
-    rate="-20%",  # 语速控制
-    punctuation_breaks={  # 标点符号的停顿时间
-        "。": "800ms",
-        "、": "200ms",
-        "，": "200ms",
-        "？": "500ms",
-        "！": "500ms",
-        "\n": "500ms",  # 换行符的停顿
-    },
-):
-    """Convert text to speech and generate subtitle"""
-    try:
-        # Configure speech service
-        speech_config = speechsdk.SpeechConfig(
-            subscription=speech_key, region=service_region
-        )
-        speech_config.speech_synthesis_voice_name = voice
+DEFAULT_PUNCTUATION_BREAKS = {  # 标点符号的停顿时间
+    "。": "800ms",
+    "、": "200ms",
+    "，": "200ms",
+    "？": "500ms",
+    "！": "500ms",
+    "\n": "500ms",  # 换行符的停顿
+}
 
-        # Configure audio output
-        audio_config = speechsdk.audio.AudioOutputConfig(filename=audio_path)
-        speech_synthesizer = speechsdk.SpeechSynthesizer(
-            speech_config=speech_config, audio_config=audio_config
+
+def build_ssml_body(text, punctuation_breaks=DEFAULT_PUNCTUATION_BREAKS, trailing_break=True):
+    """
+    把讲稿文本转换为带停顿标记的 SSML 片段（不含 <speak>/<voice>）
+    trailing_break=False 时不在末尾标点后加停顿（分段合成时由拼接处补上静音）
+    """
+    # 处理标点停顿
+    text_with_breaks = text
+    for punct, break_time in punctuation_breaks.items():
+        text_with_breaks = text_with_breaks.replace(
+            punct, f'{punct}<break time="{break_time}"/>'
         )
+    if not trailing_break:
+        text_with_breaks = re.sub(r'<break time="[^"]*"/>\s*$', '', text_with_breaks)
 
-        # 处理标点停顿
-        text_with_breaks = text
-        for punct, break_time in punctuation_breaks.items():
-            text_with_breaks = text_with_breaks.replace(
-                punct, f'{punct}<break time="{break_time}"/>'
-            )
+    # 处理不同长度的停顿标记 - 完全替换，不保留原始标记
+    text_with_all_breaks = text_with_breaks.replace(
+        "[PAUSE5]", '<break time="5s"/>'
+    )
+    text_with_all_breaks = text_with_all_breaks.replace(
+        "[PAUSE10]", '<break time="10s"/>'
+    )
+    text_with_all_breaks = text_with_all_breaks.replace(
+        "[PAUSE15]", '<break time="15s"/>'
+    )
 
-        # 处理不同长度的停顿标记 - 完全替换，不保留原始标记
-        text_with_all_breaks = text_with_breaks.replace(
-            "[PAUSE5]", '<break time="5s"/>'
-        )
-        text_with_all_breaks = text_with_all_breaks.replace(
-            "[PAUSE10]", '<break time="10s"/>'
-        )
-        text_with_all_breaks = text_with_all_breaks.replace(
-            "[PAUSE15]", '<break time="15s"/>'
-        )
-        
-        # 额外确保所有PAUSE标记都被处理
-        import re
-        text_with_all_breaks = re.sub(r'\[PAUSE\d+\]', '', text_with_all_breaks)
-
-        # 根据voice判断语言
-        lang = "zh-CN" if "zh-CN" in voice else "ja-JP"
-        
-        ssml = f"""
+    # 额外确保所有PAUSE标记都被处理
+    return re.sub(r'\[PAUSE\d+\]', '', text_with_all_breaks)
+
+
+def wrap_ssml(body, voice, rate="-20%"):
+    # 根据voice判断语言
+    lang = "zh-CN" if "zh-CN" in voice else "ja-JP"
+
+    return f"""
         <speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" xml:lang="{lang}">
             <voice name="{voice}">
                 <prosody rate="{rate}">
-                    {text_with_all_breaks}
+                    {body}
                 </prosody>
             </voice>
         </speak>
         """
 
-        word_boundaries = []
 
-        def handle_word_boundary(evt):
-            word_boundaries.append(
-                {
-                    "text": evt.text,
-                    "audio_offset": evt.audio_offset,
-                    "duration": evt.duration,
-                }
-            )
+def build_ssml(text, voice, rate="-20%", punctuation_breaks=DEFAULT_PUNCTUATION_BREAKS, trailing_break=True):
+    """
+    把讲稿文本转换为带停顿的 SSML
+    trailing_break=False 时不在末尾标点后加停顿（分段合成时由拼接处补上静音）
+    """
+    return wrap_ssml(build_ssml_body(text, punctuation_breaks, trailing_break), voice, rate)
 
-        speech_synthesizer.synthesis_word_boundary.connect(handle_word_boundary)
-        result = speech_synthesizer.speak_ssml_async(ssml).get()
+
+def build_batch_ssml(texts, voice, rate="-20%", punctuation_breaks=DEFAULT_PUNCTUATION_BREAKS):
+    """
+    把多页讲稿放进一个 SSML，每页前插入 <bookmark mark="page{序号}"/>，
+    合成后按书签的位置把音频和单词边界切回各页
+    """
+    body = "".join(
+        f'<bookmark mark="page{i}"/>{build_ssml_body(text, punctuation_breaks)}' for i, text in enumerate(texts)
+    )
+    return wrap_ssml(body, voice, rate)
+
+
+def synthesize_ssml_audio(speech_key, service_region, ssml, voice, stats=None, audio_format=None):
+    """
+    合成 SSML（使用合成器池中复用的连接），音频保存在内存中
+    成功时返回 (音频字节, 单词边界列表 [{"text", "audio_offset", "duration"}])，失败返回 None
+    audio_format 为 audio_formats 中的格式名（合成器直接输出该格式），None 时为默认格式 TTS_AUDIO_FORMAT
+    stats 不为空时写入 {"acquire": 借出合成器（可能需要建连）, "first_byte": 开始合成到收到首段音频, "elapsed": 总耗时}（秒）
+    以及 SSML 中 <bookmark> 的位置 "bookmarks": [{"mark", "audio_offset"}]
+    """
+    try:
+        start = time.perf_counter()
+        with synthesizer_pool.acquire(speech_key, service_region, voice, audio_format) as synth:
+            acquire = time.perf_counter() - start
+            result = synth.synthesizer.speak_ssml_async(ssml).get()
+            if result.reason != speechsdk.ResultReason.SynthesizingAudioCompleted:
+                synth.discard = True
+            word_boundaries = list(synth.word_boundaries)
+            bookmarks = list(synth.bookmarks)
+            first_byte = synth.first_byte_latency()
 
         if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
-            #print(f"Speech synthesized for text [{text}]")
-            create_srt(word_boundaries, srt_path)
-            print(f"Audio saved to: {audio_path}")
-            print(f"Subtitle saved to: {srt_path}")
-            return True
+            if stats is not None:
+                stats.update(
+                    acquire=acquire, first_byte=first_byte, elapsed=time.perf_counter() - start, bookmarks=bookmarks
+                )
+            return result.audio_data, word_boundaries
         elif result.reason == speechsdk.ResultReason.Canceled:
             cancellation_details = result.cancellation_details
             print(f"Speech synthesis canceled: {cancellation_details.reason}")
             if cancellation_details.reason == speechsdk.CancellationReason.Error:
                 print(f"Error details: {cancellation_details.error_details}")
-            return False
+        return None
 
     except Exception as e:
         print(f"Error occurred: {str(e)}")
         import traceback
 
         print(traceback.format_exc())
+        return None
+
+
+def write_audio(audio_path, audio_data):
+    """先写临时文件再替换，失败时不留下半个文件"""
+    tmp_path = f"{audio_path}.part"
+    with open(tmp_path, "wb") as f:
+        f.write(audio_data)
+    os.replace(tmp_path, audio_path)
+
+
+def synthesize_ssml(speech_key, service_region, ssml, audio_path, voice, stats=None, audio_format=None):
+    """
+    合成 SSML 并写入 audio_path
+    成功时返回单词边界列表，失败返回 None；stats、audio_format 同 synthesize_ssml_audio
+    """
+    synthesized = synthesize_ssml_audio(speech_key, service_region, ssml, voice, stats, audio_format)
+    if synthesized is None:
+        return None
+    audio_data, word_boundaries = synthesized
+    write_audio(audio_path, audio_data)
+    return word_boundaries
+
+
+STREAM_CHUNK_BYTES = int(os.getenv("TTS_STREAM_CHUNK_BYTES", "4096"))   # 流式合成每次读取的最大字节数
+
+
+def stream_ssml_audio(
+    speech_key, service_region, ssml, voice, audio_format=None, chunk_size=STREAM_CHUNK_BYTES, stats=None
+):
+    """
+    流式合成 SSML：合成器开始输出后通过 AudioDataStream 拉取音频，收到一段就 yield 一段（bytes）
+    合成失败时抛出 RuntimeError；调用方中途停止迭代时合成器被丢弃（连接上还有未读完的音频）
+    stats 不为空时写入 {"acquire", "first_chunk", "elapsed"}（秒）、"bytes" 和单词边界 "word_boundaries"
+    """
+    start = time.perf_counter()
+    with synthesizer_pool.acquire(speech_key, service_region, voice, audio_format) as synth:
+        acquire = time.perf_counter() - start
+        result = synth.synthesizer.start_speaking_ssml_async(ssml).get()
+        if result.reason == speechsdk.ResultReason.Canceled:
+            raise RuntimeError(f"语音合成被取消: {result.cancellation_details.error_details}")
+        stream = speechsdk.AudioDataStream(result)
+        buffer = bytes(chunk_size)
+        first_chunk, total = None, 0
+        while True:
+            size = stream.read_data(buffer)
+            if size == 0:
+                break
+            if first_chunk is None:
+                first_chunk = time.perf_counter() - start
+            total += size
+            yield buffer[:size]
+        if stream.status == speechsdk.StreamStatus.Canceled:
+            raise RuntimeError(f"语音合成被取消: {stream.cancellation_details.error_details}")
+        if stats is not None:
+            stats.update(
+                acquire=acquire, first_chunk=first_chunk, elapsed=time.perf_counter() - start, bytes=total,
+                word_boundaries=list(synth.word_boundaries),
+            )
+
+
+def controlable_text_to_speech_with_subtitle(
+    speech_key,
+    service_region,
+    text,
+    audio_path,
+    srt_path,
+    voice,
+    rate="-20%",  # 语速控制
+    punctuation_breaks=DEFAULT_PUNCTUATION_BREAKS,
+):
+    """Convert text to speech and generate subtitle"""
+    ssml = build_ssml(text, voice, rate, punctuation_breaks)
+    word_boundaries = synthesize_ssml(speech_key, service_region, ssml, audio_path, voice)
+    if word_boundaries is None:
         return False
+    #print(f"Speech synthesized for text [{text}]")
+    create_srt(word_boundaries, srt_path)
+    print(f"Audio saved to: {audio_path}")
+    print(f"Subtitle saved to: {srt_path}")
+    return True
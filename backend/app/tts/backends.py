@@ -0,0 +1,301 @@
+"""
+TTS 合成后端
+
+合成流程（缓存、分段、字幕、并发）只依赖 TTSBackend 接口：
+    synthesize(text, voice, rate, punctuation_breaks) -> (音频字节, 单词边界) 或 None
+    stream(...) -> 逐段 yield 音频字节（试听用）
+- azure：Azure 语音服务。密钥和区域在第一次合成时才读取（MySQL 配置，读取失败时用环境变量
+  AZURE_SPEECH_KEY / AZURE_SPEECH_REGION），导入模块和启动服务不再依赖 MySQL
+- fake：本地确定性的假引擎，不访问网络。按语速估算每个词的时长，生成正弦音/静音的 PCM 和对应的单词边界，
+  可配置首包延迟和实时率，用于离线压测和验证合成流程
+
+用环境变量 TTS_BACKEND 选择后端（默认 azure），register_backend() 可以注册其他实现。
+"""
+import io
+import os
+import re
+import threading
+import time
+import wave
+import zlib
+from datetime import timedelta
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .audio_formats import get_audio_format
+from .azure_toolkit import build_batch_ssml, build_ssml, stream_ssml_audio, synthesize_ssml_audio
+from .synthesizer_pool import synthesizer_pool
+from .tts_chunking import break_ms, concat_chunks
+
+TTS_BACKEND = os.getenv("TTS_BACKEND", "azure")
+
+FAKE_TTS_LATENCY_MS = int(os.getenv("FAKE_TTS_LATENCY_MS", "100"))              # 假引擎的首包延迟
+FAKE_TTS_REALTIME_FACTOR = float(os.getenv("FAKE_TTS_REALTIME_FACTOR", "0.05"))  # 合成耗时 / 音频时长
+FAKE_TTS_CHARS_PER_SECOND = float(os.getenv("FAKE_TTS_CHARS_PER_SECOND", "8"))   # 语速 0% 时每秒的字数
+
+SynthesisResult = Tuple[bytes, List[dict]]
+BatchResult = Tuple[bytes, List[dict], List[int]]
+
+
+class TTSBackend:
+    """合成后端接口，单词边界的格式为 {"text", "audio_offset"(100 纳秒), "duration"(timedelta)}"""
+
+    name = "base"
+
+    @property
+    def region(self) -> str:
+        """并发上限按区域计算（见 tts_pool）"""
+        return self.name
+
+    def supports_format(self, audio_format: str) -> bool:
+        return True
+
+    def synthesize(
+        self, text: str, voice: str, rate: str, punctuation_breaks: dict,
+        audio_format: str = None, trailing_break: bool = True, stats: dict = None,
+    ) -> Optional[SynthesisResult]:
+        """合成一段文本，失败返回 None；stats 不为空时写入 {"acquire", "first_byte", "elapsed"}（秒）"""
+        raise NotImplementedError
+
+    def synthesize_batch(
+        self, texts: List[str], voice: str, rate: str, punctuation_breaks: dict, audio_format: str = None,
+    ) -> Optional[BatchResult]:
+        """
+        把多段文本合成为一段音频，返回 (音频字节, 单词边界, 各段起始位置(100 纳秒))
+        不支持或失败时返回 None，调用方改为逐段合成
+        """
+        return None
+
+    def stream(
+        self, text: str, voice: str, rate: str, punctuation_breaks: dict,
+        audio_format: str = None, stats: dict = None,
+    ) -> Iterator[bytes]:
+        """边合成边 yield 音频，失败时抛出 RuntimeError；stats 同 azure_toolkit.stream_ssml_audio"""
+        raise NotImplementedError
+
+    def warm(self, voice: str, count: int = 1, audio_format: str = None) -> int:
+        """预先建立连接，返回新建的数量"""
+        return 0
+
+
+def _config_value(key: str) -> str:
+    try:
+        from app.utils.mysql_config_helper import get_config_value
+        return get_config_value(key)
+    except Exception as e:
+        print(f"[WARN] 读取配置 {key} 失败: {e}")
+        return ""
+
+
+class AzureBackend(TTSBackend):
+    name = "azure"
+
+    def __init__(self, speech_key: str = None, region: str = None):
+        self._speech_key = speech_key
+        self._region = region
+        self._loaded = bool(speech_key and region)
+        self._lock = threading.Lock()
+
+    def _load_credentials(self):
+        with self._lock:
+            if self._loaded:
+                return
+            self._speech_key = self._speech_key or _config_value("speech_key") or os.getenv("AZURE_SPEECH_KEY", "")
+            self._region = self._region or _config_value("service_region") or os.getenv("AZURE_SPEECH_REGION", "")
+            self._loaded = True
+            if not self._speech_key or not self._region:
+                print("[WARN] 未配置 Azure 语音服务的 speech_key / service_region")
+
+    def reset_credentials(self):
+        """配置修改后调用，下次合成时重新读取密钥和区域；池中用旧密钥/区域建立的空闲合成器一并关闭"""
+        with self._lock:
+            self._speech_key, self._region, self._loaded = None, None, False
+        synthesizer_pool.close_all()
+
+    @property
+    def speech_key(self) -> str:
+        self._load_credentials()
+        return self._speech_key
+
+    @property
+    def region(self) -> str:
+        self._load_credentials()
+        return self._region
+
+    def synthesize(self, text, voice, rate, punctuation_breaks, audio_format=None, trailing_break=True, stats=None):
+        ssml = build_ssml(text, voice, rate, punctuation_breaks, trailing_break=trailing_break)
+        return synthesize_ssml_audio(self.speech_key, self.region, ssml, voice, stats, audio_format)
+
+    def synthesize_batch(self, texts, voice, rate, punctuation_breaks, audio_format=None):
+        """各段前插入 <bookmark>，按 bookmark_reached 事件的 audio_offset 得到各段的起始位置"""
+        stats = {}
+        ssml = build_batch_ssml(texts, voice, rate, punctuation_breaks)
+        synthesized = synthesize_ssml_audio(self.speech_key, self.region, ssml, voice, stats, audio_format)
+        if synthesized is None:
+            return None
+        marks = {bookmark["mark"]: bookmark["audio_offset"] for bookmark in stats.get("bookmarks", [])}
+        offsets = [marks.get(f"page{i}") for i in range(len(texts))]
+        if any(offset is None for offset in offsets):
+            print(f"[WARN] 批量合成缺少书签（{len(marks)}/{len(texts)}），改为逐页合成")
+            return None
+        audio_data, word_boundaries = synthesized
+        return audio_data, word_boundaries, offsets
+
+    def stream(self, text, voice, rate, punctuation_breaks, audio_format=None, stats=None):
+        ssml = build_ssml(text, voice, rate, punctuation_breaks)
+        return stream_ssml_audio(self.speech_key, self.region, ssml, voice, audio_format, stats=stats)
+
+    def warm(self, voice, count=1, audio_format=None):
+        if count <= 0 or not self.speech_key or not self.region:
+            return 0
+        return synthesizer_pool.warm(self.speech_key, self.region, voice, count, audio_format)
+
+
+# 假引擎的分词：同一种文字（假名 / 汉字 / 字母数字）连续的部分算一个词，标点单独成词
+_FAKE_TOKEN_RE = re.compile(
+    r"\[PAUSE\d+\]|[\u3040-\u309f]+|[\u30a0-\u30ff]+|[\u4e00-\u9fff\u3005]+|[A-Za-z0-9]+|\S"
+)
+_FAKE_SAMPLE_RATES = {"wav": 16000, "wav16": 16000, "wav24": 24000, "wav48": 48000}
+_FAKE_LEADING_MS = 50
+
+
+def _rate_factor(rate: str) -> float:
+    """SSML 语速 "-10%" / "+20%" 转为倍数"""
+    match = re.fullmatch(r"\s*([+-]?\d+(?:\.\d+)?)%\s*", rate or "")
+    return max(0.1, 1 + float(match.group(1)) / 100) if match else 1.0
+
+
+class FakeBackend(TTSBackend):
+    """
+    确定性的假引擎：同样的输入总是得到同样的音频和单词边界
+    每个词是一段正弦音（频率由词的内容决定），标点后按 punctuation_breaks 插入静音，[PAUSEn] 为 n 秒静音
+    """
+
+    name = "fake"
+
+    def __init__(
+        self, latency_ms: int = FAKE_TTS_LATENCY_MS, realtime_factor: float = FAKE_TTS_REALTIME_FACTOR,
+        chars_per_second: float = FAKE_TTS_CHARS_PER_SECOND,
+    ):
+        self.latency_ms = latency_ms
+        self.realtime_factor = realtime_factor
+        self.chars_per_second = chars_per_second
+
+    def supports_format(self, audio_format: str) -> bool:
+        return get_audio_format(audio_format)["name"] in _FAKE_SAMPLE_RATES
+
+    def render(self, text, rate, punctuation_breaks, audio_format=None, trailing_break=True) -> SynthesisResult:
+        """生成 WAV 字节和单词边界（不含模拟延迟）"""
+        name = get_audio_format(audio_format)["name"]
+        if name not in _FAKE_SAMPLE_RATES:
+            raise ValueError(f"fake 后端只支持 PCM 格式，不支持 {name}")
+        framerate = _FAKE_SAMPLE_RATES[name]
+        speed = _rate_factor(rate)
+        tokens = _FAKE_TOKEN_RE.findall(text)
+        segments = [(None, framerate * _FAKE_LEADING_MS // 1000)]   # (频率 或 None 表示静音, 帧数)
+        word_boundaries = []
+        position = segments[0][1]
+        for i, token in enumerate(tokens):
+            pause = re.fullmatch(r"\[PAUSE(\d+)\]", token)
+            if pause:
+                frames = framerate * int(pause.group(1))
+                segments.append((None, frames))
+                position += frames
+                continue
+            punctuation = token in punctuation_breaks or not token.isalnum()
+            frames = 0 if punctuation else int(framerate * len(token) / (self.chars_per_second * speed))
+            word_boundaries.append({
+                "text": token,
+                "audio_offset": position * 10000000 // framerate,
+                "duration": timedelta(microseconds=frames * 1000000 // framerate),
+            })
+            if frames:
+                segments.append((180 + zlib.crc32(token.encode("utf-8")) % 240, frames))
+                position += frames
+            if token in punctuation_breaks and (trailing_break or i < len(tokens) - 1):
+                frames = framerate * break_ms(punctuation_breaks[token]) // 1000
+                segments.append((None, frames))
+                position += frames
+        samples = np.zeros(position, dtype=np.int16)
+        start = 0
+        for freq, frames in segments:
+            if freq is not None and frames:
+                t = np.arange(frames) / framerate
+                samples[start:start + frames] = (np.sin(2 * np.pi * freq * t) * 6000).astype(np.int16)
+            start += frames
+        out = io.BytesIO()
+        with wave.open(out, "wb") as writer:
+            writer.setnchannels(1)
+            writer.setsampwidth(2)
+            writer.setframerate(framerate)
+            writer.writeframes(samples.tobytes())
+        return out.getvalue(), word_boundaries
+
+    def _audio_seconds(self, audio_data: bytes) -> float:
+        # 16 位单声道，WAV 头 44 字节
+        framerate = int.from_bytes(audio_data[24:28], "little")
+        return (len(audio_data) - 44) / 2 / framerate
+
+    def synthesize(self, text, voice, rate, punctuation_breaks, audio_format=None, trailing_break=True, stats=None):
+        start = time.perf_counter()
+        audio_data, word_boundaries = self.render(text, rate, punctuation_breaks, audio_format, trailing_break)
+        time.sleep(self.latency_ms / 1000 + self._audio_seconds(audio_data) * self.realtime_factor)
+        if stats is not None:
+            stats.update(acquire=0.0, first_byte=self.latency_ms / 1000, elapsed=time.perf_counter() - start)
+        return audio_data, word_boundaries
+
+    def synthesize_batch(self, texts, voice, rate, punctuation_breaks, audio_format=None):
+        """各段分别生成后拼接，起始位置按各段的帧数计算（与书签的位置一致）"""
+        parts = [self.render(text, rate, punctuation_breaks, audio_format) for text in texts]
+        audio_data, word_boundaries = concat_chunks(parts, [0] * len(parts))
+        framerate = int.from_bytes(audio_data[24:28], "little")
+        offsets, frames = [], 0
+        for part, _ in parts:
+            offsets.append(frames * 10000000 // framerate)
+            frames += (len(part) - 44) // 2
+        # 批量请求只付一次首包延迟
+        time.sleep(self.latency_ms / 1000 + self._audio_seconds(audio_data) * self.realtime_factor)
+        return audio_data, word_boundaries, offsets
+
+    def stream(self, text, voice, rate, punctuation_breaks, audio_format=None, stats=None, chunk_size=4096):
+        start = time.perf_counter()
+        audio_data, word_boundaries = self.render(text, rate, punctuation_breaks, audio_format)
+        time.sleep(self.latency_ms / 1000)
+        first_chunk = time.perf_counter() - start
+        chunks = range(0, len(audio_data), chunk_size)
+        # 按实时率均匀地输出剩余音频
+        delay = self._audio_seconds(audio_data) * self.realtime_factor / max(1, len(chunks))
+        for offset in chunks:
+            yield audio_data[offset:offset + chunk_size]
+            time.sleep(delay)
+        if stats is not None:
+            stats.update(
+                acquire=0.0, first_chunk=first_chunk, elapsed=time.perf_counter() - start, bytes=len(audio_data),
+                word_boundaries=word_boundaries,
+            )
+
+
+BACKENDS: Dict[str, Callable[[], TTSBackend]] = {
+    "azure": AzureBackend,
+    "fake": FakeBackend,
+}
+_instances: Dict[str, TTSBackend] = {}
+_instances_lock = threading.Lock()
+
+
+def register_backend(name: str, factory: Callable[[], TTSBackend]):
+    BACKENDS[name] = factory
+    with _instances_lock:
+        _instances.pop(name, None)
+
+
+def get_backend(name: str = None) -> TTSBackend:
+    """按名称取后端实例（None 时为 TTS_BACKEND），同名后端只创建一次"""
+    name = name or TTS_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"未知的 TTS 后端: {name}，可选: {', '.join(BACKENDS)}")
+    with _instances_lock:
+        if name not in _instances:
+            _instances[name] = BACKENDS[name]()
+        return _instances[name]
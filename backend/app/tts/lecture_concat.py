@@ -0,0 +1,166 @@
+"""
+整套课程的连续音频
+
+原来只能下载每页的 WAV 自己拼接。这里把 srt_and_wav/<subdir>/ 下各页的 WAV 按页码拼成一条音轨：
+- 只拷贝各页 data 块的 PCM 数据（Linux 上用 os.sendfile 在内核中拷贝），重新写一个 RIFF 头，不解码、不经过 Python 缓冲区
+- 各页 _merged.srt 按该页在整条音轨中的起点平移后顺序写出，序号连续
+- 每页一个章节（FFMETADATA 格式，ffmpeg -i lecture.wav -i chapters.txt -map_metadata 1 可写入 m4a/mp4），标题取该页第一句字幕
+- 一次只处理一页：内存占用与课程总长度无关，几个小时的课程也可以拼接
+结果写到 srt_and_wav/<subdir>/lecture/，不会被页面列表、音频索引和打包下载当成某一页
+"""
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Optional
+
+from .audio_index import audio_index, read_wav_header
+from .subtitles import read_subtitles
+
+LECTURE_DIRNAME = "lecture"
+COPY_CHUNK_SIZE = 1 << 20
+CHAPTER_TITLE_CHARS = 40
+_MAX_RIFF_BYTES = 0xFFFFFFFF
+
+# 第一次 sendfile 失败（文件系统不支持）后不再尝试
+_sendfile_supported = hasattr(os, "sendfile")
+
+
+def lecture_paths(output_dir, name: Optional[str] = None) -> dict:
+    """拼接结果的路径：{"audio", "subtitle", "chapters"}"""
+    output_dir = Path(output_dir)
+    name = name or output_dir.name
+    lecture_dir = output_dir / LECTURE_DIRNAME
+    return {
+        "audio": lecture_dir / f"{name}.wav",
+        "subtitle": lecture_dir / f"{name}.srt",
+        "chapters": lecture_dir / f"{name}_chapters.txt",
+    }
+
+
+def _wav_header(channels: int, sample_rate: int, bits: int, block_align: int, data_bytes: int) -> bytes:
+    """44 字节的 PCM RIFF 头"""
+    return b"".join((
+        b"RIFF", struct.pack("<I", 36 + data_bytes), b"WAVE",
+        b"fmt ", struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, sample_rate * block_align, block_align, bits),
+        b"data", struct.pack("<I", data_bytes),
+    ))
+
+
+def _copy_range(src, dst, offset: int, count: int):
+    """把 src 文件 [offset, offset+count) 追加到 dst；支持时用 os.sendfile，否则按块读写"""
+    global _sendfile_supported
+    if _sendfile_supported:
+        dst.flush()
+        try:
+            while count > 0:
+                sent = os.sendfile(dst.fileno(), src.fileno(), offset, count)
+                if sent == 0:
+                    raise EOFError("音频文件在拼接过程中被截断")
+                offset += sent
+                count -= sent
+            return
+        except OSError as e:
+            # 某些文件系统不支持 sendfile，之后改用普通读写
+            print(f"[WARN] sendfile 不可用，改为按块拷贝: {e}")
+            _sendfile_supported = False
+    src.seek(offset)
+    while count > 0:
+        block = src.read(min(COPY_CHUNK_SIZE, count))
+        if not block:
+            raise EOFError("音频文件在拼接过程中被截断")
+        dst.write(block)
+        count -= len(block)
+
+
+def _escape_ffmetadata(value: str) -> str:
+    for char in ("\\", "=", ";", "#", "\n"):
+        value = value.replace(char, "\\" + char)
+    return value
+
+
+def concat_lecture(output_dir, name: Optional[str] = None) -> dict:
+    """
+    拼接 output_dir 下各页的 WAV 和 _merged.srt，写出整条音轨、字幕和章节文件
+    返回 {"audio_file", "subtitle_file", "chapters_file", "pages", "duration_ms", "bytes", "chapters", "elapsed"}
+    没有 WAV、存在压缩格式页面或各页的采样参数不一致时抛出 ValueError
+    """
+    start = time.perf_counter()
+    output_dir = Path(output_dir)
+    pages = audio_index.timeline(output_dir)["pages"]
+    if not pages:
+        raise ValueError(f"没有可拼接的音频: {output_dir}")
+    compressed = [page["filename"] for page in pages if page["audio_format"] != "wav"]
+    if compressed:
+        raise ValueError(f"只能拼接 WAV 音频，以下页面为压缩格式: {', '.join(compressed[:5])}")
+
+    headers = [read_wav_header(output_dir / page["filename"]) for page in pages]
+    params = {(h["channels"], h["sample_rate"], h["bits_per_sample"], h["block_align"]) for h in headers}
+    if len(params) > 1:
+        raise ValueError("各页音频的声道数、采样率或位深不一致，无法直接拼接")
+    channels, sample_rate, bits, block_align = params.pop()
+    # 每页只取整帧，保证拼接处不会错位
+    sizes = [h["data_bytes"] // block_align * block_align for h in headers]
+    total_bytes = sum(sizes)
+    if 36 + total_bytes > _MAX_RIFF_BYTES:
+        raise ValueError("拼接后的音频超过 WAV 的 4GB 上限")
+
+    paths = lecture_paths(output_dir, name)
+    paths["audio"].parent.mkdir(parents=True, exist_ok=True)
+    part_paths = {kind: Path(f"{path}.part") for kind, path in paths.items()}
+    chapters = []
+    frames = 0
+    cue_index = 1
+    try:
+        with open(part_paths["audio"], "wb") as audio_out, \
+                open(part_paths["subtitle"], "w", encoding="utf-8") as srt_out:
+            audio_out.write(_wav_header(channels, sample_rate, bits, block_align, total_bytes))
+            for page, header, size in zip(pages, headers, sizes):
+                with open(output_dir / page["filename"], "rb") as src:
+                    _copy_range(src, audio_out, header["data_offset"], size)
+                # 按累计帧数换算起点，避免逐页取整的误差累积
+                page_start = frames * 1000 // sample_rate
+                frames += size // block_align
+                page_end = frames * 1000 // sample_rate
+                stem = Path(page["filename"]).stem
+                title = f"第 {stem} 页"
+                srt_path = output_dir / f"{stem}_merged.srt"
+                if srt_path.exists():
+                    cues = read_subtitles(srt_path).shift(page_start)
+                    if len(cues):
+                        title = cues.text(0).replace("\n", " ")[:CHAPTER_TITLE_CHARS]
+                    for block in cues.iter_srt(cue_index):
+                        srt_out.write(block if cue_index == 1 else "\n" + block)
+                        cue_index += 1
+                else:
+                    print(f"[WARN] 缺少字幕文件，该页只拼接音频: {srt_path}")
+                chapters.append({"page": stem, "title": title, "start_ms": page_start, "end_ms": page_end})
+
+        with open(part_paths["chapters"], "w", encoding="utf-8") as f:
+            f.write(";FFMETADATA1\n")
+            f.write(f"title={_escape_ffmetadata(paths['audio'].stem)}\n")
+            for chapter in chapters:
+                f.write(
+                    f"\n[CHAPTER]\nTIMEBASE=1/1000\nSTART={chapter['start_ms']}\nEND={chapter['end_ms']}\n"
+                    f"title={_escape_ffmetadata(chapter['title'])}\n"
+                )
+        for kind, path in paths.items():
+            os.replace(part_paths[kind], path)
+    finally:
+        for path in part_paths.values():
+            if path.exists():
+                path.unlink()
+
+    duration_ms = frames * 1000 // sample_rate
+    elapsed = round(time.perf_counter() - start, 3)
+    print(f"[LOG] 课程音频拼接完成: {paths['audio']}，{len(pages)} 页，时长 {duration_ms / 1000:.1f} 秒，耗时 {elapsed} 秒")
+    return {
+        "audio_file": f"{LECTURE_DIRNAME}/{paths['audio'].name}",
+        "subtitle_file": f"{LECTURE_DIRNAME}/{paths['subtitle'].name}",
+        "chapters_file": f"{LECTURE_DIRNAME}/{paths['chapters'].name}",
+        "pages": len(pages),
+        "duration_ms": duration_ms,
+        "bytes": 44 + total_bytes,
+        "chapters": chapters,
+        "elapsed": elapsed,
+    }
@@ -0,0 +1,41 @@
+"""
+按 Azure 区域限制同时进行的合成请求数
+
+上限默认为 TTS_CONCURRENCY，可用 TTS_REGION_CONCURRENCY 按区域覆盖（格式 "japaneast=8,eastasia=4"）。
+tts_pool 用同样的上限限制同时处理的页面数；真正发出请求的地方（整页、批量、分段合成）
+在所在线程中再占用 region_slot(region)，长页面拆成多段并行合成时，各段也计入该区域的上限，
+同一区域同时进行的请求数不会超过 Azure 资源的并发配额。
+"""
+import os
+import threading
+from typing import Dict, Optional
+
+TTS_CONCURRENCY = int(os.getenv("TTS_CONCURRENCY", "4"))
+
+
+def _parse_region_limits(value: str) -> Dict[str, int]:
+    limits = {}
+    for item in (value or "").split(","):
+        if "=" in item:
+            region, limit = item.split("=", 1)
+            limits[region.strip()] = max(1, int(limit))
+    return limits
+
+
+TTS_REGION_CONCURRENCY = _parse_region_limits(os.getenv("TTS_REGION_CONCURRENCY", ""))
+
+_slots: Dict[str, threading.BoundedSemaphore] = {}
+_slots_lock = threading.Lock()
+
+
+def region_limit(region: Optional[str]) -> int:
+    return TTS_REGION_CONCURRENCY.get(region or "", TTS_CONCURRENCY)
+
+
+def region_slot(region: Optional[str]) -> threading.BoundedSemaphore:
+    """该区域的请求名额（线程侧），用法：with region_slot(backend.region): backend.synthesize(...)"""
+    key = region or ""
+    with _slots_lock:
+        if key not in _slots:
+            _slots[key] = threading.BoundedSemaphore(region_limit(region))
+        return _slots[key]
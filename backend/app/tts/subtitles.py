@@ -0,0 +1,466 @@
+"""
+字幕模型与 SRT/WebVTT 编解码
+
+- Cues 用紧凑的并行数组表示字幕：开始/结束时间（整数毫秒）和文本在拼接字符串中的偏移
+- 合成时单词边界直接转换为 Cues，在内存中按句合并，最后只写一次文件（不再经过 _pre.srt）
+- 时间统一用整数毫秒，解析和格式化都不经过浮点或 timedelta
+- 解析器按块流式读取，只缓存最后一个不完整的字幕块，不需要把整个文件读入内存
+- 平移/缩放基于 numpy 对数组原地批量计算；合并多个字幕按各自的起点拼接
+- merge_sentences / merge_short 分别对应原 srt_processer.process_srt 和 merge_subtitle.merge_subtitles 的合并规则
+"""
+import os
+import re
+from array import array
+from itertools import accumulate
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 按句合并时的断句标点（与原 process_srt 相同）
+SENTENCE_PUNCTUATION = re.compile(r"[。？！…．，、｡?!､：；]")
+# merge_short 中视为句末的结尾
+SENTENCE_ENDINGS = ("。", "！", "？", ".", "!", "?")
+
+TIMING_ARROW = "-->"
+
+
+def timedelta_ticks(value) -> int:
+    """timedelta 转为 100 纳秒单位的整数（Azure 的时间单位），不经过浮点"""
+    return (value.days * 86400 + value.seconds) * 10000000 + value.microseconds * 10
+
+
+def parse_time(value: str) -> int:
+    """
+    SRT（HH:MM:SS,mmm）或 WebVTT（[HH:]MM:SS.mmm）时间转为整数毫秒
+    小数部分不足 3 位时按位补齐（"1.5" 为 1500 毫秒），超过 3 位时截断
+    """
+    if len(value) == 12 and value[2] == ":" and value[5] == ":":
+        # 标准定长格式直接按位置切片
+        return (
+            int(value[0:2]) * 3600000 + int(value[3:5]) * 60000 + int(value[6:8]) * 1000 + int(value[9:12])
+        )
+    value = value.strip()
+    main, sep, frac = value.replace(",", ".").partition(".")
+    parts = main.split(":")
+    if len(parts) == 3:
+        hours, minutes, seconds = parts
+    elif len(parts) == 2:
+        hours, (minutes, seconds) = "0", parts
+    else:
+        raise ValueError(f"无法解析的时间: {value!r}")
+    millis = int((frac + "000")[:3]) if sep else 0
+    return ((int(hours) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + millis
+
+
+def format_srt_time(ms: int) -> str:
+    """整数毫秒转为 SRT 时间 HH:MM:SS,mmm"""
+    hours, rest = divmod(ms, 3600000)
+    minutes, rest = divmod(rest, 60000)
+    seconds, millis = divmod(rest, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{millis:03d}"
+
+
+def format_vtt_time(ms: int) -> str:
+    """整数毫秒转为 WebVTT 时间 HH:MM:SS.mmm"""
+    hours, rest = divmod(ms, 3600000)
+    minutes, rest = divmod(rest, 60000)
+    seconds, millis = divmod(rest, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{millis:03d}"
+
+
+def parse_timing_line(line: str) -> Tuple[int, int]:
+    """解析 "start --> end [WebVTT 设置]"，返回 (开始, 结束) 毫秒"""
+    if line[12:17] == " --> " and line[2] == ":" and line[19] == ":" and (len(line) == 29 or line[29:30].isspace()):
+        # 标准定长格式 HH:MM:SS,mmm --> HH:MM:SS,mmm
+        return (
+            int(line[0:2]) * 3600000 + int(line[3:5]) * 60000 + int(line[6:8]) * 1000 + int(line[9:12]),
+            int(line[17:19]) * 3600000 + int(line[20:22]) * 60000 + int(line[23:25]) * 1000 + int(line[26:29]),
+        )
+    start, _, rest = line.partition(TIMING_ARROW)
+    end = rest.split(None, 1)[0] if rest.strip() else ""
+    return parse_time(start), parse_time(end)
+
+
+class Cues:
+    """
+    字幕列表：starts/ends 为毫秒，第 i 条的文本为 text_buffer[offsets[i]:offsets[i + 1]]
+    """
+
+    __slots__ = ("starts", "ends", "offsets", "_parts", "_buffer")
+
+    def __init__(self):
+        self.starts = array("q")
+        self.ends = array("q")
+        self.offsets = array("q", [0])
+        self._parts: List[str] = []
+        self._buffer = ""
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def append(self, start: int, end: int, text: str):
+        self.starts.append(start)
+        self.ends.append(end)
+        self.offsets.append(self.offsets[-1] + len(text))
+        self._parts.append(text)
+
+    def extend_last(self, end: int, text: str):
+        """延长最后一条字幕并在其文本后追加 text（最后一条的文本位于缓冲区末尾，可以直接追加）"""
+        self.ends[-1] = end
+        self.offsets[-1] += len(text)
+        self._parts.append(text)
+
+    @property
+    def text_buffer(self) -> str:
+        if self._parts:
+            self._buffer += "".join(self._parts)
+            self._parts = []
+        return self._buffer
+
+    def text(self, i: int) -> str:
+        return self.text_buffer[self.offsets[i]:self.offsets[i + 1]]
+
+    def __iter__(self) -> Iterator[Tuple[int, int, str]]:
+        buffer, offsets = self.text_buffer, self.offsets
+        for i in range(len(self.starts)):
+            yield self.starts[i], self.ends[i], buffer[offsets[i]:offsets[i + 1]]
+
+    def copy(self) -> "Cues":
+        cues = Cues()
+        cues.starts = array("q", self.starts)
+        cues.ends = array("q", self.ends)
+        cues.offsets = array("q", self.offsets)
+        cues._buffer = self.text_buffer
+        return cues
+
+    @property
+    def duration(self) -> int:
+        """最后一条字幕的结束时间（毫秒）"""
+        return max(self.ends) if self.ends else 0
+
+    # ---------- 批量时间操作（原地修改，返回自身便于链式调用） ----------
+
+    def _times(self) -> Tuple[np.ndarray, np.ndarray]:
+        """starts/ends 的 numpy 视图（共享内存，不复制）"""
+        if not len(self):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.frombuffer(self.starts, dtype=np.int64), np.frombuffer(self.ends, dtype=np.int64)
+
+    def shift(self, ms: int) -> "Cues":
+        """整体平移 ms 毫秒，平移后小于 0 的时间截为 0"""
+        starts, ends = self._times()
+        starts += ms
+        ends += ms
+        if ms < 0:
+            np.maximum(starts, 0, out=starts)
+            np.maximum(ends, 0, out=ends)
+        return self
+
+    def scale(self, factor: float, origin: int = 0) -> "Cues":
+        """以 origin 为原点按 factor 缩放时间（如音频变速后同步字幕），结果四舍五入到毫秒"""
+        starts, ends = self._times()
+        for times in (starts, ends):
+            times[:] = np.rint((times - origin) * factor) + origin
+        return self
+
+    def clip(self, start: int = 0, end: Optional[int] = None) -> "Cues":
+        """只保留与 [start, end) 有重叠的字幕，并把时间截到该范围内，返回新的 Cues"""
+        starts, ends = self._times()
+        mask = ends > start
+        if end is not None:
+            mask &= starts < end
+        clipped = Cues()
+        buffer, offsets = self.text_buffer, self.offsets
+        for i in np.flatnonzero(mask).tolist():
+            s = max(self.starts[i], start)
+            e = self.ends[i] if end is None else min(self.ends[i], end)
+            clipped.append(s, e, buffer[offsets[i]:offsets[i + 1]])
+        return clipped
+
+    @classmethod
+    def concat(cls, parts: Sequence["Cues"], offsets: Sequence[int] = None) -> "Cues":
+        """
+        按顺序拼接多段字幕，第 i 段平移 offsets[i] 毫秒
+        不传 offsets 时每段紧接在前一段最后一条字幕之后
+        """
+        merged = cls()
+        position = 0
+        for i, part in enumerate(parts):
+            offset = offsets[i] if offsets is not None else position
+            if len(part):
+                merged.starts.frombytes((np.frombuffer(part.starts, dtype=np.int64) + offset).tobytes())
+                merged.ends.frombytes((np.frombuffer(part.ends, dtype=np.int64) + offset).tobytes())
+                text_offsets = np.frombuffer(part.offsets, dtype=np.int64)[1:] + merged.offsets[-1]
+                merged.offsets.frombytes(text_offsets.tobytes())
+                merged._parts.append(part.text_buffer)
+            position = offset + part.duration
+        return merged
+
+    # ---------- 构造 ----------
+
+    @classmethod
+    def from_word_boundaries(cls, word_boundaries: Iterable[dict]) -> "Cues":
+        """Azure 单词边界（100 纳秒单位）转为逐词字幕，与原 create_srt 写出的 _pre.srt 一一对应"""
+        cues = cls()
+        for wb in word_boundaries:
+            start = wb["audio_offset"]
+            end = start + timedelta_ticks(wb["duration"])
+            cues.append(start // 10000, end // 10000, wb["text"])
+        return cues
+
+    @classmethod
+    def from_iter(cls, items: Iterable[Tuple[int, int, str]]) -> "Cues":
+        """由 (开始, 结束, 文本) 序列一次性构造各数组"""
+        cues = cls()
+        columns = list(zip(*items))
+        if columns:
+            starts, ends, texts = columns
+            cues.starts = array("q", starts)
+            cues.ends = array("q", ends)
+            cues.offsets = array("q", [0])
+            cues.offsets.extend(accumulate(map(len, texts)))
+            cues._buffer = "".join(texts)
+        return cues
+
+    # ---------- 输出 ----------
+
+    def _time_fields(self) -> Tuple[list, list]:
+        """批量拆出开始/结束的 (时, 分, 秒, 毫秒)，格式化时只剩字符串拼接"""
+        starts, ends = self._times()
+        fields = []
+        for times in (starts, ends):
+            hours, rest = np.divmod(times, 3600000)
+            minutes, rest = np.divmod(rest, 60000)
+            seconds, millis = np.divmod(rest, 1000)
+            fields.append(list(zip(hours.tolist(), minutes.tolist(), seconds.tolist(), millis.tolist())))
+        return fields[0], fields[1]
+
+    def iter_srt(self, first_index: int = 1) -> Iterator[str]:
+        """逐条输出 SRT 块，序号从 first_index 开始（分段写出同一个文件时接着上一段编号）"""
+        starts, ends = self._time_fields()
+        buffer, offsets = self.text_buffer, self.offsets
+        for i in range(len(starts)):
+            yield "%d\n%02d:%02d:%02d,%03d --> %02d:%02d:%02d,%03d\n%s\n" % (
+                i + first_index, *starts[i], *ends[i], buffer[offsets[i]:offsets[i + 1]]
+            )
+
+    def iter_vtt(self) -> Iterator[str]:
+        yield "WEBVTT\n"
+        starts, ends = self._time_fields()
+        buffer, offsets = self.text_buffer, self.offsets
+        for i in range(len(starts)):
+            yield "%02d:%02d:%02d.%03d --> %02d:%02d:%02d.%03d\n%s\n" % (
+                *starts[i], *ends[i], buffer[offsets[i]:offsets[i + 1]]
+            )
+
+    def to_srt(self) -> str:
+        return "\n".join(self.iter_srt())
+
+    def to_vtt(self) -> str:
+        return "\n".join(self.iter_vtt())
+
+    def write_srt(self, path):
+        """先写临时文件再替换，读取方不会看到写了一半的字幕"""
+        _write_atomic(path, self.to_srt())
+
+    def write_vtt(self, path):
+        _write_atomic(path, self.to_vtt())
+
+
+def _write_atomic(path, content: str):
+    tmp_path = f"{path}.part"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+# ---------- 解析 ----------
+
+READ_CHUNK_SIZE = 1 << 20
+_BLANK_LINES = re.compile(r"\n[ \t]*(?:\n[ \t]*)*\n")
+_VTT_SKIP_BLOCKS = ("NOTE", "STYLE", "REGION")
+
+
+# 标准定长时间行 "HH:MM:SS,mmm --> HH:MM:SS,mmm" 中数字所在的列
+_DIGIT_COLUMNS = [0, 1, 3, 4, 6, 7, 9, 10, 11, 17, 18, 20, 21, 23, 24, 26, 27, 28]
+_TIMING_WIDTH = 29
+
+
+def _is_fixed_timing(line: str) -> bool:
+    return (
+        len(line) >= _TIMING_WIDTH and line[12:17] == " --> " and line[2] == ":" and line[19] == ":"
+        and (len(line) == _TIMING_WIDTH or line[_TIMING_WIDTH].isspace()) and line[:_TIMING_WIDTH].isascii()
+    )
+
+
+def parse_timing_lines(lines: List[str]) -> Tuple[List[int], List[int]]:
+    """
+    批量解析时间行：标准定长格式的行拼成一个字节矩阵，用 numpy 一次算出所有毫秒数；
+    其余格式（WebVTT 省略小时、小数位数不同等）逐行解析，无法解析时抛出 ValueError
+    """
+    starts, ends = [0] * len(lines), [0] * len(lines)
+    fixed = [i for i, line in enumerate(lines) if _is_fixed_timing(line)]
+    if fixed:
+        raw = "".join(lines[i][:_TIMING_WIDTH] for i in fixed).encode("ascii")
+        d = np.frombuffer(raw, dtype=np.uint8).reshape(-1, _TIMING_WIDTH).astype(np.int64) - 48
+        digits = d[:, _DIGIT_COLUMNS]
+        valid = ((digits >= 0) & (digits <= 9)).all(axis=1)
+        for col, times in ((0, starts), (17, ends)):
+            ms = (
+                (d[:, col] * 10 + d[:, col + 1]) * 3600000
+                + (d[:, col + 3] * 10 + d[:, col + 4]) * 60000
+                + (d[:, col + 6] * 10 + d[:, col + 7]) * 1000
+                + d[:, col + 9] * 100 + d[:, col + 10] * 10 + d[:, col + 11]
+            ).tolist()
+            for i, value, ok in zip(fixed, ms, valid.tolist()):
+                if ok:
+                    times[i] = value
+        fixed = [i for i, ok in zip(fixed, valid.tolist()) if ok]
+    done = set(fixed)
+    for i, line in enumerate(lines):
+        if i not in done:
+            starts[i], ends[i] = parse_timing_line(line)
+    return starts, ends
+
+
+def _parse_blocks(text: str, joiner: str, vtt: bool) -> Iterator[Tuple[int, int, str]]:
+    """解析若干完整的字幕块（块之间以空行分隔）"""
+    timings, bodies = [], []
+    for block in _BLANK_LINES.split(text):
+        lines = block.strip("\n").split("\n")
+        if vtt and lines[0].startswith(("WEBVTT",) + _VTT_SKIP_BLOCKS):
+            continue
+        # 时间行一般是第 2 行（SRT 序号 / WebVTT 字幕 ID 之后），也可能没有序号
+        if len(lines) > 1 and TIMING_ARROW in lines[1]:
+            index = 1
+        elif TIMING_ARROW in lines[0]:
+            index = 0
+        else:
+            continue
+        body = lines[index + 1:]
+        if not body:
+            continue
+        timings.append(lines[index])
+        bodies.append(body[0] if len(body) == 1 else joiner.join(body))
+    try:
+        starts, ends = parse_timing_lines(timings)
+    except ValueError:
+        # 有无法解析的时间行时逐条解析并跳过出错的字幕
+        for timing, body in zip(timings, bodies):
+            try:
+                start, end = parse_timing_line(timing)
+            except ValueError:
+                continue
+            yield start, end, body
+        return
+    yield from zip(starts, ends, bodies)
+
+
+def iter_parse(chunks: Iterable[str], joiner: str = "\n", vtt: bool = False) -> Iterator[Tuple[int, int, str]]:
+    """
+    流式解析，chunks 为任意切分的文本片段（如按块读取的文件或逐行迭代），依次 yield (开始毫秒, 结束毫秒, 文本)
+    只缓存最后一个空行之后未完整的部分；多行文本用 joiner 连接
+    容忍 BOM、CRLF、缺少序号和多余空行；无法解析的时间行连同其文本一起跳过
+    """
+    pending = ""
+    first = True
+    for chunk in chunks:
+        if first:
+            chunk = chunk.lstrip("\ufeff")
+            first = False
+        if "\r" in chunk:
+            chunk = chunk.replace("\r\n", "\n").replace("\r", "\n")
+        pending += chunk
+        cut = pending.rfind("\n\n")
+        if cut < 0:
+            continue
+        complete, pending = pending[:cut], pending[cut + 2:]
+        yield from _parse_blocks(complete, joiner, vtt)
+    if pending.strip():
+        yield from _parse_blocks(pending, joiner, vtt)
+
+
+def iter_srt(chunks: Iterable[str], joiner: str = "\n") -> Iterator[Tuple[int, int, str]]:
+    return iter_parse(chunks, joiner)
+
+
+def iter_vtt(chunks: Iterable[str], joiner: str = "\n") -> Iterator[Tuple[int, int, str]]:
+    """WebVTT：跳过文件头和 NOTE/STYLE/REGION 块，忽略字幕 ID 和时间行后的设置"""
+    return iter_parse(chunks, joiner, vtt=True)
+
+
+def read_subtitles(path, joiner: str = "\n") -> Cues:
+    """按块读取 .srt 或 .vtt 文件（按扩展名判断格式）"""
+    vtt = str(path).lower().endswith(".vtt")
+    with open(path, "r", encoding="utf-8-sig") as f:
+        return Cues.from_iter(iter_parse(iter(lambda: f.read(READ_CHUNK_SIZE), ""), joiner, vtt))
+
+
+def parse_srt(content: str, joiner: str = "\n") -> Cues:
+    return Cues.from_iter(iter_parse((content,), joiner))
+
+
+def parse_vtt(content: str, joiner: str = "\n") -> Cues:
+    return Cues.from_iter(iter_parse((content,), joiner, vtt=True))
+
+
+# ---------- 合并规则 ----------
+
+def merge_sentences(cues: Cues, min_length: int = 12) -> Cues:
+    """
+    把逐词字幕合并为句子（规则同 process_srt）：累积文本，遇到含标点的字幕且累积长度不少于 min_length 时断开；
+    末尾不足 min_length 的文本并入前一条
+    空白字幕在原来写出/读回 _pre.srt 时就被丢弃，这里同样跳过
+    """
+    merged = Cues()
+    current_text = ""
+    start = None
+    last_end = None
+    for sub_start, sub_end, text in cues:
+        text = text.rstrip()
+        if not text:
+            continue
+        last_end = sub_end
+        if start is None:
+            start = sub_start
+        current_text += text
+        if SENTENCE_PUNCTUATION.search(text) and len(current_text) >= min_length:
+            merged.append(start, sub_end, current_text)
+            current_text = ""
+            start = None
+
+    if current_text and start is not None:
+        if len(merged) and len(current_text) < min_length:
+            # 合并到前一条字幕
+            merged.extend_last(last_end, current_text)
+        else:
+            merged.append(start, last_end, current_text)
+    return merged
+
+
+def merge_short(cues: Cues, max_duration: int = 5000, max_chars: int = 40, max_gap: int = 300) -> Cues:
+    """
+    把相邻的短字幕合并（规则同 merge_subtitles）：间隔小于 max_gap 毫秒、合并后不超过 max_duration 毫秒
+    和 max_chars 字、且前一条不以句末标点结尾时合并
+    """
+    merged = Cues()
+    current = None
+    for start, end, text in cues:
+        if current is None:
+            current = [start, end, text]
+            continue
+        merged_text = current[2] + text
+        if (
+            start - current[1] < max_gap
+            and end - current[0] <= max_duration
+            and len(merged_text) <= max_chars
+            and not current[2].endswith(SENTENCE_ENDINGS)
+        ):
+            current[1] = end
+            current[2] = merged_text
+        else:
+            merged.append(*current)
+            current = [start, end, text]
+    if current:
+        merged.append(*current)
+    return merged
@@ -0,0 +1,221 @@
+"""
+Azure 语音合成器池
+
+原来每页都新建 SpeechConfig / AudioOutputConfig / SpeechSynthesizer，每次都要重新建立连接和 TLS 握手。
+这里按 (region, voice, 输出格式, 密钥摘要) 缓存合成器：
+- 合成器不绑定输出文件（audio_config=None），音频从结果的 audio_data 取出后写入各自的文件，因此可以跨页面复用
+- 新建时通过 Connection.open() 预先建立连接；warm() 可在服务启动时预热
+- 每个合成器同一时刻只被一个调用借出，单词边界、书签和首包时间记录在借出期间的状态中
+- 合成出错（如连接断开）的合成器直接丢弃，不放回池中；空闲超过 TTS_SYNTH_IDLE_SECONDS 的合成器被关闭
+- 更换 speech_key 后，用旧密钥建立的合成器不会再被借出（键中带密钥摘要，配置修改时也会 close_all）
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, Optional, Tuple
+
+import azure.cognitiveservices.speech as speechsdk
+
+from .audio_formats import get_audio_format, sdk_output_format
+
+TTS_SYNTH_POOL_SIZE = int(os.getenv("TTS_SYNTH_POOL_SIZE", "8"))             # 每个 (region, voice, 格式, 密钥) 最多保留的空闲合成器数
+TTS_SYNTH_IDLE_SECONDS = float(os.getenv("TTS_SYNTH_IDLE_SECONDS", "300"))   # 空闲超过该秒数的合成器关闭，Azure 服务端也会断开长时间空闲的连接
+
+
+PoolKey = Tuple[str, str, Optional[str], str]
+
+
+def pool_key(speech_key: str, region: str, voice: str, audio_format: str = None) -> PoolKey:
+    """池的键；只保存密钥的摘要，不在内存中的键和指标里留下明文"""
+    digest = hashlib.sha256((speech_key or "").encode("utf-8")).hexdigest()[:12]
+    return region, voice, audio_format, digest
+
+
+class PooledSynthesizer:
+    def __init__(self, speech_key: str, region: str, voice: str, audio_format: str = None):
+        self.key = pool_key(speech_key, region, voice, audio_format)
+        speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=region)
+        speech_config.speech_synthesis_voice_name = voice
+        output_format = sdk_output_format(audio_format)
+        if output_format is not None:
+            speech_config.set_speech_synthesis_output_format(output_format)
+        self.synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
+        self.connection = speechsdk.Connection.from_speech_synthesizer(self.synthesizer)
+        self.connection.open(True)
+        self.last_used = time.monotonic()
+        self.uses = 0
+        # 当前调用的状态，借出时重置
+        self.word_boundaries = []
+        self.bookmarks = []
+        self.started_at = None
+        self.first_byte_at = None
+        self.discard = False
+        self.synthesizer.synthesis_word_boundary.connect(self._on_word_boundary)
+        self.synthesizer.bookmark_reached.connect(self._on_bookmark)
+        self.synthesizer.synthesizing.connect(self._on_synthesizing)
+
+    def _on_word_boundary(self, evt):
+        self.word_boundaries.append(
+            {
+                "text": evt.text,
+                "audio_offset": evt.audio_offset,
+                "duration": evt.duration,
+            }
+        )
+
+    def _on_bookmark(self, evt):
+        self.bookmarks.append({"mark": evt.text, "audio_offset": evt.audio_offset})
+
+    def _on_synthesizing(self, evt):
+        if self.first_byte_at is None:
+            self.first_byte_at = time.perf_counter()
+
+    def reset(self):
+        self.word_boundaries = []
+        self.bookmarks = []
+        self.started_at = time.perf_counter()
+        self.first_byte_at = None
+        self.discard = False
+
+    def first_byte_latency(self) -> Optional[float]:
+        if self.first_byte_at is None or self.started_at is None:
+            return None
+        return self.first_byte_at - self.started_at
+
+    def close(self):
+        try:
+            self.connection.close()
+        except Exception as e:
+            print(f"[WARN] 关闭语音合成连接失败: {e}")
+
+
+class SynthesizerPool:
+    def __init__(self, max_idle: int = TTS_SYNTH_POOL_SIZE, idle_seconds: float = TTS_SYNTH_IDLE_SECONDS):
+        self.max_idle = max_idle
+        self.idle_seconds = idle_seconds
+        self._idle: Dict[PoolKey, Deque[PooledSynthesizer]] = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+        self.calls = 0
+        self.setup_seconds = 0.0         # 新建合成器（含建立连接）的累计耗时
+        self.first_byte_seconds = 0.0    # 从开始合成到收到第一段音频的累计耗时
+        self.first_byte_samples = 0
+
+    def _take_idle(self, key: PoolKey) -> Optional[PooledSynthesizer]:
+        now = time.monotonic()
+        with self._lock:
+            idle = self._idle.get(key)
+            while idle:
+                synth = idle.pop()
+                if now - synth.last_used < self.idle_seconds:
+                    return synth
+                self.discarded += 1
+                synth.close()
+        return None
+
+    def _create(self, speech_key: str, region: str, voice: str, audio_format: str = None) -> PooledSynthesizer:
+        start = time.perf_counter()
+        synth = PooledSynthesizer(speech_key, region, voice, audio_format)
+        with self._lock:
+            self.created += 1
+            self.setup_seconds += time.perf_counter() - start
+        return synth
+
+    def _give_back(self, synth: PooledSynthesizer):
+        synth.last_used = time.monotonic()
+        with self._lock:
+            idle = self._idle.setdefault(synth.key, deque())
+            if len(idle) < self.max_idle:
+                idle.append(synth)
+                return
+            self.discarded += 1
+        synth.close()
+
+    @contextmanager
+    def acquire(
+        self, speech_key: str, region: str, voice: str, audio_format: str = None
+    ) -> Iterator[PooledSynthesizer]:
+        """
+        借出一个合成器；with 块正常结束时放回池中，抛出异常时丢弃
+        合成失败（如连接出错被取消）时调用方设置 synth.discard = True，让它不被放回
+        audio_format 为 audio_formats 中的格式名，None 时为默认格式 TTS_AUDIO_FORMAT
+        """
+        audio_format = get_audio_format(audio_format)["name"]
+        synth = self._take_idle(pool_key(speech_key, region, voice, audio_format))
+        if synth is None:
+            synth = self._create(speech_key, region, voice, audio_format)
+        else:
+            with self._lock:
+                self.reused += 1
+        synth.reset()
+        synth.uses += 1
+        try:
+            yield synth
+        except BaseException:
+            synth.close()
+            with self._lock:
+                self.discarded += 1
+            raise
+        latency = synth.first_byte_latency()
+        with self._lock:
+            self.calls += 1
+            if latency is not None:
+                self.first_byte_seconds += latency
+                self.first_byte_samples += 1
+        if synth.discard:
+            synth.close()
+            with self._lock:
+                self.discarded += 1
+        else:
+            self._give_back(synth)
+
+    def warm(self, speech_key: str, region: str, voice: str, count: int = 1, audio_format: str = None) -> int:
+        """预先建立 count 个连接放入池中（已有的空闲合成器计入数量），返回新建的数量"""
+        audio_format = get_audio_format(audio_format)["name"]
+        key = pool_key(speech_key, region, voice, audio_format)
+        with self._lock:
+            missing = max(0, min(count, self.max_idle) - len(self._idle.get(key, ())))
+        for _ in range(missing):
+            self._give_back(self._create(speech_key, region, voice, audio_format))
+        if missing:
+            print(f"[LOG] 语音合成连接已预热: {region}/{voice} × {missing}")
+        return missing
+
+    def close_all(self):
+        """关闭所有空闲合成器（服务关闭或更换密钥/区域时调用）"""
+        with self._lock:
+            pools, self._idle = self._idle, {}
+        for idle in pools.values():
+            for synth in idle:
+                synth.close()
+
+    def _idle_counts(self) -> Dict[str, int]:
+        counts = {}
+        for (region, voice, audio_format, _), idle in self._idle.items():
+            name = f"{region}/{voice}/{audio_format}"
+            counts[name] = counts.get(name, 0) + len(idle)
+        return counts
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "created": self.created,
+                "reused": self.reused,
+                "discarded": self.discarded,
+                "calls": self.calls,
+                "idle": self._idle_counts(),
+                "avg_setup_ms": round(self.setup_seconds / self.created * 1000, 1) if self.created else None,
+                "avg_first_byte_ms": (
+                    round(self.first_byte_seconds / self.first_byte_samples * 1000, 1)
+                    if self.first_byte_samples else None
+                ),
+            }
+
+
+# 全局合成器池
+synthesizer_pool = SynthesizerPool()
@@ -0,0 +1,86 @@
+"""
+短页面的批量合成
+
+只有一两句话的页面，每页单独请求时大部分时间花在请求开销上。这里：
+- 把连续的短页面（不超过 TTS_BATCH_PAGE_CHARS 字）按字数预算 TTS_BATCH_CHARS 打包，每批最多 TTS_BATCH_MAX_PAGES 页，
+  批的大小随各页字数变化
+- 一批放进一个 SSML，每页前插入 <bookmark>，合成后按书签的位置把 PCM 和单词边界切回各页的 WAV / 字幕
+- 只用于 PCM 格式；后端不支持或缺少书签时，调用方改为逐页合成
+"""
+import io
+import os
+import wave
+from pathlib import Path
+from typing import List, Tuple
+
+from .tts_cache import normalize_text
+
+TTS_BATCH_CHARS = int(os.getenv("TTS_BATCH_CHARS", "400"))           # 每批的总字数预算，0 表示不批量合成
+TTS_BATCH_PAGE_CHARS = int(os.getenv("TTS_BATCH_PAGE_CHARS", "100"))  # 不超过该字数的页面才参与批量合成
+TTS_BATCH_MAX_PAGES = int(os.getenv("TTS_BATCH_MAX_PAGES", "8"))      # 每批最多的页数
+
+
+def plan_batches(
+    lengths: List[int], budget: int = TTS_BATCH_CHARS, page_chars: int = TTS_BATCH_PAGE_CHARS,
+    max_pages: int = TTS_BATCH_MAX_PAGES,
+) -> List[List[int]]:
+    """
+    按页面顺序分组，返回各组的页面下标；连续的短页面在字数预算内放进同一组，其余页面单独成组
+    """
+    groups, current, current_chars = [], [], 0
+    for i, length in enumerate(lengths):
+        short = budget > 0 and 0 < length <= page_chars
+        if current and (not short or current_chars + length > budget or len(current) >= max_pages):
+            groups.append(current)
+            current, current_chars = [], 0
+        if short:
+            current.append(i)
+            current_chars += length
+        else:
+            groups.append([i])
+    if current:
+        groups.append(current)
+    return groups
+
+
+def plan_page_batches(txt_paths: List[Path], budget: int = TTS_BATCH_CHARS) -> List[List[int]]:
+    """读取各页讲稿的字数（与合成时相同的规范化）并分组"""
+    if budget <= 0:
+        return [[i] for i in range(len(txt_paths))]
+    lengths = []
+    for path in txt_paths:
+        try:
+            lengths.append(len(normalize_text(Path(path).read_text(encoding="utf-8").replace("\n", ""))))
+        except OSError:
+            lengths.append(0)
+    return plan_batches(lengths, budget)
+
+
+def split_batch(audio_data: bytes, word_boundaries: list, offsets: List[int]) -> List[Tuple[bytes, list]]:
+    """
+    按各页的起始位置（100 纳秒单位，通常为书签的 audio_offset）切分 WAV 和单词边界
+    第一页从音频开头开始（包含开头的静音），各页的单词边界平移到该页的起点
+    """
+    with wave.open(io.BytesIO(audio_data), "rb") as reader:
+        channels, sampwidth, framerate = reader.getnchannels(), reader.getsampwidth(), reader.getframerate()
+        nframes = reader.getnframes()
+        frames = reader.readframes(nframes)
+    frame_size = channels * sampwidth
+    starts = [0] + [min(nframes, offset * framerate // 10000000) for offset in offsets[1:]] + [nframes]
+    start_ticks = [start * 10000000 // framerate for start in starts]
+    pages = []
+    for i in range(len(offsets)):
+        out = io.BytesIO()
+        with wave.open(out, "wb") as writer:
+            writer.setnchannels(channels)
+            writer.setsampwidth(sampwidth)
+            writer.setframerate(framerate)
+            writer.writeframes(frames[starts[i] * frame_size:starts[i + 1] * frame_size])
+        boundaries = [
+            dict(wb, audio_offset=wb["audio_offset"] - start_ticks[i])
+            for wb in word_boundaries
+            if (i == 0 or wb["audio_offset"] >= start_ticks[i])
+            and (i == len(offsets) - 1 or wb["audio_offset"] < start_ticks[i + 1])
+        ]
+        pages.append((out.getvalue(), boundaries))
+    return pages
@@ -0,0 +1,211 @@
+"""
+TTS 合成结果的磁盘缓存
+
+- 键为 (规范化后的文本, 声音, 语速, 标点停顿设置) 的 sha256，讲稿没有变化的页面重新生成时直接复用，不再调用 Azure
+- 音频按键名存放在 TTS_CACHE_DIR 下（输出格式参与键的计算，文件名沿用 .wav），单词边界（生成字幕用）和访问时间记录在同目录的 SQLite 中
+- 按 WAV 总字节数做 LRU 淘汰：超过 TTS_CACHE_MAX_BYTES 时删除最久未访问的条目
+- 合成失败的结果不写入缓存
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+import unicodedata
+from datetime import timedelta
+from pathlib import Path
+from typing import List, Optional
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+TTS_CACHE_DIR = Path(os.getenv("TTS_CACHE_DIR", str(BASE_DIR / "cache" / "tts")))
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+TTS_CACHE_ENABLED = os.getenv("TTS_CACHE_ENABLED", "1") != "0"
+
+# 缓存格式版本，SSML 模板或字幕生成方式变化时修改，使旧条目失效
+CACHE_FORMAT_VERSION = 1
+
+
+def normalize_text(text: str) -> str:
+    """NFC 规范化并合并连续空白，合成时使用同一份文本，保证相同的键对应相同的音频"""
+    text = unicodedata.normalize("NFC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def make_tts_cache_key(
+    text: str, voice: str, rate: str, punctuation_breaks: dict, chunk_chars: int = 0, audio_format: str = None,
+    backend: str = "azure", batched: bool = False,
+) -> str:
+    """
+    chunk_chars 为分段合成的每段字数（分段边界影响音频），整页合成时为 0，不参与计算
+    audio_format 为输出格式名，默认的 wav 不参与计算（与原有缓存条目兼容）
+    backend 为合成后端名，azure 以外的后端（如 fake）参与计算，不与真实合成的结果混用
+    batched 表示该页与其他短页面一起合成（见 tts_batching），与单独合成的结果分开缓存
+    """
+    key = {
+        "version": CACHE_FORMAT_VERSION,
+        "text": normalize_text(text),
+        "voice": voice,
+        "rate": rate,
+        "breaks": punctuation_breaks,
+    }
+    if chunk_chars:
+        key["chunk_chars"] = chunk_chars
+    if audio_format and audio_format != "wav":
+        key["audio_format"] = audio_format
+    if backend != "azure":
+        key["backend"] = backend
+    if batched:
+        key["batched"] = True
+    raw = json.dumps(key, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def dump_boundaries(word_boundaries: List[dict]) -> str:
+    """单词边界序列化，duration 转为 100 纳秒单位的整数"""
+    return json.dumps(
+        [
+            {
+                "text": wb["text"],
+                "audio_offset": wb["audio_offset"],
+                "duration": round(wb["duration"].total_seconds() * 10000000),
+            }
+            for wb in word_boundaries
+        ],
+        ensure_ascii=False,
+    )
+
+
+def load_boundaries(raw: str) -> List[dict]:
+    return [
+        {"text": wb["text"], "audio_offset": wb["audio_offset"], "duration": timedelta(microseconds=wb["duration"] / 10)}
+        for wb in json.loads(raw)
+    ]
+
+
+class TTSCache:
+    def __init__(self, cache_dir: Path = TTS_CACHE_DIR, max_bytes: int = TTS_CACHE_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.db_path = self.cache_dir / "index.sqlite3"
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    cache_key TEXT PRIMARY KEY,
+                    voice TEXT,
+                    boundaries TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries(last_access)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _wav_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.wav"
+
+    def get(self, key: str, audio_path) -> Optional[List[dict]]:
+        """
+        命中时把缓存的音频复制到 audio_path 并返回单词边界，未命中返回 None
+        """
+        wav_path = self._wav_path(key)
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT boundaries FROM entries WHERE cache_key = ?", (key,)).fetchone()
+            if row is not None and not wav_path.exists():
+                # 文件被手动删除，丢弃这条记录
+                conn.execute("DELETE FROM entries WHERE cache_key = ?", (key,))
+                conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE entries SET last_access = ? WHERE cache_key = ?", (time.time(), key))
+            conn.commit()
+            self.hits += 1
+        shutil.copyfile(wav_path, audio_path)
+        return load_boundaries(row[0])
+
+    def put(self, key: str, audio_path, word_boundaries: List[dict], voice: str = None):
+        """写入缓存（复制 audio_path 的音频）并按总字节数淘汰最久未访问的条目"""
+        size = os.path.getsize(audio_path)
+        if size > self.max_bytes:
+            return
+        wav_path = self._wav_path(key)
+        wav_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = wav_path.with_name(f"{wav_path.name}.{threading.get_ident()}.tmp")
+        shutil.copyfile(audio_path, tmp_path)
+        os.replace(tmp_path, wav_path)
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (cache_key, voice, boundaries, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, voice, dump_boundaries(word_boundaries), size, now, now),
+            )
+            self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for cache_key, size in conn.execute("SELECT cache_key, size FROM entries ORDER BY last_access ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM entries WHERE cache_key = ?", (cache_key,))
+            self._wav_path(cache_key).unlink(missing_ok=True)
+            total -= size
+            evicted += 1
+        self.evictions += evicted
+        print(f"[LOG] TTS缓存淘汰 {evicted} 条，当前大小: {total} 字节")
+
+    def stats(self) -> dict:
+        with self._lock:
+            conn = self._connect()
+            entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "enabled": TTS_CACHE_ENABLED,
+            "entries": entries,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "path": str(self.cache_dir),
+        }
+
+    def clear(self) -> int:
+        with self._lock:
+            conn = self._connect()
+            keys = [row[0] for row in conn.execute("SELECT cache_key FROM entries").fetchall()]
+            conn.execute("DELETE FROM entries")
+            conn.commit()
+            for key in keys:
+                self._wav_path(key).unlink(missing_ok=True)
+        return len(keys)
+
+
+# 全局缓存实例
+tts_cache = TTSCache()
@@ -0,0 +1,136 @@
+"""
+长讲稿的分段并行合成
+
+整页作为一个 SSML 合成时，长页面耗时长，任何一次失败都要整页重试。这里：
+- 在句末标点（。？！）处把讲稿切成不超过 TTS_CHUNK_CHARS 字的若干段
+- 各段在线程池中并行合成（同时进行的段数不超过 TTS_CHUNK_WORKERS），失败时只重试该段；
+  每段请求占用所在区域的名额（见 region_limits），一个长页面不会让该区域的并发请求超过 TTS_REGION_CONCURRENCY
+- 按顺序拼接 PCM：非末段不带末尾停顿，拼接处插入该段末尾标点对应长度的静音
+- 每段的单词边界按前面音频的实际长度平移，字幕时间与拼接后的音频一致
+"""
+import io
+import os
+import re
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from .region_limits import region_slot
+
+TTS_CHUNK_CHARS = int(os.getenv("TTS_CHUNK_CHARS", "300"))       # 每段的最大字数，0 表示不分段
+TTS_CHUNK_WORKERS = int(os.getenv("TTS_CHUNK_WORKERS", "8"))     # 同时合成的段数（所有页面共用）
+TTS_CHUNK_RETRIES = int(os.getenv("TTS_CHUNK_RETRIES", "2"))     # 每段失败后的重试次数
+
+SENTENCE_ENDINGS = "。？！"
+# 句末标点及其后紧跟的右括号/引号算作同一句
+_SENTENCE_RE = re.compile(rf"[^{SENTENCE_ENDINGS}]*[{SENTENCE_ENDINGS}]+[」』）)\"']*|[^{SENTENCE_ENDINGS}]+$")
+
+_executor = ThreadPoolExecutor(max_workers=TTS_CHUNK_WORKERS, thread_name_prefix="tts-chunk")
+
+
+def should_chunk(text: str, chunk_chars: int = TTS_CHUNK_CHARS) -> bool:
+    """超过两段长度的页面才分段，较短的页面整页合成更快"""
+    return chunk_chars > 0 and len(text) > chunk_chars * 2
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s for s in _SENTENCE_RE.findall(text) if s.strip()]
+
+
+def split_chunks(text: str, chunk_chars: int = TTS_CHUNK_CHARS) -> List[str]:
+    """按句子切分并合并为不超过 chunk_chars 字的段；单句超长时单独成段"""
+    chunks, current = [], ""
+    for sentence in split_sentences(text):
+        if current and len(current) + len(sentence) > chunk_chars:
+            chunks.append(current)
+            current = ""
+        current += sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def break_ms(break_time: str) -> int:
+    """SSML 停顿时长（"800ms" / "5s"）转为毫秒"""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*(ms|s)\s*", break_time or "")
+    if not match:
+        return 0
+    value, unit = float(match.group(1)), match.group(2)
+    return int(value if unit == "ms" else value * 1000)
+
+
+def trailing_break_ms(chunk: str, punctuation_breaks: dict) -> int:
+    """段末标点（跳过右括号/引号）对应的停顿毫秒数"""
+    stripped = chunk.rstrip().rstrip("」』）)\"'")
+    return break_ms(punctuation_breaks.get(stripped[-1:], "")) if stripped else 0
+
+
+def _synthesize_chunk(backend, chunk, voice, rate, punctuation_breaks, trailing_break, retries, audio_format=None):
+    for attempt in range(retries + 1):
+        with region_slot(backend.region):
+            synthesized = backend.synthesize(
+                chunk, voice, rate, punctuation_breaks, audio_format=audio_format, trailing_break=trailing_break
+            )
+        if synthesized is not None:
+            return synthesized
+        if attempt < retries:
+            print(f"[WARN] 分段合成失败，重试第 {attempt + 1} 次")
+    return None
+
+
+def concat_chunks(parts: List[Tuple[bytes, list]], gaps_ms: List[int]) -> Tuple[bytes, list]:
+    """
+    拼接各段 WAV，第 i 段之后插入 gaps_ms[i] 毫秒静音
+    返回 (拼接后的 WAV 字节, 平移后的单词边界)
+    """
+    out = io.BytesIO()
+    word_boundaries = []
+    params = None
+    frames_written = 0
+    with wave.open(out, "wb") as writer:
+        for (audio_data, boundaries), gap_ms in zip(parts, gaps_ms):
+            with wave.open(io.BytesIO(audio_data), "rb") as reader:
+                chunk_params = (reader.getnchannels(), reader.getsampwidth(), reader.getframerate())
+                if params is None:
+                    params = chunk_params
+                    writer.setnchannels(params[0])
+                    writer.setsampwidth(params[1])
+                    writer.setframerate(params[2])
+                elif chunk_params != params:
+                    raise ValueError(f"分段音频格式不一致: {chunk_params} != {params}")
+                frames = reader.readframes(reader.getnframes())
+            channels, sampwidth, framerate = params
+            # 单词边界以 100 纳秒为单位，按已写入的帧数换算偏移，避免浮点累计误差
+            offset = frames_written * 10000000 // framerate
+            for wb in boundaries:
+                word_boundaries.append(dict(wb, audio_offset=wb["audio_offset"] + offset))
+            silence_frames = framerate * gap_ms // 1000
+            writer.writeframes(frames + b"\0" * (silence_frames * channels * sampwidth))
+            frames_written += len(frames) // (channels * sampwidth) + silence_frames
+    return out.getvalue(), word_boundaries
+
+
+def synthesize_chunked(
+    backend, text, voice, rate, punctuation_breaks,
+    chunk_chars: int = TTS_CHUNK_CHARS, retries: int = TTS_CHUNK_RETRIES, audio_format: str = None,
+) -> Optional[Tuple[bytes, list]]:
+    """
+    分段并行合成整页讲稿，backend 为合成后端（见 backends）
+    成功时返回 (WAV 字节, 单词边界)，任一段重试后仍失败时返回 None
+    audio_format 必须是 PCM 格式（wav / wav16 / wav24 / wav48），压缩格式无法按帧拼接
+    """
+    chunks = split_chunks(text, chunk_chars)
+    last = len(chunks) - 1
+    gaps_ms = [0 if i == last else trailing_break_ms(chunk, punctuation_breaks) for i, chunk in enumerate(chunks)]
+    print(f"[LOG] 分段合成: {len(text)} 字，共 {len(chunks)} 段")
+    futures = [
+        _executor.submit(
+            _synthesize_chunk, backend, chunk, voice, rate, punctuation_breaks, i == last, retries, audio_format
+        )
+        for i, chunk in enumerate(chunks)
+    ]
+    parts = [future.result() for future in futures]
+    if any(part is None for part in parts):
+        print(f"[ERROR] 分段合成失败: {sum(part is None for part in parts)}/{len(parts)} 段重试后仍失败")
+        return None
+    return concat_chunks(parts, gaps_ms)
@@ -1,13 +1,16 @@
 import os
 
-from .azure_toolkit import controlable_text_to_speech_with_subtitle
-from .merge_subtitle import merge_subtitles
-from .srt_processer import process_srt
-from app.utils.mysql_config_helper import get_config_value
-
-
-speech_key = get_config_value("speech_key")
-service_region = get_config_value("service_region")
+from .audio_formats import AUDIO_EXTENSIONS, format_stats, get_audio_format
+from .audio_index import audio_index
+from .azure_toolkit import write_audio
+from .backends import get_backend
+from .region_limits import region_slot
+from .subtitles import Cues, merge_sentences
+from .tts_batching import split_batch
+from .tts_cache import TTS_CACHE_ENABLED, make_tts_cache_key, normalize_text, tts_cache
+from .tts_chunking import TTS_CHUNK_CHARS, should_chunk, split_chunks, synthesize_chunked
+
+DEFAULT_VOICE = "ja-JP-DaichiNeural"
 
 custom_breaks = {
     "。": "800ms",
@@ -17,45 +20,193 @@ custom_breaks = {
     "！": "500ms",
     "\n": "500ms",
 }
+speech_rate = "-10%"
+TTS_SYNTH_WARM = int(os.getenv("TTS_SYNTH_WARM", "2"))   # 启动时为当前声音预先建立的合成连接数
+TTS_WRITE_PRE_SRT = os.getenv("TTS_WRITE_PRE_SRT", "0") == "1"   # 调试用：额外写出合并前的逐词字幕 _pre.srt
+
+
+def default_voice():
+    """配置中的声音，读取配置失败（如 MySQL 不可用）时使用 DEFAULT_VOICE"""
+    try:
+        from app.utils.mysql_config_helper import get_config_value
+        return get_config_value("voice", DEFAULT_VOICE)
+    except Exception as e:
+        print(f"[WARN] 读取声音配置失败，使用默认声音 {DEFAULT_VOICE}: {e}")
+        return DEFAULT_VOICE
 
 
-def tts(filename, output_dir="./srt_and_wav", voice=None):
+def warm_synthesizers(count=TTS_SYNTH_WARM, voice=None):
+    """为当前配置的声音预先建立合成连接，失败时只打印警告"""
+    if count <= 0:
+        return 0
+    try:
+        return get_backend().warm(voice or default_voice(), count)
+    except Exception as e:
+        print(f"[WARN] 语音合成连接预热失败: {e}")
+        return 0
+
+
+def tts(
+    filename, output_dir="./srt_and_wav", voice=None, use_cache=TTS_CACHE_ENABLED, result=None,
+    chunk_chars=TTS_CHUNK_CHARS, audio_format=None, backend=None,
+):
+    """
+    合成单页音频和字幕，成功生成音频和 _merged.srt 时返回 True
+    文本、声音和语速都没有变化的页面直接使用 TTS 缓存；result 不为空时写入
+    {"cached": 是否命中缓存, "chunks": 分段数, "audio_format", "audio_bytes", "audio_ms"}
+    长页面按句子分段并行合成（见 tts_chunking），chunk_chars=0 时整页合成
+    audio_format 为输出格式（见 audio_formats），默认 TTS_AUDIO_FORMAT；压缩格式不分段
+    backend 为合成后端（见 backends），默认 TTS_BACKEND
+    """
     # 从配置中获取声音设置，如果没有传入voice参数的话
     if voice is None:
-        voice = get_config_value("voice", "ja-JP-DaichiNeural")
+        voice = default_voice()
+    backend = backend or get_backend()
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
     with open(filename, "r", encoding="utf-8") as file:
-        content = file.read().replace("\n", "")
+        content = normalize_text(file.read().replace("\n", ""))
 
+    fmt = get_audio_format(audio_format)
     fn_prefix = os.path.splitext(os.path.basename(filename))[0]
-    audio_path = os.path.join(output_dir, fn_prefix + ".wav")
-    srt_path = os.path.join(output_dir, fn_prefix + "_pre.srt")
-    merged_srt_path = os.path.join(output_dir, fn_prefix + "_merged.srt")
+    audio_path = os.path.join(output_dir, fn_prefix + fmt["ext"])
 
     try:
         print(f"🔄 开始处理 {filename}")
-        controlable_text_to_speech_with_subtitle(
-            speech_key=speech_key,
-            service_region=service_region,
-            text=content,
-            audio_path=audio_path,
-            srt_path=srt_path,
-            voice=voice,
-            rate="-10%",
-            punctuation_breaks=custom_breaks,
-        )
-        #print("✅ 合成完成，检查 SRT：", srt_path)
-
-        if os.path.exists(srt_path):
-            process_srt(srt_path, merged_srt_path)
-            #print(f"✅ 成功生成：{merged_srt_path}")
+        chunked = fmt["pcm"] and should_chunk(content, chunk_chars)
+        cache_key = make_tts_cache_key(
+            content, voice, speech_rate, custom_breaks, chunk_chars if chunked else 0, fmt["name"], backend.name
+        ) if use_cache else None
+        word_boundaries = tts_cache.get(cache_key, audio_path) if cache_key else None
+        if result is not None:
+            result["cached"] = word_boundaries is not None
+            result["chunks"] = len(split_chunks(content, chunk_chars)) if chunked else 1
+        if word_boundaries is not None:
+            print(f"[LOG] 命中TTS缓存: {filename}")
+        elif chunked:
+            synthesized = synthesize_chunked(
+                backend, content, voice, speech_rate, custom_breaks, chunk_chars, audio_format=fmt["name"],
+            )
         else:
-            print(f"❌ 错误：SRT 文件未生成：{srt_path}")
+            with region_slot(backend.region):
+                synthesized = backend.synthesize(content, voice, speech_rate, custom_breaks, audio_format=fmt["name"])
+        if word_boundaries is None:
+            if synthesized is None:
+                print(f"❌ 错误：语音合成失败：{filename}")
+                return False
+            audio_data, word_boundaries = synthesized
+            write_audio(audio_path, audio_data)
+            if cache_key:
+                tts_cache.put(cache_key, audio_path, word_boundaries, voice)
+        _finish_page(output_dir, fn_prefix, fmt, word_boundaries, result)
+        #print(f"✅ 成功生成：{fn_prefix}_merged.srt")
+        return True
 
     except Exception as e:
         print(f"[TTS错误] 文件 {filename} 处理失败: {e}")
+        return False
+
+
+def _finish_page(output_dir, fn_prefix, fmt, word_boundaries, result=None):
+    """音频写好之后：生成字幕、清理其他格式的旧音频、记录格式统计"""
+    audio_path = os.path.join(output_dir, fn_prefix + fmt["ext"])
+    # 单词边界在内存中按句合并，只写一次 _merged.srt
+    cues = Cues.from_word_boundaries(word_boundaries)
+    if TTS_WRITE_PRE_SRT:
+        cues.write_srt(os.path.join(output_dir, fn_prefix + "_pre.srt"))
+    merge_sentences(cues).write_srt(os.path.join(output_dir, fn_prefix + "_merged.srt"))
+    _remove_other_formats(output_dir, fn_prefix, fmt["ext"])
+    # 更新项目音频索引（只读 WAV 头），时长和字节数取自索引条目
+    entry = audio_index.update(output_dir, audio_path)
+    audio_bytes, audio_ms = entry["bytes"], entry["duration_ms"]
+    format_stats.record(fmt["name"], audio_bytes, audio_ms)
+    if result is not None:
+        result.update(audio_format=fmt["name"], audio_bytes=audio_bytes, audio_ms=audio_ms)
+
+
+def tts_batch(
+    filenames, output_dir="./srt_and_wav", voice=None, use_cache=TTS_CACHE_ENABLED, results=None,
+    audio_format=None, backend=None,
+):
+    """
+    把几页短讲稿放进一个请求合成（见 tts_batching），再按书签切回各页的音频和 _merged.srt
+    返回各页是否成功；results 不为空时为每页的 result 字典（同 tts()，另加 "batch": 本批合成的页数）
+    命中缓存的页面不参与合成；压缩格式、后端不支持或批量合成失败时逐页调用 tts()
+    """
+    results = results if results is not None else [{} for _ in filenames]
+    if voice is None:
+        voice = default_voice()
+    backend = backend or get_backend()
+    fmt = get_audio_format(audio_format)
+
+    def one_by_one(indexes):
+        for i in indexes:
+            oks[i] = tts(filenames[i], output_dir, voice, use_cache, results[i], audio_format=fmt["name"], backend=backend)
+
+    oks = [False] * len(filenames)
+    if not fmt["pcm"] or len(filenames) < 2:
+        one_by_one(range(len(filenames)))
+        return oks
+    os.makedirs(output_dir, exist_ok=True)
+
+    try:
+        contents, prefixes, cache_keys, misses = [], [], [], []
+        for i, filename in enumerate(filenames):
+            with open(filename, "r", encoding="utf-8") as file:
+                contents.append(normalize_text(file.read().replace("\n", "")))
+            prefixes.append(os.path.splitext(os.path.basename(filename))[0])
+            audio_path = os.path.join(output_dir, prefixes[i] + fmt["ext"])
+            # 批量合成的音频带有前后页的语境，与整页单独合成的缓存分开
+            cache_key = make_tts_cache_key(
+                contents[i], voice, speech_rate, custom_breaks, 0, fmt["name"], backend.name, batched=True
+            ) if use_cache else None
+            cache_keys.append(cache_key)
+            word_boundaries = tts_cache.get(cache_key, audio_path) if cache_key else None
+            results[i].update(cached=word_boundaries is not None, chunks=1)
+            if word_boundaries is None:
+                misses.append(i)
+            else:
+                print(f"[LOG] 命中TTS缓存: {filename}")
+                _finish_page(output_dir, prefixes[i], fmt, word_boundaries, results[i])
+                oks[i] = True
+
+        if len(misses) < 2:
+            one_by_one(misses)
+            return oks
+        print(f"🔄 批量合成 {len(misses)} 页: {', '.join(prefixes[i] for i in misses)}")
+        with region_slot(backend.region):
+            synthesized = backend.synthesize_batch(
+                [contents[i] for i in misses], voice, speech_rate, custom_breaks, audio_format=fmt["name"]
+            )
+        if synthesized is None:
+            print(f"[WARN] 批量合成失败，改为逐页合成")
+            one_by_one(misses)
+            return oks
+        audio_data, word_boundaries, offsets = synthesized
+        for i, (page_audio, page_boundaries) in zip(misses, split_batch(audio_data, word_boundaries, offsets)):
+            audio_path = os.path.join(output_dir, prefixes[i] + fmt["ext"])
+            write_audio(audio_path, page_audio)
+            if cache_keys[i]:
+                tts_cache.put(cache_keys[i], audio_path, page_boundaries, voice)
+            results[i]["batch"] = len(misses)
+            _finish_page(output_dir, prefixes[i], fmt, page_boundaries, results[i])
+            oks[i] = True
+        return oks
+
+    except Exception as e:
+        print(f"[TTS错误] 批量合成失败: {e}")
+        one_by_one([i for i, ok in enumerate(oks) if not ok])
+        return oks
+
+
+def _remove_other_formats(output_dir, fn_prefix, keep_ext):
+    """换了输出格式重新生成时，删除同一页其他格式的旧音频，避免下载和合成视频时重复"""
+    for ext in AUDIO_EXTENSIONS:
+        if ext != keep_ext:
+            path = os.path.join(output_dir, fn_prefix + ext)
+            if os.path.exists(path):
+                os.remove(path)
 
 
 def find_txt_files(directory):
@@ -0,0 +1,216 @@
+"""
+后台 TTS 合成任务
+
+原来 WebSocket 接口在连接协程里直接驱动合成：连接断开时合成随之中断，重新连接要从头再来，
+两个客户端查看同一个目录就会各合成一遍。这里把合成放到后台任务（asyncio.Task）中运行：
+- 每页完成后追加一条带递增序号 seq 的事件，WebSocket 只负责订阅并转发事件
+- 断线重连时带上最后收到的 seq，只补发之后的事件；任务结束后仍保留 TTS_JOB_RETENTION 秒供重连查看
+- 相同的目录、页面、声音和格式已有进行中的任务时直接加入该任务，不会重复合成
+- 事件在事件循环中产生和分发，订阅方等待 asyncio.Condition，不轮询、不阻塞其他请求
+- 每个 owner（任务ID或目录名）可以注册自己的事件回调，加入别人已启动的任务时也能更新自己的进度记录
+"""
+import asyncio
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from app.tts.audio_formats import get_audio_format
+from app.tts.tts_pool import iter_synthesize_pages
+
+TTS_JOB_RETENTION = int(os.getenv("TTS_JOB_RETENTION", "3600"))   # 结束的任务保留多少秒供重连
+
+
+class TTSJob:
+    """一次多页合成；events 为按 seq 递增的事件列表（seq 从 1 开始）"""
+
+    def __init__(self, key: tuple, output_dir: Path, txt_paths: List[Path], voice: Optional[str],
+                 audio_format: str, use_cache: bool, owner: Optional[str]):
+        self.job_id = str(uuid.uuid4())
+        self.key = key
+        self.output_dir = output_dir
+        self.txt_paths = txt_paths
+        self.voice = voice
+        self.audio_format = audio_format
+        self.use_cache = use_cache
+        self.owner = owner
+        self.status = "pending"
+        self.error = None
+        self.results: List[dict] = []
+        self.events: List[dict] = []
+        self.created_at = time.time()
+        self.finished_at = None
+        self.task: Optional[asyncio.Task] = None
+        self._closed = False   # 不会再有新事件（与最后一条事件在同一把锁内设置）
+        self._changed = asyncio.Condition()
+        self._listeners: Dict[Optional[str], Callable[["TTSJob", dict], None]] = {}   # owner -> 事件回调
+
+    @property
+    def total(self) -> int:
+        return len(self.txt_paths)
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("completed", "failed", "cancelled")
+
+    @property
+    def last_seq(self) -> int:
+        return len(self.events)
+
+    def add_listener(self, owner: Optional[str], on_event: Callable[["TTSJob", dict], None]):
+        """
+        注册 owner 的事件回调（同一 owner 再次注册时替换），并立即按顺序补发已有的事件，
+        之后的事件在产生时调用；回调在事件循环中同步执行
+        """
+        self._listeners[owner] = on_event
+        for event in list(self.events):
+            self._call(on_event, event)
+
+    def _call(self, on_event, event: dict):
+        try:
+            on_event(self, event)
+        except Exception as e:
+            print(f"[WARN] TTS任务事件回调失败: {e}")
+
+    async def _emit(self, event: dict, final: bool = False) -> dict:
+        async with self._changed:
+            event = {"seq": len(self.events) + 1, "job_id": self.job_id, **event}
+            self.events.append(event)
+            self._closed = self._closed or final
+            # 与追加事件在同一段同步代码中分发，add_listener 补发的事件和之后分发的事件不会重复或遗漏
+            for on_event in list(self._listeners.values()):
+                self._call(on_event, event)
+            self._changed.notify_all()
+        return event
+
+    async def subscribe(self, after_seq: int = 0) -> AsyncIterator[dict]:
+        """依次 yield seq > after_seq 的事件，任务结束且事件发完后停止"""
+        seq = max(0, after_seq)
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: len(self.events) > seq or self._closed)
+                pending = self.events[seq:]
+                finished = self._closed
+            for event in pending:
+                yield event
+            seq += len(pending)
+            if finished and seq >= len(self.events):
+                return
+
+    def snapshot(self) -> dict:
+        completed = len(self.results)
+        return {
+            "job_id": self.job_id,
+            "owner": self.owner,
+            "status": self.status,
+            "error": self.error,
+            "audio_format": self.audio_format,
+            "total": self.total,
+            "completed": completed,
+            "progress": int(completed / self.total * 100) if self.total else 100,
+            "last_seq": self.last_seq,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class TTSJobManager:
+    """按 job_id 和 owner（任务ID或目录名）管理后台合成任务"""
+
+    def __init__(self, retention: int = TTS_JOB_RETENTION):
+        self.retention = retention
+        self._jobs: Dict[str, TTSJob] = {}
+        self._by_owner: Dict[str, str] = {}
+
+    def _cleanup(self):
+        now = time.time()
+        for job_id in [j.job_id for j in self._jobs.values() if j.done and now - j.finished_at > self.retention]:
+            job = self._jobs.pop(job_id)
+            if self._by_owner.get(job.owner) == job_id:
+                del self._by_owner[job.owner]
+
+    def start(
+        self, output_dir, txt_paths: List[Path], voice: str = None, audio_format: str = None, use_cache: bool = True,
+        owner: str = None, on_event: Callable[[TTSJob, dict], None] = None,
+    ) -> TTSJob:
+        """
+        启动后台合成并返回任务；已有相同参数且未结束的任务时返回该任务
+        on_event(job, event) 在每条事件产生后调用（在事件循环中），用于更新 owner 自己的进度记录等副作用；
+        加入已有任务时同样注册（见 TTSJob.add_listener），并补发已产生的事件
+        """
+        self._cleanup()
+        output_dir = Path(output_dir)
+        txt_paths = [Path(path) for path in txt_paths]
+        audio_format = get_audio_format(audio_format)["name"]
+        key = (str(output_dir.resolve()), tuple(str(p.resolve()) for p in txt_paths), voice, audio_format, use_cache)
+        for job in self._jobs.values():
+            if job.key == key and not job.done:
+                print(f"[LOG] 加入进行中的TTS任务: {job.job_id}（{job.owner}）")
+                if owner:
+                    self._by_owner[owner] = job.job_id
+                if on_event:
+                    job.add_listener(owner, on_event)
+                return job
+        job = TTSJob(key, output_dir, txt_paths, voice, audio_format, use_cache, owner)
+        self._jobs[job.job_id] = job
+        if owner:
+            self._by_owner[owner] = job.job_id
+        if on_event:
+            job.add_listener(owner, on_event)
+        job.task = asyncio.create_task(self._run(job))
+        print(f"[LOG] 启动TTS任务: {job.job_id}（{owner}），{job.total} 页")
+        return job
+
+    async def _run(self, job: TTSJob):
+        emit = job._emit
+        job.status = "processing"
+        try:
+            await emit({"type": "started", "total": job.total})
+            async for idx, result in iter_synthesize_pages(
+                job.txt_paths, job.output_dir, job.voice, use_cache=job.use_cache, audio_format=job.audio_format
+            ):
+                job.results.append(result)
+                if result["status"] != "success" and job.error is None:
+                    job.error = result.get("error")
+                await emit({
+                    "type": "page",
+                    "index": idx,
+                    "total": job.total,
+                    "progress": int(idx / job.total * 100),
+                    "result": result,
+                })
+            job.status = "failed" if job.error else "completed"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            raise
+        except Exception as e:
+            print(f"[ERROR] TTS任务 {job.job_id} 失败: {e}")
+            job.status, job.error = "failed", str(e)
+        finally:
+            job.finished_at = time.time()
+            await emit({"type": "finished", "status": job.status, "error": job.error, "total": job.total}, final=True)
+            print(f"[LOG] TTS任务结束: {job.job_id}，状态: {job.status}")
+
+    def get(self, job_id: str) -> Optional[TTSJob]:
+        return self._jobs.get(job_id)
+
+    def find(self, owner: str) -> Optional[TTSJob]:
+        """owner 最近一次的任务（进行中或保留期内已结束的）"""
+        job_id = self._by_owner.get(owner)
+        return self._jobs.get(job_id) if job_id else None
+
+    def cancel(self, job_id: str) -> bool:
+        job = self._jobs.get(job_id)
+        if not job or job.done or not job.task:
+            return False
+        job.task.cancel()
+        return True
+
+    def list_jobs(self) -> List[dict]:
+        self._cleanup()
+        return [job.snapshot() for job in self._jobs.values()]
+
+
+# 全局实例
+tts_jobs = TTSJobManager()
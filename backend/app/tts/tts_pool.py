@@ -0,0 +1,182 @@
+"""
+多页 TTS 并发合成
+
+Azure SDK 的合成调用是阻塞的，原来在请求协程里逐页串行调用，整套课件的耗时是所有页面之和，且合成期间服务无法响应。
+这里把每页的合成放到专用线程池中并发执行：
+- 同一区域同时进行的合成数受并发上限限制（默认 TTS_CONCURRENCY，可用 TTS_REGION_CONCURRENCY 按区域覆盖，
+  格式 "japaneast=8,eastasia=4"，见 region_limits），避免超出 Azure 资源的并发配额；
+  长页面分段合成时各段也占用该区域的名额
+- 结果按页面顺序返回：所有页面同时开始，调用方按顺序等待，进度始终按页码递增
+- 连续的短页面合并为一个请求合成（见 tts_batching），占用一个并发名额
+"""
+import asyncio
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from app.tts import tts_engine
+from app.tts.audio_formats import get_audio_format
+from app.tts.backends import get_backend
+from app.tts.region_limits import region_limit
+from app.tts.tts_batching import TTS_BATCH_CHARS, plan_page_batches
+from app.tts.tts_cache import TTS_CACHE_ENABLED
+
+TTS_MAX_WORKERS = int(os.getenv("TTS_MAX_WORKERS", "16"))
+
+_executor = ThreadPoolExecutor(max_workers=TTS_MAX_WORKERS, thread_name_prefix="tts")
+_region_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+def _semaphore(region: Optional[str]) -> asyncio.Semaphore:
+    key = region or ""
+    if key not in _region_semaphores:
+        _region_semaphores[key] = asyncio.Semaphore(region_limit(region))
+    return _region_semaphores[key]
+
+
+def page_result(
+    txt_path: Path, output_dir: Path, ok: bool, error: str = None, elapsed: float = None, cached: bool = False,
+    info: dict = None,
+) -> dict:
+    """
+    单页合成结果（与原接口返回的字段一致，另加耗时和是否命中TTS缓存）
+    info 为 tts() 写入的信息，成功时带上音频格式、字节数和时长；批量合成的页面另有 batch（同批页数）
+    """
+    info = info or {}
+    fmt = get_audio_format(info.get("audio_format"))
+    audio_path = Path(output_dir) / f"{txt_path.stem}{fmt['ext']}"
+    srt_path = Path(output_dir) / f"{txt_path.stem}_merged.srt"
+    result = {
+        "filename": txt_path.name,
+        "audio_file": audio_path.name if ok and audio_path.exists() else None,
+        "subtitle_file": srt_path.name if ok and srt_path.exists() else None,
+        "status": "success" if ok else "failed",
+        "elapsed": elapsed,
+        "cached": cached,
+    }
+    if ok:
+        result.update(
+            audio_format=fmt["name"], audio_bytes=info.get("audio_bytes"), audio_ms=info.get("audio_ms"),
+        )
+        if info.get("batch"):
+            result["batch"] = info["batch"]
+    else:
+        result["error"] = error or "语音合成失败"
+    return result
+
+
+async def synthesize_page(
+    txt_path, output_dir, voice: str = None, region: str = None, use_cache: bool = True, audio_format: str = None,
+) -> dict:
+    """
+    在线程池中合成一页，受区域并发上限限制；use_cache=False 时不使用TTS缓存
+    audio_format 为输出格式（见 audio_formats），None 时为默认格式
+    """
+    txt_path = Path(txt_path)
+    region = region or get_backend().region
+    async with _semaphore(region):
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        info = {"audio_format": audio_format}
+        try:
+            ok = await loop.run_in_executor(
+                _executor, functools.partial(
+                    tts_engine.tts, txt_path, str(output_dir), voice,
+                    use_cache=use_cache and TTS_CACHE_ENABLED, result=info, audio_format=audio_format,
+                )
+            )
+            error = None
+        except Exception as e:
+            ok, error = False, str(e)
+        elapsed = round(time.perf_counter() - start, 3)
+    print(f"[LOG] TTS完成: {txt_path.name}，{'成功' if ok else '失败'}{'（缓存）' if info.get('cached') else ''}，耗时 {elapsed} 秒")
+    return page_result(txt_path, output_dir, ok, error, elapsed, info.get("cached", False), info)
+
+
+async def synthesize_group(
+    txt_paths: List[Path], output_dir, voice: str = None, region: str = None, use_cache: bool = True,
+    audio_format: str = None,
+) -> List[dict]:
+    """在线程池中批量合成一组短页面（tts_engine.tts_batch），占用一个并发名额，按页面顺序返回结果"""
+    txt_paths = [Path(path) for path in txt_paths]
+    region = region or get_backend().region
+    async with _semaphore(region):
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        infos = [{"audio_format": audio_format} for _ in txt_paths]
+        try:
+            oks = await loop.run_in_executor(
+                _executor, functools.partial(
+                    tts_engine.tts_batch, txt_paths, str(output_dir), voice,
+                    use_cache=use_cache and TTS_CACHE_ENABLED, results=infos, audio_format=audio_format,
+                )
+            )
+            error = None
+        except Exception as e:
+            oks, error = [False] * len(txt_paths), str(e)
+        elapsed = round(time.perf_counter() - start, 3)
+    print(f"[LOG] TTS完成: {', '.join(p.name for p in txt_paths)}，成功 {sum(oks)}/{len(oks)} 页，耗时 {elapsed} 秒")
+    return [
+        page_result(path, output_dir, ok, error, elapsed, info.get("cached", False), info)
+        for path, ok, info in zip(txt_paths, oks, infos)
+    ]
+
+
+async def _synthesize_single(*args) -> List[dict]:
+    return [await synthesize_page(*args)]
+
+
+async def iter_synthesize_pages(
+    txt_paths: List[Path], output_dir, voice: str = None, region: str = None, use_cache: bool = True,
+    audio_format: str = None,
+) -> AsyncIterator[Tuple[int, dict]]:
+    """
+    所有页面同时提交（受并发上限限制），按页面顺序逐个 yield (序号(1起), 结果)
+    PCM 格式时连续的短页面分组批量合成，同组的页面一起完成
+    调用方中途停止迭代时，取消尚未开始的页面
+    """
+    region = region or get_backend().region
+    if TTS_BATCH_CHARS > 0 and get_audio_format(audio_format)["pcm"]:
+        groups = plan_page_batches(txt_paths)
+    else:
+        groups = [[i] for i in range(len(txt_paths))]
+    batched = sum(len(group) for group in groups if len(group) > 1)
+    print(
+        f"[LOG] 开始并发合成 {len(txt_paths)} 页，区域: {region}，并发上限: {region_limit(region)}"
+        + (f"，其中 {batched} 页分 {sum(len(g) > 1 for g in groups)} 批合成" if batched else "")
+    )
+    tasks = [
+        asyncio.create_task(
+            synthesize_group([txt_paths[i] for i in group], output_dir, voice, region, use_cache, audio_format)
+            if len(group) > 1 else
+            _synthesize_single(txt_paths[group[0]], output_dir, voice, region, use_cache, audio_format)
+        )
+        for group in groups
+    ]
+    try:
+        idx = 0
+        for task in tasks:
+            for result in await task:
+                idx += 1
+                yield idx, result
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def synthesize_pages(
+    txt_paths: List[Path], output_dir, voice: str = None, on_result: Callable[[int, dict], None] = None,
+    use_cache: bool = True, audio_format: str = None,
+) -> List[dict]:
+    """并发合成所有页面，按页面顺序返回结果；每得到一页结果（按顺序）调用一次 on_result(序号, 结果)"""
+    results = []
+    async for idx, result in iter_synthesize_pages(
+        txt_paths, output_dir, voice, use_cache=use_cache, audio_format=audio_format
+    ):
+        results.append(result)
+        if on_result:
+            on_result(idx, result)
+    return results
@@ -0,0 +1,163 @@
+"""
+TTS 试听：边合成边返回音频
+
+原来试听声音或语速要先整页合成 WAV 再下载。这里通过合成后端的 stream()（Azure 为 start_speaking + AudioDataStream）拉取音频，
+在专用线程中读取、通过 asyncio.Queue 交给请求协程，收到一段就发给客户端（HTTP 分块响应或 WebSocket 二进制帧）。
+- 默认输出 MP3（可边收边播），也可以选择 audio_formats 中的其他格式；后端不支持 MP3（如 fake）时默认输出 WAV
+- 记录首段音频耗时（time to first audio，TTFA：从收到请求到第一段音频交给客户端），GET /api/tts/preview/metrics 查看
+- 客户端中途断开时停止读取，合成器被丢弃
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Optional
+
+from app.tts import tts_engine
+from app.tts.backends import get_backend
+from app.tts.tts_cache import normalize_text
+from app.tts.tts_chunking import split_sentences
+
+PREVIEW_AUDIO_FORMAT = os.getenv("TTS_PREVIEW_FORMAT", "mp3")
+PREVIEW_MAX_CHARS = int(os.getenv("TTS_PREVIEW_MAX_CHARS", "600"))     # 试听文本的最大字数，超出时截到句末
+PREVIEW_MAX_WORKERS = int(os.getenv("TTS_PREVIEW_MAX_WORKERS", "4"))   # 同时进行的试听数，不与批量合成共用线程池
+
+_executor = ThreadPoolExecutor(max_workers=PREVIEW_MAX_WORKERS, thread_name_prefix="tts-preview")
+_DONE = object()
+
+
+def clip_preview_text(text: str, max_chars: int = PREVIEW_MAX_CHARS) -> str:
+    """规范化讲稿文本，超过 max_chars 时按句子截断（单句超长时直接截断）"""
+    text = normalize_text(text.replace("\n", ""))
+    if len(text) <= max_chars:
+        return text
+    clipped = ""
+    for sentence in split_sentences(text):
+        if len(clipped) + len(sentence) > max_chars:
+            break
+        clipped += sentence
+    return clipped or text[:max_chars]
+
+
+class PreviewMetrics:
+    """试听的 TTFA 和总耗时统计，保留最近 recent 次的记录"""
+
+    def __init__(self, recent: int = 50):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.failed = 0
+        self.ttfa_seconds = 0.0
+        self._recent = deque(maxlen=recent)
+
+    def record(self, ttfa: Optional[float], elapsed: float, size: int, chars: int, ok: bool, audio_format: str):
+        with self._lock:
+            self.count += 1
+            if not ok:
+                self.failed += 1
+            if ttfa is not None:
+                self.ttfa_seconds += ttfa
+            self._recent.append({
+                "ttfa_ms": round(ttfa * 1000, 1) if ttfa is not None else None,
+                "elapsed_ms": round(elapsed * 1000, 1),
+                "bytes": size,
+                "chars": chars,
+                "audio_format": audio_format,
+                "status": "success" if ok else "failed",
+            })
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            recent = list(self._recent)
+            count, failed = self.count, self.failed
+        ttfas = sorted(r["ttfa_ms"] for r in recent if r["ttfa_ms"] is not None)
+        return {
+            "count": count,
+            "failed": failed,
+            "avg_ttfa_ms": round(sum(ttfas) / len(ttfas), 1) if ttfas else None,
+            "p95_ttfa_ms": ttfas[math.ceil(len(ttfas) * 0.95) - 1] if ttfas else None,
+            "recent": recent,
+        }
+
+
+# 全局统计
+preview_metrics = PreviewMetrics()
+
+
+async def iter_preview_audio(
+    text: str, voice: str, rate: str = None, audio_format: str = PREVIEW_AUDIO_FORMAT, info: dict = None,
+) -> AsyncIterator[bytes]:
+    """
+    流式合成一段试听文本，按收到的顺序 yield 音频字节
+    info 不为空时在结束后写入 {"ttfa_ms", "elapsed_ms", "bytes", "word_boundaries"}（单词边界为毫秒）
+    """
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+    stats = {}
+    backend = get_backend()
+
+    def put(item):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:
+            # 事件循环已关闭
+            stop.set()
+
+    def produce():
+        # backend.stream 本身也可能直接抛出（构建 SSML、凭据错误等），同样要通知等待方，否则 queue.get() 永远等不到结果
+        chunks = None
+        try:
+            chunks = backend.stream(
+                text, voice, rate or tts_engine.speech_rate, tts_engine.custom_breaks, audio_format, stats=stats
+            )
+            for chunk in chunks:
+                if stop.is_set():
+                    break
+                put(chunk)
+            put(_DONE)
+        except Exception as e:
+            put(e)
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+
+    loop.run_in_executor(_executor, produce)
+    ttfa, size, ok = None, 0, False
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                ok = True
+                break
+            if isinstance(item, Exception):
+                raise item
+            if ttfa is None:
+                ttfa = time.perf_counter() - start
+            size += len(item)
+            yield item
+    finally:
+        stop.set()
+        elapsed = time.perf_counter() - start
+        preview_metrics.record(ttfa, elapsed, size, len(text), ok, audio_format)
+        print(
+            f"[LOG] 试听合成{'完成' if ok else '中断'}: {len(text)} 字，"
+            f"首段音频 {round(ttfa * 1000) if ttfa is not None else '-'} ms，总耗时 {round(elapsed * 1000)} ms"
+        )
+        if info is not None:
+            info.update(
+                ttfa_ms=round(ttfa * 1000, 1) if ttfa is not None else None,
+                elapsed_ms=round(elapsed * 1000, 1),
+                bytes=size,
+                word_boundaries=[
+                    {
+                        "text": wb["text"],
+                        "offset_ms": wb["audio_offset"] // 10000,
+                        "duration_ms": round(wb["duration"].total_seconds() * 1000),
+                    }
+                    for wb in stats.get("word_boundaries", [])
+                ],
+            )
@@ -0,0 +1,94 @@
+"""
+发送给 LLM 前的幻灯片图片预处理
+
+原图为 200dpi 的 PNG（部分带黑边），直接 base64 上传会让请求体达到数 MB。
+这里为每张幻灯片生成一个面向 LLM 的缩小版本：
+- 裁掉四周的纯黑边
+- 长边缩放到 LLM_IMAGE_MAX_EDGE 以内
+- 重新编码为 JPEG/WebP
+
+生成结果缓存在原图目录下的 _llm/ 子目录中，原图更新后自动重新生成。
+"""
+import base64
+import io
+import os
+import threading
+from pathlib import Path
+from typing import Tuple
+
+from PIL import Image
+
+LLM_IMAGE_MAX_EDGE = int(os.getenv("LLM_IMAGE_MAX_EDGE", "1280"))
+LLM_IMAGE_FORMAT = os.getenv("LLM_IMAGE_FORMAT", "jpeg").lower()   # jpeg 或 webp
+LLM_IMAGE_QUALITY = int(os.getenv("LLM_IMAGE_QUALITY", "80"))
+LLM_IMAGE_CROP_BORDERS = os.getenv("LLM_IMAGE_CROP_BORDERS", "true").lower() in ("1", "true", "yes")
+
+OPTIMIZED_SUBDIR = "_llm"
+BORDER_THRESHOLD = 16  # 灰度低于该值视为黑边
+
+IMAGE_FORMATS = {
+    "jpeg": ("JPEG", ".jpg", "image/jpeg"),
+    "webp": ("WEBP", ".webp", "image/webp"),
+}
+
+
+def crop_black_borders(img: Image.Image) -> Image.Image:
+    """裁掉图片四周的黑边，整张图都是黑色时原样返回"""
+    mask = img.convert("L").point(lambda v: 255 if v > BORDER_THRESHOLD else 0)
+    bbox = mask.getbbox()
+    if not bbox or bbox == (0, 0, img.width, img.height):
+        return img
+    return img.crop(bbox)
+
+
+def optimized_path(image_path, max_edge: int, fmt: str, quality: int, crop: bool) -> Path:
+    """优化后图片的缓存路径，文件名包含参数，参数变化时不会误用旧文件"""
+    image_path = Path(image_path)
+    suffix = IMAGE_FORMATS[fmt][1]
+    tag = f"{max_edge}_q{quality}{'_crop' if crop else ''}"
+    return image_path.parent / OPTIMIZED_SUBDIR / f"{image_path.stem}_{tag}{suffix}"
+
+
+def optimize_image(
+    image_path,
+    max_edge: int = LLM_IMAGE_MAX_EDGE,
+    fmt: str = LLM_IMAGE_FORMAT,
+    quality: int = LLM_IMAGE_QUALITY,
+    crop: bool = LLM_IMAGE_CROP_BORDERS,
+) -> Path:
+    """
+    生成（或复用缓存的）LLM 用图片，返回文件路径
+    """
+    if fmt not in IMAGE_FORMATS:
+        raise ValueError(f"不支持的图片格式: {fmt}，可选: {', '.join(IMAGE_FORMATS)}")
+    image_path = Path(image_path)
+    target = optimized_path(image_path, max_edge, fmt, quality, crop)
+    if target.exists() and target.stat().st_mtime >= image_path.stat().st_mtime:
+        return target
+
+    with Image.open(image_path) as img:
+        img = img.convert("RGB")
+        if crop:
+            img = crop_black_borders(img)
+        img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        buf = io.BytesIO()
+        img.save(buf, format=IMAGE_FORMATS[fmt][0], quality=quality, optimize=True)
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    # 临时文件名带线程号：并发处理同一张幻灯片时各写各的，不会用写了一半的文件替换结果
+    tmp_path = target.with_name(f"{target.name}.{threading.get_ident()}.tmp")
+    tmp_path.write_bytes(buf.getvalue())
+    os.replace(tmp_path, target)
+    print(f"[LOG] 已生成LLM用图片: {target} ({image_path.stat().st_size} -> {len(buf.getvalue())} 字节)")
+    return target
+
+
+def encode_for_llm(image_path, **options) -> Tuple[str, str]:
+    """
+    返回 (base64字符串, MIME类型)，用于构建 data URL
+    """
+    fmt = options.get("fmt", LLM_IMAGE_FORMAT)
+    path = optimize_image(image_path, **options)
+    with open(path, "rb") as f:
+        encoded = base64.b64encode(f.read()).decode("utf-8")
+    return encoded, IMAGE_FORMATS[fmt][2]
@@ -0,0 +1,352 @@
+"""
+整套课件讲稿的离线批量生成（OpenAI 兼容的 Batch 接口）
+
+流程：
+1. 为一个或多个 processed_images/<folder> 下的所有幻灯片构建请求，写成 JSONL 文件
+   （每行 {"custom_id", "method", "url", "body"}，body 与 pipelined 模式的草稿请求相同：图片 + 相邻页PDF文本）
+2. POST /files 上传（purpose=batch），POST /batches 创建批任务
+3. 轮询 GET /batches/{id} 直到进入终态
+4. 下载 GET /files/{output_file_id}/content，按 custom_id 把讲稿写回 notes_output/<folder>/<页>.txt，
+   生成合并文稿，并在断点记录中标记为已完成；成功结果同时写入LLM缓存，之后用 pipelined 模式重新生成时直接命中
+
+批任务的状态保存在 cache/batch_jobs/<job_id>.json，服务重启后仍可查询和收取结果。
+批量请求之间没有先后依赖，因此不携带前几页讲稿（与 pipelined 模式的草稿阶段一致），也不做润色。
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+from app.utils.image_optimizer import encode_for_llm
+from app.utils.llm_cache import llm_cache, make_cache_key
+from app.utils.llm_client import USER_AGENT, llm_client
+from app.utils.llm_provider_pool import LLMProvider, provider_pool
+from app.utils.notes_index import notes_index
+from app.utils.script_checkpoint import ScriptCheckpoint
+from app.utils.script_generation import (
+    build_neighbor_prompt, build_payload, extract_page_num, find_source_pdf,
+    list_slide_images, load_pdf_page_texts, save_page_script,
+)
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+PROCESSED_IMAGES_DIR = BASE_DIR / "processed_images"
+NOTES_DIR = BASE_DIR / "notes_output"
+BATCH_JOBS_DIR = Path(os.getenv("LLM_BATCH_JOBS_DIR", str(BASE_DIR / "cache" / "batch_jobs")))
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_COMPLETION_WINDOW = "24h"
+BATCH_POLL_INTERVAL = int(os.getenv("LLM_BATCH_POLL_INTERVAL", "60"))   # 轮询间隔秒数
+BATCH_HTTP_TIMEOUT = 600    # 上传/下载批文件的超时秒数
+BATCH_POLL_MAX_FAILURES = int(os.getenv("LLM_BATCH_POLL_MAX_FAILURES", "10"))   # 连续查询失败多少次后放弃
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+def api_base(provider: LLMProvider) -> str:
+    """从提供方的 chat/completions 地址推出接口根地址（…/v1）"""
+    url = provider.url.rstrip("/")
+    suffix = "/chat/completions"
+    return url[:-len(suffix)] if url.endswith(suffix) else url
+
+
+def _headers(provider: LLMProvider) -> dict:
+    return {"Authorization": f"Bearer {provider.api_key}", "User-Agent": USER_AGENT}
+
+
+def select_provider(api_key: str = None) -> LLMProvider:
+    """
+    选择提交批任务的提供方：优先使用 batch 组，没有时使用 script 组；传入 api_key 时作为临时提供方
+    """
+    group = "batch" if provider_pool.has_providers("batch") else "script"
+    candidates = provider_pool.candidates(group, api_key)
+    if not candidates:
+        raise ValueError("没有可用的LLM提供方，请传入 api_key 或配置 llm_providers.json")
+    if api_key:
+        return next(p for p in candidates if p.api_key == api_key)
+    return max(candidates, key=lambda p: p.weight)
+
+
+def find_provider(job: dict, api_key: str = None) -> LLMProvider:
+    """找回提交批任务时使用的提供方；临时提供方在服务重启后需要重新传入 api_key"""
+    name = job["provider"]
+    provider = provider_pool.providers.get(name)
+    if provider is None and api_key and provider_pool.adhoc(api_key, job["group"]).name == name:
+        provider = provider_pool.providers[name]
+    if provider is None:
+        raise ValueError(f"找不到提交批任务时使用的LLM提供方 {name}，请重新传入 api_key")
+    return provider
+
+
+# ---------- 批任务状态文件 ----------
+
+def job_path(job_id: str) -> Path:
+    return BATCH_JOBS_DIR / f"{job_id}.json"
+
+
+def save_job(job: dict):
+    """原子写入批任务状态"""
+    job["updated_at"] = time.time()
+    BATCH_JOBS_DIR.mkdir(parents=True, exist_ok=True)
+    path = job_path(job["job_id"])
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps(job, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def load_job(job_id: str) -> Optional[dict]:
+    path = job_path(job_id)
+    if not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        print(f"[WARN] 批任务状态读取失败: {path}，错误: {e}")
+        return None
+
+
+def list_jobs() -> List[dict]:
+    """按创建时间倒序列出所有批任务（不含请求清单）"""
+    if not BATCH_JOBS_DIR.exists():
+        return []
+    jobs = [load_job(path.stem) for path in BATCH_JOBS_DIR.glob("*.json")]
+    jobs = [job_summary(job) for job in jobs if job]
+    return sorted(jobs, key=lambda job: job["created_at"], reverse=True)
+
+
+def job_summary(job: dict) -> dict:
+    """对外返回的批任务信息，去掉逐页清单和提示词"""
+    return {k: v for k, v in job.items() if k not in ("requests", "base_prompt")}
+
+
+# ---------- 构建请求 ----------
+
+def build_batch_requests(
+    folders: List[str], base_prompt: str, jsonl_path: Path, images_root=PROCESSED_IMAGES_DIR
+) -> Dict[str, dict]:
+    """
+    把所有文件夹的幻灯片请求逐行写入 JSONL 文件，返回 {custom_id: 页面信息}
+    custom_id 格式为 <folder>/<页序号>，页序号与 generate-folder-scripts 的页码一致
+    """
+    requests = {}
+    jsonl_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(jsonl_path, "w", encoding="utf-8") as f:
+        for folder in folders:
+            slides = list_slide_images(Path(images_root) / folder)
+            page_texts = load_pdf_page_texts(find_source_pdf(folder))
+            print(f"[LOG] 批任务加入文件夹 {folder}: {len(slides)} 页，PDF文本页数: {len(page_texts)}")
+            for i, slide in enumerate(slides, 1):
+                encoded_slide, mime_type = encode_for_llm(slide)
+                page_num = extract_page_num(slide) or i
+                payload = build_payload(build_neighbor_prompt(base_prompt, page_texts, page_num), encoded_slide, mime_type=mime_type)
+                custom_id = f"{folder}/{i}"
+                f.write(json.dumps(
+                    {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": payload},
+                    ensure_ascii=False
+                ) + "\n")
+                requests[custom_id] = {
+                    "folder": folder,
+                    "page": i,
+                    "slide": slide.name,
+                    "cache_key": make_cache_key(payload),
+                    "model": payload["model"],
+                    "context": {"pdf_text_pages": [n for n in (page_num - 1, page_num, page_num + 1) if page_texts.get(n)]},
+                }
+    return requests
+
+
+# ---------- 提交 / 查询 / 收取 ----------
+
+async def submit_batch(
+    folders: List[str], base_prompt: str, api_key: str = None, images_root=PROCESSED_IMAGES_DIR, notes_root=NOTES_DIR
+) -> dict:
+    """构建 JSONL、上传并创建批任务，返回批任务状态"""
+    provider = select_provider(api_key)
+    base = api_base(provider)
+    job_id = uuid.uuid4().hex[:12]
+    jsonl_path = BATCH_JOBS_DIR / f"{job_id}.jsonl"
+    requests = await asyncio.to_thread(build_batch_requests, folders, base_prompt, jsonl_path, images_root)
+    if not requests:
+        jsonl_path.unlink(missing_ok=True)
+        raise ValueError("所选文件夹中没有找到图片文件")
+    input_bytes = jsonl_path.stat().st_size
+    print(f"[LOG] 批任务 {job_id} 请求文件: {len(requests)} 条，{input_bytes} 字节，提供方: {provider.name}")
+
+    client = llm_client.http_client()
+    try:
+        with open(jsonl_path, "rb") as f:
+            response = await client.post(
+                f"{base}/files", headers=_headers(provider), data={"purpose": "batch"},
+                files={"file": (jsonl_path.name, f, "application/jsonl")}, timeout=BATCH_HTTP_TIMEOUT
+            )
+        response.raise_for_status()
+        input_file_id = response.json()["id"]
+        response = await client.post(
+            f"{base}/batches", headers=_headers(provider), timeout=BATCH_HTTP_TIMEOUT,
+            json={
+                "input_file_id": input_file_id,
+                "endpoint": BATCH_ENDPOINT,
+                "completion_window": BATCH_COMPLETION_WINDOW,
+                "metadata": {"job_id": job_id, "folders": ",".join(folders)},
+            },
+        )
+        response.raise_for_status()
+        batch = response.json()
+    finally:
+        jsonl_path.unlink(missing_ok=True)   # 已上传到服务端，本地不保留几十MB的请求文件
+
+    job = {
+        "job_id": job_id,
+        "batch_id": batch["id"],
+        "input_file_id": input_file_id,
+        "provider": provider.name,
+        "group": provider.group,
+        "folders": folders,
+        "notes_root": str(notes_root),
+        "base_prompt": base_prompt,
+        "status": batch.get("status", "validating"),
+        "request_counts": batch.get("request_counts"),
+        "output_file_id": None,
+        "error_file_id": None,
+        "input_bytes": input_bytes,
+        "total_requests": len(requests),
+        "collected": False,
+        "results": None,
+        "created_at": time.time(),
+        "requests": requests,
+    }
+    save_job(job)
+    print(f"[LOG] 批任务已提交: job_id={job_id}, batch_id={job['batch_id']}")
+    return job
+
+
+async def refresh_batch(job: dict, api_key: str = None) -> dict:
+    """查询服务端批任务状态并写回状态文件"""
+    if job["status"] in TERMINAL_STATUSES:
+        return job
+    provider = find_provider(job, api_key)
+    response = await llm_client.http_client().get(
+        f"{api_base(provider)}/batches/{job['batch_id']}", headers=_headers(provider), timeout=BATCH_HTTP_TIMEOUT
+    )
+    response.raise_for_status()
+    batch = response.json()
+    job.update(
+        status=batch.get("status", job["status"]),
+        request_counts=batch.get("request_counts"),
+        output_file_id=batch.get("output_file_id"),
+        error_file_id=batch.get("error_file_id"),
+    )
+    save_job(job)
+    print(f"[LOG] 批任务 {job['job_id']} 状态: {job['status']}，进度: {job['request_counts']}")
+    return job
+
+
+async def _download(provider: LLMProvider, file_id: str) -> List[dict]:
+    response = await llm_client.http_client().get(
+        f"{api_base(provider)}/files/{file_id}/content", headers=_headers(provider), timeout=BATCH_HTTP_TIMEOUT
+    )
+    response.raise_for_status()
+    return [json.loads(line) for line in response.text.splitlines() if line.strip()]
+
+
+def _parse_result(line: dict) -> tuple:
+    """从结果行中取出 (是否成功, 讲稿或错误信息, token用量)"""
+    response = line.get("response") or {}
+    body = response.get("body") or {}
+    if response.get("status_code") == 200:
+        try:
+            return True, body["choices"][0]["message"]["content"], body.get("usage")
+        except (KeyError, IndexError, TypeError) as e:
+            return False, f"API响应格式错误: {e!r}", None
+    error = line.get("error") or body.get("error") or {}
+    return False, f"API调用失败: {response.get('status_code')} {error.get('message', error)}", None
+
+
+def fan_out_results(job: dict, lines: List[dict]) -> dict:
+    """把批任务结果写回每个文件夹：单页 txt、合并文稿和断点记录；返回各文件夹的成功/失败页数"""
+    results = {line.get("custom_id"): line for line in lines}
+    notes_root = Path(job["notes_root"])
+    summary = {}
+    for folder in job["folders"]:
+        output_dir = notes_root / folder
+        output_dir.mkdir(parents=True, exist_ok=True)
+        checkpoint = ScriptCheckpoint(output_dir, job["base_prompt"], "batch", resume=True)
+        entries = sorted(
+            ((custom_id, entry) for custom_id, entry in job["requests"].items() if entry["folder"] == folder),
+            key=lambda item: item[1]["page"]
+        )
+        scripts = []
+        failed_pages = []
+        for custom_id, entry in entries:
+            slide = Path(entry["slide"])
+            line = results.get(custom_id)
+            ok, content, usage = _parse_result(line) if line else (False, "批任务结果中没有该页", None)
+            call = {"content": content, "usage": usage, "latency": None}
+            context = dict(entry["context"], batch_id=job["batch_id"])
+            if ok:
+                page_txt = save_page_script(output_dir, slide, content)
+                checkpoint.mark_done(slide, entry["page"], page_txt, context, call)
+                llm_cache.put(entry["cache_key"], {"content": content, "usage": usage}, entry["model"])
+                scripts.append(f"Page {entry['page']}:\n{content}")
+            else:
+                print(f"[ERROR] 批任务第{entry['page']}页失败（{folder}）: {content}")
+                checkpoint.mark_failed(slide, entry["page"], context, call)
+                failed_pages.append(entry["page"])
+
+        combined_script_file = output_dir / f"{folder}_combined_scripts.txt"
+        with open(combined_script_file, "w", encoding="utf-8") as f:
+            f.write("\n\n".join(scripts))
+        notes_index.update(combined_script_file)
+        print(f"[LOG] 合并脚本已保存到: {combined_script_file}")
+        summary[folder] = {
+            "succeeded": len(scripts),
+            "failed_pages": failed_pages,
+            "combined_script_file": str(combined_script_file),
+        }
+    return summary
+
+
+async def collect_batch(job: dict, api_key: str = None) -> dict:
+    """批任务完成后下载结果并写回 notes_output；已收取过的任务直接返回"""
+    if job["collected"] or job["status"] != "completed":
+        return job
+    provider = find_provider(job, api_key)
+    lines = await _download(provider, job["output_file_id"]) if job.get("output_file_id") else []
+    if job.get("error_file_id"):
+        lines += await _download(provider, job["error_file_id"])
+    print(f"[LOG] 批任务 {job['job_id']} 结果已下载: {len(lines)} 条")
+    job["results"] = await asyncio.to_thread(fan_out_results, job, lines)
+    job["collected"] = True
+    save_job(job)
+    return job
+
+
+async def poll_batch(job_id: str, interval: float = BATCH_POLL_INTERVAL, api_key: str = None) -> dict:
+    """
+    后台轮询直到批任务进入终态，完成后自动收取结果
+    查询连续失败 BATCH_POLL_MAX_FAILURES 次，或返回 429 以外的 4xx（批任务不存在、key 失效等）时，
+    把任务标记为 failed 并停止轮询
+    """
+    job = load_job(job_id)
+    failures = 0
+    while job["status"] not in TERMINAL_STATUSES:
+        await asyncio.sleep(interval)
+        try:
+            job = await refresh_batch(job, api_key)
+            failures = 0
+        except Exception as e:
+            failures += 1
+            status_code = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else None
+            permanent = status_code is not None and 400 <= status_code < 500 and status_code != 429
+            if permanent or failures >= BATCH_POLL_MAX_FAILURES:
+                job.update(status="failed", error=f"批任务状态查询失败（连续 {failures} 次）: {e!r}")
+                save_job(job)
+                break
+            print(f"[WARN] 批任务 {job_id} 状态查询失败（第 {failures} 次），稍后重试: {e!r}")
+    if job["status"] != "completed":
+        print(f"[ERROR] 批任务 {job_id} 结束，状态: {job['status']}")
+        return job
+    return await collect_batch(job, api_key)
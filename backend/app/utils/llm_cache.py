@@ -0,0 +1,152 @@
+"""
+LLM 响应的磁盘缓存
+
+- 以 SQLite 单文件存储，键为请求内容（模型、消息、参数）的 sha256；
+  消息中的 base64 图片先替换成图片内容的 sha256，避免键随编码方式变化且减少哈希开销
+- 模型按实际发送的计算：提供方配置了 model 时会替换请求体中的 model，不同模型的结果不共用条目
+- 按总字节数做 LRU 淘汰：超过 LLM_CACHE_MAX_BYTES 时删除最久未访问的条目
+- 失败的调用不写入缓存
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+CACHE_DIR = BASE_DIR / "cache"
+LLM_CACHE_PATH = Path(os.getenv("LLM_CACHE_PATH", str(CACHE_DIR / "llm_responses.sqlite3")))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# 不影响生成结果的请求字段，不参与缓存键计算
+IGNORED_PAYLOAD_KEYS = {"user", "stream", "stream_options"}
+
+
+def _normalize(value):
+    """递归处理请求体：data URL 图片替换为内容哈希"""
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_normalize(v) for v in value]
+    if isinstance(value, str) and value.startswith("data:") and ";base64," in value:
+        return "sha256:" + hashlib.sha256(value.split(";base64,", 1)[1].encode("ascii")).hexdigest()
+    return value
+
+
+def make_cache_key(payload: dict, model: str = None) -> str:
+    """根据 chat/completions 请求体计算缓存键，model 为实际发送的模型（为空时取请求体中的 model）"""
+    if model:
+        payload = dict(payload, model=model)
+    normalized = _normalize({k: v for k, v in payload.items() if k not in IGNORED_PAYLOAD_KEYS})
+    raw = json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class CacheStats:
+    """单次请求内的缓存命中统计"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit: bool):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def to_dict(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class LLMResponseCache:
+    def __init__(self, db_path: Path = LLM_CACHE_PATH, max_bytes: int = LLM_CACHE_MAX_BYTES):
+        self.db_path = Path(db_path)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    cache_key TEXT PRIMARY KEY,
+                    model TEXT,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Optional[dict]:
+        """读取缓存，命中时刷新访问时间"""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value FROM responses WHERE cache_key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE responses SET last_access = ? WHERE cache_key = ?", (time.time(), key))
+            conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, value: dict, model: str = None):
+        """写入缓存并按总字节数淘汰最久未访问的条目"""
+        raw = json.dumps(value, ensure_ascii=False)
+        size = len(raw.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (cache_key, model, value, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, raw, size, now, now),
+            )
+            self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for cache_key, size in conn.execute(
+            "SELECT cache_key, size FROM responses ORDER BY last_access ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM responses WHERE cache_key = ?", (cache_key,))
+            total -= size
+            evicted += 1
+        print(f"[LOG] LLM缓存淘汰 {evicted} 条，当前大小: {total} 字节")
+
+    def stats(self) -> dict:
+        with self._lock:
+            conn = self._connect()
+            entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"entries": entries, "bytes": total, "max_bytes": self.max_bytes, "path": str(self.db_path)}
+
+    def clear(self) -> int:
+        with self._lock:
+            conn = self._connect()
+            deleted = conn.execute("DELETE FROM responses").rowcount
+            conn.commit()
+        return deleted
+
+
+# 全局缓存实例
+llm_cache = LLMResponseCache()
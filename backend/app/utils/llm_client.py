@@ -0,0 +1,406 @@
+"""
+LLM 调用的容错层（所有 chat/completions 请求都经过这里）
+
+- 共享 httpx.AsyncClient：每个事件循环只创建一次，复用连接，不再每次请求新建客户端
+- 重试：指数退避 + 全抖动（delay = random(0, min(上限, 基数 × 2^n))），429 的 Retry-After 由提供方池的冷却时间保证
+- 熔断：同一提供方连续 LLM_BREAKER_THRESHOLD 次 5xx/网络错误后熔断，LLM_BREAKER_RECOVERY 秒内直接跳过；
+  到期后放行一次试探请求，成功则恢复，失败继续熔断；试探请求返回 429/其他 4xx 或被取消时不改变熔断状态，
+  之后可以再放行一次试探（429 的等待由提供方池的冷却时间保证）。所有提供方都熔断时立即失败，不再排队等待
+- 对冲请求：请求耗时超过该组最近成功请求的 p95 时，向另一个空闲提供方再发一份，取先成功的结果并取消另一个
+- 流式请求（stream_chat_completion）：逐段返回生成的文本；收到第一段之前的失败同样退避重试并切换提供方，
+  已经输出部分内容后失败则直接抛出 LLMStreamError（无法无缝续接），流式请求不做对冲；
+  没有收到 [DONE] 或 finish_reason 就结束的流（连接中途断开）按失败处理，不当作完整结果
+"""
+import asyncio
+import json
+import os
+import random
+import time
+import weakref
+from collections import deque
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from app.utils.llm_provider_pool import FAILOVER_STATUS, LLMProvider, provider_pool
+
+REQUEST_TIMEOUT = 300
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "4"))
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 20.0
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_RECOVERY = float(os.getenv("LLM_BREAKER_RECOVERY", "30"))
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "true").lower() in ("1", "true", "yes")
+HEDGE_MIN_SAMPLES = 20     # 至少有这么多成功样本后才启用对冲
+HEDGE_PERCENTILE = 0.95
+
+USER_AGENT = "DMXAPI/1.0.0 (https://www.dmxapi.com/)"
+
+
+def backoff_delay(attempt: int) -> float:
+    """第 attempt 次失败后的等待秒数（全抖动）"""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** (attempt - 1))))
+
+
+def _retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class LLMStreamError(Exception):
+    """流式请求失败（所有重试都失败，或已输出部分内容后中断）"""
+
+
+class CircuitBreaker:
+    def __init__(self, threshold: int = LLM_BREAKER_THRESHOLD, recovery: float = LLM_BREAKER_RECOVERY):
+        self.threshold = threshold
+        self.recovery = recovery
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.recovery:
+            return "half_open"
+        return "open"
+
+    def blocks(self) -> bool:
+        """熔断中，或半开状态下试探请求尚未返回"""
+        state = self.state
+        return state == "open" or (state == "half_open" and self.trial_in_flight)
+
+    def on_attempt(self):
+        if self.state == "half_open":
+            self.trial_in_flight = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_neutral(self):
+        """请求有结果但不说明提供方是否恢复（429/其他 4xx、被取消）：只结束试探，不改变熔断状态"""
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        half_open = self.state == "half_open"
+        self.trial_in_flight = False
+        if half_open or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+    def to_dict(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self.failures}
+
+
+class LLMClient:
+    def __init__(self):
+        self._clients = weakref.WeakKeyDictionary()   # 事件循环 -> httpx.AsyncClient
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._latencies: Dict[str, deque] = {}        # 组 -> 最近成功请求耗时
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def http_client(self) -> httpx.AsyncClient:
+        """当前事件循环的共享 httpx 客户端"""
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=10),
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            )
+            self._clients[loop] = client
+        return client
+
+    async def aclose(self):
+        """关闭当前事件循环的共享客户端（服务关闭时调用）"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        client = self._clients.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+
+    def breaker(self, provider: LLMProvider) -> CircuitBreaker:
+        if provider.name not in self.breakers:
+            self.breakers[provider.name] = CircuitBreaker()
+        return self.breakers[provider.name]
+
+    def hedge_delay(self, group: str) -> Optional[float]:
+        samples = self._latencies.get(group)
+        if not LLM_HEDGE_ENABLED or not samples or len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * HEDGE_PERCENTILE))]
+
+    def models(self, payload: dict, api_key: str = None, group: str = "script") -> List[str]:
+        """请求可能实际发送的模型（按候选提供方顺序去重），用于按实际模型查找缓存"""
+        models = [p.model or payload.get("model") for p in provider_pool.candidates(group, api_key)]
+        return list(dict.fromkeys(m for m in models or [payload.get("model")] if m))
+
+    async def _send(self, provider: LLMProvider, payload: dict, timeout: float) -> dict:
+        """向单个提供方发送一次请求，释放并发名额并更新熔断状态"""
+        breaker = self.breaker(provider)
+        breaker.on_attempt()
+        body = dict(payload, model=provider.model) if provider.model else payload
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {provider.api_key}",
+            "User-Agent": USER_AGENT,
+        }
+        start = time.perf_counter()
+        status_code = None
+        retry_after = None
+        usage = None
+        content = None
+        error = None
+        try:
+            response = await self.http_client().post(provider.url, json=body, headers=headers, timeout=timeout)
+            status_code = response.status_code
+            print(f"[LOG] API响应状态: {status_code}（{provider.name}）")
+            if status_code == 200:
+                result = response.json()
+                content = result["choices"][0]["message"]["content"]
+                usage = result.get("usage")
+            else:
+                retry_after = _retry_after_seconds(response)
+                error = f"API调用失败: {status_code} {response.text}"
+                print(f"[ERROR] API调用失败: {response.text}")
+        except asyncio.CancelledError:
+            provider_pool.abandon(provider)
+            breaker.record_neutral()
+            raise
+        except httpx.HTTPError as e:
+            error = f"API异常: {e!r}"
+            print(f"[ERROR] API异常（{provider.name}）: {e!r}")
+        except (ValueError, KeyError, IndexError) as e:
+            status_code = None  # 响应格式错误按服务端故障处理
+            error = f"API响应格式错误: {e!r}"
+            print(f"[ERROR] API响应格式错误（{provider.name}）: {e!r}")
+        latency = time.perf_counter() - start
+        ok = content is not None
+        provider_pool.release(provider, status_code, latency, usage, retry_after)
+        if ok:
+            breaker.record_success()
+            self._latencies.setdefault(provider.group, deque(maxlen=50)).append(latency)
+        elif status_code is None or status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_neutral()
+        return {
+            "ok": ok,
+            "content": content if ok else error,
+            "usage": usage,
+            "status_code": status_code,
+            "provider": provider.name,
+            "model": body.get("model"),
+            "retryable": not ok and (status_code is None or status_code in FAILOVER_STATUS),
+        }
+
+    async def _send_hedged(self, provider: LLMProvider, usable: List[LLMProvider], payload: dict, timeout: float) -> dict:
+        """发送请求，超过对冲阈值仍未返回时向另一个提供方再发一份，返回先成功的结果"""
+        primary = asyncio.create_task(self._send(provider, payload, timeout))
+        pending = {primary}
+        try:
+            delay = self.hedge_delay(provider.group)
+            if delay is None:
+                return await primary
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
+            others = [p for p in usable if p.name != provider.name and not self.breaker(p).blocks()]
+            try:
+                backup_provider = await provider_pool.acquire(others, timeout=0)
+            except TimeoutError:
+                backup_provider = None
+            if backup_provider is None:
+                return await primary
+            self.hedges += 1
+            print(f"[LOG] 请求超过 {delay:.1f} 秒未返回，向 {backup_provider.name} 发送对冲请求")
+            backup = asyncio.create_task(self._send(backup_provider, payload, timeout))
+            pending.add(backup)
+            result = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = dict(task.result(), hedged=True)
+                    if result["ok"]:
+                        if task is backup:
+                            self.hedge_wins += 1
+                        return result
+            return result
+        finally:
+            # 返回或被取消时，取消还没结束的请求
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def chat_completion(
+        self,
+        payload: dict,
+        api_key: str = None,
+        group: str = "script",
+        timeout: float = REQUEST_TIMEOUT,
+        max_attempts: int = LLM_MAX_ATTEMPTS,
+    ) -> dict:
+        """
+        发送 chat/completions 请求，失败时退避重试并切换提供方
+
+        返回 {"ok", "content"(成功为讲稿，失败为错误信息), "usage", "status_code", "provider", "model"(实际发送的模型),
+              "attempts", "hedged"}
+        """
+        candidates = provider_pool.candidates(group, api_key)
+        if not candidates:
+            return {
+                "ok": False, "content": "API调用失败: 没有可用的LLM提供方，请传入 api_key 或配置 llm_providers.json",
+                "usage": None, "status_code": None, "provider": None, "model": None, "attempts": 0, "hedged": False,
+            }
+        result = None
+        for attempt in range(1, max_attempts + 1):
+            usable = [p for p in candidates if not self.breaker(p).blocks()]
+            if not usable:
+                print(f"[ERROR] {group} 组所有LLM提供方均已熔断，直接失败")
+                result = dict(result or {}, ok=False, content="API调用失败: 所有LLM提供方暂时不可用（熔断中）")
+                break
+            try:
+                provider = await provider_pool.acquire(usable)
+            except TimeoutError as e:
+                result = dict(result or {}, ok=False, content=f"API调用失败: {e}")
+                break
+            result = await self._send_hedged(provider, usable, payload, timeout)
+            if result["ok"] or not result["retryable"]:
+                break
+            if attempt < max_attempts:
+                delay = backoff_delay(attempt)
+                print(f"[LOG] 第{attempt}次调用失败，{delay:.2f} 秒后重试")
+                await asyncio.sleep(delay)
+        result.setdefault("usage", None)
+        result.setdefault("status_code", None)
+        result.setdefault("provider", None)
+        result.setdefault("model", None)
+        result.setdefault("hedged", False)
+        result["attempts"] = attempt
+        return result
+
+    async def stream_chat_completion(
+        self,
+        payload: dict,
+        api_key: str = None,
+        group: str = "script",
+        timeout: float = REQUEST_TIMEOUT,
+        max_attempts: int = LLM_MAX_ATTEMPTS,
+        result: dict = None,
+    ) -> AsyncIterator[str]:
+        """
+        以 SSE 流式发送 chat/completions 请求，逐段 yield 生成的文本
+        result 不为空时，结束后写入 {"provider", "model"(实际发送的模型), "usage", "attempts"}；失败时抛出 LLMStreamError
+        """
+        candidates = provider_pool.candidates(group, api_key)
+        if not candidates:
+            raise LLMStreamError("API调用失败: 没有可用的LLM提供方，请传入 api_key 或配置 llm_providers.json")
+        headers = {"Content-Type": "application/json", "User-Agent": USER_AGENT}
+        error = None
+        for attempt in range(1, max_attempts + 1):
+            usable = [p for p in candidates if not self.breaker(p).blocks()]
+            if not usable:
+                raise LLMStreamError("API调用失败: 所有LLM提供方暂时不可用（熔断中）")
+            try:
+                provider = await provider_pool.acquire(usable)
+            except TimeoutError as e:
+                raise LLMStreamError(f"API调用失败: {e}")
+            breaker = self.breaker(provider)
+            breaker.on_attempt()
+            body = dict(payload, stream=True, stream_options={"include_usage": True})
+            if provider.model:
+                body["model"] = provider.model
+            start = time.perf_counter()
+            status_code = None
+            retry_after = None
+            usage = None
+            emitted = False
+            finished = False
+            error = None
+            try:
+                async with self.http_client().stream(
+                    "POST", provider.url, json=body, timeout=timeout,
+                    headers=dict(headers, Authorization=f"Bearer {provider.api_key}"),
+                ) as response:
+                    status_code = response.status_code
+                    print(f"[LOG] API流式响应状态: {status_code}（{provider.name}）")
+                    if status_code != 200:
+                        await response.aread()
+                        retry_after = _retry_after_seconds(response)
+                        error = f"API调用失败: {status_code} {response.text}"
+                        print(f"[ERROR] API调用失败: {response.text}")
+                    else:
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[5:].strip()
+                            if data == "[DONE]":
+                                finished = True
+                                break
+                            chunk = json.loads(data)
+                            usage = chunk.get("usage") or usage
+                            for choice in chunk.get("choices") or []:
+                                finished = finished or bool(choice.get("finish_reason"))
+                                delta = (choice.get("delta") or {}).get("content")
+                                if delta:
+                                    emitted = True
+                                    yield delta
+                        if not finished:
+                            status_code = None   # 按网络错误处理
+                            error = "API异常: 流式响应在结束前中断（未收到 [DONE]）"
+                            print(f"[ERROR] API流式响应未正常结束（{provider.name}）")
+            except (asyncio.CancelledError, GeneratorExit):
+                # 调用方中途放弃（如客户端断开），只释放并发名额
+                provider_pool.abandon(provider)
+                breaker.record_neutral()
+                raise
+            except httpx.HTTPError as e:
+                status_code = None
+                error = f"API异常: {e!r}"
+                print(f"[ERROR] API流式请求异常（{provider.name}）: {e!r}")
+            except ValueError as e:
+                status_code = None
+                error = f"API响应格式错误: {e!r}"
+                print(f"[ERROR] API流式响应格式错误（{provider.name}）: {e!r}")
+            provider_pool.release(provider, status_code, time.perf_counter() - start, usage, retry_after)
+            if error is None:
+                breaker.record_success()
+                if result is not None:
+                    result.update(provider=provider.name, model=body.get("model"), usage=usage, attempts=attempt)
+                return
+            if status_code is None or status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_neutral()
+            retryable = status_code is None or status_code in FAILOVER_STATUS
+            if emitted or not retryable:
+                break
+            if attempt < max_attempts:
+                delay = backoff_delay(attempt)
+                print(f"[LOG] 第{attempt}次流式调用失败，{delay:.2f} 秒后重试")
+                await asyncio.sleep(delay)
+        raise LLMStreamError(error)
+
+    def metrics(self) -> dict:
+        return {
+            "breakers": {name: breaker.to_dict() for name, breaker in self.breakers.items()},
+            "hedge_delay": {group: self.hedge_delay(group) for group in self._latencies},
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
+
+
+# 全局客户端
+llm_client = LLMClient()
@@ -0,0 +1,258 @@
+"""
+LLM 服务提供方（key + 接口地址）的负载均衡池
+
+配置文件 llm_providers.json（路径可用环境变量 LLM_PROVIDERS_PATH 修改）：
+    {
+      "providers": [
+        {"name": "dmx-1", "url": "https://www.dmxapi.com/v1/chat/completions", "api_key": "sk-...",
+         "weight": 2, "max_concurrency": 4, "rpm": 60},
+        {"name": "openai", "group": "openai", "url": "https://api.openai.com/v1/chat/completions",
+         "api_key": "sk-...", "model": "gpt-4o-mini"}
+      ]
+    }
+
+没有配置文件时，从环境变量 SCRIPT_API_KEYS（逗号分隔）生成 script 组的提供方。
+请求中传入的 api_key 作为临时提供方加入候选，同一个 key 共享并发和RPM统计。
+
+选择策略：在未达到并发上限、RPM上限且不在冷却期的提供方中，选 (进行中请求数+1)/(并发上限×权重) 最小的；
+遇到 429/5xx 时该提供方进入冷却，调用方换下一个提供方重试。
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+LLM_PROVIDERS_PATH = Path(os.getenv("LLM_PROVIDERS_PATH", str(BASE_DIR / "llm_providers.json")))
+DEFAULT_SCRIPT_API_URL = os.getenv("SCRIPT_API_URL", "https://www.dmxapi.com/v1/chat/completions")
+DEFAULT_OPENAI_API_URL = os.getenv("OPENAI_API_URL", "https://api.openai.com/v1/chat/completions")
+
+DEFAULT_MAX_CONCURRENCY = 4
+ACQUIRE_TIMEOUT = 300          # 等待可用提供方的最长秒数
+RATE_LIMIT_COOLDOWN = 10       # 429 且没有 Retry-After 时的冷却秒数
+SERVER_ERROR_COOLDOWN = 5      # 5xx/网络错误的冷却秒数
+FAILOVER_STATUS = {429, 500, 502, 503, 504}
+
+# 配置文件中每个提供方可用的字段（adhoc 只用于请求中传入的 key）
+PROVIDER_CONFIG_KEYS = {"name", "url", "api_key", "group", "weight", "max_concurrency", "rpm", "model"}
+
+
+def mask_key(api_key: str) -> str:
+    if not api_key:
+        return ""
+    return f"{api_key[:6]}...{api_key[-4:]}" if len(api_key) > 12 else "***"
+
+
+class LLMProvider:
+    def __init__(
+        self,
+        name: str,
+        url: str,
+        api_key: str,
+        group: str = "script",
+        weight: float = 1.0,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        rpm: int = 0,
+        model: str = None,
+        adhoc: bool = False,
+    ):
+        self.name = name
+        self.url = url
+        self.api_key = api_key
+        self.group = group
+        self.weight = max(float(weight), 0.01)
+        self.max_concurrency = max(int(max_concurrency), 1)
+        self.rpm = int(rpm or 0)
+        self.model = model
+        self.adhoc = adhoc
+
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self._recent = deque()  # 最近60秒内的请求开始时间
+        self.stats = {
+            "requests": 0,
+            "successes": 0,
+            "failures": 0,
+            "rate_limited": 0,
+            "cancelled": 0,
+            "total_latency": 0.0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "last_status": None,
+            "last_error_at": None,
+        }
+
+    def _prune(self, now: float):
+        while self._recent and now - self._recent[0] >= 60:
+            self._recent.popleft()
+
+    def available(self, now: float) -> bool:
+        if now < self.cooldown_until or self.in_flight >= self.max_concurrency:
+            return False
+        self._prune(now)
+        return not self.rpm or len(self._recent) < self.rpm
+
+    def load(self) -> float:
+        return (self.in_flight + 1) / (self.max_concurrency * self.weight)
+
+    def to_dict(self) -> dict:
+        now = time.time()
+        self._prune(now)
+        finished = self.stats["successes"] + self.stats["failures"]
+        return {
+            "name": self.name,
+            "group": self.group,
+            "url": self.url,
+            "api_key": mask_key(self.api_key),
+            "adhoc": self.adhoc,
+            "weight": self.weight,
+            "max_concurrency": self.max_concurrency,
+            "rpm_limit": self.rpm,
+            "in_flight": self.in_flight,
+            "requests_last_minute": len(self._recent),
+            "cooldown_remaining": round(max(0.0, self.cooldown_until - now), 1),
+            **{k: v for k, v in self.stats.items() if k != "total_latency"},
+            "avg_latency": round(self.stats["total_latency"] / finished, 3) if finished else None,
+        }
+
+
+class LLMProviderPool:
+    def __init__(self, config_path: Path = LLM_PROVIDERS_PATH):
+        self.config_path = Path(config_path)
+        self.providers: Dict[str, LLMProvider] = {}
+        self.reload()
+
+    def reload(self):
+        """重新读取配置；临时提供方保留，避免丢失统计"""
+        adhoc = {name: p for name, p in self.providers.items() if p.adhoc}
+        self.providers = {}
+        for entry in self._load_config():
+            try:
+                provider = LLMProvider(**entry)
+            except (TypeError, ValueError) as e:
+                print(f"[WARN] 忽略无效的提供方配置: {entry.get('name')}，错误: {e}")
+                continue
+            self.providers[provider.name] = provider
+        self.providers.update(adhoc)
+        configured = [p.name for p in self.providers.values() if not p.adhoc]
+        print(f"[LOG] LLM提供方池已加载: {configured or '无配置，仅使用请求中的api_key'}")
+
+    def _load_config(self) -> List[dict]:
+        if self.config_path.exists():
+            try:
+                config = json.loads(self.config_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError) as e:
+                print(f"[ERROR] LLM提供方配置读取失败: {self.config_path}，错误: {e}")
+                return []
+            entries = []
+            for i, entry in enumerate(config.get("providers", []), 1):
+                if not isinstance(entry, dict):
+                    print(f"[WARN] 忽略格式错误的提供方配置: 第{i}项")
+                    continue
+                unknown = set(entry) - PROVIDER_CONFIG_KEYS
+                if unknown:
+                    print(f"[WARN] 提供方配置第{i}项包含未知字段，已忽略: {sorted(unknown)}")
+                    entry = {k: v for k, v in entry.items() if k in PROVIDER_CONFIG_KEYS}
+                if not entry.get("api_key") or not entry.get("url"):
+                    print(f"[WARN] 忽略缺少 url 或 api_key 的提供方配置: 第{i}项")
+                    continue
+                entry.setdefault("name", f"{entry.get('group', 'script')}-{i}")
+                entries.append(entry)
+            return entries
+        keys = [k.strip() for k in os.getenv("SCRIPT_API_KEYS", "").split(",") if k.strip()]
+        return [
+            {"name": f"script-env-{i}", "url": DEFAULT_SCRIPT_API_URL, "api_key": key}
+            for i, key in enumerate(keys, 1)
+        ]
+
+    def has_providers(self, group: str = "script") -> bool:
+        return any(p.group == group and not p.adhoc for p in self.providers.values())
+
+    def adhoc(self, api_key: str, group: str = "script", url: str = None) -> LLMProvider:
+        """把请求中传入的 key 注册为临时提供方（同一个 key 复用同一个对象）"""
+        url = url or (DEFAULT_OPENAI_API_URL if group == "openai" else DEFAULT_SCRIPT_API_URL)
+        digest = hashlib.sha256(f"{url}|{api_key}".encode("utf-8")).hexdigest()[:8]
+        name = f"adhoc-{group}-{digest}"
+        if name not in self.providers:
+            self.providers[name] = LLMProvider(name, url, api_key, group=group, adhoc=True)
+        return self.providers[name]
+
+    def candidates(self, group: str = "script", api_key: str = None) -> List[LLMProvider]:
+        """某个组的所有候选提供方，传入 api_key 时加上对应的临时提供方"""
+        providers = [p for p in self.providers.values() if p.group == group and not p.adhoc]
+        if api_key and not any(p.api_key == api_key for p in providers):
+            providers.append(self.adhoc(api_key, group))
+        return providers
+
+    async def acquire(
+        self, candidates: List[LLMProvider], exclude: Iterable[str] = (), timeout: float = ACQUIRE_TIMEOUT
+    ) -> Optional[LLMProvider]:
+        """
+        选择负载最低的可用提供方并占用一个并发名额；候选全部被排除时返回 None，等待超时时抛出 TimeoutError
+        """
+        exclude = set(exclude)
+        remaining = [p for p in candidates if p.name not in exclude]
+        if not remaining:
+            return None
+        deadline = time.monotonic() + timeout
+        while True:
+            now = time.time()
+            available = [p for p in remaining if p.available(now)]
+            if available:
+                provider = min(available, key=lambda p: p.load())
+                provider.in_flight += 1
+                provider._recent.append(now)
+                provider.stats["requests"] += 1
+                return provider
+            if time.monotonic() >= deadline:
+                raise TimeoutError("等待可用的LLM提供方超时")
+            await asyncio.sleep(0.05)
+
+    def release(
+        self,
+        provider: LLMProvider,
+        status_code: Optional[int],
+        latency: float,
+        usage: dict = None,
+        retry_after: float = None,
+    ):
+        """释放并发名额并记录结果；429/5xx/网络错误时让该提供方进入冷却"""
+        provider.in_flight = max(0, provider.in_flight - 1)
+        provider.stats["total_latency"] += latency
+        provider.stats["last_status"] = status_code
+        if status_code == 200:
+            provider.stats["successes"] += 1
+            if usage:
+                provider.stats["prompt_tokens"] += usage.get("prompt_tokens") or 0
+                provider.stats["completion_tokens"] += usage.get("completion_tokens") or 0
+            return
+        provider.stats["failures"] += 1
+        provider.stats["last_error_at"] = time.time()
+        if status_code == 429:
+            provider.stats["rate_limited"] += 1
+            cooldown = retry_after if retry_after is not None else RATE_LIMIT_COOLDOWN
+        elif status_code is None or status_code >= 500:
+            cooldown = SERVER_ERROR_COOLDOWN
+        else:
+            return
+        provider.cooldown_until = max(provider.cooldown_until, time.time() + cooldown)
+        print(f"[WARN] LLM提供方 {provider.name} 返回 {status_code or '网络错误'}，冷却 {cooldown} 秒")
+
+    def abandon(self, provider: LLMProvider):
+        """请求被取消（如对冲请求中落后的一方）时只释放并发名额，不计入成功或失败"""
+        provider.in_flight = max(0, provider.in_flight - 1)
+        provider.stats["cancelled"] += 1
+
+    def metrics(self) -> dict:
+        return {
+            "config_path": str(self.config_path),
+            "providers": [p.to_dict() for p in self.providers.values()],
+        }
+
+
+# 全局提供方池
+provider_pool = LLMProviderPool()
@@ -0,0 +1,241 @@
+"""
+notes_output 下讲稿的全文索引（SQLite FTS5 + trigram 分词）
+
+- trigram 分词不依赖空格，日文、中文和英文都可以直接做子串检索
+- files 表记录每个 txt 的修改时间和大小，notes_fts 的 rowid 与 files.id 对应
+- 增量更新：讲稿写入/改写/拆分/删除时调用 update()；搜索前按 NOTES_INDEX_SYNC_INTERVAL 节流做一次
+  只比较修改时间和大小的增量同步，兜底捕获其他途径修改的文件
+- 关键词都不短于 3 个字符时用 MATCH + bm25 排序并由 FTS5 生成摘要；
+  有更短的关键词（trigram 无法匹配，如两个汉字的词）时改用 LIKE，按命中次数排序
+"""
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+NOTES_DIR = BASE_DIR / "notes_output"
+NOTES_INDEX_PATH = Path(os.getenv("NOTES_INDEX_PATH", str(BASE_DIR / "cache" / "notes_index.sqlite3")))
+NOTES_INDEX_SYNC_INTERVAL = float(os.getenv("NOTES_INDEX_SYNC_INTERVAL", "30"))  # 搜索前增量同步的最小间隔秒数
+
+TRIGRAM_MIN_CHARS = 3
+SNIPPET_TOKENS = 32       # FTS5 摘要的长度（trigram 下约等于字符数）
+SNIPPET_BEFORE = 20       # LIKE 检索时摘要取命中位置前后的字符数
+SNIPPET_AFTER = 100
+DEFAULT_SEARCH_LIMIT = 50
+
+
+def _like_pattern(keyword: str) -> str:
+    escaped = keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _match_query(keywords: List[str]) -> str:
+    """多个关键词按 OR 组合，每个关键词作为短语匹配"""
+    return " OR ".join('"{}"'.format(kw.replace('"', '""')) for kw in keywords)
+
+
+def _like_snippet(content: str, keywords: List[str]) -> str:
+    lowered = content.lower()
+    hits = [lowered.find(kw.lower()) for kw in keywords]
+    first = min(index for index in hits if index != -1)
+    snippet = content[max(0, first - SNIPPET_BEFORE):first + SNIPPET_AFTER].replace("\n", " ")
+    for kw in keywords:
+        snippet = snippet.replace(kw, f"<mark>{kw}</mark>")
+    return snippet
+
+
+class NotesIndex:
+    def __init__(self, db_path: Path = NOTES_INDEX_PATH, notes_root: Path = NOTES_DIR):
+        self.db_path = Path(db_path)
+        self.notes_root = Path(notes_root).resolve()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._last_sync: Dict[Optional[str], float] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS files (
+                    id INTEGER PRIMARY KEY,
+                    path TEXT UNIQUE NOT NULL,
+                    folder TEXT NOT NULL,
+                    mtime REAL NOT NULL,
+                    size INTEGER NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_files_folder ON files(folder)")
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(content, tokenize='trigram')")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _relative(self, path) -> Optional[str]:
+        """notes_output 下的相对路径，不在该目录下时返回 None"""
+        try:
+            return Path(path).resolve().relative_to(self.notes_root).as_posix()
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _folder(rel_path: str) -> str:
+        return rel_path.split("/", 1)[0] if "/" in rel_path else ""
+
+    def _upsert(self, conn: sqlite3.Connection, rel_path: str, stat: os.stat_result, content: str):
+        row = conn.execute("SELECT id FROM files WHERE path = ?", (rel_path,)).fetchone()
+        if row:
+            conn.execute("UPDATE files SET mtime = ?, size = ? WHERE id = ?", (stat.st_mtime, stat.st_size, row[0]))
+            conn.execute("DELETE FROM notes_fts WHERE rowid = ?", (row[0],))
+            file_id = row[0]
+        else:
+            file_id = conn.execute(
+                "INSERT INTO files (path, folder, mtime, size) VALUES (?, ?, ?, ?)",
+                (rel_path, self._folder(rel_path), stat.st_mtime, stat.st_size),
+            ).lastrowid
+        conn.execute("INSERT INTO notes_fts (rowid, content) VALUES (?, ?)", (file_id, content))
+
+    def _delete(self, conn: sqlite3.Connection, rel_path: str):
+        row = conn.execute("SELECT id FROM files WHERE path = ?", (rel_path,)).fetchone()
+        if row:
+            conn.execute("DELETE FROM notes_fts WHERE rowid = ?", (row[0],))
+            conn.execute("DELETE FROM files WHERE id = ?", (row[0],))
+
+    def update(self, path):
+        """文件写入、改写或删除后调用，更新单个文件的索引；不在 notes_output 下的文件忽略"""
+        path = Path(path)
+        rel_path = self._relative(path)
+        if rel_path is None or path.suffix != ".txt":
+            return
+        try:
+            with self._lock:
+                conn = self._connect()
+                if path.exists():
+                    self._upsert(conn, rel_path, path.stat(), path.read_text(encoding="utf-8", errors="replace"))
+                else:
+                    self._delete(conn, rel_path)
+                conn.commit()
+        except (OSError, sqlite3.Error) as e:
+            print(f"[WARN] 讲稿索引更新失败: {path}，错误: {e}")
+
+    def sync(self, folder: str = None) -> dict:
+        """
+        增量同步：只重新索引修改时间或大小变化的文件，删除已不存在的文件
+        folder 为空时同步整个 notes_output
+        """
+        start = time.perf_counter()
+        scope = self.notes_root / folder if folder else self.notes_root
+        on_disk = {}
+        if scope.is_dir():
+            for txt_file in scope.rglob("*.txt"):
+                on_disk[txt_file.relative_to(self.notes_root).as_posix()] = txt_file
+        added = updated = removed = 0
+        with self._lock:
+            conn = self._connect()
+            if folder:
+                rows = conn.execute("SELECT path, mtime, size FROM files WHERE folder = ?", (folder,)).fetchall()
+            else:
+                rows = conn.execute("SELECT path, mtime, size FROM files").fetchall()
+            indexed = {path: (mtime, size) for path, mtime, size in rows}
+            for rel_path in indexed.keys() - on_disk.keys():
+                self._delete(conn, rel_path)
+                removed += 1
+            for rel_path, txt_file in on_disk.items():
+                try:
+                    stat = txt_file.stat()
+                    if indexed.get(rel_path) == (stat.st_mtime, stat.st_size):
+                        continue
+                    self._upsert(conn, rel_path, stat, txt_file.read_text(encoding="utf-8", errors="replace"))
+                except OSError as e:
+                    print(f"[WARN] 讲稿索引读取失败: {txt_file}，错误: {e}")
+                    continue
+                if rel_path in indexed:
+                    updated += 1
+                else:
+                    added += 1
+            conn.commit()
+        self._last_sync[folder] = time.monotonic()
+        result = {
+            "files": len(on_disk), "added": added, "updated": updated, "removed": removed,
+            "elapsed_seconds": round(time.perf_counter() - start, 3),
+        }
+        if added or updated or removed:
+            print(f"[LOG] 讲稿索引已同步（{folder or '全部'}）: {result}")
+        return result
+
+    def ensure_fresh(self, folder: str = None):
+        """距上次同步超过 NOTES_INDEX_SYNC_INTERVAL 秒时做一次增量同步"""
+        last = max(self._last_sync.get(folder, 0.0), self._last_sync.get(None, 0.0))
+        if not last or time.monotonic() - last >= NOTES_INDEX_SYNC_INTERVAL:
+            self.sync(folder)
+
+    def rebuild(self) -> dict:
+        """清空后重建整个索引"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM notes_fts")
+            conn.execute("DELETE FROM files")
+            conn.commit()
+        self._last_sync.clear()
+        return self.sync()
+
+    def search(self, keywords: List[str], folder: str = None, limit: int = DEFAULT_SEARCH_LIMIT) -> List[dict]:
+        """
+        搜索包含任一关键词的讲稿，返回 [{"file", "snippet", "score"}]，按相关度从高到低排序
+        folder 为空时搜索所有项目
+        """
+        self.ensure_fresh(folder)
+        folder_filter = "AND f.folder = ?" if folder else ""
+        folder_args = (folder,) if folder else ()
+        with self._lock:
+            conn = self._connect()
+            if all(len(kw) >= TRIGRAM_MIN_CHARS for kw in keywords):
+                rows = conn.execute(
+                    f"""
+                    SELECT f.path, bm25(notes_fts) AS score,
+                           snippet(notes_fts, 0, '<mark>', '</mark>', '…', {SNIPPET_TOKENS})
+                    FROM notes_fts JOIN files f ON f.id = notes_fts.rowid
+                    WHERE notes_fts MATCH ? {folder_filter}
+                    ORDER BY score LIMIT ?
+                    """,
+                    (_match_query(keywords), *folder_args, limit),
+                ).fetchall()
+                return [
+                    {"file": path, "snippet": snippet.replace("\n", " "), "score": round(-score, 4)}
+                    for path, score, snippet in rows
+                ]
+            conditions = " OR ".join("notes_fts.content LIKE ? ESCAPE '\\'" for _ in keywords)
+            # 命中次数 = (原长度 - 去掉关键词后的长度) / 关键词长度，在SQL中排序后只取前 limit 条的正文
+            hits = " + ".join(
+                "(length(notes_fts.content) - length(replace(lower(notes_fts.content), ?, ''))) / ?" for _ in keywords
+            )
+            hit_args = [arg for kw in keywords for arg in (kw.lower(), len(kw))]
+            rows = conn.execute(
+                f"""
+                SELECT f.path, notes_fts.content, {hits} AS hits
+                FROM notes_fts JOIN files f ON f.id = notes_fts.rowid
+                WHERE ({conditions}) {folder_filter}
+                ORDER BY hits DESC LIMIT ?
+                """,
+                (*hit_args, *[_like_pattern(kw) for kw in keywords], *folder_args, limit),
+            ).fetchall()
+        return [
+            {"file": path, "snippet": _like_snippet(content, keywords), "score": hits}
+            for path, content, hits in rows
+        ]
+
+    def stats(self) -> dict:
+        with self._lock:
+            conn = self._connect()
+            files, folders = conn.execute("SELECT COUNT(*), COUNT(DISTINCT folder) FROM files").fetchone()
+        return {"files": files, "folders": folders, "path": str(self.db_path)}
+
+
+# 全局索引
+notes_index = NotesIndex()
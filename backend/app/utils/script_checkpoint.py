@@ -0,0 +1,144 @@
+"""
+讲稿生成的断点记录
+
+每页生成后把状态写入 notes_output/<folder>/_generation_state.json：
+- done：讲稿已完成并保存到 txt
+- drafted：流水线模式的草稿已保存，尚未润色
+- failed：调用失败，续跑时重新生成
+
+同时记录每页使用的上下文（参考了哪些页的讲稿/PDF文本），续跑时从已保存的 txt 恢复上下文，只生成未完成的页面。
+不续跑而只重新生成部分页面时，只清除这些页面的记录，其他页面的记录保留，之后仍可续跑。
+"""
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+CHECKPOINT_FILENAME = "_generation_state.json"
+CHECKPOINT_VERSION = 1
+
+
+def prompt_digest(base_prompt: str) -> str:
+    return hashlib.sha256((base_prompt or "").encode("utf-8")).hexdigest()
+
+
+class ScriptCheckpoint:
+    def __init__(
+        self, output_dir, base_prompt: str, mode: str, resume: bool = False, slides: Iterable[Path] = None
+    ):
+        """
+        resume=True 时沿用上次的记录（提示词相同时）；否则清除 slides 这些页面的记录，
+        slides 为空时重新开始整个目录的记录
+        """
+        self.output_dir = Path(output_dir)
+        self.path = self.output_dir / CHECKPOINT_FILENAME
+        self.state = {
+            "version": CHECKPOINT_VERSION,
+            "mode": mode,
+            "prompt_sha256": prompt_digest(base_prompt),
+            "created_at": time.time(),
+            "updated_at": time.time(),
+            "pages": {},
+        }
+        previous = load_state(self.output_dir) if resume or slides is not None else None
+        same_prompt = previous is not None and previous.get("prompt_sha256") == self.state["prompt_sha256"]
+        if resume:
+            if previous is None:
+                print(f"[LOG] 没有可续跑的生成记录: {self.path}")
+            elif not same_prompt:
+                print("[WARN] 提示词与上次生成不一致，忽略断点重新生成")
+            else:
+                previous["mode"] = mode
+                self.state = previous
+                print(f"[LOG] 已加载生成记录，已完成 {len(self.completed_slides())} 页")
+        elif same_prompt:
+            # 只重新生成部分页面：保留其他页面的记录（提示词不同时其他页面的记录已失效，重新开始）
+            names = {Path(slide).name for slide in slides}
+            previous["pages"] = {name: page for name, page in previous["pages"].items() if name not in names}
+            previous["mode"] = mode
+            self.state = previous
+            print(f"[LOG] 保留其他 {len(previous['pages'])} 页的生成记录，重新生成 {len(names)} 页")
+        self.save()
+
+    def save(self):
+        """原子写入状态文件，进程中途退出也不会留下半个JSON"""
+        self.state["updated_at"] = time.time()
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        tmp_path.write_text(json.dumps(self.state, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+    def entry(self, slide: Path) -> Optional[dict]:
+        return self.state["pages"].get(Path(slide).name)
+
+    def completed_slides(self) -> List[str]:
+        return [name for name, page in self.state["pages"].items() if page["status"] == "done"]
+
+    def _load_text(self, slide: Path, status: str) -> Optional[str]:
+        page = self.entry(slide)
+        if not page or page["status"] != status:
+            return None
+        txt_path = Path(page["txt_path"])
+        if not txt_path.exists():
+            return None
+        return txt_path.read_text(encoding="utf-8")
+
+    def load_script(self, slide: Path) -> Optional[str]:
+        """返回已完成页面的讲稿，未完成或文件丢失时返回 None"""
+        return self._load_text(slide, "done")
+
+    def load_draft(self, slide: Path) -> Optional[str]:
+        """返回流水线模式已保存但未润色的草稿"""
+        return self._load_text(slide, "drafted")
+
+    def first_incomplete(self, slides: List[Path]) -> int:
+        """第一个未完成页面的下标（0起），全部完成时返回 len(slides)"""
+        for index, slide in enumerate(slides):
+            if self.load_script(slide) is None:
+                return index
+        return len(slides)
+
+    def _mark(self, slide: Path, page: int, status: str, txt_path=None, context=None, call=None):
+        self.state["pages"][Path(slide).name] = {
+            "page": page,
+            "status": status,
+            "txt_path": str(txt_path) if txt_path else None,
+            "context": context or {},
+            "usage": (call or {}).get("usage"),
+            "latency": (call or {}).get("latency"),
+            "error": None if status != "failed" else (call or {}).get("content"),
+            "updated_at": time.time(),
+        }
+        self.save()
+
+    def mark_done(self, slide: Path, page: int, txt_path, context: dict, call: dict):
+        self._mark(slide, page, "done", txt_path, context, call)
+
+    def mark_drafted(self, slide: Path, page: int, txt_path, context: dict, call: dict):
+        self._mark(slide, page, "drafted", txt_path, context, call)
+
+    def mark_failed(self, slide: Path, page: int, context: dict, call: dict):
+        self._mark(slide, page, "failed", None, context, call)
+
+    def summary(self) -> dict:
+        counts = {}
+        for page in self.state["pages"].values():
+            counts[page["status"]] = counts.get(page["status"], 0) + 1
+        return {"path": str(self.path), "mode": self.state.get("mode"), "pages": counts}
+
+
+def load_state(output_dir) -> Optional[dict]:
+    """读取目录下的生成记录，不存在或损坏时返回 None"""
+    path = Path(output_dir) / CHECKPOINT_FILENAME
+    if not path.exists():
+        return None
+    try:
+        state = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        print(f"[WARN] 生成记录读取失败: {path}，错误: {e}")
+        return None
+    if state.get("version") != CHECKPOINT_VERSION:
+        return None
+    return state
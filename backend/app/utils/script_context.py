@@ -0,0 +1,115 @@
+"""
+串行讲稿生成的上下文管理
+
+原做法每页都附带前 6 页讲稿全文，提示词随讲稿长度线性增长。这里改为：
+- 上一页：发送全文，保证衔接
+- 更早的页面：只发送抽取式摘要（首句 + 末句），不额外调用LLM
+- 按 token 预算从近到远加入摘要，超出预算的页面不再附带
+
+context_mode="full" 时保持原有行为（前几页全文）。
+"""
+import re
+from typing import Dict, List
+
+CONTEXT_MODES = ("compressed", "full")
+CONTEXT_TOKEN_BUDGET = 2000   # 前文部分的 token 预算（不含基础提示词和图片）
+SUMMARY_CHARS = 160           # 每页摘要的最大字符数
+
+CJK_PATTERN = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯＀-￯]")
+SENTENCE_SPLIT = re.compile(r"(?<=[。！？!?])|(?<=\.)\s+|\n+")
+MARKER_PATTERN = re.compile(r"\[(?:PAUSE\d*|breaktime[^\]]*)\]", re.IGNORECASE)
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中日韩字符按 1 字 1 token，其余按 4 字符 1 token"""
+    if not text:
+        return 0
+    cjk = len(CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def estimate_payload_tokens(payload: dict) -> int:
+    """估算 chat/completions 请求体中文本部分的 token 数（图片不计）"""
+    total = 0
+    for message in payload.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            total += estimate_tokens(content)
+        elif isinstance(content, list):
+            total += sum(estimate_tokens(part.get("text", "")) for part in content if part.get("type") == "text")
+    return total
+
+
+def summarize_script(script: str, max_chars: int = SUMMARY_CHARS) -> str:
+    """抽取式摘要：保留首句和末句，去掉停顿标记，超长时截断"""
+    text = MARKER_PATTERN.sub("", script or "")
+    sentences = [s.strip() for s in SENTENCE_SPLIT.split(text) if s and s.strip()]
+    if not sentences:
+        return ""
+    summary = sentences[0]
+    if len(sentences) > 1 and len(summary) + len(sentences[-1]) + 1 <= max_chars:
+        summary = f"{summary} … {sentences[-1]}"
+    if len(summary) > max_chars:
+        summary = summary[:max_chars - 1] + "…"
+    return summary
+
+
+class ScriptContextManager:
+    def __init__(
+        self,
+        mode: str = "compressed",
+        max_pages: int = 6,
+        token_budget: int = CONTEXT_TOKEN_BUDGET,
+        summary_chars: int = SUMMARY_CHARS,
+    ):
+        if mode not in CONTEXT_MODES:
+            raise ValueError(f"context_mode 必须是 {' 或 '.join(CONTEXT_MODES)}")
+        self.mode = mode
+        self.max_pages = max_pages
+        self.token_budget = token_budget
+        self.summary_chars = summary_chars
+        self._scripts: List[tuple] = []     # [(页码, 全文)]
+        self._summaries: Dict[int, str] = {}
+
+    def add(self, page_index: int, script: str):
+        """记录一页已生成的讲稿，只保留最近 max_pages 页"""
+        self._scripts.append((page_index, script))
+        if len(self._scripts) > self.max_pages:
+            dropped, _ = self._scripts.pop(0)
+            self._summaries.pop(dropped, None)
+
+    def _summary(self, page_index: int, script: str) -> str:
+        if page_index not in self._summaries:
+            self._summaries[page_index] = summarize_script(script, self.summary_chars)
+        return self._summaries[page_index]
+
+    def build(self, base_prompt: str, page_index: int) -> tuple:
+        """
+        构建当前页的提示词，返回 (提示词, 上下文说明)
+        上下文说明记录全文/摘要各用了哪些页，写入断点记录
+        """
+        if not self._scripts:
+            return base_prompt, {"full_pages": [], "summary_pages": [], "context_tokens": 0}
+        if self.mode == "full":
+            previous = "\n".join(
+                f"Page {index}:\n{script}" for index, script in reversed(self._scripts)
+            )
+            section = f"[Scripts of Previous pages]\n{previous}"
+            context = {"full_pages": [index for index, _ in self._scripts], "summary_pages": []}
+        else:
+            last_index, last_script = self._scripts[-1]
+            section = f"[Script of Previous page]\nPage {last_index}:\n{last_script}"
+            used = estimate_tokens(section)
+            summaries = []
+            for index, script in reversed(self._scripts[:-1]):
+                line = f"Page {index}: {self._summary(index, script)}"
+                cost = estimate_tokens(line)
+                if used + cost > self.token_budget:
+                    break
+                summaries.append((index, line))
+                used += cost
+            if summaries:
+                section += "\n\n[Summaries of earlier pages]\n" + "\n".join(line for _, line in summaries)
+            context = {"full_pages": [last_index], "summary_pages": [index for index, _ in summaries]}
+        context["context_tokens"] = estimate_tokens(section)
+        return f"{base_prompt}\n\n{section}", context
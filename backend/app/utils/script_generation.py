@@ -0,0 +1,400 @@
+"""
+幻灯片讲稿生成的公共逻辑
+
+提供两种生成模式：
+- sequential：逐页串行生成，每页提示词携带前几页已生成的讲稿（上一页全文 + 更早页面的摘要，见 script_context）
+- pipelined：所有页面在并发上限内同时生成草稿，上下文使用幻灯片图片和相邻页的PDF文本，
+  之后再做一次仅文本的顺序润色，保证页与页之间的衔接
+
+幻灯片图片先经 image_optimizer 缩小并重新编码后再上传，每次调用记录请求体字节数
+每页结果生成后立即写入 txt 文件，并通过 on_page 回调通知调用方（用于流式返回进度）
+"""
+import asyncio
+import json
+import re
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import fitz  # 来自 PyMuPDF
+
+from app.utils.image_optimizer import encode_for_llm
+from app.utils.llm_cache import CacheStats, llm_cache, make_cache_key
+from app.utils.llm_client import llm_client
+from app.utils.notes_index import notes_index
+from app.utils.script_checkpoint import ScriptCheckpoint
+from app.utils.script_context import ScriptContextManager, estimate_payload_tokens
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+PDF_UPLOAD_DIR = BASE_DIR / "pdf_uploads"
+
+SCRIPT_MODEL = "claude-3-5-sonnet-20241022"
+SYSTEM_PROMPT = "You are an experienced lecturer for IT skill training, now you are in charge of writing scripts for various IT courses."
+
+GENERATION_MODES = ("sequential", "pipelined")
+RECENT_CONTEXT_PAGES = 6     # 串行模式携带的前文页数
+REQUEST_INTERVAL = 5         # 串行模式每页之间的间隔秒数，避免API频率限制
+REQUEST_TIMEOUT = 300        # 单次API请求超时秒数
+PIPELINE_CONCURRENCY = 4     # 流水线模式默认并发数
+NEIGHBOR_TEXT_CHARS = 1500   # 流水线模式每个相邻页PDF文本的最大长度
+
+SMOOTHING_PROMPT = (
+    "Below are the final lecture script of the previous page and a draft script of the current page. "
+    "Revise only the opening of the current draft so that it follows naturally from the previous page "
+    "and does not repeat what was already said. Keep the language, tone and the rest of the draft unchanged. "
+    "Output only the revised script of the current page."
+)
+
+
+def extract_page_num(path) -> Optional[int]:
+    """
+    从图片文件名中提取页码：pdf_to_jpg 输出的 xxx_page_001.jpg 取 page_ 后的数字，
+    其他文件名与原来一样取第一组数字（1.png、1_v2.png 都是第 1 页）
+    """
+    stem = Path(path).stem
+    match = re.search(r"_page_(\d+)$", stem) or re.search(r"(\d+)", stem)
+    return int(match.group(1)) if match else None
+
+
+def list_slide_images(target_dir) -> List[Path]:
+    """列出目录下的所有幻灯片图片，按页码顺序排序"""
+    slides = []
+    for ext in ["*.jpg", "*.jpeg", "*.png"]:
+        slides.extend(Path(target_dir).glob(ext))
+
+    def sort_key(p):
+        page_num = extract_page_num(p)
+        return (page_num is None, page_num or 0, p.name)
+
+    slides.sort(key=sort_key)
+    return slides
+
+
+def find_source_pdf(folder_name: str) -> Optional[Path]:
+    """查找图片目录对应的源PDF（pdf_uploads/<folder_name>.pdf）"""
+    pdf_path = PDF_UPLOAD_DIR / f"{folder_name}.pdf"
+    return pdf_path if pdf_path.exists() else None
+
+
+def load_pdf_page_texts(pdf_path) -> Dict[int, str]:
+    """读取PDF每页的文本，返回 {页码: 文本}；PDF不存在时返回空字典"""
+    texts = {}
+    if not pdf_path or not Path(pdf_path).exists():
+        return texts
+    try:
+        with fitz.open(str(pdf_path)) as doc:
+            for i, page in enumerate(doc, 1):
+                texts[i] = page.get_text().strip()
+    except Exception as e:
+        print(f"[WARN] 读取PDF文本失败: {pdf_path}，错误: {e}")
+    return texts
+
+
+def build_neighbor_prompt(base_prompt: str, page_texts: Dict[int, str], page_num: int) -> str:
+    """流水线模式：在提示词后附加上一页、当前页、下一页的PDF文本"""
+    sections = []
+    for label, num in (("Previous page", page_num - 1), ("Current page", page_num), ("Next page", page_num + 1)):
+        text = page_texts.get(num)
+        if text:
+            sections.append(f"[{label} text (Page {num})]\n{text[:NEIGHBOR_TEXT_CHARS]}")
+    if not sections:
+        return base_prompt
+    return f"{base_prompt}\n\n" + "\n\n".join(sections)
+
+
+def build_payload(
+    prompt_text: str, encoded_slide: str = None, max_tokens: int = 4000, mime_type: str = "image/png"
+) -> dict:
+    """构建 chat/completions 请求体，encoded_slide 为空时只发送文本"""
+    content = [{"type": "text", "text": prompt_text}]
+    if encoded_slide:
+        content.append({"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{encoded_slide}"}})
+    return {
+        "model": SCRIPT_MODEL,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": content},
+        ],
+        "temperature": 0.4,
+        "max_tokens": max_tokens,
+        "user": "DMXAPI",
+    }
+
+
+async def request_script(
+    api_key: Optional[str],
+    payload: dict,
+    use_cache: bool = True,
+    cache_stats: CacheStats = None,
+    group: str = "script",
+) -> dict:
+    """
+    调用讲稿生成API（经 llm_client：共享连接、退避重试、提供方故障转移、熔断和对冲请求）
+
+    api_key 不为空时作为临时提供方加入候选
+
+    返回 {"content": 讲稿或错误信息, "ok": 是否成功, "usage": token用量, "latency": 耗时秒数,
+          "cached": 是否命中缓存, "payload_bytes": 请求体字节数, "prompt_tokens": 提示词文本的估算token数,
+          "provider": 最终使用的提供方, "attempts": 尝试次数}
+    use_cache=False 时跳过缓存的读取和写入
+    """
+    payload_bytes = len(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+    prompt_tokens = estimate_payload_tokens(payload)
+    if use_cache:
+        # 按候选提供方实际会发送的模型查找，任一模型的结果都可作为本次请求的回答
+        cached = None
+        for model in llm_client.models(payload, api_key, group):
+            cache_key = make_cache_key(payload, model)
+            cached = await asyncio.to_thread(llm_cache.get, cache_key)
+            if cached is not None:
+                break
+        if cache_stats:
+            cache_stats.record(cached is not None)
+        if cached is not None:
+            print(f"[LOG] 命中LLM缓存: {cache_key[:12]}")
+            return {
+                "content": cached["content"], "ok": True, "usage": cached.get("usage"),
+                "latency": 0.0, "cached": True, "payload_bytes": payload_bytes, "prompt_tokens": prompt_tokens,
+                "provider": None, "attempts": 0,
+            }
+    print(f"[LOG] 请求体大小: {payload_bytes} 字节，提示词约 {prompt_tokens} tokens")
+    start = time.perf_counter()
+    result = await llm_client.chat_completion(payload, api_key=api_key, group=group, timeout=REQUEST_TIMEOUT)
+    if result["ok"] and use_cache:
+        model = result.get("model") or payload.get("model")
+        await asyncio.to_thread(
+            llm_cache.put, make_cache_key(payload, model), {"content": result["content"], "usage": result["usage"]}, model
+        )
+    return {
+        "content": result["content"],
+        "ok": result["ok"],
+        "usage": result["usage"],
+        "latency": round(time.perf_counter() - start, 3),
+        "cached": False,
+        "payload_bytes": payload_bytes,
+        "prompt_tokens": prompt_tokens,
+        "provider": result["provider"],
+        "attempts": result["attempts"],
+    }
+
+
+def save_page_script(output_dir, slide: Path, script: str) -> Path:
+    """保存单页文稿"""
+    page_txt = Path(output_dir) / f"{slide.stem}.txt"
+    with open(page_txt, "w", encoding="utf-8") as f:
+        f.write(script)
+    notes_index.update(page_txt)
+    print(f"[LOG] 单页脚本已保存到: {page_txt}")
+    return page_txt
+
+
+def _page_result(index: int, slide: Path, script: str, call: dict, txt_path: Path) -> dict:
+    return {
+        "page": index,
+        "slide": slide.name,
+        "script": script,
+        "ok": call["ok"],
+        "latency": call["latency"],
+        "usage": call["usage"],
+        "cached": call.get("cached", False),
+        "payload_bytes": call.get("payload_bytes", 0),
+        "prompt_tokens": call.get("prompt_tokens", 0),
+        "provider": call.get("provider"),
+        "resumed": call.get("resumed", False),
+        "txt_path": str(txt_path),
+    }
+
+
+def _resumed_call(checkpoint: ScriptCheckpoint, slide: Path, script: str) -> dict:
+    """
+    用断点记录中已保存的讲稿构造一次“调用结果”，不发送请求
+    字段与 request_script 的返回值一致，本次没有发送的请求体和提示词按 0 计
+    """
+    entry = checkpoint.entry(slide)
+    return {
+        "content": script,
+        "ok": True,
+        "usage": entry.get("usage"),
+        "latency": 0.0,
+        "cached": False,
+        "payload_bytes": 0,
+        "prompt_tokens": 0,
+        "provider": None,
+        "attempts": 0,
+        "resumed": True,
+        "context": entry.get("context", {}),
+    }
+
+
+async def generate_scripts_sequential(
+    slides: List[Path],
+    api_key: Optional[str],
+    base_prompt: str,
+    output_dir,
+    interval: float = REQUEST_INTERVAL,
+    use_cache: bool = True,
+    cache_stats: CacheStats = None,
+    on_page: Callable[[dict], None] = None,
+    checkpoint: ScriptCheckpoint = None,
+    context_mode: str = "compressed",
+) -> List[dict]:
+    """
+    逐页串行生成讲稿，每页携带最近 RECENT_CONTEXT_PAGES 页的讲稿作为上下文
+    context_mode="compressed" 时只有上一页发送全文，更早的页面发送摘要；"full" 时全部发送全文
+
+    传入 checkpoint 时，第一个未完成页面之前的页面直接读取已保存的讲稿（同时恢复上下文），从该页开始继续生成
+    """
+    pages = []
+    context_manager = ScriptContextManager(mode=context_mode, max_pages=RECENT_CONTEXT_PAGES)
+    resume_from = checkpoint.first_incomplete(slides) if checkpoint else 0
+    if resume_from:
+        print(f"[LOG] 从第 {resume_from + 1} 页继续生成，跳过已完成的 {resume_from} 页")
+    for i, slide in enumerate(slides, 1):
+        full_prompt, context = context_manager.build(base_prompt, i)
+        if i <= resume_from:
+            script = checkpoint.load_script(slide)
+            call = _resumed_call(checkpoint, slide, script)
+            page_txt = Path(checkpoint.entry(slide)["txt_path"])
+        else:
+            print(f"[LOG] 开始处理图片 {i}/{len(slides)}: {slide.name}")
+            encoded_slide, mime_type = await asyncio.to_thread(encode_for_llm, slide)
+            print(f"[LOG] 图片base64编码长度: {len(encoded_slide)}")
+
+            print(f"[LOG] 前文上下文: 全文页 {context['full_pages']}，摘要页 {context['summary_pages']}，约 {context['context_tokens']} tokens")
+            payload = build_payload(full_prompt, encoded_slide, mime_type=mime_type)
+            call = await request_script(api_key, payload, use_cache, cache_stats)
+            script = call["content"]
+            page_txt = save_page_script(output_dir, slide, script)
+            if checkpoint and call["ok"]:
+                checkpoint.mark_done(slide, i, page_txt, context, call)
+            elif checkpoint:
+                checkpoint.mark_failed(slide, i, context, call)
+            if interval and not call["cached"] and i < len(slides):
+                await asyncio.sleep(interval)  # 避免API频率限制，命中缓存时无需等待
+
+        context_manager.add(i, script)
+
+        pages.append(_page_result(i, slide, script, call, page_txt))
+        if on_page:
+            on_page(pages[-1])
+    return pages
+
+
+async def generate_scripts_pipelined(
+    slides: List[Path],
+    api_key: Optional[str],
+    base_prompt: str,
+    output_dir,
+    page_texts: Dict[int, str] = None,
+    concurrency: int = PIPELINE_CONCURRENCY,
+    smooth: bool = True,
+    use_cache: bool = True,
+    cache_stats: CacheStats = None,
+    on_page: Callable[[dict], None] = None,
+    checkpoint: ScriptCheckpoint = None,
+) -> List[dict]:
+    """
+    流水线生成讲稿：
+    1. 在并发上限内同时为所有页面生成草稿（图片 + 相邻页PDF文本），草稿完成即落盘
+    2. 按页码顺序做一次仅文本的润色，只调整每页开头使其与上一页衔接，润色后覆盖草稿
+
+    传入 checkpoint 时，已完成的页面直接复用，已有草稿的页面只做润色
+    """
+    page_texts = page_texts or {}
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def draft(i, slide):
+        if checkpoint:
+            script = checkpoint.load_script(slide)
+            if script is not None:
+                return _resumed_call(checkpoint, slide, script)
+            script = checkpoint.load_draft(slide)
+            if script is not None:
+                return dict(_resumed_call(checkpoint, slide, script), drafted=True)
+        async with semaphore:
+            print(f"[LOG] 开始生成草稿 {i}/{len(slides)}: {slide.name}")
+            encoded_slide, mime_type = await asyncio.to_thread(encode_for_llm, slide)
+            page_num = extract_page_num(slide) or i
+            prompt_text = build_neighbor_prompt(base_prompt, page_texts, page_num)
+            payload = build_payload(prompt_text, encoded_slide, mime_type=mime_type)
+            call = await request_script(api_key, payload, use_cache, cache_stats)
+            call["context"] = {"pdf_text_pages": [n for n in (page_num - 1, page_num, page_num + 1) if page_texts.get(n)]}
+            if call["ok"]:
+                page_txt = save_page_script(output_dir, slide, call["content"])  # 先保存草稿，中途断开也不丢失
+                if checkpoint:
+                    checkpoint.mark_drafted(slide, i, page_txt, call["context"], call)
+            elif checkpoint:
+                checkpoint.mark_failed(slide, i, call["context"], call)
+            return call
+
+    drafts = await asyncio.gather(*[draft(i, slide) for i, slide in enumerate(slides, 1)])
+    print(f"[LOG] 草稿生成完成: {len(drafts)} 页，成功 {len([d for d in drafts if d['ok']])} 页")
+
+    pages = []
+    previous_script = None
+    for i, (slide, call) in enumerate(zip(slides, drafts), 1):
+        script = call["content"]
+        if call.get("resumed") and not call.get("drafted"):
+            previous_script = script
+            pages.append(_page_result(i, slide, script, call, checkpoint.entry(slide)["txt_path"]))
+            if on_page:
+                on_page(pages[-1])
+            continue
+        context = call["context"]
+        if smooth and call["ok"] and previous_script is not None:
+            smoothing_prompt = (
+                f"{SMOOTHING_PROMPT}\n\n[Previous page script]\n{previous_script}"
+                f"\n\n[Current page draft]\n{script}"
+            )
+            smoothed = await request_script(api_key, build_payload(smoothing_prompt), use_cache, cache_stats)
+            if smoothed["ok"]:
+                script = smoothed["content"]
+                context = dict(context, smoothed_with=i - 1)
+                call = dict(
+                    call,
+                    latency=round(call["latency"] + smoothed["latency"], 3),
+                    payload_bytes=call["payload_bytes"] + smoothed["payload_bytes"],
+                    prompt_tokens=call["prompt_tokens"] + smoothed["prompt_tokens"],
+                )
+            else:
+                print(f"[WARN] 第{i}页润色失败，保留草稿")
+        previous_script = script if call["ok"] else None
+
+        page_txt = save_page_script(output_dir, slide, script)
+        if checkpoint and call["ok"]:
+            checkpoint.mark_done(slide, i, page_txt, context, call)
+        pages.append(_page_result(i, slide, script, call, page_txt))
+        if on_page:
+            on_page(pages[-1])
+    return pages
+
+
+async def generate_scripts(
+    slides: List[Path],
+    api_key: Optional[str],
+    base_prompt: str,
+    output_dir,
+    mode: str = "sequential",
+    pdf_path=None,
+    concurrency: int = PIPELINE_CONCURRENCY,
+    use_cache: bool = True,
+    cache_stats: CacheStats = None,
+    on_page: Callable[[dict], None] = None,
+    checkpoint: ScriptCheckpoint = None,
+    context_mode: str = "compressed",
+) -> List[dict]:
+    """
+    按指定模式生成讲稿，返回每页的结果列表（按页码顺序），每完成一页调用一次 on_page
+    context_mode 只影响 sequential 模式（pipelined 模式本身只携带相邻页内容）
+    """
+    if mode == "pipelined":
+        page_texts = load_pdf_page_texts(pdf_path)
+        print(f"[LOG] 流水线模式，并发数: {concurrency}，PDF文本页数: {len(page_texts)}")
+        return await generate_scripts_pipelined(
+            slides, api_key, base_prompt, output_dir, page_texts=page_texts, concurrency=concurrency,
+            use_cache=use_cache, cache_stats=cache_stats, on_page=on_page, checkpoint=checkpoint
+        )
+    return await generate_scripts_sequential(
+        slides, api_key, base_prompt, output_dir, use_cache=use_cache, cache_stats=cache_stats,
+        on_page=on_page, checkpoint=checkpoint, context_mode=context_mode
+    )
@@ -0,0 +1,136 @@
+"""
+文稿清洗/改写的流式调用（/api/notes/rewrite 和 OCR 讲稿生成共用）
+
+- 经 llm_client.stream_chat_completion 流式调用，生成的文本边收边写入目标文件，
+  先写 <文件名>.part，完成后原子替换，失败时删除，不会留下半个文件
+- 相同请求命中LLM缓存时一次性输出缓存内容；成功的结果写入缓存
+- rewrite_limiter 限制同时进行的清洗请求数，避免大量清洗请求占满LLM额度和连接，拖慢其他接口
+"""
+import asyncio
+import os
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from app.utils.llm_cache import CacheStats, llm_cache, make_cache_key
+from app.utils.llm_client import llm_client
+from app.utils.notes_index import notes_index
+
+REWRITE_MODEL = "gpt-3.5-turbo"
+REWRITE_CONCURRENCY = int(os.getenv("REWRITE_CONCURRENCY", "4"))          # 同时进行的清洗请求数
+REWRITE_QUEUE_TIMEOUT = float(os.getenv("REWRITE_QUEUE_TIMEOUT", "10"))   # 排队等待的最长秒数，超时返回 429
+
+
+class RewriteLimiter:
+    def __init__(self, limit: int = REWRITE_CONCURRENCY, queue_timeout: float = REWRITE_QUEUE_TIMEOUT):
+        self.limit = limit
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(limit)
+        self.in_use = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    async def acquire(self, timeout: Optional[float] = -1) -> bool:
+        """
+        占用一个名额；timeout=-1 使用 REWRITE_QUEUE_TIMEOUT，None 表示一直等待
+        超时返回 False
+        """
+        timeout = self.queue_timeout if timeout == -1 else timeout
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return False
+        finally:
+            self.waiting -= 1
+        self.in_use += 1
+        return True
+
+    def release(self):
+        self.in_use -= 1
+        self._semaphore.release()
+
+    def metrics(self) -> dict:
+        return {"limit": self.limit, "in_use": self.in_use, "waiting": self.waiting, "rejected": self.rejected}
+
+
+# 全局限流器
+rewrite_limiter = RewriteLimiter()
+
+
+def build_rewrite_payload(prompt: str, text: str, model: str = REWRITE_MODEL) -> dict:
+    return {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": prompt},
+            {"role": "user", "content": text}
+        ]
+    }
+
+
+async def stream_rewrite_to_file(
+    payload: dict,
+    target_path,
+    api_key: str = None,
+    group: str = "openai",
+    use_cache: bool = True,
+    cache_stats: CacheStats = None,
+    result: dict = None,
+) -> AsyncIterator[str]:
+    """
+    流式调用并把结果逐段写入 target_path，逐段 yield 写入的文本（已去掉首尾空白）
+    result 不为空时，结束后写入 {"cached", "provider", "usage", "chars"}；调用失败时抛出 LLMStreamError
+    """
+    target_path = Path(target_path)
+    part_path = target_path.with_name(target_path.name + ".part")
+    cache_key = None
+    cached = None
+    if use_cache:
+        # 按候选提供方实际会发送的模型查找
+        for model in llm_client.models(payload, api_key, group):
+            cache_key = make_cache_key(payload, model)
+            cached = await asyncio.to_thread(llm_cache.get, cache_key)
+            if cached is not None:
+                break
+        if cache_stats:
+            cache_stats.record(cached is not None)
+    info = {"cached": cached is not None, "provider": None, "usage": cached.get("usage") if cached else None}
+
+    async def chunks():
+        if cached is not None:
+            print(f"[LOG] 命中LLM缓存: {cache_key[:12]}")
+            yield cached["content"]
+            return
+        async for delta in llm_client.stream_chat_completion(payload, api_key=api_key, group=group, result=info):
+            yield delta
+
+    written = []
+    pending_space = ""   # 暂不写入的末尾空白，后面还有内容时再补上，保证结果与 strip() 一致
+    try:
+        with open(part_path, "w", encoding="utf-8") as f:
+            async for delta in chunks():
+                text = pending_space + delta
+                if not written:
+                    text = text.lstrip()
+                stripped = text.rstrip()
+                pending_space = text[len(stripped):]
+                if not stripped:
+                    continue
+                f.write(stripped)
+                f.flush()
+                written.append(stripped)
+                yield stripped
+        os.replace(part_path, target_path)
+    finally:
+        if part_path.exists():
+            part_path.unlink()
+    notes_index.update(target_path)
+    content = "".join(written)
+    if use_cache and cached is None:
+        model = info.get("model") or payload.get("model")
+        await asyncio.to_thread(
+            llm_cache.put, make_cache_key(payload, model), {"content": content, "usage": info["usage"]}, model
+        )
+    print(f"[LOG] 清洗结果已保存到: {target_path}（{len(content)} 字）")
+    if result is not None:
+        result.update(info, chars=len(content))
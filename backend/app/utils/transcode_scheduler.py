@@ -0,0 +1,175 @@
+"""
+视频转码调度
+
+原来每个转码任务在后台协程中逐个调用阻塞的 encode_video，既只能同时转码一个文件，又会在转码期间卡住整个事件循环。
+这里把转码放到线程池中，同时运行 TRANSCODE_WORKERS 个 ffmpeg 进程：
+- 每个进程的 libx264 线程数为 TRANSCODE_THREADS，默认进程数 = CPU 核数 / 线程数，总线程数与核数相当
+- 多个任务同时提交时按优先级（priority 大者优先）调度；优先级相同的任务轮流取文件，
+  后提交的小任务不必等前面的大任务全部完成
+- 每个文件开始、进度变化（ffmpeg -progress）和结束时回调调用方（在事件循环中 await），用于推送 WebSocket 进度
+"""
+import asyncio
+import itertools
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.utils.transcoding import encode_video
+
+_CPU_COUNT = os.cpu_count() or 2
+TRANSCODE_THREADS = int(os.getenv("TRANSCODE_THREADS", str(max(1, min(4, _CPU_COUNT // 2)))))   # 每个 ffmpeg 的编码线程数
+TRANSCODE_WORKERS = int(os.getenv("TRANSCODE_WORKERS", str(max(1, _CPU_COUNT // TRANSCODE_THREADS))))   # 同时运行的 ffmpeg 数
+
+
+class TranscodeItem:
+    def __init__(self, input_path: Path, output_path: Path):
+        self.input_path = Path(input_path)
+        self.output_path = Path(output_path)
+        self.percent = 0
+        self.finished = False
+
+
+class TranscodeBatch:
+    """一个任务（目录）提交的一批文件"""
+
+    def __init__(self, name: str, items: List[TranscodeItem], priority: int, on_start, on_progress, on_done):
+        self.name = name
+        self.priority = priority
+        self.pending = deque(items)
+        self.total = len(items)
+        self.running: List[TranscodeItem] = []
+        self.finished = 0
+        self.reported = 0           # on_done 已执行完的文件数，全部执行完才算结束
+        self.served_at = 0          # 最近一次取文件的序号，用于同优先级任务之间轮流
+        self.on_start = on_start
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.done = asyncio.Event()
+        self.submitted_at = time.time()
+
+
+class TranscodeScheduler:
+    def __init__(self, workers: int = TRANSCODE_WORKERS, threads: int = TRANSCODE_THREADS, encoder=encode_video):
+        self.workers = workers
+        self.threads = threads
+        self.encoder = encoder
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="transcode")
+        self._batches: List[TranscodeBatch] = []
+        self._running = 0
+        self._counter = itertools.count(1)
+        self._tasks = set()   # 保留后台协程的引用，事件循环只持有弱引用，避免运行中被回收
+
+    async def run(
+        self, name: str, files: List[Tuple[Path, Path]], priority: int = 0,
+        on_start: Callable[[TranscodeItem], Awaitable] = None,
+        on_progress: Callable[[TranscodeItem, int], Awaitable] = None,
+        on_done: Callable[[TranscodeItem, bool, Optional[dict]], Awaitable] = None,
+    ):
+        """
+        提交一批 (输入, 输出) 文件并等待全部完成
+        on_start(item) / on_progress(item, percent) / on_done(item, success, result) 均为协程函数，可为 None
+        """
+        batch = TranscodeBatch(
+            name, [TranscodeItem(src, dst) for src, dst in files], priority, on_start, on_progress, on_done
+        )
+        if not batch.total:
+            return
+        self._batches.append(batch)
+        print(f"[LOG] 转码任务入队: {name}，{batch.total} 个文件，优先级 {priority}，并发上限 {self.workers}")
+        self._dispatch()
+        await batch.done.wait()
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _next_batch(self) -> Optional[TranscodeBatch]:
+        candidates = [b for b in self._batches if b.pending]
+        if not candidates:
+            return None
+        # 优先级高的先取；同优先级时正在转码的文件少、最久没有取过文件的任务先取
+        return min(candidates, key=lambda b: (-b.priority, len(b.running), b.served_at))
+
+    def _dispatch(self):
+        while self._running < self.workers:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            item = batch.pending.popleft()
+            batch.running.append(item)
+            batch.served_at = next(self._counter)
+            self._running += 1
+            self._spawn(self._run_item(batch, item))
+
+    async def _run_item(self, batch: TranscodeBatch, item: TranscodeItem):
+        loop = asyncio.get_running_loop()
+        success, result = False, None
+
+        def report(percent):
+            # 在转码线程中调用，转到事件循环处理
+            loop.call_soon_threadsafe(self._report_progress, batch, item, percent)
+
+        try:
+            if batch.on_start:
+                await batch.on_start(item)
+            item.output_path.parent.mkdir(parents=True, exist_ok=True)
+            success, result = await loop.run_in_executor(
+                self._executor, self.encoder, str(item.input_path), str(item.output_path), report, self.threads
+            )
+        except Exception as e:
+            print(f"[ERROR] 转码异常: {item.input_path} - {e}")
+            result = {"status": "failed", "error": str(e)}
+        finally:
+            item.finished = True
+            item.percent = 100
+            self._running -= 1
+            batch.running.remove(item)
+            batch.finished += 1
+            if batch.finished == batch.total:
+                self._batches.remove(batch)
+            # 先让出名额再回调，回调（WebSocket 推送）较慢时不影响下一个文件开始
+            self._dispatch()
+        try:
+            if batch.on_done:
+                await batch.on_done(item, success, result)
+        except Exception as e:
+            print(f"[WARN] 转码完成回调失败: {e}")
+        finally:
+            batch.reported += 1
+            if batch.reported == batch.total:
+                batch.done.set()
+
+    def _report_progress(self, batch: TranscodeBatch, item: TranscodeItem, percent: int):
+        if item.finished or percent == item.percent:
+            return
+        item.percent = percent
+        if batch.on_progress:
+            self._spawn(batch.on_progress(item, percent))
+
+    def snapshot(self) -> Dict:
+        """当前运行和排队的情况"""
+        return {
+            "workers": self.workers,
+            "threads_per_worker": self.threads,
+            "running": self._running,
+            "tasks": [
+                {
+                    "name": b.name,
+                    "priority": b.priority,
+                    "total": b.total,
+                    "finished": b.finished,
+                    "queued": len(b.pending),
+                    "running": {item.input_path.name: item.percent for item in b.running},
+                }
+                for b in self._batches
+            ],
+        }
+
+
+# 全局实例
+transcode_scheduler = TranscodeScheduler()
@@ -4,6 +4,7 @@ from pathlib import Path
 import time
 import logging
 import json
+import threading
 from datetime import datetime
 
 
@@ -57,8 +58,35 @@ def get_video_info(file_path):
         return None
 
 
-def encode_video(input_path, output_path, progress_callback=None):
-    """Encode a single video file with detailed logging and progress tracking"""
+def _run_with_progress(stream, duration, progress_callback):
+    """
+    运行 ffmpeg 并解析 -progress 输出，按输出时长占输入时长的比例回调进度（0-99 的整数，变化时才回调）
+    stderr 在单独的线程中读取，避免管道写满导致 ffmpeg 阻塞
+    """
+    process = stream.global_args("-progress", "pipe:1", "-nostats").run_async(pipe_stdout=True, pipe_stderr=True)
+    stderr_chunks = []
+    reader = threading.Thread(target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True)
+    reader.start()
+    last_percent = -1
+    for raw in process.stdout:
+        key, _, value = raw.decode("utf-8", errors="ignore").strip().partition("=")
+        # out_time_ms 实际单位也是微秒
+        if key in ("out_time_us", "out_time_ms") and value.isdigit() and duration > 0:
+            percent = min(99, int(int(value) / 1000000 / duration * 100))
+            if percent != last_percent:
+                last_percent = percent
+                progress_callback(percent)
+    process.wait()
+    reader.join()
+    if process.returncode != 0:
+        raise ffmpeg.Error("ffmpeg", None, b"".join(stderr_chunks))
+
+
+def encode_video(input_path, output_path, progress_callback=None, threads=None):
+    """
+    Encode a single video file with detailed logging and progress tracking
+    progress_callback(percent) 在转码过程中回调进度；threads 为 libx264 的线程数（None 时由 ffmpeg 自动决定）
+    """
     try:
         logger.info(f"开始转码: {input_path} -> {output_path}")
         
@@ -76,6 +104,7 @@ def encode_video(input_path, output_path, progress_callback=None):
         logger.info("  - CRF值: 23")
         logger.info("  - 音频比特率: 128k")
         logger.info("  - 快速启动: 启用")
+        logger.info(f"  - 编码线程数: {threads or '自动'}")
         
         # 记录开始时间
         start_time = time.time()
@@ -84,6 +113,7 @@ def encode_video(input_path, output_path, progress_callback=None):
         logger.info(f"转码开始时间: {start_datetime.strftime('%Y-%m-%d %H:%M:%S')}")
         
         # 构建ffmpeg命令
+        thread_args = {"threads": threads} if threads else {}
         stream = (
             ffmpeg.input(input_path)
             .output(
@@ -97,6 +127,7 @@ def encode_video(input_path, output_path, progress_callback=None):
                     "crf": 23,  # Constant Rate Factor
                     "b:a": "128k",  # Audio bitrate
                     "movflags": "+faststart",  # Enable fast start
+                    **thread_args,
                 },
             )
             .overwrite_output()
@@ -104,7 +135,10 @@ def encode_video(input_path, output_path, progress_callback=None):
 
         # 执行转码过程并捕获输出
         logger.info("执行转码命令...")
-        process = stream.run(capture_stdout=True, capture_stderr=True, input=None)
+        if progress_callback:
+            _run_with_progress(stream, input_info["duration"], progress_callback)
+        else:
+            stream.run(capture_stdout=True, capture_stderr=True, input=None)
         
         # 计算转码时间
         end_time = time.time()
@@ -152,7 +186,8 @@ def encode_video(input_path, output_path, progress_callback=None):
                 "video_level": "4.0",
                 "preset": "slow",
                 "crf": 23,
-                "audio_bitrate": "128k"
+                "audio_bitrate": "128k",
+                "threads": threads
             }
         }
         
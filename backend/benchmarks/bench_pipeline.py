@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+TTS 流程基准测试（离线）：用 fake 后端合成若干页讲稿，测量并发合成、分段拼接、字幕生成和写文件的整体吞吐
+
+不需要 Azure 和 MySQL：
+    python benchmarks/bench_pipeline.py --pages 40 --chars 600 --latency-ms 200 --rtf 0.1 --concurrency 8
+"""
+import argparse
+import asyncio
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+SENTENCES = [
+    "今日は関数の基本について説明します。",
+    "まず、関数とは何かを確認しましょう。",
+    "引数を受け取り、結果を返すのが関数です。",
+    "それでは、実際のコードを見てみましょう？",
+    "ここが重要なポイントです！",
+]
+
+
+def make_page(index: int, chars: int) -> str:
+    text, i = "", index
+    while len(text) < chars:
+        text += SENTENCES[i % len(SENTENCES)]
+        i += 1
+    return text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="用 fake 后端测量 TTS 流程的吞吐")
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--chars", type=int, default=600, help="每页字数")
+    parser.add_argument("--latency-ms", type=int, default=100, help="fake 后端的首包延迟")
+    parser.add_argument("--rtf", type=float, default=0.05, help="fake 后端的实时率（合成耗时 / 音频时长）")
+    parser.add_argument("--concurrency", type=int, default=4, help="同时合成的页数")
+    parser.add_argument("--chunk-chars", type=int, default=300, help="分段字数，0 表示不分段")
+    args = parser.parse_args()
+
+    # 模块导入时读取这些配置
+    os.environ["TTS_BACKEND"] = "fake"
+    os.environ["FAKE_TTS_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["FAKE_TTS_REALTIME_FACTOR"] = str(args.rtf)
+    os.environ["TTS_CONCURRENCY"] = str(args.concurrency)
+    os.environ["TTS_CHUNK_CHARS"] = str(args.chunk_chars)
+    from app.tts.tts_pool import synthesize_pages
+
+    with tempfile.TemporaryDirectory() as tmp:
+        notes_dir, output_dir = Path(tmp) / "notes", Path(tmp) / "out"
+        notes_dir.mkdir()
+        txt_paths = []
+        for i in range(1, args.pages + 1):
+            path = notes_dir / f"{i}.txt"
+            path.write_text(make_page(i, args.chars), encoding="utf-8")
+            txt_paths.append(path)
+
+        start = time.perf_counter()
+        results = asyncio.run(synthesize_pages(txt_paths, output_dir, voice="ja-JP-DaichiNeural", use_cache=False))
+        wall = time.perf_counter() - start
+
+    ok = [r for r in results if r["status"] == "success"]
+    elapsed = sorted(r["elapsed"] for r in ok)
+    audio_seconds = sum(r["audio_ms"] or 0 for r in ok) / 1000
+    print(f"\n{len(ok)}/{len(results)} pages ok, {args.chars} chars/page, concurrency {args.concurrency}")
+    print(f"wall time:        {wall:.2f} s")
+    print(f"pages/s:          {len(ok) / wall:.2f}")
+    print(f"audio generated:  {audio_seconds:.1f} s ({audio_seconds / wall:.1f}x realtime)")
+    if elapsed:
+        p95 = elapsed[math.ceil(len(elapsed) * 0.95) - 1]
+        print(f"per page avg/p95: {statistics.mean(elapsed) * 1000:.0f} / {p95 * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
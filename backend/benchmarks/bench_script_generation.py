@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+讲稿生成模式基准测试：对比 sequential 与 pipelined 两种模式的总耗时
+
+默认启动本地模拟LLM服务并生成合成幻灯片，不会调用真实API：
+    python benchmarks/bench_script_generation.py --pages 20 --latency 2.0
+
+也可以指定真实目录与接口：
+    python benchmarks/bench_script_generation.py --folder presentation --url https://... --api-key sk-...
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def make_synthetic_slides(target_dir: Path, pages: int):
+    """生成简单的合成幻灯片图片"""
+    from PIL import Image, ImageDraw
+
+    for i in range(1, pages + 1):
+        img = Image.new("RGB", (1280, 720), (255, 255, 255))
+        ImageDraw.Draw(img).text((40, 40), f"Slide {i}", fill=(0, 0, 0))
+        img.save(target_dir / f"{i}.png")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比讲稿生成模式的耗时")
+    parser.add_argument("--folder", type=str, default=None, help="processed_images 下的目录名，默认使用合成幻灯片")
+    parser.add_argument("--pages", type=int, default=20, help="合成幻灯片页数")
+    parser.add_argument("--url", type=str, default=None, help="chat/completions 接口地址，默认启动本地模拟服务")
+    parser.add_argument("--api-key", type=str, default="fake-key")
+    parser.add_argument("--latency", type=float, default=2.0, help="本地模拟服务的延迟（秒）")
+    parser.add_argument("--interval", type=float, default=5.0, help="sequential 模式每页间隔（秒）")
+    parser.add_argument("--concurrency", type=int, default=4, help="pipelined 模式并发数")
+    parser.add_argument("--context-mode", type=str, default="compressed", choices=["compressed", "full"],
+                        help="sequential 模式的前文携带方式")
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        os.environ["SCRIPT_API_URL"] = args.url
+    else:
+        from benchmarks.fake_llm_server import start_server
+
+        server = start_server(port=8765, latency=args.latency)
+        os.environ["SCRIPT_API_URL"] = "http://127.0.0.1:8765/v1/chat/completions"
+
+    from app.utils import script_generation as sg
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        if args.folder:
+            slides = sg.list_slide_images(sg.BASE_DIR / "processed_images" / args.folder)
+            pdf_path = sg.find_source_pdf(args.folder)
+        else:
+            (tmp / "slides").mkdir()
+            make_synthetic_slides(tmp / "slides", args.pages)
+            slides = sg.list_slide_images(tmp / "slides")
+            pdf_path = None
+
+        results = {}
+        for mode in sg.GENERATION_MODES:
+            output_dir = tmp / mode
+            output_dir.mkdir()
+            start = time.perf_counter()
+            if mode == "sequential":
+                coro = sg.generate_scripts_sequential(
+                    slides, args.api_key, "benchmark prompt", output_dir, interval=args.interval,
+                    use_cache=False, context_mode=args.context_mode
+                )
+            else:
+                coro = sg.generate_scripts_pipelined(
+                    slides, args.api_key, "benchmark prompt", output_dir,
+                    page_texts=sg.load_pdf_page_texts(pdf_path), concurrency=args.concurrency,
+                    use_cache=False
+                )
+            pages = asyncio.run(coro)
+            results[mode] = (
+                time.perf_counter() - start,
+                len([p for p in pages if p["ok"]]),
+                sum(p["payload_bytes"] for p in pages),
+                sum(p["prompt_tokens"] for p in pages),
+            )
+
+    if server:
+        server.shutdown()
+
+    print(f"\n{'mode':<12}{'pages':>8}{'ok':>6}{'wall-clock(s)':>16}{'s/page':>10}{'payload(KB)':>14}{'prompt tokens':>15}")
+    for mode, (elapsed, ok, payload_bytes, prompt_tokens) in results.items():
+        print(
+            f"{mode:<12}{len(slides):>8}{ok:>6}{elapsed:>16.2f}"
+            f"{elapsed / max(1, len(slides)):>10.2f}{payload_bytes / 1024:>14.1f}{prompt_tokens:>15}"
+        )
+    seq, pipe = results["sequential"][0], results["pipelined"][0]
+    print(f"\nspeedup (sequential / pipelined): {seq / pipe:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+字幕编解码基准测试：对 10k 条字幕的文件测量解析、格式化、平移/缩放和合并的耗时，
+并与原来三种时间编解码实现（浮点 / 整数 / timedelta 字符串截取）及按空行正则拆分的解析方式对比
+
+    python benchmarks/bench_subtitles.py --cues 10000 --repeat 5
+"""
+import argparse
+import random
+import re
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.tts import subtitles as st
+
+WORDS = ["これは", "テスト", "です。", "関数", "、", "を", "使い", "ます？", "データ", "について"]
+
+
+# ---------- 原实现（仅用于对比） ----------
+
+def legacy_format_float(ticks):
+    """原 azure_toolkit.format_time：浮点换算"""
+    total_seconds = ticks / 10000000
+    hours = int(total_seconds // 3600)
+    minutes = int((total_seconds % 3600) // 60)
+    seconds = int(total_seconds % 60)
+    milliseconds = int((total_seconds * 1000) % 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
+
+
+def legacy_format_timedelta(ms):
+    """原 srt_processer.format_time：timedelta 字符串截取（整秒时丢失毫秒）"""
+    text = str(timedelta(milliseconds=ms))[:-3]
+    if len(text) < 11:
+        text = "0" + text
+    return text.replace(".", ",")
+
+
+def legacy_parse_time(time_str):
+    """原 merge_subtitle.parse_time"""
+    hours, minutes, seconds = time_str.split(":")
+    seconds, milliseconds = seconds.split(",")
+    return int(hours) * 3600000 + int(minutes) * 60000 + int(seconds) * 1000 + int(milliseconds)
+
+
+def legacy_parse(path):
+    """原解析方式：整文件读入后按空行正则拆分"""
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read().strip()
+    subs = []
+    for block in re.split(r"\n\n+", content):
+        lines = block.split("\n")
+        if len(lines) >= 3:
+            times = lines[1].split(" --> ")
+            subs.append((legacy_parse_time(times[0]), legacy_parse_time(times[1]), " ".join(lines[2:])))
+    return subs
+
+
+# ---------- 测试 ----------
+
+def make_cues(count: int) -> st.Cues:
+    random.seed(0)
+    cues = st.Cues()
+    position = 0
+    for _ in range(count):
+        start = position + random.randint(0, 400)
+        end = start + random.randint(100, 3000)
+        cues.append(start, end, random.choice(WORDS))
+        position = end
+    return cues
+
+
+def bench(label, func, repeat, rows):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    rows.append((label, best * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="字幕编解码耗时")
+    parser.add_argument("--cues", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5, help="每项重复次数，取最好成绩")
+    args = parser.parse_args()
+
+    cues = make_cues(args.cues)
+    ms_values = list(cues.starts)
+    ticks_values = [ms * 10000 for ms in ms_values]
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        srt_path = Path(tmp) / "bench.srt"
+        vtt_path = Path(tmp) / "bench.vtt"
+        cues.write_srt(srt_path)
+        cues.write_vtt(vtt_path)
+
+        bench("format time: float (legacy)", lambda: [legacy_format_float(t) for t in ticks_values], args.repeat, rows)
+        bench("format time: timedelta (legacy)", lambda: [legacy_format_timedelta(m) for m in ms_values], args.repeat, rows)
+        bench("format time: integer ms", lambda: [st.format_srt_time(m) for m in ms_values], args.repeat, rows)
+        texts = [st.format_srt_time(m) for m in ms_values]
+        bench("parse time: split (legacy)", lambda: [legacy_parse_time(t) for t in texts], args.repeat, rows)
+        bench("parse time: subtitles", lambda: [st.parse_time(t) for t in texts], args.repeat, rows)
+
+        bench("parse srt file: regex blocks (legacy)", lambda: legacy_parse(srt_path), args.repeat, rows)
+        bench("parse srt file: streaming", lambda: st.read_subtitles(srt_path), args.repeat, rows)
+        bench("parse vtt file: streaming", lambda: st.read_subtitles(vtt_path), args.repeat, rows)
+        bench("write srt", lambda: cues.write_srt(srt_path), args.repeat, rows)
+        bench("write vtt", lambda: cues.write_vtt(vtt_path), args.repeat, rows)
+
+        bench("shift", lambda: cues.shift(1500), args.repeat, rows)
+        bench("scale", lambda: cues.copy().scale(1.1), args.repeat, rows)
+        bench("concat x10", lambda: st.Cues.concat([cues] * 10), args.repeat, rows)
+        bench("merge_sentences", lambda: st.merge_sentences(cues), args.repeat, rows)
+        bench("merge_short", lambda: st.merge_short(cues), args.repeat, rows)
+
+    print(f"\n{args.cues} cues, best of {args.repeat}\n")
+    print(f"{'operation':<40}{'ms':>10}")
+    for label, ms in rows:
+        print(f"{label:<40}{ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+语音合成基准测试：对比每页新建合成器（原实现）与合成器池复用连接的首包耗时和每页耗时
+
+需要真实的 Azure 语音服务密钥：
+    python benchmarks/bench_tts.py --key xxx --region japaneast --pages 10
+也可以用环境变量 AZURE_SPEECH_KEY / AZURE_SPEECH_REGION 提供
+
+--formats 时改为用同一段讲稿合成各输出格式，比较每分钟语音的字节数：
+    python benchmarks/bench_tts.py --formats wav16,wav24,wav48,mp3,opus
+"""
+import argparse
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import azure.cognitiveservices.speech as speechsdk
+
+from app.tts.audio_formats import audio_duration_ms, get_audio_format
+from app.tts.azure_toolkit import build_ssml, synthesize_ssml
+from app.tts.synthesizer_pool import synthesizer_pool
+
+SAMPLE_TEXT = "今日は関数の基本について説明します。まず、関数とは何かを確認しましょう。"
+
+
+def synthesize_per_call(key, region, ssml, audio_path, voice):
+    """原实现：每页新建 SpeechConfig / AudioOutputConfig / SpeechSynthesizer"""
+    start = time.perf_counter()
+    first_byte = []
+    speech_config = speechsdk.SpeechConfig(subscription=key, region=region)
+    speech_config.speech_synthesis_voice_name = voice
+    audio_config = speechsdk.audio.AudioOutputConfig(filename=audio_path)
+    synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=audio_config)
+    synthesizer.synthesizing.connect(lambda evt: first_byte or first_byte.append(time.perf_counter() - start))
+    result = synthesizer.speak_ssml_async(ssml).get()
+    ok = result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted
+    return ok, first_byte[0] if first_byte else None, time.perf_counter() - start
+
+
+def synthesize_pooled(key, region, ssml, audio_path, voice):
+    stats = {}
+    ok = synthesize_ssml(key, region, ssml, audio_path, voice, stats=stats) is not None
+    if not ok:
+        return False, None, None
+    # 首包耗时加上借出合成器的时间，与原实现（含新建合成器）口径一致
+    first_byte = stats["acquire"] + stats["first_byte"] if stats["first_byte"] is not None else None
+    return True, first_byte, stats["elapsed"]
+
+
+def summarize(samples):
+    values = [v for v in samples if v is not None]
+    if not values:
+        return "-", "-"
+    p95 = sorted(values)[math.ceil(len(values) * 0.95) - 1]
+    return f"{statistics.mean(values) * 1000:.0f}", f"{p95 * 1000:.0f}"
+
+
+def bench_formats(key, region, ssml, voice, formats):
+    """各格式合成同一段 SSML，输出文件大小、时长和每分钟字节数"""
+    print(f"\n{'format':<8}{'bytes':>10}{'ms':>8}{'bytes/min':>12}{'vs wav':>8}")
+    baseline = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in formats:
+            fmt = get_audio_format(name)
+            audio_path = Path(tmp) / f"{name}{fmt['ext']}"
+            if synthesize_ssml(key, region, ssml, str(audio_path), voice, audio_format=name) is None:
+                print(f"{name:<8}{'failed':>10}")
+                continue
+            size = audio_path.stat().st_size
+            ms = audio_duration_ms(audio_path, name)
+            per_minute = size * 60000 // ms if ms else None
+            baseline = baseline or (per_minute if fmt["pcm"] else None)
+            ratio = f"{per_minute / baseline:.2f}" if per_minute and baseline else "-"
+            print(f"{name:<8}{size:>10}{ms or '-':>8}{per_minute or '-':>12}{ratio:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比每页新建合成器与合成器池的耗时")
+    parser.add_argument("--key", type=str, default=os.getenv("AZURE_SPEECH_KEY"))
+    parser.add_argument("--region", type=str, default=os.getenv("AZURE_SPEECH_REGION"))
+    parser.add_argument("--voice", type=str, default="ja-JP-DaichiNeural")
+    parser.add_argument("--pages", type=int, default=10, help="每种方式合成的页数")
+    parser.add_argument("--warm", type=int, default=1, help="池化方式预热的连接数")
+    parser.add_argument("--formats", type=str, default=None, help="逗号分隔的输出格式，指定时只比较各格式的大小")
+    args = parser.parse_args()
+    if not args.key or not args.region:
+        parser.error("需要 --key 和 --region（或环境变量 AZURE_SPEECH_KEY / AZURE_SPEECH_REGION）")
+
+    ssml = build_ssml(SAMPLE_TEXT, args.voice, "-10%")
+    if args.formats:
+        bench_formats(args.key, args.region, ssml, args.voice, [f.strip() for f in args.formats.split(",") if f.strip()])
+        synthesizer_pool.close_all()
+        return
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        synthesizer_pool.warm(args.key, args.region, args.voice, args.warm)
+        warm_seconds = time.perf_counter() - start
+        for mode, func in (("per-call", synthesize_per_call), ("pooled", synthesize_pooled)):
+            rows = [func(args.key, args.region, ssml, str(Path(tmp) / f"{mode}_{i}.wav"), args.voice)
+                    for i in range(args.pages)]
+            results[mode] = rows
+    synthesizer_pool.close_all()
+
+    print(f"\nwarm-up: {args.warm} connection(s) in {warm_seconds * 1000:.0f} ms")
+    print(f"\n{'mode':<10}{'pages':>7}{'ok':>5}{'first byte avg(ms)':>20}{'p95':>8}{'per page avg(ms)':>18}{'p95':>8}")
+    for mode, rows in results.items():
+        fb_avg, fb_p95 = summarize([r[1] for r in rows])
+        total_avg, total_p95 = summarize([r[2] for r in rows])
+        ok = sum(1 for r in rows if r[0])
+        print(f"{mode:<10}{len(rows):>7}{ok:>5}{fb_avg:>20}{fb_p95:>8}{total_avg:>18}{total_p95:>8}")
+    per_call = [r[2] for r in results["per-call"] if r[0]]
+    pooled = [r[2] for r in results["pooled"] if r[0]]
+    if per_call and pooled:
+        print(f"\nper-page overhead saved: {(statistics.mean(per_call) - statistics.mean(pooled)) * 1000:.0f} ms")
+    print(f"pool metrics: {synthesizer_pool.metrics()}")
+
+
+if __name__ == "__main__":
+    main()
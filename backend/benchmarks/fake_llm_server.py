@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+本地模拟的 OpenAI 兼容 LLM 服务，用于基准测试和离线联调
+
+用法:
+    python benchmarks/fake_llm_server.py --port 8765 --latency 2.0
+
+接口:
+    POST /v1/chat/completions  按 --latency 延迟后返回固定格式的讲稿；stream=true 时以 SSE 分段返回
+    POST /v1/files             上传批任务 JSONL（multipart，purpose=batch）
+    POST /v1/batches           创建批任务，后台逐条处理（每条按 --latency 的 1/10 延迟）
+    GET  /v1/batches/{id}      查询批任务状态（validating -> in_progress -> completed）
+    GET  /v1/files/{id}/content 下载批任务结果 JSONL
+
+模拟故障（按请求的 API Key 判断，用于测试提供方池的故障转移）:
+    key 中包含 "ratelimited"  返回 429 和 Retry-After: 1
+    key 中包含 "broken"       返回 503
+    key 中包含 "slow"         延迟为 --latency 的 10 倍（模拟长尾延迟）
+"""
+import argparse
+import email.parser
+import email.policy
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONFIG = {"latency": 2.0}
+STATS = {"requests": 0}
+STATS_LOCK = threading.Lock()
+FILES = {}     # file_id -> bytes
+BATCHES = {}   # batch_id -> 批任务对象
+
+
+def fake_completion(body: dict) -> dict:
+    """根据请求体生成一条假的 chat/completions 响应"""
+    with STATS_LOCK:
+        STATS["requests"] += 1
+        seq = STATS["requests"]
+    prompt_chars = len(json.dumps(body.get("messages", []), ensure_ascii=False))
+    content = f"これは第{seq}回目のリクエストに対するダミーの講義原稿です。"
+    return {
+        "id": f"chatcmpl-fake-{seq}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake-model"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {
+            "prompt_tokens": prompt_chars // 4,
+            "completion_tokens": len(content),
+            "total_tokens": prompt_chars // 4 + len(content),
+        },
+    }
+
+
+def parse_multipart(content_type: str, body: bytes) -> dict:
+    """解析 multipart/form-data，返回 {字段名: bytes}"""
+    message = email.parser.BytesParser(policy=email.policy.default).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + body
+    )
+    return {part.get_param("name", header="content-disposition"): part.get_payload(decode=True)
+            for part in message.iter_parts()}
+
+
+def run_batch(batch_id: str):
+    """后台处理批任务：逐条生成结果，写成输出文件"""
+    batch = BATCHES[batch_id]
+    time.sleep(CONFIG["latency"] / 10)
+    lines = [json.loads(line) for line in FILES[batch["input_file_id"]].decode("utf-8").splitlines() if line.strip()]
+    batch.update(status="in_progress", request_counts={"total": len(lines), "completed": 0, "failed": 0})
+    output = []
+    for line in lines:
+        time.sleep(CONFIG["latency"] / 10)
+        output.append({
+            "id": f"batch_req_{uuid.uuid4().hex[:8]}",
+            "custom_id": line["custom_id"],
+            "response": {"status_code": 200, "request_id": uuid.uuid4().hex, "body": fake_completion(line["body"])},
+            "error": None,
+        })
+        batch["request_counts"]["completed"] += 1
+    output_file_id = f"file-{uuid.uuid4().hex[:12]}"
+    FILES[output_file_id] = "".join(json.dumps(item, ensure_ascii=False) + "\n" for item in output).encode("utf-8")
+    batch.update(status="completed", output_file_id=output_file_id, completed_at=int(time.time()))
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    def _send_json(self, status: int, data: dict, headers: dict = None):
+        payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        try:
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # 客户端已取消请求（如对冲请求中落后的一方）
+
+    def _send_stream(self, completion: dict, chunks: int = 5):
+        """以 SSE 分段发送，总耗时约为 --latency，最后一段带 usage"""
+        content = completion["choices"][0]["message"]["content"]
+        size = max(1, -(-len(content) // chunks))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        try:
+            for start in range(0, len(content), size):
+                time.sleep(CONFIG["latency"] / chunks)
+                chunk = {
+                    "id": completion["id"], "object": "chat.completion.chunk", "model": completion["model"],
+                    "choices": [{"index": 0, "delta": {"content": content[start:start + size]}, "finish_reason": None}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+            final = {"id": completion["id"], "object": "chat.completion.chunk", "choices": [], "usage": completion["usage"]}
+            self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.close_connection = True
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_POST(self):
+        if self.path.rstrip("/").endswith("/chat/completions"):
+            body = self._read_json()
+            api_key = self.headers.get("Authorization", "")
+            if "ratelimited" in api_key:
+                self._send_json(429, {"error": {"message": "rate limited"}}, {"Retry-After": "1"})
+                return
+            if "broken" in api_key:
+                self._send_json(503, {"error": {"message": "service unavailable"}})
+                return
+            if body.get("stream"):
+                self._send_stream(fake_completion(body))
+                return
+            time.sleep(CONFIG["latency"] * (10 if "slow" in api_key else 1))
+            self._send_json(200, fake_completion(body))
+        elif self.path.rstrip("/").endswith("/files"):
+            length = int(self.headers.get("Content-Length", 0))
+            fields = parse_multipart(self.headers.get("Content-Type", ""), self.rfile.read(length))
+            if "file" not in fields:
+                self._send_json(400, {"error": {"message": "missing file"}})
+                return
+            file_id = f"file-{uuid.uuid4().hex[:12]}"
+            FILES[file_id] = fields["file"]
+            self._send_json(200, {
+                "id": file_id, "object": "file", "bytes": len(fields["file"]),
+                "purpose": (fields.get("purpose") or b"").decode(), "created_at": int(time.time()),
+            })
+        elif self.path.rstrip("/").endswith("/batches"):
+            body = self._read_json()
+            if body.get("input_file_id") not in FILES:
+                self._send_json(404, {"error": {"message": "input file not found"}})
+                return
+            batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+            BATCHES[batch_id] = {
+                "id": batch_id, "object": "batch", "endpoint": body.get("endpoint"),
+                "input_file_id": body["input_file_id"], "completion_window": body.get("completion_window"),
+                "status": "validating", "output_file_id": None, "error_file_id": None,
+                "created_at": int(time.time()), "request_counts": {"total": 0, "completed": 0, "failed": 0},
+                "metadata": body.get("metadata"),
+            }
+            threading.Thread(target=run_batch, args=(batch_id,), daemon=True).start()
+            self._send_json(200, BATCHES[batch_id])
+        else:
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    def do_GET(self):
+        batch_match = re.search(r"/batches/([^/]+)$", self.path.rstrip("/"))
+        file_match = re.search(r"/files/([^/]+)/content$", self.path.rstrip("/"))
+        if batch_match and batch_match.group(1) in BATCHES:
+            self._send_json(200, BATCHES[batch_match.group(1)])
+        elif file_match and file_match.group(1) in FILES:
+            data = FILES[file_match.group(1)]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/jsonl")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port: int = 8765, latency: float = 2.0) -> ThreadingHTTPServer:
+    """在后台线程启动服务，返回 server 对象（调用 shutdown() 停止）"""
+    CONFIG["latency"] = latency
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeLLMHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟 OpenAI 兼容 LLM 服务")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=2.0, help="每次请求的模拟延迟（秒）")
+    args = parser.parse_args()
+    CONFIG["latency"] = args.latency
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), FakeLLMHandler)
+    print(f"Fake LLM server listening on http://127.0.0.1:{args.port} (latency={args.latency}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
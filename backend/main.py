@@ -220,4 +220,18 @@ def extract_notes_for_project(project_id: str, task_id: str = None):
 # 可选：on_startup
 @app.on_event("startup")
 async def startup_event():
-    logging.info("🚀 服务启动中... Redis、路径初始化完毕")
\ No newline at end of file
+    logging.info("🚀 服务启动中... Redis、路径初始化完毕")
+    # 后台同步讲稿全文索引，首次搜索时无需等待全量建索引
+    import asyncio
+    from app.utils.notes_index import notes_index
+    app.state.notes_index_sync = asyncio.create_task(asyncio.to_thread(notes_index.sync))
+    # 后台预热语音合成连接，第一页合成时不必再建立连接
+    from app.tts.tts_engine import warm_synthesizers
+    app.state.tts_warmup = asyncio.create_task(asyncio.to_thread(warm_synthesizers))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    from app.utils.llm_client import llm_client
+    await llm_client.aclose()
+    from app.tts.synthesizer_pool import synthesizer_pool
+    synthesizer_pool.close_all()
\ No newline at end of file
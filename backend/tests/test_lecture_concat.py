@@ -0,0 +1,68 @@
+import wave
+
+import pytest
+
+from app.tts.lecture_concat import concat_lecture, lecture_paths
+from app.tts.subtitles import Cues, read_subtitles
+
+RATE = 24000
+
+
+def write_page(output_dir, stem, ms, cues=None, rate=RATE, fill=1):
+    with wave.open(str(output_dir / f"{stem}.wav"), "wb") as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(rate)
+        writer.writeframes(fill.to_bytes(2, "little") * (rate * ms // 1000))
+    if cues is not None:
+        Cues.from_iter(cues).write_srt(output_dir / f"{stem}_merged.srt")
+
+
+def test_concat_lecture_offsets(tmp_path):
+    # 按页码自然排序：1, 2, 10
+    write_page(tmp_path, "10", 500, [(0, 400, "最后一页")], fill=3)
+    write_page(tmp_path, "1", 1500, [(0, 700, "第一句"), (800, 1400, "第二句")], fill=1)
+    write_page(tmp_path, "2", 1250, [(100, 1200, "第二页")], fill=2)
+
+    info = concat_lecture(tmp_path, "course")
+
+    assert info["pages"] == 3 and info["duration_ms"] == 3250
+    assert [(c["page"], c["start_ms"], c["end_ms"]) for c in info["chapters"]] == [
+        ("1", 0, 1500), ("2", 1500, 2750), ("10", 2750, 3250),
+    ]
+    assert info["chapters"][0]["title"] == "第一句"
+
+    paths = lecture_paths(tmp_path, "course")
+    with wave.open(str(paths["audio"]), "rb") as reader:
+        assert reader.getframerate() == RATE
+        frames = reader.readframes(reader.getnframes())
+    samples = [int.from_bytes(frames[i:i + 2], "little") for i in (0, RATE * 3 // 2 * 2 - 2, RATE * 3 // 2 * 2, len(frames) - 2)]
+    assert samples == [1, 1, 2, 3]
+    assert len(frames) == RATE * 3250 // 1000 * 2
+
+    assert list(read_subtitles(paths["subtitle"])) == [
+        (0, 700, "第一句"), (800, 1400, "第二句"), (1600, 2700, "第二页"), (2750, 3150, "最后一页"),
+    ]
+    chapters = paths["chapters"].read_text(encoding="utf-8")
+    assert chapters.startswith(";FFMETADATA1\n")
+    assert "START=1500\nEND=2750\n" in chapters
+
+
+def test_concat_lecture_page_without_subtitles(tmp_path):
+    write_page(tmp_path, "1", 1000)
+    write_page(tmp_path, "2", 1000, [(0, 500, "二")])
+    info = concat_lecture(tmp_path)
+    assert info["chapters"][0]["title"] == "第 1 页"
+    assert list(read_subtitles(lecture_paths(tmp_path)["subtitle"])) == [(1000, 1500, "二")]
+
+
+def test_concat_lecture_rejects_mismatched_rates(tmp_path):
+    write_page(tmp_path, "1", 500)
+    write_page(tmp_path, "2", 500, rate=16000)
+    with pytest.raises(ValueError):
+        concat_lecture(tmp_path)
+
+
+def test_concat_lecture_without_pages(tmp_path):
+    with pytest.raises(ValueError):
+        concat_lecture(tmp_path)
@@ -0,0 +1,60 @@
+import asyncio
+
+from app.utils import script_generation
+from app.utils.llm_cache import LLMResponseCache, make_cache_key
+from app.utils.llm_provider_pool import LLMProvider, provider_pool
+
+
+def payload(image="QUJD", **kwargs):
+    return dict({
+        "model": "gpt-4o",
+        "messages": [{"role": "user", "content": [
+            {"type": "text", "text": "讲稿"},
+            {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{image}"}},
+        ]}],
+        "temperature": 0.4,
+    }, **kwargs)
+
+
+def test_llm_key_ignores_transport_fields():
+    assert make_cache_key(payload()) == make_cache_key(payload(user="DMXAPI", stream=True, stream_options={}))
+
+
+def test_llm_key_depends_on_image_and_parameters():
+    assert make_cache_key(payload()) != make_cache_key(payload(image="QUJE"))
+    assert make_cache_key(payload()) != make_cache_key(payload(temperature=0.7))
+
+
+def test_llm_key_uses_the_model_actually_sent():
+    assert make_cache_key(payload(), "gpt-4o-mini") == make_cache_key(payload(model="gpt-4o-mini"))
+    assert make_cache_key(payload(), "gpt-4o-mini") != make_cache_key(payload())
+    assert make_cache_key(payload(), None) == make_cache_key(payload())
+
+
+def test_providers_with_different_models_do_not_share_entries(tmp_path, monkeypatch):
+    cache = LLMResponseCache(tmp_path / "cache.sqlite3")
+    monkeypatch.setattr(script_generation, "llm_cache", cache)
+    monkeypatch.setattr(provider_pool, "providers", {"mini": LLMProvider("mini", "http://mini", "k1", model="gpt-4o-mini")})
+    sent = []
+
+    async def chat_completion(body, api_key=None, group="script", timeout=None):
+        provider = next(iter(provider_pool.providers.values()))
+        sent.append(provider.model)
+        return {
+            "ok": True, "content": f"by {provider.model}", "usage": None,
+            "provider": provider.name, "model": provider.model, "attempts": 1,
+        }
+
+    monkeypatch.setattr(script_generation.llm_client, "chat_completion", chat_completion)
+    request = lambda: asyncio.run(script_generation.request_script(None, payload()))
+
+    assert request()["cached"] is False
+    assert request()["content"] == "by gpt-4o-mini"   # 同一模型命中缓存
+    assert cache.get(make_cache_key(payload(), "gpt-4o-mini")) is not None
+    assert cache.get(make_cache_key(payload())) is None
+
+    # 换成另一个模型的提供方后不会命中前一个模型的结果
+    monkeypatch.setattr(provider_pool, "providers", {"large": LLMProvider("large", "http://large", "k2", model="gpt-4o")})
+    result = request()
+    assert result["cached"] is False and result["content"] == "by gpt-4o"
+    assert sent == ["gpt-4o-mini", "gpt-4o"]
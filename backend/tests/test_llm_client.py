@@ -0,0 +1,136 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.utils.llm_client import BACKOFF_CAP, CircuitBreaker, LLMClient, LLMStreamError, backoff_delay
+from app.utils.llm_provider_pool import LLMProvider
+
+
+def open_breaker(threshold=1):
+    # recovery=0：熔断后立即进入半开状态
+    breaker = CircuitBreaker(threshold=threshold, recovery=0)
+    for _ in range(threshold):
+        breaker.record_failure()
+    return breaker
+
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker(threshold=3, recovery=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed" and not breaker.blocks()
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.blocks()
+
+
+def test_success_resets_failures():
+    breaker = CircuitBreaker(threshold=2, recovery=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_half_open_allows_a_single_trial():
+    breaker = open_breaker()
+    assert breaker.state == "half_open" and not breaker.blocks()
+    breaker.on_attempt()
+    assert breaker.blocks()
+
+
+def test_half_open_trial_success_closes():
+    breaker = open_breaker()
+    breaker.on_attempt()
+    breaker.record_success()
+    assert breaker.state == "closed" and not breaker.blocks()
+
+
+def test_half_open_trial_failure_reopens():
+    breaker = CircuitBreaker(threshold=1, recovery=60)
+    breaker.opened_at = 0   # 早已过了恢复时间
+    breaker.on_attempt()
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.blocks()
+
+
+def test_half_open_trial_neutral_allows_another_trial():
+    breaker = open_breaker()
+    breaker.on_attempt()
+    breaker.record_neutral()
+    assert breaker.state == "half_open" and not breaker.blocks()
+    breaker.on_attempt()
+    assert breaker.blocks()
+
+
+def _client_returning(status_code, **kwargs):
+    client = LLMClient()
+    http = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(status_code, **kwargs)))
+    client.http_client = lambda: http
+    return client
+
+
+def test_send_429_does_not_lock_out_half_open_provider():
+    client = _client_returning(429, text="rate limited", headers={"Retry-After": "0"})
+    provider = LLMProvider("test", "http://llm.test/v1/chat/completions", "key")
+    breaker = client.breaker(provider)
+    breaker.threshold, breaker.recovery = 1, 0
+    breaker.record_failure()
+
+    result = asyncio.run(client._send(provider, {"messages": []}, timeout=5))
+
+    assert not result["ok"] and result["status_code"] == 429
+    assert breaker.state == "half_open" and not breaker.blocks()
+
+
+def test_send_success_closes_half_open_breaker():
+    client = _client_returning(200, json={"choices": [{"message": {"content": "ok"}}]})
+    provider = LLMProvider("test", "http://llm.test/v1/chat/completions", "key")
+    breaker = client.breaker(provider)
+    breaker.threshold, breaker.recovery = 1, 0
+    breaker.record_failure()
+
+    result = asyncio.run(client._send(provider, {"messages": []}, timeout=5))
+
+    assert result["ok"] and result["content"] == "ok"
+    assert breaker.state == "closed"
+
+
+def _sse(*chunks, done=True):
+    lines = [f"data: {chunk}" for chunk in chunks] + (["data: [DONE]"] if done else [])
+    return "\n\n".join(lines) + "\n\n"
+
+
+def _stream(client, api_key, **kwargs):
+    # 每个用例用不同的 key：失败后提供方池会让该临时提供方进入冷却
+    async def collect():
+        return [delta async for delta in client.stream_chat_completion({"messages": []}, api_key=api_key, **kwargs)]
+    return asyncio.run(collect())
+
+
+def test_stream_complete_response():
+    body = _sse('{"choices": [{"delta": {"content": "he"}}]}', '{"choices": [{"delta": {"content": "llo"}}]}')
+    client = _client_returning(200, text=body)
+    result = {}
+    assert _stream(client, "stream-complete", result=result) == ["he", "llo"]
+    assert result["attempts"] == 1
+
+
+def test_stream_finish_reason_without_done_is_complete():
+    body = _sse('{"choices": [{"delta": {"content": "hi"}, "finish_reason": "stop"}]}', done=False)
+    assert _stream(_client_returning(200, text=body), "stream-finish-reason") == ["hi"]
+
+
+def test_stream_truncated_after_output_raises():
+    body = _sse('{"choices": [{"delta": {"content": "partial"}}]}', done=False)
+    client = _client_returning(200, text=body)
+    with pytest.raises(LLMStreamError):
+        _stream(client, "stream-truncated")
+    breaker = next(iter(client.breakers.values()))
+    assert breaker.failures == 1
+
+
+def test_backoff_delay_is_bounded():
+    for attempt in range(1, 12):
+        delay = backoff_delay(attempt)
+        assert 0 <= delay <= min(BACKOFF_CAP, 0.5 * 2 ** (attempt - 1))
@@ -0,0 +1,16 @@
+import json
+
+from app.utils.llm_provider_pool import LLMProviderPool
+
+
+def test_invalid_provider_entries_do_not_stop_loading(tmp_path):
+    config = tmp_path / "llm_providers.json"
+    config.write_text(json.dumps({"providers": [
+        {"name": "extra", "url": "http://a", "api_key": "k1", "comment": "备用", "timeout": 30},
+        {"name": "bad-weight", "url": "http://b", "api_key": "k2", "weight": "heavy"},
+        "not an entry",
+        {"name": "ok", "url": "http://c", "api_key": "k3", "model": "gpt-4o-mini"},
+    ]}), encoding="utf-8")
+    pool = LLMProviderPool(config)
+    assert sorted(pool.providers) == ["extra", "ok"]   # 未知字段被忽略，无效的条目跳过
+    assert pool.providers["ok"].model == "gpt-4o-mini"
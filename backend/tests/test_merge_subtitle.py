@@ -0,0 +1,84 @@
+import random
+import re
+
+import pytest
+
+from app.tts import subtitles as st
+from app.tts.merge_subtitle import merge_subtitles
+
+WORDS = ["これは", "テスト", "です。", "関数", "、", "を", "使い", "ます？", "データ", "について", "OK!", "end."]
+
+
+# ---------- 原实现（改写前的 merge_subtitle.merge_subtitles），作为对照 ----------
+
+def legacy_merge_subtitles(input_file, output_file, max_duration=5000, max_chars=40):
+    def parse_time(time_str):
+        hours, minutes, seconds = time_str.split(":")
+        seconds, milliseconds = seconds.split(",")
+        return int(hours) * 3600000 + int(minutes) * 60000 + int(seconds) * 1000 + int(milliseconds)
+
+    def format_time(ms):
+        return f"{ms // 3600000:02d}:{(ms % 3600000) // 60000:02d}:{(ms % 60000) // 1000:02d},{ms % 1000:03d}"
+
+    with open(input_file, "r", encoding="utf-8") as f:
+        content = f.read().strip()
+    subtitles = []
+    for block in re.split(r"\n\n+", content):
+        lines = block.split("\n")
+        if len(lines) >= 3:
+            times = lines[1].split(" --> ")
+            subtitles.append({"start": parse_time(times[0]), "end": parse_time(times[1]), "text": " ".join(lines[2:])})
+    merged = []
+    current = None
+    for sub in subtitles:
+        if current is None:
+            current = sub.copy()
+            continue
+        merged_text = current["text"] + sub["text"]
+        if (
+            sub["start"] - current["end"] < 300
+            and sub["end"] - current["start"] <= max_duration
+            and len(merged_text) <= max_chars
+            and not any(current["text"].endswith(x) for x in ["。", "！", "？", ".", "!", "?"])
+        ):
+            current["end"] = sub["end"]
+            current["text"] = merged_text
+        else:
+            merged.append(current)
+            current = sub.copy()
+    if current:
+        merged.append(current)
+    with open(output_file, "w", encoding="utf-8") as f:
+        for i, sub in enumerate(merged, 1):
+            f.write(f"{i}\n{format_time(sub['start'])} --> {format_time(sub['end'])}\n{sub['text']}\n\n")
+
+
+def make_cues(count, seed):
+    rng = random.Random(seed)
+    cues = st.Cues()
+    position = rng.randint(0, 4000000)
+    for _ in range(count):
+        start = position + rng.randint(0, 600)
+        end = start + rng.randint(0, 3000)
+        text = rng.choice(WORDS)
+        if rng.random() < 0.2:
+            text += "\n" + rng.choice(WORDS)
+        cues.append(start, end, text)
+        position = end
+    return cues
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_merge_subtitles_matches_legacy(tmp_path, seed):
+    source = tmp_path / "merged.srt"
+    source.write_text(make_cues(300, seed).to_srt(), encoding="utf-8")
+    merge_subtitles(source, tmp_path / "new.srt")
+    legacy_merge_subtitles(source, tmp_path / "old.srt")
+    assert (tmp_path / "new.srt").read_bytes() == (tmp_path / "old.srt").read_bytes()
+
+
+def test_merge_subtitles_ends_with_blank_line(tmp_path):
+    source = tmp_path / "merged.srt"
+    source.write_text(make_cues(3, 0).to_srt(), encoding="utf-8")
+    merge_subtitles(source, tmp_path / "new.srt")
+    assert (tmp_path / "new.srt").read_text(encoding="utf-8").endswith("\n\n")
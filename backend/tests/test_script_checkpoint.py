@@ -0,0 +1,152 @@
+import asyncio
+from pathlib import Path
+
+from app.utils import script_generation
+from app.utils.script_checkpoint import CHECKPOINT_FILENAME, ScriptCheckpoint, load_state
+
+
+class NullIndex:
+    def update(self, path):
+        pass
+
+
+def make_slides(tmp_path, count):
+    slides = []
+    for i in range(1, count + 1):
+        slide = tmp_path / "slides" / f"{i}.png"
+        slide.parent.mkdir(exist_ok=True)
+        slide.write_bytes(b"png")
+        slides.append(slide)
+    return slides
+
+
+def fake_generation(monkeypatch, fail_pages=()):
+    """替换图片编码和 LLM 调用，记录实际请求了哪些页"""
+    requested = []
+
+    def encode(slide):
+        return f"page-{Path(slide).stem}", "image/png"
+
+    async def request(api_key, payload, use_cache=True, cache_stats=None, group="script"):
+        content = payload["messages"][1]["content"]
+        page = int(content[1]["image_url"]["url"].rsplit("page-", 1)[1])
+        requested.append((page, content[0]["text"]))
+        ok = page not in fail_pages
+        return {
+            "content": f"script {page}" if ok else "API调用失败: 500", "ok": ok, "usage": None, "latency": 0.0,
+            "cached": False, "payload_bytes": 0, "prompt_tokens": 0, "provider": None, "attempts": 1,
+        }
+
+    monkeypatch.setattr(script_generation, "encode_for_llm", encode)
+    monkeypatch.setattr(script_generation, "request_script", request)
+    monkeypatch.setattr(script_generation, "notes_index", NullIndex())
+    return requested
+
+
+def run(slides, output_dir, checkpoint):
+    return asyncio.run(script_generation.generate_scripts_sequential(
+        slides, None, "prompt", output_dir, interval=0, checkpoint=checkpoint,
+    ))
+
+
+def test_checkpoint_records_page_status(tmp_path):
+    checkpoint = ScriptCheckpoint(tmp_path, "prompt", "sequential")
+    txt = tmp_path / "1.txt"
+    txt.write_text("script 1", encoding="utf-8")
+    checkpoint.mark_done(Path("1.png"), 1, txt, {"full_pages": []}, {"usage": None})
+    checkpoint.mark_failed(Path("2.png"), 2, {}, {"content": "API调用失败"})
+
+    state = load_state(tmp_path)
+    assert state["pages"]["1.png"]["status"] == "done"
+    assert state["pages"]["2.png"]["error"] == "API调用失败"
+    assert checkpoint.first_incomplete([Path("1.png"), Path("2.png")]) == 1
+    assert not (tmp_path / (CHECKPOINT_FILENAME + ".tmp")).exists()
+
+
+def test_resume_ignores_state_for_a_different_prompt(tmp_path):
+    checkpoint = ScriptCheckpoint(tmp_path, "prompt", "sequential")
+    txt = tmp_path / "1.txt"
+    txt.write_text("script 1", encoding="utf-8")
+    checkpoint.mark_done(Path("1.png"), 1, txt, {}, {})
+    assert ScriptCheckpoint(tmp_path, "prompt", "sequential", resume=True).completed_slides() == ["1.png"]
+    assert ScriptCheckpoint(tmp_path, "other prompt", "sequential", resume=True).completed_slides() == []
+
+
+def test_resume_continues_from_first_incomplete_page(tmp_path, monkeypatch):
+    slides = make_slides(tmp_path, 4)
+    output_dir = tmp_path / "notes"
+    output_dir.mkdir()
+
+    requested = fake_generation(monkeypatch, fail_pages={3})
+    pages = run(slides, output_dir, ScriptCheckpoint(output_dir, "prompt", "sequential"))
+    assert [page["ok"] for page in pages] == [True, True, False, True]
+
+    requested = fake_generation(monkeypatch)
+    pages = run(slides, output_dir, ScriptCheckpoint(output_dir, "prompt", "sequential", resume=True))
+
+    # 只重新请求第一个未完成的页面及之后的页面，前面的页面从 txt 恢复
+    assert [page for page, _ in requested] == [3, 4]
+    assert [page["resumed"] for page in pages] == [True, True, False, False]
+    assert [page["script"] for page in pages] == ["script 1", "script 2", "script 3", "script 4"]
+    # 恢复的讲稿仍作为后续页面的上下文
+    assert "script 2" in requested[0][1]
+    assert load_state(output_dir)["pages"]["3.png"]["status"] == "done"
+
+
+def test_regenerating_a_subset_keeps_other_pages_state(tmp_path, monkeypatch):
+    slides = make_slides(tmp_path, 4)
+    output_dir = tmp_path / "notes"
+    output_dir.mkdir()
+    fake_generation(monkeypatch)
+    run(slides, output_dir, ScriptCheckpoint(output_dir, "prompt", "sequential", slides=slides))
+
+    # 不续跑、只重新生成第 2 页：其他页面的记录保留
+    checkpoint = ScriptCheckpoint(output_dir, "prompt", "sequential", slides=slides[1:2])
+    assert sorted(checkpoint.completed_slides()) == ["1.png", "3.png", "4.png"]
+    run(slides[1:2], output_dir, checkpoint)
+    assert sorted(load_state(output_dir)["pages"]) == ["1.png", "2.png", "3.png", "4.png"]
+
+    # 之后续跑整个目录时不再重新请求任何页面
+    requested = fake_generation(monkeypatch)
+    run(slides, output_dir, ScriptCheckpoint(output_dir, "prompt", "sequential", resume=True))
+    assert requested == []
+
+    # 提示词不同时其他页面的记录已失效
+    assert ScriptCheckpoint(output_dir, "other prompt", "sequential", slides=slides[:1]).completed_slides() == []
+
+
+def test_pipelined_resume_smooths_saved_drafts(tmp_path, monkeypatch):
+    slides = make_slides(tmp_path, 2)
+    output_dir = tmp_path / "notes"
+    output_dir.mkdir()
+
+    def pipelined(checkpoint):
+        return asyncio.run(script_generation.generate_scripts_pipelined(
+            slides, None, "prompt", output_dir, checkpoint=checkpoint,
+        ))
+
+    # 第一次运行：两页草稿都已保存，第 1 页不需要润色，润色第 2 页时中断（润色请求不带图片，fake 取图片时抛出 IndexError）
+    fake_generation(monkeypatch)
+    try:
+        pipelined(ScriptCheckpoint(output_dir, "prompt", "pipelined"))
+    except IndexError:
+        pass
+    assert [page["status"] for page in load_state(output_dir)["pages"].values()] == ["done", "drafted"]
+
+    smoothed = []
+
+    async def request(api_key, payload, use_cache=True, cache_stats=None, group="script"):
+        smoothed.append(payload["messages"][1]["content"][0]["text"])
+        return {
+            "content": "smoothed", "ok": True, "usage": None, "latency": 0.0, "cached": False,
+            "payload_bytes": 10, "prompt_tokens": 5, "provider": None, "attempts": 1,
+        }
+
+    monkeypatch.setattr(script_generation, "request_script", request)
+    pages = pipelined(ScriptCheckpoint(output_dir, "prompt", "pipelined", resume=True))
+
+    # 草稿不重新生成，只润色第 2 页
+    assert len(smoothed) == 1 and "script 2" in smoothed[0]
+    assert [page["script"] for page in pages] == ["script 1", "smoothed"]
+    assert [page["prompt_tokens"] for page in pages] == [0, 5]
+    assert [page["status"] for page in load_state(output_dir)["pages"].values()] == ["done", "done"]
@@ -0,0 +1,166 @@
+import random
+import re
+
+import pytest
+
+from app.tts import subtitles as st
+from app.tts.srt_processer import process_srt
+
+WORDS = ["これは", "テスト", "です。", "関数", "、", "を", "使い", "ます？", "データ", "について", "OK!", "end."]
+
+
+# ---------- 原实现（改写前的 srt_processer.process_srt），作为对照 ----------
+
+def legacy_process_srt(input_file, output_file, min_length=12):
+    punctuation = r"[。？！…．，、｡?!､：；]"
+    with open(input_file, "r", encoding="utf-8") as f:
+        content = f.read().strip()
+    original_subs = []
+    for block in re.split(r"\n\n+", content):
+        lines = block.strip().split("\n")
+        if len(lines) >= 3:
+            times = lines[1].split(" --> ")
+            original_subs.append(
+                {"start_time": times[0].strip(), "end_time": times[1].strip(), "text": "".join(lines[2:])}
+            )
+    processed_subs = []
+    current_text = ""
+    start_time = None
+    for i, sub in enumerate(original_subs):
+        if not sub["text"].strip():
+            if current_text and len(current_text) >= min_length:
+                processed_subs.append(
+                    {"start_time": start_time, "end_time": original_subs[i - 1]["end_time"], "text": current_text}
+                )
+                current_text = ""
+                start_time = None
+            continue
+        if not start_time:
+            start_time = sub["start_time"]
+        current_text += sub["text"]
+        if re.search(punctuation, sub["text"]) and len(current_text) >= min_length:
+            processed_subs.append({"start_time": start_time, "end_time": sub["end_time"], "text": current_text})
+            current_text = ""
+            start_time = None
+    if current_text and start_time:
+        if processed_subs and len(current_text) < min_length:
+            last_sub = processed_subs[-1]
+            processed_subs[-1] = {
+                "start_time": last_sub["start_time"],
+                "end_time": original_subs[-1]["end_time"],
+                "text": last_sub["text"] + current_text,
+            }
+        else:
+            processed_subs.append(
+                {"start_time": start_time, "end_time": original_subs[-1]["end_time"], "text": current_text}
+            )
+    output_content = []
+    for i, sub in enumerate(processed_subs, 1):
+        output_content.extend([str(i), f"{sub['start_time']} --> {sub['end_time']}", sub["text"], ""])
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write("\n".join(output_content))
+
+
+# ---------- 测试数据 ----------
+
+def make_cues(count, seed, multiline=False):
+    rng = random.Random(seed)
+    cues = st.Cues()
+    position = rng.randint(0, 4000000)
+    for _ in range(count):
+        start = position + rng.randint(0, 600)
+        end = start + rng.randint(0, 3000)
+        text = rng.choice(WORDS)
+        if multiline and rng.random() < 0.2:
+            text += "\n" + rng.choice(WORDS)
+        cues.append(start, end, text)
+        position = end
+    return cues
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_process_srt_matches_legacy(tmp_path, seed):
+    source = tmp_path / "pre.srt"
+    source.write_text(make_cues(300, seed, multiline=True).to_srt(), encoding="utf-8")
+    process_srt(source, tmp_path / "new.srt")
+    legacy_process_srt(source, tmp_path / "old.srt")
+    assert (tmp_path / "new.srt").read_bytes() == (tmp_path / "old.srt").read_bytes()
+
+
+# ---------- 编解码 ----------
+
+@pytest.mark.parametrize("ms", [0, 1, 999, 1000, 59999, 60000, 3599999, 3600000, 86399999, 360000000 + 7])
+def test_time_round_trip(ms):
+    assert st.parse_time(st.format_srt_time(ms)) == ms
+    assert st.parse_time(st.format_vtt_time(ms)) == ms
+
+
+def test_parse_time_variants():
+    assert st.parse_time("00:00:01,500") == 1500
+    assert st.parse_time("01:02.5") == 62500
+    assert st.parse_time("1:00:00.1234") == 3600123
+    assert st.parse_time(" 00:00:02 ") == 2000
+    with pytest.raises(ValueError):
+        st.parse_time("12")
+
+
+def test_parse_timing_line_with_vtt_settings():
+    assert st.parse_timing_line("00:00:01.000 --> 00:00:02.500 align:start") == (1000, 2500)
+    assert st.parse_timing_line("00:00:01,000 --> 00:00:02,500") == (1000, 2500)
+
+
+@pytest.mark.parametrize("vtt", [False, True])
+def test_cues_round_trip(tmp_path, vtt):
+    cues = make_cues(2000, 7)
+    path = tmp_path / ("out.vtt" if vtt else "out.srt")
+    cues.write_vtt(path) if vtt else cues.write_srt(path)
+    assert list(st.read_subtitles(path)) == list(cues)
+
+
+def test_streaming_parse_across_chunk_boundaries():
+    cues = make_cues(200, 3, multiline=True)
+    text = cues.to_srt()
+    # 按很小且不规则的块输入，块边界落在字幕块、时间行和多字节字符中间
+    rng = random.Random(1)
+    chunks, pos = [], 0
+    while pos < len(text):
+        size = rng.randint(1, 40)
+        chunks.append(text[pos:pos + size])
+        pos += size
+    assert list(st.iter_srt(chunks)) == list(st.parse_srt(text))
+    assert list(st.parse_srt(text)) == list(cues)
+
+
+# ---------- 时间操作 ----------
+
+def sample():
+    return st.Cues.from_iter([(0, 1000, "a"), (1500, 2500, "bc"), (3000, 4200, "def")])
+
+
+def test_shift():
+    assert list(sample().shift(500)) == [(500, 1500, "a"), (2000, 3000, "bc"), (3500, 4700, "def")]
+    assert list(sample().shift(-1200)) == [(0, 0, "a"), (300, 1300, "bc"), (1800, 3000, "def")]
+
+
+def test_scale():
+    assert list(sample().scale(0.5)) == [(0, 500, "a"), (750, 1250, "bc"), (1500, 2100, "def")]
+
+
+def test_clip():
+    assert list(sample().clip(800, 3500)) == [(800, 1000, "a"), (1500, 2500, "bc"), (3000, 3500, "def")]
+    assert list(sample().clip(1000, 1500)) == []
+    assert list(sample().clip(2000)) == [(2000, 2500, "bc"), (3000, 4200, "def")]
+
+
+def test_concat_back_to_back_and_with_offsets():
+    first, second = sample(), st.Cues.from_iter([(100, 200, "x")])
+    assert list(st.Cues.concat([first, st.Cues(), second])) == list(sample()) + [(4300, 4400, "x")]
+    assert list(st.Cues.concat([first, second], [1000, 10000])) == [
+        (1000, 2000, "a"), (2500, 3500, "bc"), (4000, 5200, "def"), (10100, 10200, "x"),
+    ]
+
+
+def test_iter_srt_first_index():
+    blocks = list(sample().iter_srt(5))
+    assert blocks[0] == "5\n00:00:00,000 --> 00:00:01,000\na\n"
+    assert blocks[-1].startswith("7\n")
@@ -0,0 +1,48 @@
+from app.tts import synthesizer_pool as sp
+from app.tts.backends import AzureBackend
+
+
+class FakeSynthesizer(sp.PooledSynthesizer):
+    """不连接 Azure，只记录用哪个密钥建立"""
+
+    def __init__(self, speech_key, region, voice, audio_format=None):
+        self.key = sp.pool_key(speech_key, region, voice, audio_format)
+        self.speech_key = speech_key
+        self.closed = False
+        self.started_at = self.first_byte_at = None
+        self.uses = 0
+
+    def close(self):
+        self.closed = True
+
+
+def borrow(pool, speech_key, region="japaneast"):
+    with pool.acquire(speech_key, region, "ja-JP-KeitaNeural", "wav") as synth:
+        return synth
+
+
+def test_pool_reuses_synthesizer_for_same_key(monkeypatch):
+    monkeypatch.setattr(sp, "PooledSynthesizer", FakeSynthesizer)
+    pool = sp.SynthesizerPool()
+    first = borrow(pool, "key-1")
+    assert borrow(pool, "key-1") is first
+    assert pool.metrics()["idle"] == {"japaneast/ja-JP-KeitaNeural/wav": 1}
+
+
+def test_rotated_key_gets_a_new_synthesizer(monkeypatch):
+    monkeypatch.setattr(sp, "PooledSynthesizer", FakeSynthesizer)
+    pool = sp.SynthesizerPool()
+    old = borrow(pool, "key-1")
+    new = borrow(pool, "key-2")
+    assert new is not old and new.speech_key == "key-2"
+
+
+def test_reset_credentials_closes_idle_synthesizers(monkeypatch):
+    monkeypatch.setattr(sp, "PooledSynthesizer", FakeSynthesizer)
+    pool = sp.SynthesizerPool()
+    monkeypatch.setattr("app.tts.backends.synthesizer_pool", pool)
+    synth = borrow(pool, "key-1")
+
+    AzureBackend("key-1", "japaneast").reset_credentials()
+
+    assert synth.closed and pool.metrics()["idle"] == {}
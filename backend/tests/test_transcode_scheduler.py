@@ -0,0 +1,125 @@
+import asyncio
+import gc
+import threading
+import time
+from pathlib import Path
+
+from app.utils.transcode_scheduler import TranscodeScheduler
+
+
+class FakeEncoder:
+    """阻塞的假编码器：记录开始顺序和同时运行的数量，gate 未打开前第一个文件一直阻塞"""
+
+    def __init__(self, duration=0.02, progress=()):
+        self.duration = duration
+        self.progress = progress
+        self.order = []
+        self.running = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+        self.started = threading.Event()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self, input_path, output_path, report, threads):
+        with self.lock:
+            self.order.append(Path(input_path).name)
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        self.started.set()
+        self.gate.wait(5)
+        for percent in self.progress:
+            report(percent)
+        time.sleep(self.duration)
+        with self.lock:
+            self.running -= 1
+        return True, {"status": "success"}
+
+
+def files(tmp_path, prefix, count):
+    return [(tmp_path / f"{prefix}{i}.mp4", tmp_path / "out" / f"{prefix}{i}.mp4") for i in range(1, count + 1)]
+
+
+def test_concurrency_cap_and_one_on_done_per_file(tmp_path):
+    encoder = FakeEncoder()
+    scheduler = TranscodeScheduler(workers=2, threads=1, encoder=encoder)
+    done = []
+
+    async def on_done(item, success, result):
+        done.append((item.input_path.name, success))
+
+    async def run():
+        await asyncio.gather(
+            scheduler.run("a", files(tmp_path, "a", 4), on_done=on_done),
+            scheduler.run("b", files(tmp_path, "b", 3), on_done=on_done),
+        )
+
+    asyncio.run(asyncio.wait_for(run(), timeout=10))
+    assert encoder.peak == 2
+    assert sorted(done) == sorted((f"{p}{i}.mp4", True) for p, n in (("a", 4), ("b", 3)) for i in range(1, n + 1))
+    assert scheduler.snapshot()["running"] == 0 and not scheduler._tasks
+
+
+def test_priority_first_then_round_robin(tmp_path):
+    encoder = FakeEncoder(duration=0)
+    encoder.gate.clear()
+    scheduler = TranscodeScheduler(workers=1, threads=1, encoder=encoder)
+
+    async def run():
+        first = asyncio.create_task(scheduler.run("a", files(tmp_path, "a", 3)))
+        # 等 a1 开始转码后再提交其他任务
+        await asyncio.to_thread(encoder.started.wait, 5)
+        others = [
+            asyncio.create_task(scheduler.run("c", files(tmp_path, "c", 2))),
+            asyncio.create_task(scheduler.run("b", files(tmp_path, "b", 2), priority=1)),
+        ]
+        await asyncio.sleep(0.05)
+        encoder.gate.set()
+        await asyncio.gather(first, *others)
+
+    asyncio.run(asyncio.wait_for(run(), timeout=10))
+    # 优先级高的 b 先转码；a、c 优先级相同，轮流取文件（c 还没取过文件，先于 a）
+    assert encoder.order == ["a1.mp4", "b1.mp4", "b2.mp4", "c1.mp4", "a2.mp4", "c2.mp4", "a3.mp4"]
+
+
+def test_progress_is_forwarded_to_the_event_loop(tmp_path):
+    encoder = FakeEncoder(progress=(10, 10, 50))
+    scheduler = TranscodeScheduler(workers=1, threads=1, encoder=encoder)
+    progress = []
+
+    async def on_progress(item, percent):
+        progress.append((item.input_path.name, percent, threading.get_ident()))
+
+    async def run():
+        await scheduler.run("a", files(tmp_path, "a", 1), on_progress=on_progress)
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(asyncio.wait_for(run(), timeout=10))
+    # 重复的进度只回调一次，回调在事件循环所在的线程中执行
+    assert progress == [("a1.mp4", 10, loop_thread), ("a1.mp4", 50, loop_thread)]
+
+
+def test_scheduler_keeps_references_to_pending_callbacks(tmp_path):
+    encoder = FakeEncoder(progress=(50,))
+    scheduler = TranscodeScheduler(workers=1, threads=1, encoder=encoder)
+    release = None
+    finished = []
+
+    async def on_progress(item, percent):
+        await release.wait()
+        finished.append(percent)
+
+    async def run():
+        nonlocal release
+        release = asyncio.Event()
+        job = asyncio.create_task(scheduler.run("a", files(tmp_path, "a", 1), on_progress=on_progress))
+        while not finished and not any(not t.done() and t.get_coro().__name__ == "on_progress" for t in scheduler._tasks):
+            await asyncio.sleep(0.01)
+        gc.collect()   # 事件循环只持有弱引用，调度器自己保留的引用让回调不被回收
+        release.set()
+        await job
+        await asyncio.sleep(0.01)
+
+    asyncio.run(asyncio.wait_for(run(), timeout=10))
+    assert finished == [50]
+    assert not scheduler._tasks
@@ -0,0 +1,70 @@
+import io
+import wave
+from datetime import timedelta
+
+from app.tts.tts_batching import plan_batches, split_batch
+
+RATE = 16000
+
+
+def make_wav(frames: int) -> bytes:
+    out = io.BytesIO()
+    with wave.open(out, "wb") as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(RATE)
+        writer.writeframes(b"".join((i % 30000).to_bytes(2, "little") for i in range(frames)))
+    return out.getvalue()
+
+
+def read_frames(data: bytes) -> bytes:
+    with wave.open(io.BytesIO(data), "rb") as reader:
+        assert (reader.getnchannels(), reader.getsampwidth(), reader.getframerate()) == (1, 2, RATE)
+        return reader.readframes(reader.getnframes())
+
+
+def ticks(ms: int) -> int:
+    return ms * 10000
+
+
+def word(text, start_ms, duration_ms=100):
+    return {"text": text, "audio_offset": ticks(start_ms), "duration": timedelta(milliseconds=duration_ms)}
+
+
+def test_plan_batches_groups_consecutive_short_pages():
+    # 长页面（200 字）单独成组，并打断前后的短页面
+    assert plan_batches([10, 20, 200, 30, 40, 50], budget=100, page_chars=100, max_pages=8) == [
+        [0, 1], [2], [3, 4], [5],
+    ]
+
+
+def test_plan_batches_respects_max_pages_and_empty_pages():
+    assert plan_batches([5] * 5, budget=400, page_chars=100, max_pages=2) == [[0, 1], [2, 3], [4]]
+    assert plan_batches([0, 5, 5], budget=400, page_chars=100, max_pages=8) == [[0], [1, 2]]
+    assert plan_batches([5, 5], budget=0) == [[0], [1]]
+
+
+def test_split_batch_cuts_audio_at_bookmarks():
+    audio = make_wav(RATE * 3)   # 3 秒
+    offsets = [ticks(250), ticks(1000), ticks(2200)]   # 第一页的书签在开头静音之后
+    boundaries = [word("a", 300), word("b", 900), word("c", 1000), word("d", 2500)]
+
+    pages = split_batch(audio, boundaries, offsets)
+
+    # 第一页从音频开头开始，各页首尾相接，拼起来与原音频一致
+    frames = [read_frames(page_audio) for page_audio, _ in pages]
+    assert [len(f) // 2 for f in frames] == [RATE * 1, int(RATE * 1.2), int(RATE * 0.8)]
+    assert b"".join(frames) == read_frames(audio)
+    # 单词边界按所在页切分，并平移到该页的起点
+    assert [[(wb["text"], wb["audio_offset"]) for wb in page] for _, page in pages] == [
+        [("a", ticks(300)), ("b", ticks(900))],
+        [("c", 0)],
+        [("d", ticks(300))],
+    ]
+
+
+def test_split_batch_clamps_offsets_past_the_end():
+    audio = make_wav(RATE)
+    pages = split_batch(audio, [], [0, ticks(5000)])
+    assert len(read_frames(pages[0][0])) == RATE * 2
+    assert read_frames(pages[1][0]) == b""
@@ -0,0 +1,33 @@
+from app.tts.tts_cache import make_tts_cache_key, normalize_text
+
+BREAKS = {"。": "800ms", "、": "300ms"}
+
+
+def tts_key(text="こんにちは。", voice="ja-JP-KeitaNeural", rate="0%", breaks=BREAKS, **kwargs):
+    return make_tts_cache_key(text, voice, rate, breaks, **kwargs)
+
+
+def test_tts_key_ignores_whitespace_and_unicode_form():
+    assert normalize_text("  a \n\t b ") == "a b"
+    assert tts_key("が 。") == tts_key("が  。")   # NFC 规范化后相同
+
+
+def test_tts_key_depends_on_synthesis_settings():
+    base = tts_key()
+    variants = [
+        tts_key(text="こんばんは。"),
+        tts_key(voice="ja-JP-NanamiNeural"),
+        tts_key(rate="10%"),
+        tts_key(breaks={"。": "500ms"}),
+        tts_key(chunk_chars=300),
+        tts_key(audio_format="mp3"),
+        tts_key(backend="fake"),
+        tts_key(batched=True),
+    ]
+    assert len({base, *variants}) == len(variants) + 1
+
+
+def test_tts_key_defaults_match_existing_entries():
+    # 默认值不参与计算，升级前写入的缓存条目仍然命中
+    assert tts_key() == tts_key(chunk_chars=0, audio_format="wav", backend="azure", batched=False)
+    assert tts_key(breaks={"、": "300ms", "。": "800ms"}) == tts_key()
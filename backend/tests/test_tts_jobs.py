@@ -0,0 +1,32 @@
+import asyncio
+
+from app.tts import tts_jobs
+
+
+def test_every_owner_sees_the_real_final_status(monkeypatch, tmp_path):
+    async def run():
+        gate = asyncio.Event()   # 不会被设置：任务停在第二页，等待取消
+
+        async def slow_pages(txt_paths, output_dir, voice, use_cache=True, audio_format=None):
+            yield 1, {"status": "success", "filename": "1.mp3"}
+            await gate.wait()
+            yield 2, {"status": "success", "filename": "2.mp3"}
+
+        monkeypatch.setattr(tts_jobs, "iter_synthesize_pages", slow_pages)
+        manager = tts_jobs.TTSJobManager()
+        paths = [tmp_path / "1.txt", tmp_path / "2.txt"]
+        record = lambda owner: (lambda job, event: seen[owner].append(event))
+        job = manager.start(tmp_path, paths, voice="v", audio_format="wav", owner="a", on_event=record("a"))
+        await asyncio.sleep(0.05)
+        joined = manager.start(tmp_path, paths, voice="v", audio_format="wav", owner="b", on_event=record("b"))
+        assert joined is job
+        assert manager.cancel(job.job_id)
+        await asyncio.wait_for(asyncio.gather(job.task, return_exceptions=True), timeout=5)
+        return job
+
+    seen = {"a": [], "b": []}
+    job = asyncio.run(run())
+    assert job.status == "cancelled"
+    for owner in ("a", "b"):
+        assert [e["seq"] for e in seen[owner]] == [e["seq"] for e in job.events]   # 补发已有事件，不重复不遗漏
+        assert seen[owner][-1]["type"] == "finished" and seen[owner][-1]["status"] == "cancelled"
@@ -0,0 +1,33 @@
+import asyncio
+
+import pytest
+
+from app.tts import tts_preview
+
+
+class FailingBackend:
+    name = "failing"
+
+    def stream(self, *args, **kwargs):
+        raise RuntimeError("no credentials")
+
+
+def collect(text, **kwargs):
+    async def run():
+        return [chunk async for chunk in tts_preview.iter_preview_audio(text, "voice", **kwargs)]
+    return asyncio.run(asyncio.wait_for(run(), timeout=5))
+
+
+def test_preview_reports_synchronous_backend_errors(monkeypatch):
+    monkeypatch.setattr(tts_preview, "get_backend", lambda *args, **kwargs: FailingBackend())
+    with pytest.raises(RuntimeError, match="no credentials"):
+        collect("テスト")
+
+
+def test_preview_streams_fake_backend(monkeypatch):
+    from app.tts.backends import get_backend
+    monkeypatch.setattr(tts_preview, "get_backend", lambda *args, **kwargs: get_backend("fake"))
+    info = {}
+    chunks = collect("これはテストです。", audio_format="wav", info=info)   # fake 后端只支持 PCM
+    assert b"".join(chunks).startswith(b"RIFF")
+    assert info["bytes"] == sum(map(len, chunks)) and info["word_boundaries"]
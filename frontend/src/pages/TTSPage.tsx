@@ -6,6 +6,10 @@ import axios from 'axios';
 
 const { Option } = Select;
 
+// 后端可输出的音频格式：wav / mp3 / ogg(opus)
+const AUDIO_EXTENSIONS = ['.wav', '.mp3', '.ogg'];
+const isAudioFile = (name: string) => AUDIO_EXTENSIONS.some(ext => name.endsWith(ext));
+
 const TTSPage: React.FC = () => {
   const [txtFiles, setTxtFiles] = useState<string[]>([]);
   const [audioFiles, setAudioFiles] = useState<string[]>([]);
@@ -76,7 +80,7 @@ const TTSPage: React.FC = () => {
         params: { dir_name: selectedTtsFolder }
       });
       const files: string[] = filesRes.data || [];
-      setAudioFiles(files.filter(f => f.endsWith('.wav')));
+      setAudioFiles(files.filter(isAudioFile));
       setSubtitleFiles(files.filter(f => f.endsWith('_merged.srt')));
     } catch (error) {
       // 如果目录不存在或没有文件，不报错，只是清空文件列表
@@ -292,7 +296,7 @@ const TTSPage: React.FC = () => {
   };
 
   const handleDownloadSelectedMediaZip = async () => {
-    const mediaFiles = selectedFiles.filter(name => name.endsWith('.wav') || name.endsWith('.srt'));
+    const mediaFiles = selectedFiles.filter(name => isAudioFile(name) || name.endsWith('.srt'));
     if (mediaFiles.length === 0) return;
     const link = document.createElement('a');
     link.href = `http://localhost:8000/api/download/all?dir_name=${selectedTtsFolder}`;
@@ -372,7 +376,7 @@ const TTSPage: React.FC = () => {
     message.success(`${key} 设置成功`);
   };
 
-  const hasDownloadableMedia = selectedFiles.some(name => name.endsWith('.wav') || name.endsWith('.srt'));
+  const hasDownloadableMedia = selectedFiles.some(name => isAudioFile(name) || name.endsWith('.srt'));
 
   return (
     <div style={{ padding: 24 }}>